@@ -0,0 +1,179 @@
+#
+#  Cache of frame-averaged darks, for reuse by exposures with the same readout
+#
+
+import collections
+import logging
+import os
+
+from .. import datamodels
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+# Number of averaged darks kept in memory by each cache
+DEFAULT_CACHE_SIZE = 2
+
+# One cache for each directory of saved averaged darks (None for none)
+_caches = {}
+
+
+def get_cache(directory=None):
+    """
+    Get the averaged dark cache for this process
+
+    Parameters
+    ----------
+    directory: string or None
+        if not None, averaged darks are also saved in (and read from) this
+        directory, so that they can be reused by other processes
+
+    Returns
+    -------
+    cache: AveragedDarkCache
+        the same cache is returned for each call with the same directory
+    """
+
+    if directory not in _caches:
+        _caches[directory] = AveragedDarkCache(directory)
+
+    return _caches[directory]
+
+
+class AveragedDarkCache:
+    """
+    Frame-averaged darks, keyed on the dark reference file and the readout
+    pattern of the science data
+
+    The most recently used averaged darks are kept in memory.  If a
+    directory is given, each averaged dark is also saved there as an ASDF
+    file, and read back when it is not in memory.
+    """
+
+    def __init__(self, directory=None, maxsize=DEFAULT_CACHE_SIZE):
+
+        self.directory = directory
+        self.maxsize = maxsize
+        self._models = collections.OrderedDict()
+
+    def __contains__(self, key):
+
+        return key in self._models
+
+    def __len__(self):
+
+        return len(self._models)
+
+    @staticmethod
+    def make_key(dark_model, nints, ngroups, nframes, groupgap):
+        """
+        Make the cache key for a dark averaged to match the science data
+
+        Parameters
+        ----------
+        dark_model: dark data model
+            the dark reference data
+
+        nints, ngroups, nframes, groupgap: int
+            readout pattern of the science data
+
+        Returns
+        -------
+        key: tuple or None
+            the reference file name, subarray, the number of integrations
+            averaged (None unless the dark is integration-dependent, as for
+            MIRI), ngroups, nframes and groupgap; None if the dark model
+            was not read from a file
+        """
+
+        filename = dark_model.meta.filename
+        if not filename:
+            return None
+
+        if dark_model.data.ndim == 4:
+            nints = min(nints, dark_model.data.shape[0])
+        else:
+            nints = None
+
+        return (filename, dark_model.meta.subarray.name, nints,
+                ngroups, nframes, groupgap)
+
+    def get(self, key):
+        """
+        Get an averaged dark
+
+        Parameters
+        ----------
+        key: tuple
+            key from make_key
+
+        Returns
+        -------
+        averaged_dark: dark data model or None
+            the averaged dark, which is owned by the cache and should not be
+            modified or closed; None if it is not in the cache
+        """
+
+        if key in self._models:
+            self._models.move_to_end(key)
+            log.info('Using cached averaged dark')
+            return self._models[key]
+
+        path = self._path(key)
+        if path is None or not os.path.exists(path):
+            return None
+
+        log.info('Using averaged dark %s', path)
+        if key[2] is None:
+            averaged_dark = datamodels.DarkModel(path)
+        else:
+            averaged_dark = datamodels.DarkMIRIModel(path)
+        self._add(key, averaged_dark)
+
+        return averaged_dark
+
+    def put(self, key, averaged_dark):
+        """
+        Add an averaged dark to the cache
+
+        Parameters
+        ----------
+        key: tuple
+            key from make_key
+
+        averaged_dark: dark data model
+            the averaged dark, which is then owned by the cache
+        """
+
+        path = self._path(key)
+        if path is not None and not os.path.exists(path):
+            log.info('Saving averaged dark to %s', path)
+            averaged_dark.save(path)
+        self._add(key, averaged_dark)
+
+    def clear(self):
+        """
+        Remove all averaged darks from memory
+        """
+
+        while self._models:
+            self._models.popitem(last=False)[1].close()
+
+    def _add(self, key, averaged_dark):
+
+        self._models[key] = averaged_dark
+        self._models.move_to_end(key)
+        while len(self._models) > self.maxsize:
+            self._models.popitem(last=False)[1].close()
+
+    def _path(self, key):
+
+        if self.directory is None:
+            return None
+
+        (filename, subarray, nints, ngroups, nframes, groupgap) = key
+        root = os.path.splitext(os.path.basename(filename))[0]
+        name = '{}_{}_nints{}_ngroups{}_nframes{}_groupgap{}.asdf'.format(
+            root, subarray, nints, ngroups, nframes, groupgap)
+
+        return os.path.join(self.directory, name)
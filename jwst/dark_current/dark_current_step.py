@@ -1,6 +1,7 @@
 from ..stpipe import Step
 from .. import datamodels
 from . import dark_sub
+from . import dark_cache
 
 
 __all__ = ["DarkCurrentStep"]
@@ -14,6 +15,8 @@ class DarkCurrentStep(Step):
 
     spec = """
         dark_output = output_file(default = None) # Dark model or averaged dark subtracted
+        cache_averaged_dark = boolean(default=False) # Reuse averaged darks for exposures with the same readout
+        averaged_dark_dir = string(default="") # Directory in which to also save averaged darks for reuse
     """
 
     reference_file_types = ['dark']
@@ -31,7 +34,7 @@ class DarkCurrentStep(Step):
             if self.dark_name == 'N/A':
                 self.log.warning('No DARK reference file found')
                 self.log.warning('Dark current step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.dark = 'SKIPPED'
                 return result
 
@@ -39,7 +42,7 @@ class DarkCurrentStep(Step):
             dark_output = self.dark_output
             if dark_output is not None:
                 dark_output = self.make_output_path(
-                    None, basepath=dark_output, ignore_use_model=True
+                    basepath=dark_output, suffix=False
                 )
 
             # Open the dark ref file data model - based on Instrument
@@ -51,8 +54,15 @@ class DarkCurrentStep(Step):
 
             # Do the dark correction
             result = dark_sub.do_correction(
-                input_model, dark_model, dark_output
+                input_model, dark_model, dark_output, self.in_place,
+                self.get_dark_cache()
             )
             dark_model.close()
 
         return result
+
+    def get_dark_cache(self):
+        """Get the cache of averaged darks to use, or None"""
+        if not self.cache_averaged_dark:
+            return None
+        return dark_cache.get_cache(self.averaged_dark_dir or None)
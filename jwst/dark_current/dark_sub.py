@@ -10,7 +10,8 @@ log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 
-def do_correction(input_model, dark_model, dark_output=None):
+def do_correction(input_model, dark_model, dark_output=None, in_place=False,
+                  dark_cache=None):
     """
     Short Summary
     -------------
@@ -27,6 +28,14 @@ def do_correction(input_model, dark_model, dark_output=None):
     dark_output: string
         file name in which to optionally save averaged dark data
 
+    in_place: bool
+        if True, the dark is subtracted from the input model rather than
+        from a copy
+
+    dark_cache: AveragedDarkCache or None
+        if not None, a frame-averaged dark is taken from this cache, or
+        added to it, for reuse by exposures with the same readout pattern
+
     Returns
     -------
     output_model: data model object
@@ -59,29 +68,13 @@ def do_correction(input_model, dark_model, dark_output=None):
         drk_nints, drk_ngroups, drk_nframes, drk_groupgap
     )
 
-    # Check that the number of groups in the science data does not exceed
-    # the number of groups in the dark current array.
-    sci_total_frames = sci_ngroups * (sci_nframes + sci_groupgap)
-    drk_total_frames = drk_ngroups * (drk_nframes + drk_groupgap)
-    if sci_total_frames > drk_total_frames:
-        log.warning(
-            "Not enough data in dark reference file to match to "
-            "science data."
-        )
+    # Check that the dark data can be matched to the science data
+    mismatch = dark_mismatch(input_model, dark_model)
+    if mismatch is not None:
+        log.warning(mismatch)
         log.warning("Input will be returned without subtracting dark current.")
         input_model.meta.cal_step.dark_sub = 'SKIPPED'
-        return input_model.copy()
-
-    # Check that the value of nframes and groupgap in the dark
-    # are not greater than those of the science data
-    if drk_nframes > sci_nframes or drk_groupgap > sci_groupgap:
-        log.warning(
-            "The value of nframes or groupgap in the dark data is "
-            "greater than that of the science data."
-            "Input will be returned without subtracting dark current."
-        )
-        input_model.meta.cal_step.dark_sub = 'SKIPPED'
-        return input_model.copy()
+        return input_model if in_place else input_model.copy()
 
     # Replace NaN's in the dark with zeros
     dark_model.data[np.isnan(dark_model.data)] = 0.0
@@ -91,7 +84,7 @@ def do_correction(input_model, dark_model, dark_output=None):
     if sci_nframes == drk_nframes and sci_groupgap == drk_groupgap:
 
         # They match, so we can subtract the dark ref file data directly
-        output_model = subtract_dark(input_model, dark_model)
+        output_model = subtract_dark(input_model, dark_model, in_place)
 
         # If the user requested to have the dark file saved,
         # save the reference model as this file. This will
@@ -104,17 +97,10 @@ def do_correction(input_model, dark_model, dark_output=None):
 
         # Create a frame-averaged version of the dark data to match
         # the nframes and groupgap settings of the science data.
-        # If the data are from MIRI, the darks are integration-dependent and
-        # we average them with a seperate routine.
-
-        if instrument == 'MIRI':
-            averaged_dark = average_MIRIdark_frames(
-                dark_model, sci_nints, sci_ngroups, sci_nframes, sci_groupgap
-            )
-        else:
-            averaged_dark = average_dark_frames(
-                dark_model, sci_ngroups, sci_nframes, sci_groupgap
-            )
+        averaged_dark, cached = average_dark(
+            dark_model, instrument, sci_nints, sci_ngroups, sci_nframes,
+            sci_groupgap, dark_cache
+        )
 
         # Save the frame-averaged dark data that was just created,
         # if requested by the user
@@ -123,15 +109,118 @@ def do_correction(input_model, dark_model, dark_output=None):
             averaged_dark.save(dark_output)
 
         # Subtract the frame-averaged dark data from the science data
-        output_model = subtract_dark(input_model, averaged_dark)
+        output_model = subtract_dark(input_model, averaged_dark, in_place)
 
-        averaged_dark.close()
+        if not cached:
+            averaged_dark.close()
 
     output_model.meta.cal_step.dark_sub = 'COMPLETE'
 
     return output_model
 
 
+def dark_mismatch(input_model, dark_model):
+    """
+    Check that the dark data can be matched to the group structure of the
+    science data.
+
+    Parameters
+    ----------
+    input_model: data model object
+        science data
+
+    dark_model: dark model object
+        dark data
+
+    Returns
+    -------
+    mismatch: str or None
+        the reason that the dark data cannot be matched to the science
+        data, or None if it can
+    """
+    sci_ngroups = input_model.data.shape[1]
+    sci_nframes = input_model.meta.exposure.nframes
+    sci_groupgap = input_model.meta.exposure.groupgap
+    drk_ngroups = dark_model.data.shape[-3]
+    drk_nframes = dark_model.meta.exposure.nframes
+    drk_groupgap = dark_model.meta.exposure.groupgap
+
+    # Check that the number of groups in the science data does not exceed
+    # the number of groups in the dark current array.
+    sci_total_frames = sci_ngroups * (sci_nframes + sci_groupgap)
+    drk_total_frames = drk_ngroups * (drk_nframes + drk_groupgap)
+    if sci_total_frames > drk_total_frames:
+        return ("Not enough data in dark reference file to match to "
+                "science data.")
+
+    # Check that the value of nframes and groupgap in the dark
+    # are not greater than those of the science data
+    if drk_nframes > sci_nframes or drk_groupgap > sci_groupgap:
+        return ("The value of nframes or groupgap in the dark data is "
+                "greater than that of the science data.")
+
+    return None
+
+
+def average_dark(dark_model, instrument, nints, ngroups, nframes, groupgap,
+                 dark_cache=None):
+    """
+    Short Summary
+    -------------
+    Create a frame-averaged version of the dark data to match the nframes
+    and groupgap settings of the science data, or get it from a cache of
+    averaged darks.
+
+    Parameters
+    ----------
+    dark_model: dark model object
+        dark data
+
+    instrument: string
+        instrument name; MIRI darks are integration-dependent, and are
+        averaged with a separate routine
+
+    nints, ngroups, nframes, groupgap: int
+        readout pattern of the science data
+
+    dark_cache: AveragedDarkCache or None
+        cache of averaged darks to use, if not None
+
+    Returns
+    -------
+    averaged_dark: dark model object
+        frame-averaged dark data
+
+    cached: bool
+        True if averaged_dark belongs to dark_cache, in which case it must
+        not be modified or closed
+    """
+
+    key = None
+    if dark_cache is not None:
+        key = dark_cache.make_key(dark_model, nints, ngroups, nframes,
+                                  groupgap)
+    if key is not None:
+        averaged_dark = dark_cache.get(key)
+        if averaged_dark is not None:
+            return averaged_dark, True
+
+    if instrument == 'MIRI':
+        averaged_dark = average_MIRIdark_frames(
+            dark_model, nints, ngroups, nframes, groupgap
+        )
+    else:
+        averaged_dark = average_dark_frames(
+            dark_model, ngroups, nframes, groupgap
+        )
+
+    if key is None:
+        return averaged_dark, False
+
+    dark_cache.put(key, averaged_dark)
+    return averaged_dark, True
+
+
 def average_dark_frames(input_dark, ngroups, nframes, groupgap):
     """
     Averages the individual frames of data in a dark reference
@@ -284,7 +373,7 @@ def average_MIRIdark_frames(input_dark, nints, ngroups, nframes, groupgap):
     return avg_dark
 
 
-def subtract_dark(input, dark):
+def subtract_dark(input, dark, in_place=False):
     """
     Subtracts dark current data from science arrays, combines
     error arrays in quadrature, and updates data quality array based on
@@ -298,6 +387,10 @@ def subtract_dark(input, dark):
     dark: dark model object
         the dark current data
 
+    in_place: bool
+        if True, the dark is subtracted from the input model rather than
+        from a copy
+
     Returns
     -------
     output: data model object
@@ -315,8 +408,9 @@ def subtract_dark(input, dark):
               input.data.shape[0], input.data.shape[1],
               input.data.shape[2], input.data.shape[3])
 
-    # Create output as a copy of the input science data model
-    output = input.copy()
+    # Create output as a copy of the input science data model, unless the
+    # input can be modified in place
+    output = input if in_place else input.copy()
 
     if instrument == 'MIRI':
         # MIRI dark reference file has a DQ plane for each integration,
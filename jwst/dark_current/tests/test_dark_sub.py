@@ -6,6 +6,7 @@ import pytest
 import numpy as np
 from numpy.testing import assert_allclose
 
+from jwst.dark_current.dark_cache import AveragedDarkCache
 from jwst.dark_current.dark_sub import (
     average_dark_frames,
     do_correction as darkcorr
@@ -346,6 +347,43 @@ def test_frame_avg(make_rampmodel, make_darkmodel):
     np.testing.assert_array_equal(outfile.err[:, :], 0)
 
 
+def test_averaged_dark_cache(tmpdir, make_rampmodel, make_darkmodel):
+    '''Check that a cached frame-averaged dark, in memory or saved to a
+    directory, gives the same result as averaging the dark again'''
+
+    nints, ngroups, ysize, xsize = 1, 3, 10, 12
+    dm_ramp = make_rampmodel(nints, ngroups, ysize, xsize)
+    dm_ramp.meta.exposure.nframes = 4
+    dm_ramp.meta.exposure.groupgap = 1
+    dm_ramp.data[:] = np.arange(ngroups)[:, np.newaxis, np.newaxis] + 2.
+
+    dark = make_darkmodel(20, ysize, xsize)
+    dark.data[:] = np.random.RandomState(42).normal(size=dark.data.shape)
+    dark.meta.filename = 'jwst_miri_dark_0001.fits'
+
+    expected = darkcorr(dm_ramp, dark)
+
+    dark_cache = AveragedDarkCache(str(tmpdir))
+    first = darkcorr(dm_ramp, dark, dark_cache=dark_cache)
+    assert len(dark_cache) == 1
+    assert len(tmpdir.listdir()) == 1
+    second = darkcorr(dm_ramp, dark, dark_cache=dark_cache)
+
+    # read back from the directory
+    dark_cache = AveragedDarkCache(str(tmpdir))
+    third = darkcorr(dm_ramp, dark, dark_cache=dark_cache)
+
+    for result in (first, second, third):
+        np.testing.assert_array_equal(result.data, expected.data)
+        np.testing.assert_array_equal(result.pixeldq, expected.pixeldq)
+
+    # a different readout pattern is averaged separately
+    dm_ramp.meta.exposure.groupgap = 0
+    darkcorr(dm_ramp, dark, dark_cache=dark_cache)
+    assert len(dark_cache) == 2
+    assert len(tmpdir.listdir()) == 2
+
+
 @pytest.fixture(scope='function')
 def make_rampmodel():
     '''Make MIRI Ramp model for testing'''
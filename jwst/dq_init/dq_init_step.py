@@ -66,7 +66,7 @@ class DQInitStep(Step):
         if self.mask_filename == 'N/A':
             self.log.warning('No MASK reference file found')
             self.log.warning('DQ initialization step will be skipped')
-            result = input_model.copy()
+            result = input_model if self.in_place else input_model.copy()
             result.meta.cal_step.dq_init = 'SKIPPED'
             return result
 
@@ -74,7 +74,8 @@ class DQInitStep(Step):
         mask_model = datamodels.MaskModel(self.mask_filename)
 
         # Apply the step
-        result = dq_initialization.correct_model(input_model, mask_model)
+        result = dq_initialization.correct_model(input_model, mask_model,
+                                                  self.in_place)
 
         # Close the data models for the input and ref file
         input_model.close()
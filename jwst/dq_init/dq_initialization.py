@@ -14,7 +14,7 @@ guider_list = ['FGS_ID-IMAGE', 'FGS_ID-STACK', 'FGS_ACQ1', 'FGS_ACQ2',
                'FGS_TRACK', 'FGS_FINEGUIDE']
 
 
-def correct_model(input_model, mask_model):
+def correct_model(input_model, mask_model, in_place=False):
     """Perform the dq_init step on a JWST datamodel
 
     Parameters
@@ -25,18 +25,21 @@ def correct_model(input_model, mask_model):
     mask_model : mask datamodel
         The mask model to use in the correction
 
+    in_place : bool
+        If True, the input model is updated in place rather than copied
+
     Returns
     -------
     output_model : JWST datamodel
         The corrected JWST datamodel
     """
 
-    output_model = do_dqinit(input_model, mask_model)
+    output_model = do_dqinit(input_model, mask_model, in_place)
 
     return output_model
 
 
-def do_dqinit(input_model, mask_model):
+def do_dqinit(input_model, mask_model, in_place=False):
     """Perform the dq_init step on a JWST datamodel
 
     Parameters
@@ -47,6 +50,9 @@ def do_dqinit(input_model, mask_model):
     mask_model : mask datamodel
         The mask model to use in the correction
 
+    in_place : bool
+        If True, the input model is updated in place rather than copied
+
     Returns
     -------
     output_model : JWST datamodel
@@ -56,8 +62,9 @@ def do_dqinit(input_model, mask_model):
     # Inflate empty DQ array, if necessary
     check_dimensions(input_model)
 
-    # Create output model as copy of input
-    output_model = input_model.copy()
+    # Create output model as copy of input, unless the input can be
+    # updated in place
+    output_model = input_model if in_place else input_model.copy()
 
     # Extract subarray from reference data, if necessary
     if reffile_utils.ref_matches_sci(output_model, mask_model):
@@ -22,11 +22,12 @@ class FirstFrameStep(Step):
             detector = input_model.meta.instrument.detector.upper()
             if detector[:3] == 'MIR':
                 # Do the firstframe correction subtraction
-                result = firstframe_sub.do_correction(input_model)
+                result = firstframe_sub.do_correction(input_model,
+                                                      self.in_place)
             else:
                 self.log.warning('First Frame Correction is only for MIRI data')
                 self.log.warning('First frame step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.firstframe = 'SKIPPED'
 
         return result
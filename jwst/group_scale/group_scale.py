@@ -9,7 +9,7 @@ log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 
-def do_correction(input_model):
+def do_correction(input_model, in_place=False):
     """
     Short Summary
     -------------
@@ -25,6 +25,9 @@ def do_correction(input_model):
     input_model: data model object
         science data to be corrected
 
+    in_place: bool
+        if True, the input model is rescaled in place rather than copied
+
     Returns
     -------
     output_model: data model object
@@ -41,8 +44,9 @@ def do_correction(input_model):
         input_model.meta.cal_step.group_scale = 'SKIPPED'
         return input_model
 
-    # Create output as a copy of the input science data model
-    output_model = input_model.copy()
+    # Create output as a copy of the input science data model, unless the
+    # input can be modified in place
+    output_model = input_model if in_place else input_model.copy()
 
     log.info('NFRAMES={}, FRMDIVSR={}'.format(nframes, frame_divisor))
     log.info('Rescaling all groups by {}/{}'.format(frame_divisor, nframes))
@@ -49,6 +49,6 @@ class GroupScaleStep(Step):
                 return input_model
 
             # Do the scaling
-            result = group_scale.do_correction(input_model)
+            result = group_scale.do_correction(input_model, self.in_place)
 
         return result
@@ -97,6 +97,23 @@ def test_scale_value(make_rampmodel):
     assert(scale == scale_from_data[0])
 
 
+def test_in_place(make_rampmodel):
+    """When the step is allowed to work in place, as in a pipeline, the
+    input data are rescaled rather than a copy of them.
+    """
+    datmod = make_rampmodel(2, 2, 4, 2048, 2048)
+    expected = GroupScaleStep().run(datmod)
+    assert not np.array_equal(expected.data, datmod.data)
+
+    step = GroupScaleStep()
+    step.in_place = True
+    output = step.run(datmod)
+
+    assert(output.meta.cal_step.group_scale == 'COMPLETE')
+    assert np.shares_memory(output.data, datmod.data)
+    assert np.array_equal(datmod.data, expected.data)
+
+
 @pytest.fixture(scope='function')
 def make_rampmodel():
     '''Make NIRSPEC IRS2 model for testing'''
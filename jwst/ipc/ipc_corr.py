@@ -5,6 +5,7 @@
 from collections import namedtuple
 import logging
 import numpy as np
+from scipy.signal import fftconvolve
 
 from ..lib import pipe_utils
 from . import x_irs2
@@ -16,8 +17,15 @@ NumRefPixels = namedtuple("NumRefPixels",
                           ["bottom_rows", "top_rows",
                            "left_columns", "right_columns"])
 
+# Arrays used by ipc_convolve, which are reused for all integrations.
+Workspace = namedtuple("Workspace", ["temp", "product"])
 
-def do_correction(input_model, ipc_model):
+# 2-D IPC kernels with at least this many elements are applied by FFT
+# convolution rather than by adding shifted copies of the data.
+FFT_KERNEL_SIZE = 49
+
+
+def do_correction(input_model, ipc_model, in_place=False):
     """Execute all tasks for IPC correction
 
     Parameters
@@ -29,6 +37,10 @@ def do_correction(input_model, ipc_model):
         Deconvolution kernel, either a 2-D or 4-D image in the first
         extension.
 
+    in_place : bool
+        If True, the input science data are corrected in place rather than
+        in a copy.
+
     Returns
     -------
     output_model : data model object
@@ -45,12 +57,12 @@ def do_correction(input_model, ipc_model):
               (sci_nints, sci_ngroups, sci_nframes, sci_groupgap))
 
     # Apply the correction.
-    output_model = ipc_correction(input_model, ipc_model)
+    output_model = ipc_correction(input_model, ipc_model, in_place)
 
     return output_model
 
 
-def ipc_correction(input_model, ipc_model):
+def ipc_correction(input_model, ipc_model, in_place=False):
     """Apply the IPC correction to the science arrays.
 
     Parameters
@@ -62,6 +74,10 @@ def ipc_correction(input_model, ipc_model):
         The IPC kernel.  The input is corrected for IPC by convolving
         with this 2-D or 4-D array.
 
+    in_place : bool
+        If True, the input science data are corrected in place rather than
+        in a copy.
+
     Returns
     -------
     output : data model object
@@ -74,8 +90,9 @@ def ipc_correction(input_model, ipc_model):
               input_model.data.shape[-1],
               input_model.data.shape[-2])
 
-    # Create output as a copy of the input science data model.
-    output = input_model.copy()
+    # Create output as a copy of the input science data model, unless the
+    # input can be corrected in place.
+    output = input_model if in_place else input_model.copy()
 
     # Was IRS2 readout used?
     is_irs2_format = pipe_utils.is_irs2(input_model)
@@ -101,20 +118,22 @@ def ipc_correction(input_model, ipc_model):
                nref.left_columns, nref.right_columns))
     log.debug("Shape of ipc image = %s" % repr(ipc_model.data.shape))
 
-    # Loop over all integrations and groups in input science data.
+    # The temporary arrays used by the convolution, which are allocated for
+    # the first integration and reused for the others.
+    workspace = None
+
+    # Loop over all integrations in input science data, convolving all of
+    # the groups of an integration together.
     for i in range(input_model.data.shape[0]):                  # integrations
-        for j in range(input_model.data.shape[1]):              # groups
-            # Convolve the current group in-place with the IPC kernel.
-            if is_irs2_format:
-                # Extract normal data from input IRS2-format data.
-                temp = x_irs2.from_irs2(output.data[i, j, :, :], irs2_mask,
-                                        detector)
-                ipc_convolve(temp, kernel, nref)
-                # Insert normal data back into original, IRS2-format data.
-                x_irs2.to_irs2(output.data[i, j, :, :], temp, irs2_mask,
-                               detector)
-            else:
-                ipc_convolve(output.data[i, j], kernel, nref)
+        # Convolve the current integration in-place with the IPC kernel.
+        if is_irs2_format:
+            # Extract normal data from input IRS2-format data.
+            temp = x_irs2.from_irs2(output.data[i], irs2_mask, detector)
+            workspace = ipc_convolve(temp, kernel, nref, workspace)
+            # Insert normal data back into original, IRS2-format data.
+            x_irs2.to_irs2(output.data[i], temp, irs2_mask, detector)
+        else:
+            workspace = ipc_convolve(output.data[i], kernel, nref, workspace)
 
     return output
 
@@ -196,14 +215,14 @@ def get_ipc_slice(input_model, ipc_model):
         return ipc_model.data
 
 
-def ipc_convolve(output_data, kernel, nref):
+def ipc_convolve(output_data, kernel, nref, workspace=None):
     """Convolve the science data with the IPC kernel.
 
     Parameters
     ----------
-    output_data : ndarray, 2-D
-        A copy of the input science data for one group; this will be
-        modified in-place.
+    output_data : ndarray, 2-D or 3-D
+        A copy of the input science data for one group, or for all groups
+        of an integration; this will be modified in-place.
 
     kernel : ndarray, 2-D or 4-D
         The IPC kernel; the input is corrected for IPC by convolving with
@@ -219,6 +238,15 @@ def ipc_convolve(output_data, kernel, nref):
             The number of reference columns at the left edge.
         right_columns : int
             The number of reference columns at the right edge.
+
+    workspace : Workspace or None
+        The temporary arrays returned by a previous call for data of the
+        same shape, which are reused rather than allocated again.
+
+    Returns
+    -------
+    workspace : Workspace
+        The temporary arrays, to be passed to the next call.
     """
 
     bottom_rows = nref.bottom_rows
@@ -229,12 +257,12 @@ def ipc_convolve(output_data, kernel, nref):
     kshape = kernel.shape
 
     # This is the shape of the entire image, which may include reference
-    # pixels.
+    # pixels, preceded by the number of groups if there are several.
     shape = output_data.shape
 
     # These axis lengths exclude reference pixels, if there are any.
-    ny = shape[0] - (bottom_rows + top_rows)
-    nx = shape[1] - (left_columns + right_columns)
+    ny = shape[-2] - (bottom_rows + top_rows)
+    nx = shape[-1] - (left_columns + right_columns)
 
     # The temporary array temp is larger than the science part of
     # output_data by a border (set to zero) that's about half of the
@@ -251,22 +279,38 @@ def ipc_convolve(output_data, kernel, nref):
     tnx = nx + l_b + r_b
     xoff = left_columns                     # offset in output_data
 
-    # Note that when we accumulate sums to output_data below, we will
-    # always use the same slice:  output_data[yoff:yoff+ny, xoff:xoff+nx].
-
-    # Copy the science portion (not the reference pixels) of output_data
-    # to this temporary array, then make subsequent changes in-place to
-    # output_data.
-    temp = np.zeros((tny, tnx), dtype=output_data.dtype)
-    temp[b_b:b_b + ny, l_b:l_b + nx] = \
-        output_data[yoff:yoff + ny, xoff:xoff + nx].copy()
-
-    # After setting this slice to zero, we'll incrementally add to it.
-    output_data[yoff:yoff + ny, xoff:xoff + nx] = 0.
+    # The science portion (not the reference pixels) of output_data; we
+    # will always accumulate sums to this slice.
+    science = output_data[..., yoff:yoff + ny, xoff:xoff + nx]
+
+    # Copy the science portion of output_data to the temporary array, then
+    # make subsequent changes in-place to output_data.  Only the science
+    # portion of temp is ever written, so a reused temp still has a border
+    # of zeros.
+    temp_shape = shape[:-2] + (tny, tnx)
+    if workspace is None or workspace.temp.shape != temp_shape:
+        workspace = Workspace(
+            temp=np.zeros(temp_shape, dtype=output_data.dtype),
+            product=np.empty(science.shape, dtype=output_data.dtype))
+    temp = workspace.temp
+    temp[..., b_b:b_b + ny, l_b:l_b + nx] = science
+
+    if len(kshape) == 2 and kernel.size >= FFT_KERNEL_SIZE:
+        # Large 2-D IPC kernel.  The shifted sums below are a convolution
+        # of temp with the kernel, which is cheaper to do by FFT.
+        kernel_nd = kernel.reshape((1,) * (temp.ndim - 2) + kshape)
+        science[...] = fftconvolve(temp, kernel_nd, mode='valid',
+                                   axes=(-2, -1))
+        return workspace
+
+    # After setting this slice to zero, we'll incrementally add to it the
+    # products of the kernel and shifted slices of temp, which are computed
+    # in the product array rather than in newly allocated arrays.
+    science[...] = 0.
+    product = workspace.product
 
     if len(kshape) == 2:
         # 2-D IPC kernel.  Loop over pixels of the deconvolution kernel.
-        # In this section, `part` has the same shape as `temp`.
         middle_j = kshape[0] // 2
         middle_i = kshape[1] // 2
         for j in range(kshape[0]):
@@ -274,28 +318,25 @@ def ipc_convolve(output_data, kernel, nref):
             for i in range(kshape[1]):
                 if i == middle_i and j == middle_j:
                     continue                # the middle pixel is done last
-                part = kernel[j, i] * temp
                 istart = kshape[1] - i - 1
-                output_data[yoff:yoff + ny, xoff:xoff + nx] += \
-                        part[jstart:jstart + ny, istart:istart + nx]
+                np.multiply(kernel[j, i],
+                            temp[..., jstart:jstart + ny, istart:istart + nx],
+                            out=product)
+                science += product
         # The middle pixel of the IPC kernel is expected to be the largest,
         # so add that last.
-        part = kernel[middle_j, middle_i] * temp
-        output_data[yoff:yoff + ny, xoff:xoff + nx] += \
-                part[middle_j:middle_j + ny, middle_i:middle_i + nx]
+        np.multiply(kernel[middle_j, middle_i],
+                    temp[..., middle_j:middle_j + ny, middle_i:middle_i + nx],
+                    out=product)
+        science += product
 
     else:
-        # 4-D IPC kernel.  Extract a subset of the kernel:  all of the
-        # first two axes, but only the portion of the last two axes
-        # corresponding to the science data (i.e. possibly a subarray,
-        # and certainly excluding reference pixels).
-        k_temp = np.zeros((kshape[0], kshape[1], tny, tnx),
-                          dtype=kernel.dtype)
-        k_temp[:, :, b_b:b_b + ny, l_b:l_b + nx] = \
-            kernel[:, :, yoff:yoff + ny, xoff:xoff + nx]
-
-        # In this section, `part` has shape (ny, nx), which is smaller
-        # than `temp`.
+        # 4-D IPC kernel.  Use a subset of the kernel:  all of the first
+        # two axes, but only the portion of the last two axes corresponding
+        # to the science data (i.e. possibly a subarray, and certainly
+        # excluding reference pixels).
+        k_sci = kernel[:, :, yoff:yoff + ny, xoff:xoff + nx]
+
         middle_j = kshape[0] // 2
         middle_i = kshape[1] // 2
         for j in range(kshape[0]):
@@ -304,15 +345,19 @@ def ipc_convolve(output_data, kernel, nref):
                 if i == middle_i and j == middle_j:
                     continue                # the middle pixel is done last
                 istart = kshape[1] - i - 1
-                # The slice of k_temp includes different pixels for the
+                # The slice of k_sci includes different pixels for the
                 # first or second axes within each loop, but the same slice
                 # for the last two axes.
                 # The slice of temp (a copy of the science data) includes
                 # a different offset for each loop.
-                part = k_temp[j, i, b_b:b_b + ny, l_b:l_b + nx] * \
-                       temp[jstart:jstart + ny, istart:istart + nx]
-                output_data[yoff:yoff + ny, xoff:xoff + nx] += part
+                np.multiply(k_sci[j, i],
+                            temp[..., jstart:jstart + ny, istart:istart + nx],
+                            out=product)
+                science += product
         # Add the product for the middle pixel last.
-        part = k_temp[middle_j, middle_i, b_b:b_b + ny, l_b:l_b + nx] * \
-               temp[middle_j:middle_j + ny, middle_i:middle_i + nx]
-        output_data[yoff:yoff + ny, xoff:xoff + nx] += part
+        np.multiply(k_sci[middle_j, middle_i],
+                    temp[..., middle_j:middle_j + ny, middle_i:middle_i + nx],
+                    out=product)
+        science += product
+
+    return workspace
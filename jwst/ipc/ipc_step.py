@@ -38,7 +38,7 @@ class IPCStep(Step):
             if self.ipc_name == 'N/A':
                 self.log.warning('No IPC reference file found')
                 self.log.warning('IPC step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.ipc = 'SKIPPED'
                 return result
 
@@ -46,7 +46,8 @@ class IPCStep(Step):
             ipc_model = datamodels.IPCModel(self.ipc_name)
 
             # Do the ipc correction
-            result = ipc_corr.do_correction(input_model, ipc_model)
+            result = ipc_corr.do_correction(input_model, ipc_model,
+                                            self.in_place)
 
             # Close the reference file and update the step status
             ipc_model.close()
@@ -0,0 +1,169 @@
+"""Test the IPC convolution of all the groups of an integration at once,
+against convolving one group at a time by adding shifted copies of the
+data"""
+import numpy as np
+import pytest
+
+from jwst.datamodels import IPCModel, RampModel
+from jwst.ipc import ipc_corr, x_irs2
+from jwst.ipc.ipc_corr import NumRefPixels
+
+
+def shifted_sum(data, kernel, nref):
+    """Convolve one group in place with a 2-D or 4-D kernel, by adding
+    shifted copies of the science part of the data, as was done before the
+    groups of an integration were convolved together"""
+    (kny, knx) = kernel.shape[:2]
+    ny = data.shape[0] - (nref.bottom_rows + nref.top_rows)
+    nx = data.shape[1] - (nref.left_columns + nref.right_columns)
+    (yoff, xoff) = (nref.bottom_rows, nref.left_columns)
+    (b_b, l_b) = (kny // 2, knx // 2)
+
+    temp = np.zeros((ny + kny - 1, nx + knx - 1), dtype=data.dtype)
+    temp[b_b:b_b + ny, l_b:l_b + nx] = data[yoff:yoff + ny, xoff:xoff + nx]
+    if kernel.ndim == 4:
+        kernel = kernel[:, :, yoff:yoff + ny, xoff:xoff + nx]
+
+    data[yoff:yoff + ny, xoff:xoff + nx] = 0.
+    # the middle pixel of the kernel last
+    pixels = [(j, i) for j in range(kny) for i in range(knx)
+              if (j, i) != (b_b, l_b)] + [(b_b, l_b)]
+    for j, i in pixels:
+        jstart = kny - j - 1
+        istart = knx - i - 1
+        data[yoff:yoff + ny, xoff:xoff + nx] += \
+            kernel[j, i] * temp[jstart:jstart + ny, istart:istart + nx]
+
+
+def make_kernel(rng, size, image_shape=None):
+    """Return a deconvolution kernel that subtracts a few percent of each
+    pixel from its neighbors, either 2-D or (for an image shape) 4-D"""
+    kernel = rng.uniform(-0.02, 0., size=(size, size)).astype(np.float32)
+    kernel[size // 2, size // 2] = 1. - kernel.sum()
+    if image_shape is None:
+        return kernel
+    kernel_4d = (kernel[:, :, np.newaxis, np.newaxis] *
+                 rng.uniform(0.9, 1.1, size=(size, size) + image_shape))
+    return kernel_4d.astype(np.float32)
+
+
+@pytest.mark.parametrize('size', [3, 7])
+@pytest.mark.parametrize('nref', [NumRefPixels(0, 0, 0, 0),
+                                  NumRefPixels(4, 0, 4, 0),
+                                  NumRefPixels(4, 4, 4, 4)])
+def test_ipc_convolve_2d(size, nref):
+    """Convolving a stack of groups with a 3x3 kernel (shifted sums) or a
+    7x7 kernel (FFT) matches convolving each group in turn"""
+    assert (size * size >= ipc_corr.FFT_KERNEL_SIZE) == (size == 7)
+    rng = np.random.RandomState(7)
+    data = rng.normal(1000., 100., size=(4, 40, 50)).astype(np.float32)
+    kernel = make_kernel(rng, size)
+
+    expected = data.copy()
+    for group in expected:
+        shifted_sum(group, kernel, nref)
+
+    ipc_corr.ipc_convolve(data, kernel, nref)
+    np.testing.assert_allclose(data, expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize('size', [3, 7])
+def test_fft_direct(size, monkeypatch):
+    """The FFT and shifted-sum convolutions give the same results for both
+    kernel sizes"""
+    rng = np.random.RandomState(11)
+    data = rng.normal(1000., 100., size=(3, 30, 36)).astype(np.float32)
+    kernel = make_kernel(rng, size)
+    nref = NumRefPixels(4, 0, 4, 4)
+
+    monkeypatch.setattr(ipc_corr, 'FFT_KERNEL_SIZE', 1)
+    fft = data.copy()
+    ipc_corr.ipc_convolve(fft, kernel, nref)
+
+    monkeypatch.setattr(ipc_corr, 'FFT_KERNEL_SIZE', size * size + 1)
+    direct = data.copy()
+    ipc_corr.ipc_convolve(direct, kernel, nref)
+
+    np.testing.assert_allclose(fft, direct, rtol=1e-5)
+    # the reference pixels are unchanged
+    np.testing.assert_array_equal(fft[:, :4], data[:, :4])
+    np.testing.assert_array_equal(fft[..., -4:], data[..., -4:])
+    assert not np.allclose(fft, data)
+
+
+@pytest.mark.parametrize('nref', [NumRefPixels(0, 0, 0, 0),
+                                  NumRefPixels(4, 4, 4, 4)])
+def test_ipc_convolve_4d(nref):
+    """Convolving a stack of groups with a 4-D kernel matches convolving
+    each group in turn"""
+    rng = np.random.RandomState(13)
+    data = rng.normal(1000., 100., size=(4, 24, 30)).astype(np.float32)
+    kernel = make_kernel(rng, 3, data.shape[1:])
+
+    expected = data.copy()
+    for group in expected:
+        shifted_sum(group, kernel, nref)
+
+    ipc_corr.ipc_convolve(data, kernel, nref)
+    np.testing.assert_allclose(data, expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize('size', [3, 7])
+def test_workspace_reuse(size):
+    """A workspace returned for one integration gives the same results when
+    reused for the next, and is replaced for data of another shape"""
+    rng = np.random.RandomState(17)
+    data = rng.normal(1000., 100., size=(2, 3, 20, 26)).astype(np.float32)
+    kernel = make_kernel(rng, size)
+    nref = NumRefPixels(4, 0, 4, 0)
+
+    expected = data.copy()
+    for integration in expected:
+        ipc_corr.ipc_convolve(integration, kernel, nref)
+
+    workspace = ipc_corr.ipc_convolve(data[0], kernel, nref)
+    assert ipc_corr.ipc_convolve(data[1], kernel, nref, workspace) is workspace
+    np.testing.assert_array_equal(data, expected)
+    # the border of the temporary array is still zero
+    assert not workspace.temp[:, :size // 2].any()
+    assert not workspace.temp[..., -(size // 2):].any()
+
+    other = ipc_corr.ipc_convolve(data[0, :2], kernel, nref, workspace)
+    assert other is not workspace
+    assert other.temp.shape[0] == 2
+
+
+def test_ipc_correction_irs2():
+    """Correcting IRS2-format ramps matches correcting the normal pixels of
+    each group in turn"""
+    rng = np.random.RandomState(19)
+    nints = 2
+    ngroups = 2
+    model = RampModel((nints, ngroups, 3200, 2048))
+    model.data[...] = rng.normal(1000., 100., size=model.data.shape)
+    model.meta.instrument.name = 'NIRSPEC'
+    model.meta.instrument.detector = 'NRS1'
+    model.meta.exposure.nints = nints
+    model.meta.exposure.ngroups = ngroups
+    model.meta.exposure.nrs_normal = 16
+    model.meta.exposure.nrs_reference = 4
+    model.meta.subarray.xstart = 1
+    model.meta.subarray.ystart = 1
+    model.meta.subarray.xsize = 2048
+    model.meta.subarray.ysize = 2048
+    ipc_model = IPCModel(data=make_kernel(rng, 3))
+
+    irs2_mask = x_irs2.make_mask(model)
+    nref = ipc_corr.get_num_ref_pixels(model)
+    expected = model.data.copy()
+    for integration in expected:
+        for group in integration:
+            normal = x_irs2.from_irs2(group, irs2_mask, 'NRS1')
+            shifted_sum(normal, ipc_model.data, nref)
+            x_irs2.to_irs2(group, normal, irs2_mask, 'NRS1')
+
+    result = ipc_corr.ipc_correction(model, ipc_model)
+    np.testing.assert_allclose(result.data, expected, rtol=1e-6)
+    # the interspersed reference pixels are unchanged
+    np.testing.assert_array_equal(result.data[..., ~irs2_mask, :],
+                                  model.data[..., ~irs2_mask, :])
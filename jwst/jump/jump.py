@@ -13,7 +13,7 @@ log.setLevel(logging.DEBUG)
 def detect_jumps (input_model, gain_model, readnoise_model,
                   rejection_threshold, max_cores,
                   max_jump_to_flag_neighbors, min_jump_to_flag_neighbors,
-                  flag_4_neighbors):
+                  flag_4_neighbors, in_place=False):
     """
     This is the high-level controlling routine for the jump detection process.
     It loads and sets the various input data and parameters needed by each of
@@ -21,15 +21,19 @@ def detect_jumps (input_model, gain_model, readnoise_model,
     turn.
 
     Note that the detection methods are currently setup on the assumption
-    that the input science and error data arrays will be in units of
-    electrons, hence this routine scales those input arrays by the detector
-    gain. The methods assume that the read noise values will be in units
-    of DN.
-
-    The gain is applied to the science data and error arrays using the
-    appropriate instrument- and detector-dependent values for each pixel of an
-    image.  Also, a 2-dimensional read noise array with appropriate values for
+    that the input science data array will be in units of electrons, hence
+    this routine scales that input array by the detector gain. The methods
+    assume that the read noise values will be in units of DN.
+
+    The gain is applied to the science data array using the appropriate
+    instrument- and detector-dependent values for each pixel of an image.
+    Also, a 2-dimensional read noise array with appropriate values for
     each pixel is passed to the detection methods.
+
+    If in_place is True, the DQ arrays of the input model are updated in
+    place and the input model is returned; only the science data array,
+    which is scaled by the gain and modified by the detection methods, is
+    copied.
     """
     if max_cores is None:
         numslices = 1
@@ -46,9 +50,12 @@ def detect_jumps (input_model, gain_model, readnoise_model,
             numslices = 1
 
     # Load the data arrays that we need from the input model
-    output_model = input_model.copy()
-    data = input_model.data
-    err  = input_model.err
+    if in_place:
+        output_model = input_model
+        data = input_model.data.copy()
+    else:
+        output_model = input_model.copy()
+        data = input_model.data
     gdq  = input_model.groupdq
     pdq  = input_model.pixeldq
 
@@ -77,11 +84,10 @@ def detect_jumps (input_model, gain_model, readnoise_model,
         pdq[wh_g] = np.bitwise_or( pdq[wh_g], dqflags.pixel['NO_GAIN_VALUE'] )
         pdq[wh_g] = np.bitwise_or( pdq[wh_g], dqflags.pixel['DO_NOT_USE'] )
 
-    # Apply gain to the SCI, ERR, and readnoise arrays so they're in units
+    # Apply gain to the SCI and readnoise arrays so they're in units
     # of electrons
 
     data *= gain_2d
-    err  *= gain_2d
     readnoise_2d *= gain_2d
 
     # Apply the 2-point difference method as a first pass
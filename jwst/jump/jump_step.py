@@ -33,7 +33,7 @@ class JumpStep(Step):
             if ngroups <= 2:
                 self.log.warning('Can not apply jump detection when NGROUPS<=2;')
                 self.log.warning('Jump step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.jump = 'SKIPPED'
                 return result
 
@@ -64,7 +64,7 @@ class JumpStep(Step):
             result = detect_jumps(input_model, gain_model, readnoise_model,
                                 rej_thresh, max_cores,
                                 max_jump_to_flag_neighbors, min_jump_to_flag_neighbors,
-                                flag_4_neighbors)
+                                flag_4_neighbors, self.in_place)
 
             gain_model.close()
             readnoise_model.close()
@@ -67,6 +67,29 @@ def test_onecr_10_groups_neighbors_flagged(setup_inputs):
     assert (4 == out_model.groupdq[0, 5, 6, 5])
     assert (4 == out_model.groupdq[0, 5, 4, 5])
 
+def test_onecr_in_place(setup_inputs):
+    """"
+    A single CR, detected in place in the input model, which keeps its
+    unscaled science data
+    """
+    models = []
+    for in_place in (False, True):
+        model1, gdq, rnModel, pixdq, err, gain = setup_inputs(ngroups=10, gain=200,
+                                                              readnoise=7, nrows=20, ncols=20)
+        model1.data[0, :5, 5, 5] = [15.0, 20.0, 25.0, 30.0, 35.0]
+        model1.data[0, 5:, 5, 5] = [140.0, 150.0, 160.0, 170.0, 180.0]
+        model1.groupdq[0, 9, 5, 5] = dqflags.group['SATURATED']
+        data = model1.data.copy()
+        out_model = detect_jumps(model1, gain, rnModel, 4.0,  1, 200, 4, True,
+                                 in_place=in_place)
+        assert (out_model is model1) == in_place
+        models.append(out_model)
+
+    assert np.array_equal(models[1].groupdq, models[0].groupdq)
+    assert models[1].groupdq[0, 5, 5, 5] == dqflags.group['JUMP_DET']
+    assert np.array_equal(models[1].data, data)
+
+
 def test_nocr_100_groups_nframes1(setup_inputs):
     """"
     NO CR in a 100 group exposure to make sure that frames_per_group is passed correctly to
@@ -1,7 +1,7 @@
 import pytest
 import numpy as np
 
-from jwst.jump.twopoint_difference import find_crs
+from jwst.jump.twopoint_difference import find_crs, select_sorted_positions
 from jwst.datamodels import dqflags
 
 
@@ -645,6 +645,29 @@ def test_first_last_group(setup_cube):
     assert outgdq[0, 3, 100, 100] == dqflags.group['JUMP_DET']
 
 
+@pytest.mark.parametrize("ndiffs", [9, 40])
+def test_select_sorted_positions(ndiffs):
+    """ The selected differences are those at the same sorted positions as in
+        a full sort, including positions that wrap around for pixels having
+        no differences used.
+    """
+    rng = np.random.RandomState(2)
+    abs_diffs = np.abs(rng.normal(size=(500, ndiffs))).astype(np.float32)
+    num_used = rng.randint(0, ndiffs + 1, size=500)
+    num_used[:3] = [0, 1, ndiffs]
+
+    med_index_lo, med_index_hi, max_index = select_sorted_positions(abs_diffs, num_used)
+
+    sort_index = np.argsort(abs_diffs, axis=1)
+    pix = np.arange(500)
+    num_med = num_used - 1
+    np.testing.assert_array_equal(max_index, sort_index[pix, num_med])
+    np.testing.assert_array_equal(med_index_hi, sort_index[pix, num_med // 2])
+    even = (num_med % 2 == 0)
+    np.testing.assert_array_equal(med_index_lo[even], sort_index[pix[even], num_med[even] // 2 - 1])
+    np.testing.assert_array_equal(med_index_lo[~even], med_index_hi[~even])
+
+
 @pytest.fixture(scope='function')
 def setup_cube():
 
@@ -661,3 +684,56 @@ def setup_cube():
         return data, gdq, nframes, read_noise, rej_threshold
 
     return _cube
+
+
+def test_10grps_multiple_crs_neighbors(setup_cube):
+    ngroups = 10
+    data, gdq, nframes, read_noise, rej_threshold = setup_cube(ngroups)
+    jump = dqflags.group['JUMP_DET']
+
+    # three CRs in one pixel, found in successive iterations
+    data[0, 2:, 100, 100] += 500.
+    data[0, 5:, 100, 100] += 300.
+    data[0, 8:, 100, 100] += 150.
+    # CR in the first row, whose neighbor below is outside the array
+    data[0, 4:, 0, 50] = 150.
+    # CR in the last row, too large to have its neighbors flagged
+    data[0, 6:, 203, 60] = 5000.
+
+    out_gdq, row_below_gdq, row_above_gdq = find_crs(data, gdq, read_noise, rej_threshold, nframes,
+                                                     True, 200, 10)
+
+    expected = np.zeros(ngroups, dtype=np.uint32)
+    expected[[2, 5, 8]] = jump
+    assert np.array_equal(out_gdq[0, :, 100, 100], expected)
+    for (row, col) in [(99, 100), (101, 100), (100, 99), (100, 101)]:
+        assert np.array_equal(out_gdq[0, :, row, col], expected)
+
+    assert out_gdq[0, 4, 0, 50] == jump
+    assert out_gdq[0, 4, 1, 50] == jump
+    assert out_gdq[0, 4, 0, 49] == jump
+    assert out_gdq[0, 4, 0, 51] == jump
+    assert row_below_gdq[0, 4, 50] == jump
+    assert np.count_nonzero(row_below_gdq) == 1
+
+    assert out_gdq[0, 6, 203, 60] == jump
+    assert out_gdq[0, 6, 202, 60] == 0
+    assert np.count_nonzero(row_above_gdq) == 0
+    assert np.count_nonzero(out_gdq) == 3 * 5 + 4 + 1
+
+
+def test_return_ratios(setup_cube):
+    ngroups = 10
+    data, gdq, nframes, read_noise, rej_threshold = setup_cube(ngroups)
+    data[0, 4:, 100, 100] = 1000.
+
+    out_gdq, row_below_gdq, row_above_gdq = find_crs(data.copy(), gdq, read_noise, rej_threshold,
+                                                     nframes, True, 200, 10)
+    ratio_gdq, _, _, all_ratios = find_crs(data.copy(), gdq, read_noise, rej_threshold,
+                                           nframes, True, 200, 10, return_ratios=True)
+
+    # The ratios are only kept on request, and do not change the result
+    assert np.array_equal(out_gdq, ratio_gdq)
+    assert all_ratios.shape == (1, 204, 204, ngroups - 1)
+    assert all_ratios[0, 100, 100, 3] == pytest.approx(100.)
+    assert np.count_nonzero(all_ratios) == 1
@@ -3,10 +3,13 @@ Two-Point Difference method for finding outliers in a 3-d ramp data cube.
 The scheme used in this variation of the method uses numpy array methods
 to compute first-differences and find the max outlier in each pixel while
 still working in the full 3-d data array. This makes detection of the first
-outlier very fast. We then iterate pixel-by-pixel over only those pixels
-that are already known to contain an outlier, to look for any additional
-outliers and set the appropriate DQ mask for all outliers in the pixel.
-This is MUCH faster than doing all the work on a pixel-by-pixel basis.
+outlier very fast. We then iterate over the number of outliers found, for
+all of the pixels that are already known to contain an outlier at once, to
+look for any additional outliers and set the appropriate DQ mask for all
+outliers in the pixel. The neighbors of the outliers are then flagged using
+shifted masks of the outliers in the GROUPDQ array of the integration.
+Only working buffers for one integration at a time are kept, and the ratios
+of all integrations are kept only when they are requested for debugging.
 """
 
 import logging
@@ -18,14 +21,27 @@ log.setLevel(logging.DEBUG)
 
 HUGE_NUM = np.finfo(np.float32).max
 
+# Ramps having fewer differences than this are sorted rather than partitioned
+#   to find the clipped median, which is faster for a few differences
+PARTITION_MIN_DIFFS = 25
+
+# Number of differences partitioned at a time, over all pixels in a chunk
+SELECT_CHUNK_SIZE = 2**20
+
 
 def find_crs(data, group_dq, read_noise, rej_threshold, nframes, flag_4_neighbors,
-             max_jump_to_flag_neighbors, min_jump_to_flag_neighbors):
+             max_jump_to_flag_neighbors, min_jump_to_flag_neighbors,
+             return_ratios=False):
     """
     Find CRs/Jumps in each integration within the input data array.
     The input data array is assumed to be in units of electrons, i.e. already
     multiplied by the gain. We also assume that the read noise is in units of
     electrons.
+
+    The ratios of the first differences are computed one integration at a
+    time in a single buffer, unless return_ratios is True, in which case the
+    ratios of all integrations are kept and returned as a fourth output,
+    all_ratios [integration, row, column, difference], for debugging.
     """
     gdq = group_dq.copy()
     # Get data characteristics
@@ -33,29 +49,30 @@ def find_crs(data, group_dq, read_noise, rej_threshold, nframes, flag_4_neighbor
 
     # Create arrays for output
     median_slopes = np.zeros((nints, nrows, ncols), dtype=np.float32)
-    all_ratios =  np.zeros((nints, nrows, ncols, ngroups-1), dtype=np.float32)
+    if return_ratios:
+        all_ratios = np.zeros((nints, nrows, ncols, ngroups-1), dtype=np.float32)
+    else:
+        ratio = np.empty((nrows, ncols, ngroups-1), dtype=np.float32)
     row_above_gdq = np.zeros((nints, ngroups, ncols), dtype=np.uint8)
     row_below_gdq = np.zeros((nints, ngroups, ncols), dtype=np.uint8)
 
     # Square the read noise values, for use later
     read_noise_2 = read_noise**2
 
-    # Reset saturated values in input data array to NaN, so they don't get
-    # used in any of the subsequent calculations
-    saturated_pixels = np.where(np.bitwise_and(gdq, dqflags.group['SATURATED']))
-    data[saturated_pixels] = np.NaN
-
-    # Reset groups set to DO_NOT_USE in the input data array to NaN, so they don't get
-    # used in any of the subsequent calculations. For MIRI data the first and last group
-    # can be set to DO_NOT_USE.
-    wh_donotuse = np.where(np.bitwise_and(gdq, dqflags.group['DO_NOT_USE']))
-    data[wh_donotuse] = np.NaN
-
     # Loop over multiple integrations
     for integration in range(nints):
 
         log.info(' working on integration %d' % (integration+1))
 
+        # Reset saturated values in input data array to NaN, so they don't get
+        # used in any of the subsequent calculations. Also reset groups set to
+        # DO_NOT_USE, as for MIRI data the first and last group can be set to
+        # DO_NOT_USE.
+        wh_not_used = np.where(np.bitwise_and(
+            gdq[integration],
+            dqflags.group['SATURATED'] | dqflags.group['DO_NOT_USE']))
+        data[integration][wh_not_used] = np.NaN
+
         # Roll the ngroups axis of data arrays to the end, to make
         # memory access to the values for a given pixel faster
         # new array has dimensions of [nrows, ncols, ngroups]
@@ -63,27 +80,28 @@ def find_crs(data, group_dq, read_noise, rej_threshold, nframes, flag_4_neighbor
 
         # Compute first differences of adjacent groups up the ramp
         first_diffs = np.diff(rolled_data, axis=2)
-        nan_pixels = np.where(np.isnan(first_diffs))
-        first_diffs[nan_pixels] = 100000.
-
-        positive_first_diffs = np.abs(first_diffs)
-
-        # Make all the first diffs for saturated groups be equal to
-        # 100,000 to put them above the good values in the sorted index
-        matching_array = np.ones(shape=(positive_first_diffs.shape[0],
-                                        positive_first_diffs.shape[1],
-                                        positive_first_diffs.shape[2])) * 100000
-        #sat_groups is a 3D array that is true when the group is saturated
-        sat_groups = (positive_first_diffs == matching_array)
+        first_diffs[np.isnan(first_diffs)] = 100000.
+
+        # The first diffs for saturated groups are all equal to 100,000, to
+        # put them above the good values in sorted order
         #number_sat_groups is a 2D array with the count of saturated groups for each pixel
-        number_sat_groups = (sat_groups * 1).sum(axis=2)
+        number_sat_groups = ((first_diffs == 100000.) |
+                             (first_diffs == -100000.)).sum(axis=2)
         ndiffs = ngroups - 1
-        #Here we sort the 3D array along the last axis which is the group axis.
-        #np.argsort returns a 3D array with the last axis containing the indexes that would yield the groups in
-        #order.
-        sort_index = np.argsort(positive_first_diffs)
+
+        # Find, for each pixel, the differences at the sorted positions of
+        # the clipped median, which excludes the saturated groups and the
+        # largest non-saturated group, and of the largest non-saturated group.
+        # These are selected by partitioning the differences about these
+        # positions, rather than by sorting them.
+        med_index_lo, med_index_hi, max_index1d = select_sorted_positions(
+            first_diffs.reshape(-1, ndiffs),
+            (ndiffs - number_sat_groups).ravel())
+
         #median_diffs is a 2D array with the clipped median of each pixel
-        median_diffs = get_clipped_median(ndiffs, number_sat_groups, first_diffs, sort_index)
+        median_diffs = get_clipped_median(first_diffs.reshape(-1, ndiffs),
+                                          med_index_lo, med_index_hi)
+        median_diffs = median_diffs.reshape(nrows, ncols)
 
         # Save initial estimate of the median slope for all pixels
         median_slopes[integration] = median_diffs
@@ -107,153 +125,269 @@ def find_crs(data, group_dq, read_noise, rej_threshold, nframes, flag_4_neighbor
         # Compute distance of each sample from the median in units of sigma;
         # note that the use of "abs" means we'll detect both positive and
         # negative outliers.
-        #ratio is a 2D array with the units of sigma deviation of the difference from the median.
-        ratio = np.abs(first_diffs - median_diffs[:, :, np.newaxis]) / sigma[:, :, np.newaxis]
-        all_ratios[integration] = ratio
-
-        # get the rows and columns of pixels of all pixels
-        # This seems like an obtuse way to set row and column.
-        row, col = np.where(number_sat_groups >= 0)
-        # Get the group index for each pixel of the largest non-saturated group, assuming the indicies are sorted.
-        # 2 is subtracted from ngroups because we are using differences and there is one less difference than the
-        # number of groups.
-        # This is a 2-D array.
-        max_value_index = ngroups - 2 - number_sat_groups
-
-        # Extract from the sorted group index the index of the largest non-saturated group.
-        max_index1d = sort_index[row, col, max_value_index[row, col]]
-        # Reshape the list of max indicies to be a 2-day array
+        #ratio is a 3D array with the units of sigma deviation of the difference from the median.
+        if return_ratios:
+            ratio = all_ratios[integration]
+        np.subtract(first_diffs, median_diffs[:, :, np.newaxis], out=ratio)
+        np.abs(ratio, out=ratio)
+        np.divide(ratio, sigma[:, :, np.newaxis], out=ratio)
+
+        # The index of the largest non-saturated group of each pixel
         max_index1 = np.reshape(max_index1d, (nrows, ncols))
 
-        #Is this redundant? Are r and c different than row and column?
-        r, c = np.indices(max_index1.shape)
         # Get the row and column indices of pixels whose largest non-saturated ratio is above the threshold
-        row1, col1 = np.where(ratio[r, c, max_index1] > rej_threshold)
+        max_ratio = np.take_along_axis(ratio, max_index1[:, :, np.newaxis], axis=2)
+        row1, col1 = np.where(max_ratio[:, :, 0] > rej_threshold)
         log.info('From highest outlier Two point found %d pixels with at least one CR' % (len(row1)))
-        number_pixels_with_cr = len(row1)
-        # Loop over all pixels that we found the first CR in
-        for j in range(number_pixels_with_cr):
-            # Extract the first diffs for the this pixel with at least one CR yielding a 1D array
-            pixel_masked_diffs = first_diffs[row1[j], col1[j]]
-            # Get the scalar readnoise^2 and number of saturated groups for this pixel.
-            pixel_rn2 = read_noise_2[row1[j], col1[j]]
-            pixel_sat_groups = number_sat_groups[row1[j], col1[j]]
-
-            # Create a CR mask and set 1st CR to be found
-            # cr_mask=0 designates a CR
-            pixel_cr_mask = np.ones(pixel_masked_diffs.shape, dtype=bool)
-            number_CRs_found = 1
-            pixel_sorted_index = sort_index[row1[j], col1[j], :]
-            pixel_cr_mask[pixel_sorted_index[ndiffs - pixel_sat_groups - 1]] = 0  #setting largest diff to be a CR
-            new_CR_found = True
-
-            # Loop and see if there is more than one CR, setting the mask as you go
-            while new_CR_found and ((ndiffs - number_CRs_found - pixel_sat_groups) > 1):
-                new_CR_found = False
-                # For this pixel get a new median difference excluding the number of CRs found and
-                # the number of saturated groups
-                pixel_med_diff = get_clipped_median(ndiffs, number_CRs_found + pixel_sat_groups,
-                                                       pixel_masked_diffs, pixel_sorted_index)
-                #recalculate the noise and ratio for this pixel now that we have rejected a CR
-                pixel_poisson_noise = np.sqrt(np.abs(pixel_med_diff))
-                pixel_sigma = np.sqrt(pixel_poisson_noise * pixel_poisson_noise + pixel_rn2 / nframes)
-                pixel_ratio = np.abs(pixel_masked_diffs - pixel_med_diff) / pixel_sigma
-
-                # Check if largest remaining difference is above threshold
-                if pixel_ratio[pixel_sorted_index[ndiffs - number_CRs_found - pixel_sat_groups - 1]] > rej_threshold:
-                    new_CR_found = True
-                    pixel_cr_mask[pixel_sorted_index[ndiffs - number_CRs_found - pixel_sat_groups - 1]] = 0
-                    number_CRs_found += 1
-
-            # Found all CRs for this pixel. Set CR flags in input DQ array for this pixel
-            gdq[integration, 1:, row1[j], col1[j]] = \
-                np.bitwise_or(gdq[integration, 1:, row1[j], col1[j]],
-                              dqflags.group['JUMP_DET'] * np.invert(pixel_cr_mask))
-
-            # Save the CR-cleaned median slope for this pixel
-            if not new_CR_found:  # the while loop ran at least one time
-                median_slopes[integration, row1[j], col1[j]] = pixel_med_diff
-
-        # Next pixel with an outlier (j loop)
+        if len(row1) > 0:
+            # Look for additional CRs in all pixels having at least one CR
+            cr_mask, pixel_med_diffs, med_found = find_more_crs(
+                first_diffs[row1, col1], number_sat_groups[row1, col1],
+                max_index1[row1, col1], read_noise_2[row1, col1],
+                rej_threshold, nframes)
+
+            # Set CR flags in input DQ array for these pixels
+            gdq[integration, 1:, row1, col1] = \
+                np.bitwise_or(gdq[integration, 1:, row1, col1],
+                              dqflags.group['JUMP_DET'] * cr_mask)
+
+            # Save the CR-cleaned median slopes for the pixels in which the
+            # search for additional CRs ended without finding another CR
+            median_slopes[integration, row1[med_found], col1[med_found]] = \
+                pixel_med_diffs[med_found]
+
+        if flag_4_neighbors: # We need to flag the neighbors of jumps
+            flag_neighbors(gdq[integration], ratio, row_below_gdq[integration],
+                           row_above_gdq[integration],
+                           max_jump_to_flag_neighbors, min_jump_to_flag_neighbors)
+
     # Next integration (integration loop)
-    if flag_4_neighbors: # We need to flag the neighbors of jumps
-
-        cr_int, cr_group, cr_row, cr_col = np.where(np.bitwise_and(gdq, dqflags.group['JUMP_DET']))
-        number_pixels_with_cr = len(cr_int)
-        #loop over all jumps
-        for j in range(number_pixels_with_cr):
-            #jumps must be within a certain range to have neighbors flagged
-            if all_ratios[cr_int[j], cr_row[j], cr_col[j], cr_group[j] - 1] < max_jump_to_flag_neighbors and \
-                    all_ratios[cr_int[j], cr_row[j], cr_col[j], cr_group[j] - 1] > min_jump_to_flag_neighbors:
-                # This section saves flagged neighbors that are above or below the current range of row. If this
-                # method is running in a single process, the row above and below are not used. If it is running in
-                # multiprocessing mode, then the rows above and below need to be returned to find_jumps to use when
-                # it reconstructs the full group dq array from the slices.
-                if cr_row[j] != 0:
-                    gdq[cr_int[j], cr_group[j], cr_row[j] - 1, cr_col[j]] = np.bitwise_or(
-                        gdq[cr_int[j], cr_group[j], cr_row[j] - 1, cr_col[j]],
-                        dqflags.group['JUMP_DET'])
-                else:
-                    row_below_gdq[cr_int[j], cr_group[j], cr_col[j]] =  dqflags.group['JUMP_DET']
-                if cr_row[j] != nrows - 1:
-                    gdq[cr_int[j], cr_group[j], cr_row[j] + 1, cr_col[j]] = np.bitwise_or(
-                        gdq[cr_int[j], cr_group[j], cr_row[j] + 1, cr_col[j]],
-                        dqflags.group['JUMP_DET'])
-                else:
-                    row_above_gdq[cr_int[j], cr_group[j], cr_col[j]] = dqflags.group['JUMP_DET']
-                # Here we are just checking that we don't flag neighbors of jumps that are off the detector.
-                if cr_col[j] != 0:
-                    gdq[cr_int[j], cr_group[j], cr_row[j], cr_col[j] - 1] = np.bitwise_or(
-                        gdq[cr_int[j], cr_group[j], cr_row[j], cr_col[j] - 1],
-                        dqflags.group['JUMP_DET'])
-                if cr_col[j] != ncols - 1:
-                    gdq[cr_int[j], cr_group[j], cr_row[j], cr_col[j] + 1] = np.bitwise_or(
-                        gdq[cr_int[j], cr_group[j], cr_row[j], cr_col[j] + 1],
-                        dqflags.group['JUMP_DET'])
+    if return_ratios:
+        return gdq, row_below_gdq, row_above_gdq, all_ratios
 
     return gdq, row_below_gdq, row_above_gdq
 
 
-def get_clipped_median(num_differences, diffs_to_ignore, differences, sorted_index):
+def find_more_crs(pixel_diffs, pixel_sat_groups,
+                  first_cr_index, pixel_rn2, rej_threshold, nframes):
+    """
+    Find the additional CRs in pixels that are known to have at least one CR,
+    for all of the pixels at once. The largest non-saturated difference of
+    each pixel is a CR. In each iteration, the clipped median of each pixel
+    that is still being searched is recomputed excluding the CRs found, and
+    the largest remaining difference is a CR if it is above the rejection
+    threshold. The search ends for a pixel when no new CR is found, or when
+    too few differences remain.
+
+    Parameters
+    ----------
+    pixel_diffs : float, 2D array
+        first differences [pixel, difference]
+
+    pixel_sat_groups : int, 1D array
+        number of saturated differences of each pixel
+
+    first_cr_index : int, 1D array
+        index of the first CR, the largest non-saturated difference, of each
+        pixel
+
+    pixel_rn2 : float, 1D array
+        read noise squared of each pixel
+
+    rej_threshold : float
+        CR rejection threshold, in sigma
+
+    nframes : int
+        number of frames per group
+
+    Returns
+    -------
+    cr_mask : bool, 2D array
+        True for the differences [pixel, difference] that are CRs
+
+    pixel_med_diffs : float, 1D array
+        last clipped median computed for each pixel
+
+    med_found : bool, 1D array
+        True for pixels in which the search ended without finding another CR,
+        for which pixel_med_diffs is the CR-cleaned median
+    """
+    npix, ndiffs = pixel_diffs.shape
+
+    # Create a CR mask and set the first CR found
+    cr_mask = np.zeros((npix, ndiffs), dtype=bool)
+    cr_mask[np.arange(npix), first_cr_index] = True
+
+    number_crs_found = np.ones(npix, dtype=np.intp)
+    pixel_med_diffs = np.zeros(npix, dtype=pixel_diffs.dtype)
+    med_found = np.zeros(npix, dtype=bool)
+
+    # Loop and see if there is more than one CR, for all pixels still being
+    #   searched at once
+    active = np.where((ndiffs - number_crs_found - pixel_sat_groups) > 1)[0]
+    while len(active) > 0:
+        # For these pixels get a new median difference excluding the number of
+        #   CRs found and the number of saturated groups, and always excluding
+        #   the largest remaining difference
+        num_used = ndiffs - number_crs_found[active] - pixel_sat_groups[active]
+        active_diffs = pixel_diffs[active]
+        med_index_lo, med_index_hi, max_index = select_sorted_positions(
+            active_diffs, num_used)
+        med_diff = get_clipped_median(active_diffs, med_index_lo, med_index_hi)
+
+        # Recalculate the noise and ratio for these pixels now that we have
+        #   rejected a CR, for the largest remaining difference
+        poisson_noise = np.sqrt(np.abs(med_diff.astype(np.float64)))
+        sigma = np.sqrt(poisson_noise * poisson_noise +
+                        pixel_rn2[active] / nframes)
+        active_pix = np.arange(len(active))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = (np.abs(active_diffs[active_pix, max_index] - med_diff) /
+                     sigma.astype(med_diff.dtype))
+
+        new_cr_found = ratio > rej_threshold
+        number_crs_found[active[new_cr_found]] += 1
+        cr_mask[active[new_cr_found], max_index[new_cr_found]] = True
+
+        no_cr = active[~new_cr_found]
+        pixel_med_diffs[no_cr] = med_diff[~new_cr_found]
+        med_found[no_cr] = True
+
+        active = active[new_cr_found]
+        active = active[(ndiffs - number_crs_found[active] -
+                         pixel_sat_groups[active]) > 1]
+
+    return cr_mask, pixel_med_diffs, med_found
+
+
+def flag_neighbors(gdq, ratio, row_below_gdq, row_above_gdq,
+                   max_jump_to_flag_neighbors, min_jump_to_flag_neighbors):
+    """
+    Flag the four perpendicular neighbors of each jump in an integration
+    having a ratio within the range for flagging neighbors, using shifted
+    masks of these jumps.
+    The neighbors are those of the jumps flagged before this call. Neighbors
+    of jumps in the first or last row that fall outside the array are saved
+    in row_below_gdq and row_above_gdq, to be used when the array is a slice
+    of the full array in multiprocessing mode.
+
+    Parameters
+    ----------
+    gdq : int, 3D array
+        GROUPDQ array [group, row, column] of the integration, updated in
+        place
+
+    ratio : float, 3D array
+        ratios [row, column, difference] of the first differences
+
+    row_below_gdq, row_above_gdq : int, 2D arrays
+        flags [group, column] for the rows below and above the array, updated
+        in place
+
+    max_jump_to_flag_neighbors, min_jump_to_flag_neighbors : float
+        range of the jump ratio that triggers neighbor flagging
+    """
+    jump_flag = dqflags.group['JUMP_DET']
+
+    to_flag = np.bitwise_and(gdq, jump_flag).astype(bool)
+    if not to_flag.any():
+        return
+
+    # The ratio of the jump in each group is that of the difference ending at
+    #   the group; for group 0 this wraps around to the last difference.
+    ratios = np.moveaxis(ratio, 2, 0)
+    in_range = ((ratios < max_jump_to_flag_neighbors) &
+                (ratios > min_jump_to_flag_neighbors))
+    to_flag[1:] &= in_range
+    to_flag[0] &= in_range[-1]
+
+    gdq[:, :-1, :][to_flag[:, 1:, :]] |= jump_flag
+    gdq[:, 1:, :][to_flag[:, :-1, :]] |= jump_flag
+    gdq[:, :, :-1][to_flag[:, :, 1:]] |= jump_flag
+    gdq[:, :, 1:][to_flag[:, :, :-1]] |= jump_flag
+
+    row_below_gdq[to_flag[:, 0, :]] = jump_flag
+    row_above_gdq[to_flag[:, -1, :]] = jump_flag
+
+
+def select_sorted_positions(differences, num_used):
+    """
+    Find, for each pixel, the indices of the differences at the positions,
+    in order of absolute value, used for the clipped median of the num_used
+    smallest differences, which always excludes the largest of these, and of
+    that largest difference. Rather than sorting all of the differences,
+    these are found by partitioning the absolute differences about these
+    positions, for all pixels having the same number of used differences at
+    once. As in a sorted index, positions below 0 wrap around to the largest
+    differences.
+
+    Parameters
+    ----------
+    differences : float, 2D array
+        first differences [pixel, difference]
+
+    num_used : int, 1D array
+        number of smallest differences used for each pixel
+
+    Returns
+    -------
+    med_index_lo, med_index_hi : int, 1D arrays
+        indices of the two central differences of the clipped median; these
+        are the same if the clipped median has an odd number of differences
+
+    max_index : int, 1D array
+        index of the largest used difference
     """
-    This routine will return the clipped median for the input array or pixel.
-    It will ignore the input number of largest differences. At a minimum this
-    is at least one plus the number of saturated values, to avoid the median being biased
-    by a cosmic ray. As cosmic rays are found, the diffs_to_ignore will increase.
+    npix, ndiffs = differences.shape
+
+    # Get the sorted position of the median value always excluding the
+    #   highest value. For pixels with an even number of differences the
+    #   median is the mean of the two central values.
+    num_med = num_used - 1
+    pos_hi = num_med // 2
+    pos_lo = np.where(num_med % 2 == 0, pos_hi - 1, pos_hi)
+    positions = np.stack((pos_lo, pos_hi, num_med)) % ndiffs
+
+    chunk_size = max(SELECT_CHUNK_SIZE // ndiffs, 1)
+    index = np.empty((3, npix), dtype=np.intp)
+    order = np.argsort(num_used.astype(np.int16), kind='stable')
+    bounds = np.flatnonzero(np.diff(num_used[order])) + 1
+    for group in np.split(order, bounds):
+        group_pos = positions[:, group[0]]
+        for start in range(0, len(group), chunk_size):
+            rows = group[start:start + chunk_size]
+            abs_diffs = np.abs(differences[rows])
+            if ndiffs < PARTITION_MIN_DIFFS:
+                part_index = np.argsort(abs_diffs, axis=1)
+            else:
+                part_index = np.argpartition(abs_diffs, np.unique(group_pos),
+                                             axis=1)
+            index[:, rows] = part_index[:, group_pos].T
+
+    return index[0], index[1], index[2]
+
+
+def get_clipped_median(differences, med_index_lo, med_index_hi):
     """
+    Return the clipped median of the differences of each pixel, from the
+    indices of its central differences found by select_sorted_positions().
 
-    # ignore largest value and number of CRs found when finding new median
-    # Check to see if this is a 2-D array or 1-D
-    if sorted_index.ndim > 1:
-        # Get the index of the median value always excluding the highest value
-        # In addition, decrease the index by 1 for every two diffs_to_ignore,
-        # these will be saturated values in this case
-        row, col = np.indices(diffs_to_ignore.shape)
-        pixel_med_index = sorted_index[row, col, (num_differences - (diffs_to_ignore[row, col] + 1))//2]
-        pixel_med_diff = differences[row, col, pixel_med_index]
-
-
-        # For pixels with an even number of differences the median is the mean of the two central values.
-        # So we need to get the value the other central difference one lower in the sorted index that the one found
-        # above.
-        even_group_rows, even_group_cols = np.where((num_differences - diffs_to_ignore - 1) % 2 == 0)
-        pixel_med_index2 = np.zeros_like(pixel_med_index)
-        pixel_med_index2[even_group_rows, even_group_cols] = sorted_index[even_group_rows,
-                                                                          even_group_cols,
-                                                                          (num_differences
-                                                                           - (diffs_to_ignore[even_group_rows,
-                                                                                              even_group_cols] + 3))//2]
-        # Average together the two central values
-        pixel_med_diff[even_group_rows, even_group_cols] = (pixel_med_diff[even_group_rows, even_group_cols] +
-                                                            differences[even_group_rows, even_group_cols,
-                                                            pixel_med_index2[even_group_rows, even_group_cols]])/2.0
-
-    # The 1-D array case is a lot simplier.
-    else:
-        pixel_med_index = sorted_index[int(((num_differences - 1 - diffs_to_ignore) / 2))]
-        pixel_med_diff = differences[pixel_med_index]
-        if (num_differences - diffs_to_ignore - 1) % 2 == 0:  # even number of differences
-            pixel_med_index2 = sorted_index[int((num_differences - 1 - diffs_to_ignore) / 2) - 1]
-            pixel_med_diff = (pixel_med_diff + differences[pixel_med_index2]) / 2.0
+    Parameters
+    ----------
+    differences : float, 2D array
+        first differences [pixel, difference]
+
+    med_index_lo, med_index_hi : int, 1D arrays
+        indices of the two central differences of each pixel
+
+    Returns
+    -------
+    pixel_med_diff : float, 1D array
+        clipped median of each pixel
+    """
+    pix = np.arange(differences.shape[0])
 
-    return pixel_med_diff
+    # Average together the two central values, which are the same difference
+    #   for an odd number of differences
+    return (differences[pix, med_index_lo] +
+            differences[pix, med_index_hi]) / 2.0
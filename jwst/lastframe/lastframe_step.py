@@ -21,11 +21,12 @@ class LastFrameStep(Step):
             detector = input_model.meta.instrument.detector
             if detector[:3] == 'MIR':
                 # Do the lastframe correction subtraction
-                result = lastframe_sub.do_correction(input_model)
+                result = lastframe_sub.do_correction(input_model,
+                                                     self.in_place)
             else:
                 self.log.warning('Last Frame Correction is only for MIRI data')
                 self.log.warning('Last frame step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.lastframe = 'SKIPPED'
 
         return result
@@ -0,0 +1,40 @@
+"""Utilities for running parts of a step in a pool of processes"""
+
+import logging
+import multiprocessing
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+def compute_slices(max_cores):
+    """
+    Determine the number of slices (and processes) to use, from the
+    requested fraction of the available cores.
+
+    Parameters
+    ----------
+    max_cores : str or None
+        Fraction of the available cores to use; one of 'quarter', 'half',
+        'all', or None to use a single process.
+
+    Returns
+    -------
+    number_slices : int
+        The number of slices to divide the work into.
+    """
+    if max_cores is None:
+        return 1
+
+    num_cores = multiprocessing.cpu_count()
+    log.info("Found %d possible cores to use", num_cores)
+    if max_cores == 'quarter':
+        number_slices = num_cores // 4 or 1
+    elif max_cores == 'half':
+        number_slices = num_cores // 2 or 1
+    elif max_cores == 'all':
+        number_slices = num_cores
+    else:
+        number_slices = 1
+
+    return number_slices
@@ -0,0 +1,22 @@
+"""Test the parallel processing utilities"""
+import pytest
+
+from jwst.lib.parallel_utils import compute_slices
+
+
+@pytest.mark.parametrize('max_cores, expected', [
+    (None, 1),
+    ('quarter', 2),
+    ('half', 4),
+    ('all', 8),
+])
+def test_compute_slices(max_cores, expected, monkeypatch):
+    monkeypatch.setattr("multiprocessing.cpu_count", lambda: 8)
+    assert compute_slices(max_cores) == expected
+
+
+def test_compute_slices_few_cores(monkeypatch):
+    """At least one process is used"""
+    monkeypatch.setattr("multiprocessing.cpu_count", lambda: 1)
+    assert compute_slices('quarter') == 1
+    assert compute_slices('half') == 1
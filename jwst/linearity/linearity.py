@@ -9,7 +9,7 @@ log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 
-def do_correction(input_model, lin_model):
+def do_correction(input_model, lin_model, in_place=False):
     """
     Short Summary
     -------------
@@ -23,55 +23,71 @@ def do_correction(input_model, lin_model):
     lin_model: linearity model object
         linearity reference file data model
 
+    in_place: bool
+        if True, the input model is corrected in place rather than copied
+
     Returns
     -------
     output_model: data model object
         linearity corrected data
 
     """
-    # Create the output model as a copy of the input
-    output_model = input_model.copy()
-
-    # Propagate the DQ flags from the linearity ref data into the 2D science DQ
-    propagate_dq_info(output_model, lin_model)
+    # Create the output model as a copy of the input, unless the input can
+    # be corrected in place
+    output_model = input_model if in_place else input_model.copy()
 
-    # Apply the linearity correction coeffs to the science data
+    # Apply the linearity correction coeffs to the science data, and
+    # propagate the DQ flags from the linearity ref data into the 2D science DQ
     apply_linearity(output_model, lin_model)
 
     return output_model
 
 
-def propagate_dq_info(input, linearity_ref_model):
+def prepare_coeffs(input, linearity_ref_model):
     """
     Short Summary
     -------------
-    Propagate the data quality information from the linearity reference
-    file DQ array to the 2D DQ array of the science data.
+    Get the correction coefficients and DQ flags from the linearity
+    reference file, extracting the subarray of the science data if
+    necessary.  The coefficients of pixels flagged as NO_LIN_CORR, or having
+    NaN coefficients, are set so that there is effectively no correction.
 
     Parameters
     ----------
     input: data model object
-        science data model to be corrected in place
+        science data model
 
     linearity_ref_model: linearity model object
         linearity reference data
 
     Returns
     -------
+    lin_coeffs: 3D array
+        array of correction coefficients
 
+    lin_dq: 2D array
+        DQ flags to combine with the 2D DQ array of the science data,
+        including NO_LIN_CORR for the pixels having NaN coefficients
     """
 
-    # Retrieve 2D DQ subarray from linearity reference file, if necessary
+    # Check for subarray mode
     if reffile_utils.ref_matches_sci(input, linearity_ref_model):
-        lindq = linearity_ref_model.dq
+        lin_coeffs = linearity_ref_model.coeffs
+        lin_dq = linearity_ref_model.dq.copy()
     else:
         log.info('Extracting linearity subarray to match science data')
         sub_lin_model = reffile_utils.get_subarray_model(input, linearity_ref_model)
-        lindq = sub_lin_model.dq.copy()
+        lin_coeffs = sub_lin_model.coeffs.copy()
+        lin_dq = sub_lin_model.dq.copy()
         sub_lin_model.close()
 
-    # Combine the DQ arrays using bitwise_or
-    input.pixeldq = np.bitwise_or(input.pixeldq, lindq)
+    # Check for NO_LIN_CORR flags in the DQ extension of the ref file
+    lin_coeffs = correct_for_flag(lin_coeffs, lin_dq)
+
+    # Check for NaNs in the COEFFS extension of the ref file
+    lin_coeffs = correct_for_NaN(lin_coeffs, lin_dq)
+
+    return lin_coeffs, lin_dq
 
 
 def apply_linearity(input, linearity_ref_model):
@@ -80,7 +96,8 @@ def apply_linearity(input, linearity_ref_model):
     -------------
 
     Apply the linearity correction to the pixels in the science ramp data
-    that have not been flagged as saturated by the saturation step.
+    that have not been flagged as saturated by the saturation step, and
+    propagate the DQ flags of the reference file to the 2D DQ array.
 
     Parameters
     ----------
@@ -100,20 +117,10 @@ def apply_linearity(input, linearity_ref_model):
     if len(dq) == 0:
         dq = (ramp * 0).astype(np.uint32)
 
-    # Check for subarray mode
-    if reffile_utils.ref_matches_sci(input, linearity_ref_model):
-        lin_coeffs = linearity_ref_model.coeffs
-        lin_dq = linearity_ref_model.dq
-    else:
-        sub_lin_model = reffile_utils.get_subarray_model(input, linearity_ref_model)
-        lin_coeffs = sub_lin_model.coeffs.copy()
-        lin_dq = sub_lin_model.dq.copy()
-
-    # Check for NO_LIN_CORR flags in the DQ extension of the ref file
-    lin_coeffs = correct_for_flag(lin_coeffs, lin_dq)
-
-    # Check for NaNs in the COEFFS extension of the ref file
-    lin_coeffs = correct_for_NaN(lin_coeffs, input)
+    # Get the correction coefficients, and combine the DQ flags of the
+    # ref file with the 2D DQ array of the science data
+    lin_coeffs, lin_dq = prepare_coeffs(input, linearity_ref_model)
+    input.pixeldq = np.bitwise_or(input.pixeldq, lin_dq)
 
     # Get the DQ bit value that represents saturation
     sat_val = dqflags.group['SATURATED']
@@ -122,23 +129,24 @@ def apply_linearity(input, linearity_ref_model):
     input.data = apply_linearity_func(ramp, dq, lin_coeffs, sat_val)
 
 
-def correct_for_NaN(lin_coeffs, input):
+def correct_for_NaN(lin_coeffs, lin_dq):
     """
     Short Summary
     -------------
     Check for NaNs in the COEFFS extension of the ref file in case there are
     pixels that should have been (but were not) flagged there as NO_LIN_CORR
     (linearity correction not determined for pixel). For such pixels, update the
-    coefficients so that there is effectively no correction, and flag their
-    pixeldq values in place as NO_LIN_CORR in the step output.
+    coefficients so that there is effectively no correction, and flag them
+    in place as NO_LIN_CORR in the DQ flags propagated to the step output.
 
     Parameters
     ----------
     lin_coeffs: 3D array
         array of correction coefficients in reference file
 
-    input: data model object
-        science data model to be corrected in place
+    lin_dq: 2D array
+        DQ flags to combine with the pixeldq of the science data, updated
+        in place
 
     Returns
     -------
@@ -150,9 +158,6 @@ def correct_for_NaN(lin_coeffs, input):
     znan, ynan, xnan = wh_nan[0], wh_nan[1], wh_nan[2]
     num_nan = 0
 
-    nan_array = np.zeros((lin_coeffs.shape[1], lin_coeffs.shape[2]),
-                         dtype=np.uint32)
-
     # If there are NaNs as the correction coefficients, update those
     # coefficients so that those SCI values will be unchanged.
     if len(znan) > 0:
@@ -161,10 +166,7 @@ def correct_for_NaN(lin_coeffs, input):
 
         for ii in range(num_nan):
             lin_coeffs[:, ynan[ii], xnan[ii]] = ben_cor
-            nan_array[ynan[ii], xnan[ii]] = dqflags.pixel['NO_LIN_CORR']
-
-        # Include these pixels in the output pixeldq
-        input.pixeldq = np.bitwise_or(input.pixeldq, nan_array)
+            lin_dq[ynan[ii], xnan[ii]] |= dqflags.pixel['NO_LIN_CORR']
 
         log.debug("Unflagged pixels having coefficients set to NaN were"
                   " detected in the ref file; for those affected pixels"
@@ -27,7 +27,7 @@ class LinearityStep(Step):
             if self.lin_name == 'N/A':
                 self.log.warning('No Linearity reference file found')
                 self.log.warning('Linearity step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.linearity = 'SKIPPED'
                 return result
 
@@ -35,7 +35,8 @@ class LinearityStep(Step):
             lin_model = datamodels.LinearityModel(self.lin_name)
 
             # Do the linearity correction
-            result = linearity.do_correction(input_model, lin_model)
+            result = linearity.do_correction(input_model, lin_model,
+                                             self.in_place)
 
             # Close the reference file and update the step status
             lin_model.close()
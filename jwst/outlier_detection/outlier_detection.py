@@ -10,7 +10,9 @@ from drizzle.cdrizzle import tblot
 
 from .. import datamodels
 from ..resample import resample
-from ..resample.resample_utils import build_driz_weight, calc_gwcs_pixmap
+from ..resample.pixmap_cache import get_requested_cache
+from ..resample.resample_utils import (build_driz_weight, calc_gwcs_pixmap,
+                                      PIXMAP_TOLERANCE)
 from ..stpipe.step import Step
 
 import logging
@@ -261,6 +263,13 @@ class OutlierDetection:
         following ways:
         - type of combination: fixed to 'median'
         - 'minmed' not implemented as an option
+
+        If the ``median_block_size`` parameter is set, the median is computed
+        for that many rows of the images at a time, so that only those rows
+        of each resampled image need to be in memory at once (the rest may
+        be on disk, memory-mapped).  The weight threshold of each image is
+        computed from its whole weight array, one image at a time, so the
+        median image is the same.
         """
         resampled_sci = [i.data for i in resampled_models]
         resampled_weight = [i.wht for i in resampled_models]
@@ -268,32 +277,32 @@ class OutlierDetection:
         nlow = self.outlierpars.get('nlow', 0)
         nhigh = self.outlierpars.get('nhigh', 0)
         maskpt = self.outlierpars.get('maskpt', 0.7)
-
-        # Create a mask for each input image, masking out areas where there is
-        # no data or the data has very low weight
-        badmasks = []
-        for weight in resampled_weight:
-            # Create boolean masks for weight being zero or NaN
-            mask_zero_weight = np.equal(weight, 0.)
-            mask_nans = np.isnan(weight)
-            # Combine the masks
-            weight_masked = np.ma.array(weight, mask=np.logical_or(
-                mask_zero_weight, mask_nans))
-            # Sigma-clip the unmasked data
-            weight_masked = sigma_clip(weight_masked, sigma=3, maxiters=5)
-            mean_weight = np.mean(weight_masked)
-            # Mask pixels where weight falls below maskpt percent
-            weight_threshold = mean_weight * maskpt
-            badmask = np.less(weight, weight_threshold)
-            log.debug("Percentage of pixels with low weight: {}".format(
-                np.sum(badmask) / len(weight.flat) * 100))
-            badmasks.append(badmask)
-
-        # Compute median of stack of images using `badmasks` to remove
-        # low-weight values.  In the future we should use a masked array
-        # and np.median
-        median_image = median(resampled_sci, nlow=nlow, nhigh=nhigh,
-                              badmasks=badmasks)
+        block_size = self.outlierpars.get('median_block_size', 0)
+
+        # Areas where there is no data or the data has very low weight are
+        # masked out of each input image
+        weight_thresholds = [weight_threshold(weight, maskpt)
+                             for weight in resampled_weight]
+
+        shape = resampled_sci[0].shape
+        if not block_size or block_size >= shape[0]:
+            badmasks = [np.less(weight, threshold) for weight, threshold
+                        in zip(resampled_weight, weight_thresholds)]
+            # Compute median of stack of images using `badmasks` to remove
+            # low-weight values.  In the future we should use a masked array
+            # and np.median
+            return median(resampled_sci, nlow=nlow, nhigh=nhigh,
+                          badmasks=badmasks)
+
+        log.info("Computing median {} rows at a time".format(block_size))
+        median_image = np.empty(shape, dtype=resampled_sci[0].dtype)
+        for start in range(0, shape[0], block_size):
+            rows = slice(start, start + block_size)
+            badmasks = [np.less(weight[rows], threshold) for weight, threshold
+                        in zip(resampled_weight, weight_thresholds)]
+            median_image[rows] = median([sci[rows] for sci in resampled_sci],
+                                        nlow=nlow, nhigh=nhigh,
+                                        badmasks=badmasks)
 
         return median_image
 
@@ -301,6 +310,9 @@ class OutlierDetection:
         """Blot resampled median image back to the detector images."""
         interp = self.outlierpars.get('interp', 'poly5')
         sinscl = self.outlierpars.get('sinscl', 1.0)
+        cache = get_requested_cache(self.outlierpars)
+        stepsize = self.outlierpars.get('pixmap_stepsize', 1)
+        tolerance = self.outlierpars.get('pixmap_tolerance', PIXMAP_TOLERANCE)
 
         # Initialize container for output blot images
         blot_models = datamodels.ModelContainer()
@@ -318,7 +330,9 @@ class OutlierDetection:
             blotted_median.dq = None
             # apply blot to re-create model.data from median image
             blotted_median.data = gwcs_blot(median_model, model, interp=interp,
-                                                     sinscl=sinscl)
+                                            sinscl=sinscl, pixmap_cache=cache,
+                                            pixmap_stepsize=stepsize,
+                                            pixmap_tolerance=tolerance)
             blot_models.append(blotted_median)
 
         return blot_models
@@ -501,6 +515,40 @@ def flag_cr(sci_image, blot_image, **pars):
     np.bitwise_or(sci_image.dq, np.invert(cr_mask) * CRBIT, sci_image.dq)
 
 
+def weight_threshold(weight, maskpt):
+    """Return the weight below which resampled pixels are not used.
+
+    Parameters
+    ----------
+    weight : ndarray
+        The weight array of a resampled image.
+
+    maskpt : float
+        The fraction of the (sigma-clipped) mean of the non-zero weights
+        below which pixels are masked out.
+
+    Returns
+    -------
+    threshold : float
+        The weight threshold.
+    """
+    # Create boolean masks for weight being zero or NaN
+    mask_zero_weight = np.equal(weight, 0.)
+    mask_nans = np.isnan(weight)
+    # Combine the masks
+    weight_masked = np.ma.array(weight, mask=np.logical_or(
+        mask_zero_weight, mask_nans))
+    # Sigma-clip the unmasked data
+    weight_masked = sigma_clip(weight_masked, sigma=3, maxiters=5)
+    mean_weight = np.mean(weight_masked)
+    # Mask pixels where weight falls below maskpt percent
+    threshold = mean_weight * maskpt
+    log.debug("Percentage of pixels with low weight: {}".format(
+        np.sum(np.less(weight, threshold)) / weight.size * 100))
+
+    return threshold
+
+
 def abs_deriv(array):
     """Take the absolute derivate of a numpy array."""
     tmp = np.zeros(array.shape, dtype=np.float64)
@@ -526,7 +574,9 @@ def _absolute_subtract(array, tmp, out):
     return tmp, out
 
 
-def gwcs_blot(median_model, blot_img, interp='poly5', sinscl=1.0):
+def gwcs_blot(median_model, blot_img, interp='poly5', sinscl=1.0,
+              pixmap_cache=None, pixmap_stepsize=1,
+              pixmap_tolerance=PIXMAP_TOLERANCE):
     """
     Resample the output/resampled image to recreate an input image based on
     the input image's world coordinate system
@@ -548,11 +598,25 @@ def gwcs_blot(median_model, blot_img, interp='poly5', sinscl=1.0):
 
     sincscl : float, optional
         The scaling factor for sinc interpolation.
+
+    pixmap_cache : `~jwst.resample.pixmap_cache.PixmapCache`, optional
+        A cache of pixel maps, such as those computed when drizzling the
+        images that were combined into the median image.
+
+    pixmap_stepsize : int, optional
+        If more than 1, the pixel map is interpolated from the transform of
+        every ``pixmap_stepsize``-th pixel in each direction, unless that is
+        off by more than ``pixmap_tolerance`` pixels.
+
+    pixmap_tolerance : float, optional
+        Maximum error, in pixels, of an interpolated pixel map.
     """
     blot_wcs = blot_img.meta.wcs
 
     # Compute the mapping between the input and output pixel coordinates
-    pixmap = calc_gwcs_pixmap(blot_wcs, median_model.meta.wcs, blot_img.data.shape)
+    pixmap = calc_gwcs_pixmap(blot_wcs, median_model.meta.wcs, blot_img.data.shape,
+                              cache=pixmap_cache, stepsize=pixmap_stepsize,
+                              tolerance=pixmap_tolerance)
     log.debug("Pixmap shape: {}".format(pixmap[:, :, 0].shape))
     log.debug("Sci shape: {}".format(blot_img.data.shape))
 
@@ -62,6 +62,14 @@ class OutlierDetectionStep(Step):
         good_bits = string(default="~DO_NOT_USE")  # DQ flags to allow
         scale_detection = boolean(default=False)
         search_output_file = boolean(default=False)
+        cache_pixmaps = boolean(default=False) # reuse pixel maps from drizzle when blotting
+        pixmap_cache_dir = string(default="") # directory in which to also save pixel maps for reuse
+        pixmap_cache_size = integer(default=16) # number of pixel maps to keep in memory
+        pixmap_stepsize = integer(default=1) # interpolate pixel maps from every Nth pixel
+        pixmap_tolerance = float(default=0.01) # maximum error of interpolated pixel maps, in output pixels
+        output_tile_size = integer(default=0) # memory-map the resampled images, drizzling in tiles of this size
+        output_tile_dir = string(default="") # directory for the memory-mapped resampled images
+        median_block_size = integer(default=0) # number of rows to median at a time
     """
 
     def process(self, input):
@@ -107,6 +115,14 @@ class OutlierDetectionStep(Step):
                 'save_intermediate_results': self.save_intermediate_results,
                 'resample_data': self.resample_data,
                 'good_bits': self.good_bits,
+                'cache_pixmaps': self.cache_pixmaps,
+                'pixmap_cache_dir': self.pixmap_cache_dir,
+                'pixmap_cache_size': self.pixmap_cache_size,
+                'pixmap_stepsize': self.pixmap_stepsize,
+                'pixmap_tolerance': self.pixmap_tolerance,
+                'output_tile_size': self.output_tile_size,
+                'output_tile_dir': self.output_tile_dir,
+                'median_block_size': self.median_block_size,
                 'make_output_path': self.make_output_path,
             }
 
@@ -2,7 +2,8 @@ import pytest
 import numpy as np
 from scipy.ndimage.filters import gaussian_filter
 
-from jwst.outlier_detection.outlier_detection import flag_cr
+from jwst.outlier_detection.outlier_detection import (OutlierDetection,
+                                                      flag_cr)
 from jwst import datamodels
 
 
@@ -54,3 +55,24 @@ def test_flag_cr_with_subtracted_background(sci_blot_image_pair):
 
     flag_cr(sci, blot)
     assert sci.dq[5, 5] > 0
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 30])
+def test_create_median_in_blocks(block_size):
+    """Computing the median a block of rows at a time gives the same image"""
+    rng = np.random.RandomState(12)
+    shape = (23, 17)
+    models = datamodels.ModelContainer()
+    for i in range(5):
+        model = datamodels.ImageModel(shape)
+        model.data = rng.normal(size=shape).astype(np.float32)
+        model.wht = rng.uniform(0.5, 1.5, size=shape).astype(np.float32)
+        # a region without data in each image
+        model.wht[:, 3 * i:3 * i + 2] = 0.
+        models.append(model)
+
+    expected = OutlierDetection(models, reffiles={}).create_median(models)
+    detection = OutlierDetection(models, reffiles={},
+                                 median_block_size=block_size)
+
+    np.testing.assert_array_equal(detection.create_median(models), expected)
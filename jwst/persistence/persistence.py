@@ -15,6 +15,12 @@ SCALEFACTOR = 2.
 from traps, compared with photon-generated charges.
 """
 
+MAX_ACTIVE_FRACTION = 0.25
+"""If no more than this fraction of the pixels have filled traps at the start
+of an integration, trap decays are computed for just those pixels rather than
+for the full frame.
+"""
+
 def no_NaN(input_model, fill_value,
            zap_nan=False, zap_zero=False):
     """Replace NaNs and/or zeros with a fill value.
@@ -61,6 +67,44 @@ def no_NaN(input_model, fill_value,
         return temp
 
 
+def mean_of_lowest(values, num_used):
+    """Average the lowest values along the first axis.
+
+    `values` is sorted in-place along the first axis, and for each pixel
+    the `num_used` smallest values are averaged.  Values that should not
+    be included, e.g. differences for saturated groups, can be set to a
+    large value first, so that they sort above the others.
+
+    Parameters
+    ----------
+    values : ndarray
+        The values to average, e.g. the differences between adjacent
+        groups, with shape (ngroups - 1, ny, nx).  This will be modified
+        in-place.
+
+    num_used : ndarray, int
+        For each pixel, the number of the smallest values to average.
+
+    Returns
+    -------
+    ndarray
+        The mean of the `num_used` smallest values of each pixel, or zero
+        where `num_used` is zero or negative.
+    """
+
+    values.sort(axis=0)
+    total = np.zeros(values.shape[1:], dtype=values.dtype)
+    for i in range(values.shape[0]):
+        # Sum in sorted order, skipping values above num_used.
+        np.add(total, values[i], out=total, where=(num_used > i))
+
+    bad = (num_used <= 0)
+    mean = total / np.where(bad, 1, num_used).astype(values.dtype)
+    mean[bad] = 0.
+
+    return mean
+
+
 class DataSet():
     """Input dataset to which persistence will be applied
 
@@ -212,8 +256,6 @@ class DataSet():
         if nfamilies <= 0:
             log.error("The trappars reference table is empty!")
 
-        # Note that this might be a subarray.
-        persistence = np.zeros((shape[-2], shape[-1]), dtype=np.float64)
         (nints, ngroups, ny, nx) = shape
         t_group = self.output_obj.meta.exposure.group_time
 
@@ -259,12 +301,10 @@ class DataSet():
                         - self.traps_filled.meta.exposure.end_time) * 86400.
             log.debug("Decay time for previous traps-filled file = %g s",
                       to_start)
-            for k in range(nfamilies):
-                decay_param_k = self.get_decay_param(par, k)
-                decay = self.compute_decay(self.traps_filled.data[k],
-                                           decay_param_k, to_start)
-                self.traps_filled.data[k, :, :] -= decay
-                del decay
+            decay = self.compute_decay(self.traps_filled.data,
+                                       par[3], to_start)
+            self.traps_filled.data -= decay
+            del decay
 
         """
         These will be full-frame:
@@ -272,7 +312,7 @@ class DataSet():
             self.trap_density (before extracting subarray)
             self.persistencesat (before extracting subarray)
             decayed                     (nfamilies, det_ny, det_nx)
-            decayed_in_group            (det_ny, det_nx)
+            decayed_in_group            (nfamilies, det_ny, det_nx)
 
         These will be subarrays if the input object is a subarray:
             self.output_obj             (nints, ngroups, ny, nx)
@@ -280,8 +320,12 @@ class DataSet():
             self.persistencesat (after extracting subarray)
             persistence
             self.output_pers
-            filled
-            cr_filled
+            filled                      (nfamilies, ny, nx)
+
+        If only a small fraction of the pixels have filled traps at the
+        start of an integration, decayed and decayed_in_group will instead
+        be (nfamilies, nactive), and persistence will be 1-D, for just the
+        active pixels that are within the science image.
         """
 
         # If the science image is a subarray, extract matching sections of
@@ -321,68 +365,80 @@ class DataSet():
         else:
             self.output_pers = None
 
-        # Buffer for accumulating the number of decayed traps from the
-        # start of an integration to the current group (in the loop below).
-        decayed = np.zeros((nfamilies, det_ny, det_nx), dtype=np.float64)
-
         # self.traps_filled will be updated with each integration, to
         # account for charge capture and decay of traps.
         filled = -1                             # just to ensure that it exists
         for integ in range(nints):
             self.get_group_info(integ)          # self.tgroup, etc.
-            decayed[:, :, :] = 0.               # initialize
             # slope has to be computed early in the loop over integrations,
             # before the data are modified by subtracting persistence.
             # The slope is needed for computing charge captures.
             (grp_slope, slope) = self.compute_slope(integ)
+
+            # Only pixels with filled traps (in any family) at the start of
+            # the integration can contribute persistence.  If there are few
+            # of them, the decays are computed for just those pixels.
+            active = self.get_active_pixels(save_slice)
+            if active is None:
+                # traps_filled and the buffer for accumulating the number of
+                # decayed traps from the start of the integration to the
+                # current group are full-frame, (nfamilies, det_ny, det_nx).
+                traps = self.traps_filled.data
+                pers_index = (slice(None),) + save_slice
+                sci_index = (slice(None), slice(None))
+            else:
+                # These are 1-D for each trap family, (nfamilies, nactive).
+                (act_y, act_x, in_sci) = active
+                traps = self.traps_filled.data[:, act_y, act_x]
+                pers_index = (slice(None), in_sci)
+                sci_index = (act_y[in_sci] - save_slice[0].start,
+                             act_x[in_sci] - save_slice[1].start)
+            decayed = np.zeros(traps.shape, dtype=np.float64)
+
             for group in range(ngroups):
-                persistence[:, :] = 0.          # initialize
-                for k in range(nfamilies):
-                    decay_param_k = self.get_decay_param(par, k)
-                    # Compute and subtract the decays during the reset.
-                    # Decays during the reset at the beginning of the
-                    # first integration have already been accounted for.
-                    if integ > 0 and group == 0 and self.nresets > 0:
-                        reset_time = self.tframe * self.nresets
-                        decay_during_reset = \
-                            self.compute_decay(self.traps_filled.data[k],
-                                               decay_param_k, reset_time)
-                        self.traps_filled.data[k, :, :] -= decay_during_reset
-                    # Decays during current group, for current trap family.
-                    decayed_in_group = \
-                        self.compute_decay(self.traps_filled.data[k],
-                                           decay_param_k, t_group)
-                    # Cumulative decay to the end of the current group.
-                    decayed[k, :, :] += decayed_in_group
-                    self.traps_filled.data[k, :, :] -= decayed_in_group
-                    if is_subarray:
-                        persistence += decayed[k, save_slice[0], save_slice[1]]
-                    else:
-                        persistence += decayed[k, :, :]
-                    del decayed_in_group
+                # Compute and subtract the decays during the reset.
+                # Decays during the reset at the beginning of the
+                # first integration have already been accounted for.
+                if integ > 0 and group == 0 and self.nresets > 0:
+                    reset_time = self.tframe * self.nresets
+                    traps -= self.compute_decay(traps, par[3], reset_time)
+                # Decays during current group, for all trap families.
+                decayed_in_group = self.compute_decay(traps, par[3], t_group)
+                # Cumulative decay to the end of the current group.
+                decayed += decayed_in_group
+                traps -= decayed_in_group
+                del decayed_in_group
+                persistence = decayed[pers_index].sum(axis=0)
 
                 # Persistence was computed in DN.
-                self.output_obj.data[integ, group, :, :] -= persistence
+                self.output_obj.data[integ, group][sci_index] -= persistence
                 if self.save_persistence:
-                    self.output_pers.data[integ, group, :, :] = \
-                        persistence.copy()
-                if persistence.max() >= self.flag_pers_cutoff:
+                    self.output_pers.data[integ, group][sci_index] = \
+                        persistence
+                if (persistence.size > 0 and
+                        persistence.max() >= self.flag_pers_cutoff):
                     mask = (persistence >= self.flag_pers_cutoff)
-                    self.output_obj.pixeldq[mask] |= dqflags.pixel['DO_NOT_USE']
+                    if active is None:
+                        self.output_obj.pixeldq[mask] |= \
+                            dqflags.pixel['DO_NOT_USE']
+                    else:
+                        self.output_obj.pixeldq[sci_index[0][mask],
+                                                sci_index[1][mask]] |= \
+                            dqflags.pixel['DO_NOT_USE']
+            if active is not None:
+                self.traps_filled.data[:, act_y, act_x] = traps
+            del traps, decayed
 
             # Update traps_filled with the number of traps that captured
-            # a charge during the current integration.
-            for k in range(nfamilies):
-                capture_param_k = self.get_capture_param(par, k)
-                # This may be a subarray.
-                filled = self.predict_capture(capture_param_k,
-                                              self.trap_density.data,
-                                              integ, grp_slope, slope)
-                if is_subarray:
-                    self.traps_filled.data[k, save_slice[0],
-                                              save_slice[1]] += filled
-                else:
-                    self.traps_filled.data[k, :, :] += filled
+            # a charge during the current integration.  This may be a
+            # subarray, (nfamilies, ny, nx).
+            filled = self.predict_capture(par, self.trap_density.data,
+                                          integ, grp_slope, slope)
+            if is_subarray:
+                self.traps_filled.data[:, save_slice[0],
+                                          save_slice[1]] += filled
+            else:
+                self.traps_filled.data += filled
 
         del filled
 
@@ -601,13 +657,12 @@ class DataSet():
         # This assumes that the jump step has already been run, so that
         # CR jumps will have been flagged in the groupdq extension.
         # n_cr is a 2-D array of the number of cosmic-ray hits per pixel.
-        cr = (np.bitwise_and(gdq, gdqflags["JUMP_DET"]) > 0).astype(np.int32)
-        n_cr = cr.sum(axis=0)
-        del cr
+        n_cr = np.count_nonzero(np.bitwise_and(gdq, gdqflags["JUMP_DET"]),
+                                axis=0)
 
         # In the absence of saturation and jumps, these differences would
         # be approximately constant for a given pixel.
-        diff = data[1:, :, :] - data[0:-1, :, :]
+        diff = np.diff(data, axis=0)
         max_diff = diff.max()
         # Larger than any actual data value
         huge_diff = max(2. * max_diff, 1.e5)
@@ -616,30 +671,13 @@ class DataSet():
         # This assumes that the saturation step has already been run.
         # n_sat is a 2-D array of the number of saturated groups per pixel.
         s_mask = (np.bitwise_and(gdq[1:, :, :], gdqflags["SATURATED"]) > 0)
-        diff[s_mask] = huge_diff
-        sat = s_mask.astype(np.int32)
-        n_sat = sat.sum(axis=0)
-        del s_mask, sat
-
-        sdiff = np.sort(diff, axis=0)
-        # Upper limit of good data (slice notation, i.e. exclusive).
-        upper = diff.shape[0] - (n_cr + n_sat)
-        really_bad = np.where(upper < 0)
-        upper[really_bad] = 0           # for the comparison with indx below
-        del really_bad
-        temp = np.arange(ngroups - 1, dtype=np.int32)
-        temp2 = np.repeat(temp, nx * ny)
-        indx = temp2.reshape((ngroups - 1, ny, nx))
-        mask = np.where(indx >= upper)
-        sdiff[mask] = 0.                # zero values won't affect the sum
-        del temp, temp2, indx, mask
-        bad = np.where(upper <= 0)
-        upper[bad] = 1                  # so we can divide by upper
+        np.putmask(diff, s_mask, huge_diff)
+        n_sat = np.count_nonzero(s_mask, axis=0)
+        del s_mask
 
         # grp_slope has units of DN / group
-        grp_slope = np.sum(sdiff, axis=0) / upper.astype(np.float32)
-        grp_slope[bad] = 0.
-        del bad
+        grp_slope = mean_of_lowest(diff, diff.shape[0] - (n_cr + n_sat))
+        del diff
 
         # slope will have units (DN / persistence_saturation_limit) / second,
         # where persistence_saturation_limit is in units of DN.
@@ -685,28 +723,42 @@ class DataSet():
         return (par0[k], par1[k], par2[k])
 
 
-    def get_decay_param(self, par, k):
-        """Extract decay parameter(s) for the current trap family.
+    def get_active_pixels(self, save_slice):
+        """Find the pixels that have filled traps.
 
         Parameters
         ----------
-        par : tuple of ndarray
-            These were read from the trap parameters reference table.
-            Each element of the tuple is a column from the table.  Each
-            row of the table is for a different trap family.
-
-        k : int
-            Index of the current trap family
+        save_slice : tuple of two slice objects
+            The Y and X slices that can be used to extract the science
+            subarray from the full-frame traps_filled images.
 
         Returns
         -------
-        float
-            This is the decay parameter for the current trap family.
+        tuple of three ndarray, or None
+            The first two elements are the full-frame Y and X indexes of
+            the pixels that have filled traps in any trap family.  The
+            third is a boolean array that is True for those pixels that
+            are within the science data.  None will be returned if more
+            than `MAX_ACTIVE_FRACTION` of the pixels have filled traps, or
+            if `flag_pers_cutoff` is not positive (so pixels without
+            persistence would be flagged); the full frame should then be
+            used.
         """
 
-        par3 = par[3]
+        if self.flag_pers_cutoff <= 0.:
+            return None
+
+        active = np.any(self.traps_filled.data != 0., axis=0)
+        if np.count_nonzero(active) > MAX_ACTIVE_FRACTION * active.size:
+            return None
+
+        (act_y, act_x) = np.nonzero(active)
+        in_sci = ((act_y >= save_slice[0].start) &
+                  (act_y < save_slice[0].stop) &
+                  (act_x >= save_slice[1].start) &
+                  (act_x < save_slice[1].stop))
 
-        return par3[k]
+        return (act_y, act_x, in_sci)
 
 
     def get_group_info(self, integ):
@@ -754,19 +806,17 @@ class DataSet():
                 self.nresets = 1
 
 
-    def predict_capture(self, capture_param_k, trap_density, integ,
-                        grp_slope, slope):
+    def predict_capture(self, par, trap_density, integ, grp_slope, slope):
         """Compute the number of traps that will be filled in time dt.
 
         This is based on Michael Regan's trapcapturemodel.pro.
 
         Parameters
         ----------
-        capture_param_k : tuple of three floats
-            Three values read from a reference table.  These will be from
-            three separate columns but just one row; the row corresponds
-            to the current trap family.  (The _k in the variable name
-            indicates that the values are for one trap family.)
+        par : tuple of ndarray
+            These were read from the trap parameters reference table.
+            Each element of the tuple is a column from the table.  Each
+            row of the table is for a different trap family.
 
         trap_density : ndarray, 2-D
             Image of the total number of traps per pixel.
@@ -788,8 +838,9 @@ class DataSet():
 
         Returns
         -------
-        ndarray, 2-D
-            The computed traps_filled at the end of the integration.
+        ndarray, 3-D
+            The computed traps_filled at the end of the integration, with
+            one image plane for each trap family.
         """
 
         data = self.output_obj.data[integ, :, :, :]
@@ -809,11 +860,8 @@ class DataSet():
         if hasattr(self.persistencesat, "dq"):
             mask = (np.bitwise_and(self.persistencesat.dq,
                                    dqflags.pixel["DO_NOT_USE"]) > 0)
-            mshape = mask.shape
-            mask = mask.reshape((1,) + mshape)
-            m3 = np.repeat(mask, ngroups, 0)
-            pflag[m3] = False
-            del mask, m3
+            pflag &= np.logical_not(mask)
+            del mask
 
         # All of these are 2-D arrays.
         sat_count = pflag.sum(axis=0, dtype=np.intp)
@@ -821,45 +869,47 @@ class DataSet():
         sattime = sat_count.astype(np.float64) * t_group
         dt = totaltime - sattime
 
-        # Traps that were filled due to the linear portion of the ramp.
-        ramp_traps_filled = self.predict_ramp_capture(
-                                capture_param_k,
-                                trap_density, slope, dt)
+        # Traps that were filled due to the linear portion of the ramp,
+        # for all trap families.
+        filled = self.predict_ramp_capture(par[0:3], trap_density,
+                                           slope, dt)
 
-        filled = ramp_traps_filled.copy()
+        # Traps that were filled due to the saturated portion of the ramp
+        # and due to cosmic-ray jumps.  Only some of the pixels are
+        # involved, so these are computed for one trap family at a time.
         mask = (sat_count > 0)
         any_saturated = np.any(mask)
-        if any_saturated:
-            # Traps that were filled due to the saturated portion of the ramp.
-            filled[mask] = self.predict_saturation_capture(
-                                capture_param_k,
-                                trap_density[mask],
-                                ramp_traps_filled[mask],
-                                sattime[mask], sat_count[mask], ngroups)
-        del sat_count, sattime, ramp_traps_filled, mask
-
-        # Traps that were filled due to cosmic-ray jumps.
-        cr_filled = self.delta_fcn_capture(
-                                capture_param_k,
-                                trap_density, integ,
-                                grp_slope, ngroups, t_group)
-        filled += cr_filled
+        (cr_pixels, cr_jumps) = self.find_cr_jumps(integ, grp_slope)
+        for k in range(len(filled)):
+            capture_param_k = self.get_capture_param(par, k)
+            if any_saturated:
+                filled[k][mask] = self.predict_saturation_capture(
+                                        capture_param_k,
+                                        trap_density[mask],
+                                        filled[k][mask],
+                                        sattime[mask], sat_count[mask],
+                                        ngroups)
+            if len(cr_jumps) > 0:
+                filled[k][cr_pixels] += self.delta_fcn_capture(
+                                        capture_param_k,
+                                        trap_density[cr_pixels], cr_jumps,
+                                        ngroups, t_group)
+        del sat_count, sattime, mask
 
         return filled
 
 
-    def predict_ramp_capture(self, capture_param_k, trap_density, slope, dt):
+    def predict_ramp_capture(self, capture_param, trap_density, slope, dt):
         """Compute the number of traps that will be filled in time dt.
 
         This is based on Michael Regan's predictrampcapture3.pro.
 
         Parameters
         ----------
-        capture_param_k : tuple
-            Three values read from a reference table.  These will be from
-            three separate columns but just one row; the row corresponds
-            to the current trap family.  (The _k in the variable name
-            indicates that the values are for one trap family.)
+        capture_param : tuple of three ndarray
+            Columns "capture0", "capture1" and "capture2" from the trap
+            parameters reference table, with one element for each trap
+            family.
 
         trap_density : ndarray, 2-D
             Image of the total number of traps per pixel.
@@ -871,23 +921,33 @@ class DataSet():
             The unit is fraction of the persistence saturation limit
             per second.
 
-        dt : float
+        dt : ndarray, 2-D
             The time interval (unit = second) over which the charge capture
             is to be computed.  This does not include saturated groups.
 
         Returns
         -------
-        ndarray, 2-D
-            The computed traps_filled at the end of the integration.
+        ndarray, 3-D
+            The computed traps_filled at the end of the integration, with
+            one image plane for each trap family.
         """
 
-        (par0, par1, par2) = capture_param_k
-        if par1 == 0:
-            log.error("Capture parameter is zero; parameters are %g, %g, %g",
-                      par0, par1, par2)
-            tau = 1.e10                 # arbitrary "big" number
-        else:
-            tau = 1. / abs(par1)
+        (par0, par1, par2) = capture_param
+        tau = np.empty(len(par1), dtype=np.float64)
+        for k in range(len(par1)):
+            if par1[k] == 0:
+                log.error("Capture parameter is zero; "
+                          "parameters are %g, %g, %g",
+                          par0[k], par1[k], par2[k])
+                tau[k] = 1.e10          # arbitrary "big" number
+            else:
+                tau[k] = 1. / abs(par1[k])
+
+        # Broadcast the parameters over the image for each trap family.
+        shape = (len(par1), 1, 1)
+        par0 = par0.reshape(shape)
+        par2 = par2.reshape(shape)
+        tau = tau.reshape(shape)
 
         traps_filled = (trap_density * slope**2
                         * (dt**2 * (par0 + par2) / 2.
@@ -972,8 +1032,67 @@ class DataSet():
         return total_filled_traps
 
 
-    def delta_fcn_capture(self, capture_param_k, trap_density, integ,
-                          grp_slope, ngroups, t_group):
+    def find_cr_jumps(self, integ, grp_slope):
+        """Find the cosmic-ray jumps in the current integration.
+
+        If there's a CR hit in the first group, we can't determine its
+        amplitude, so the first group is skipped.  In all subsequent
+        groups, CR hits are found via the groupdq extension, and the
+        jump is the difference from the previous group in excess of the
+        slope.
+
+        Parameters
+        ----------
+        integ : int
+            Integration number.
+
+        grp_slope : ndarray, 2-D
+            Array of the slope of the ramp at each pixel, in units of
+            counts (DN) per group.
+
+        Returns
+        -------
+        cr_pixels : tuple of two ndarray
+            The Y and X indexes of the pixels that have a CR hit in any
+            group but the first.
+
+        cr_jumps : list of tuple
+            For each group that has CR hits, a tuple of the group number,
+            the indexes of the pixels that were hit in `cr_pixels`, and
+            the jumps (DN) at those pixels.
+        """
+
+        data = self.output_obj.data[integ, :, :, :]
+        gdq = self.output_obj.groupdq[integ, :, :, :]
+        gdqflags = dqflags.group
+
+        cr_groups = []
+        for group in range(1, data.shape[0]):
+            cr_flag = np.flatnonzero(np.bitwise_and(gdq[group, :, :],
+                                                    gdqflags['JUMP_DET']))
+            if len(cr_flag) > 0:
+                cr_groups.append((group, cr_flag))
+
+        if len(cr_groups) == 0:
+            return ((np.array([], dtype=np.intp),) * 2, [])
+
+        cr_flat = np.unique(np.concatenate([cr_flag for (group, cr_flag)
+                                            in cr_groups]))
+        cr_pixels = np.unravel_index(cr_flat, grp_slope.shape)
+
+        cr_jumps = []
+        for (group, cr_flag) in cr_groups:
+            cr_yx = np.unravel_index(cr_flag, grp_slope.shape)
+            jump = ((data[group][cr_yx] - data[group - 1][cr_yx])
+                    - grp_slope[cr_yx])
+            jump = np.where(jump < 0., 0., jump)
+            cr_jumps.append((group, np.searchsorted(cr_flat, cr_flag), jump))
+
+        return (cr_pixels, cr_jumps)
+
+
+    def delta_fcn_capture(self, capture_param_k, trap_density, cr_jumps,
+                          ngroups, t_group):
         """Compute number of traps filled due to cosmic-ray jumps.
 
         Extended Summary
@@ -995,17 +1114,12 @@ class DataSet():
             to the current trap family.  (The _k in the variable name
             indicates that the values are for one trap family.)
 
-        trap_density : ndarray, 2-D
-            Image of the total number of traps per pixel.
+        trap_density : ndarray, 1-D
+            The total number of traps per pixel, for the pixels that were
+            hit by cosmic rays (`cr_pixels` from `find_cr_jumps`).
 
-        integ : int
-            Integration number.
-
-        grp_slope : ndarray, 2-D
-            Array of the slope of the ramp at each pixel.  The slope was
-            computed from the pixel values that were not saturated and were
-            not affected by jumps, based on flags in the groupdq extension.
-            The unit is counts (DN) per group.
+        cr_jumps : list of tuple
+            The jumps in each group, from `find_cr_jumps`.
 
         ngroups : int
             Total number of groups in the integration.
@@ -1016,38 +1130,21 @@ class DataSet():
 
         Returns
         -------
-        ndarray, 2-D
-            The computed cr_filled at the end of the integration.
+        ndarray, 1-D
+            The computed cr_filled at the end of the integration, for the
+            pixels that were hit by cosmic rays.
         """
 
         (par0, par1, par2) = capture_param_k
         # cr_filled will be incremented group-by-group, depending on
         # where cosmic rays were found in each group.
         cr_filled = np.zeros_like(trap_density)
-        data = self.output_obj.data[integ, :, :, :]
-        gdq = self.output_obj.groupdq[integ, :, :, :]
-        gdqflags = dqflags.group
 
-        # If there's a CR hit in the first group, we can't determine its
-        # amplitude, so skip the first group.  Loop over all subsequent
-        # groups, checking (via the groupdq extension) for cosmic-ray hits.
-        for group in range(1, ngroups):
-            cr_flag = np.where(np.bitwise_and(gdq[group, :, :],
-                                              gdqflags['JUMP_DET']) > 0)
-            if len(cr_flag[0]) > 0:
-                delta_t = (float(ngroups - group) - 0.5) * t_group
-                # z and z_prev are index arrays.
-                z = np.empty(len(cr_flag[0]), dtype=np.intp)
-                z[:] = group
-                z_prev = z - 1
-                # jump is a 1-D array, just for the CRs in the current group.
-                jump = ((data[z, cr_flag[0], cr_flag[1]]
-                       - data[z_prev, cr_flag[0], cr_flag[1]])
-                        - grp_slope[cr_flag])
-                jump = np.where(jump < 0., 0., jump)
-                cr_filled[cr_flag] += trap_density[cr_flag] * jump \
-                                      * (par0 * (1. - math.exp(par1 * delta_t))
-                                         + par2)
+        for (group, index, jump) in cr_jumps:
+            delta_t = (float(ngroups - group) - 0.5) * t_group
+            cr_filled[index] += trap_density[index] * jump \
+                                * (par0 * (1. - math.exp(par1 * delta_t))
+                                   + par2)
 
         cr_filled *= SCALEFACTOR
         return cr_filled
@@ -1060,14 +1157,15 @@ class DataSet():
 
         Parameters
         ----------
-        traps_filled : ndarray, 2-D
-            This is an image of the number of filled traps in each pixel
-            for the current trap family.
+        traps_filled : ndarray
+            The number of filled traps in each pixel.  The first axis is
+            the trap family, e.g. (nfamilies, ny, nx), or (nfamilies, npix)
+            for a set of pixels.
 
-        decay_param : float
-            The decay parameter.  This is negative, but otherwise it's
-            the reciprocal of the e-folding time for trap decay for the
-            current trap family.
+        decay_param : ndarray, 1-D
+            The decay parameter for each trap family.  These are negative,
+            but otherwise they're the reciprocal of the e-folding time for
+            trap decay.
 
         delta_t : float
             The time interval (unit = second) over which the trap decay
@@ -1075,15 +1173,19 @@ class DataSet():
 
         Returns
         -------
-        decayed : ndarray, 2-D
-            Image of the computed number of trap decays for each pixel,
-            for the current trap family.
+        decayed : ndarray
+            The computed number of trap decays for each pixel and trap
+            family, with the same shape as `traps_filled`.
         """
 
-        if decay_param == 0.:
-            decayed = traps_filled * 0.
-        else:
-            tau = 1. / abs(decay_param)
-            decayed = traps_filled * (1. - math.exp(-delta_t / tau))
+        # The fraction of the filled traps that decay for each trap family.
+        fraction = np.zeros(len(decay_param), dtype=traps_filled.dtype)
+        for k in range(len(decay_param)):
+            if decay_param[k] != 0.:
+                tau = 1. / abs(decay_param[k])
+                fraction[k] = 1. - math.exp(-delta_t / tau)
+        fraction = fraction.reshape((-1,) + (1,) * (traps_filled.ndim - 1))
+
+        decayed = traps_filled * fraction
 
         return decayed
@@ -3,6 +3,7 @@
 from ..stpipe import Step
 from .. import datamodels
 from . import persistence
+from . import trapsfilled_store
 
 __all__ = ["PersistenceStep"]
 
@@ -27,6 +28,14 @@ class PersistenceStep(Step):
         # If `save_trapsfilled` is True, the updated trapsfilled file will
         # be written to an output file with suffix "_trapsfilled".
         save_trapsfilled = boolean(default=True)
+        # If `use_trapsfilled_store` is True, the traps-filled state at the
+        # end of the previous exposure of the same detector is taken from
+        # an in-process store (unless `input_trapsfilled` is given), and
+        # the updated state is saved there for the next exposure.
+        use_trapsfilled_store = boolean(default=False)
+        # Directory in which the store keeps the traps-filled arrays as
+        # memory-mapped files; if empty, they are kept in memory.
+        trapsfilled_store_dir = string(default="")
     """
 
     reference_file_types = ["trapdensity", "trappars", "persat"]
@@ -38,7 +47,9 @@ class PersistenceStep(Step):
                 len(self.input_trapsfilled) == 0):
                 self.input_trapsfilled = None
 
-        output_obj = datamodels.RampModel(input).copy()
+        output_obj = datamodels.RampModel(input)
+        if not self.in_place:
+            output_obj = output_obj.copy()
 
         self.trap_density_filename = self.get_reference_file(output_obj,
                                                              "trapdensity")
@@ -69,16 +80,30 @@ class PersistenceStep(Step):
             output_obj.meta.cal_step.persistence = "SKIPPED"
             return output_obj
 
-        if self.input_trapsfilled is None:
-            traps_filled_model = None
-        else:
-            traps_filled_model = datamodels.TrapsFilledModel(
-                                        self.input_trapsfilled)
         trap_density_model = datamodels.TrapDensityModel(
                                 self.trap_density_filename)
         trappars_model = datamodels.TrapParsModel(self.trappars_filename)
         persat_model = datamodels.PersistenceSatModel(self.persat_filename)
 
+        if self.use_trapsfilled_store:
+            store = trapsfilled_store.get_store(
+                        self.trapsfilled_store_dir or None)
+        else:
+            store = None
+
+        if self.input_trapsfilled is not None:
+            traps_filled_model = datamodels.TrapsFilledModel(
+                                        self.input_trapsfilled)
+        elif store is not None:
+            traps_filled_model = store.get(
+                output_obj.meta.instrument.detector,
+                output_obj.meta.exposure.start_time,
+                trappars_model.trappars_table["decay_param"])
+            if traps_filled_model is not None:
+                self.log.info("Using the traps-filled state from the store")
+        else:
+            traps_filled_model = None
+
         pers_a = persistence.DataSet(output_obj, traps_filled_model,
                                      self.flag_pers_cutoff,
                                      self.save_persistence,
@@ -92,6 +117,8 @@ class PersistenceStep(Step):
 
         if traps_filled_model is not None:      # input traps_filled
             traps_filled_model.close()
+        if traps_filled is not None and store is not None:
+            store.put(traps_filled)
         if traps_filled is not None:            # output traps_filled
             # Save the traps_filled image with suffix 'trapsfilled'.
             self.save_model(
@@ -0,0 +1,114 @@
+"""Synthetic science data and reference files for the persistence tests"""
+
+import numpy as np
+
+from jwst import datamodels
+from jwst.datamodels import dqflags
+
+# Shape of the (small) detector
+DET_SHAPE = (12, 16)
+
+# Shape and (1-based) start of the subarray
+SUB_SHAPE = (6, 8)
+SUB_START = (3, 5)
+
+NINTS = 2
+NGROUPS = 4
+
+START_TIME = 58000.5            # MJD
+FRAME_TIME = 10.7
+GROUP_TIME = 21.4
+
+# Capture and decay parameters of three trap families
+TRAPPARS = [(0.2, -1.e-3, 0.01, -1.e-3),
+            (0.1, -1.e-2, 0.005, -1.e-2),
+            (0.05, -0.1, 0., -0.1)]
+
+
+def set_subarray(model, shape, start=(1, 1)):
+    model.meta.subarray.ystart = start[0]
+    model.meta.subarray.xstart = start[1]
+    model.meta.subarray.ysize = shape[0]
+    model.meta.subarray.xsize = shape[1]
+
+
+def make_ramp(rng, subarray=False):
+    """Return ramps with a range of slopes, some saturated groups and some
+    cosmic-ray jumps"""
+    if subarray:
+        (shape, start) = (SUB_SHAPE, SUB_START)
+    else:
+        (shape, start) = (DET_SHAPE, (1, 1))
+    ramp = datamodels.RampModel((NINTS, NGROUPS) + shape)
+
+    slope = rng.uniform(5., 2500., size=(NINTS,) + shape)
+    groups = np.arange(1, NGROUPS + 1).reshape((1, NGROUPS, 1, 1))
+    ramp.data[...] = (slope[:, np.newaxis] * groups +
+                      rng.normal(0., 3., size=ramp.data.shape))
+    ramp.groupdq[ramp.data > 8000.] = dqflags.group['SATURATED']
+    # Jumps in about 5% of the ramps
+    (ints, pixels) = np.nonzero(rng.uniform(size=(NINTS, shape[0] * shape[1]))
+                                < 0.05)
+    for integ, pixel in zip(ints, pixels):
+        (y, x) = np.unravel_index(pixel, shape)
+        group = rng.randint(1, NGROUPS)
+        ramp.data[integ, group:, y, x] += 500.
+        ramp.groupdq[integ, group, y, x] |= dqflags.group['JUMP_DET']
+
+    ramp.meta.instrument.name = 'NIRCAM'
+    ramp.meta.instrument.detector = 'NRCA1'
+    ramp.meta.exposure.start_time = START_TIME
+    ramp.meta.exposure.end_time = (START_TIME +
+                                   NINTS * NGROUPS * GROUP_TIME / 86400.)
+    ramp.meta.exposure.frame_time = FRAME_TIME
+    ramp.meta.exposure.group_time = GROUP_TIME
+    ramp.meta.exposure.ngroups = NGROUPS
+    ramp.meta.exposure.nframes = 2
+    ramp.meta.exposure.groupgap = 0
+    ramp.meta.exposure.nresets_at_start = 1
+    ramp.meta.exposure.nresets_between_ints = 1
+    set_subarray(ramp, shape, start)
+
+    return ramp
+
+
+def make_traps_filled(rng, kind):
+    """Return a traps-filled state of the detector at the end of an exposure
+    100 s before the ramp
+
+    `kind` is 'empty' (no filled traps), 'sparse' (filled traps in a few
+    percent of the pixels) or 'full' (filled traps in every pixel).
+    """
+    data = np.zeros((len(TRAPPARS),) + DET_SHAPE, dtype=np.float32)
+    if kind == 'sparse':
+        mask = rng.uniform(size=DET_SHAPE) < 0.05
+        data[:, mask] = rng.uniform(100., 20000., size=(len(TRAPPARS),
+                                                        mask.sum()))
+    elif kind == 'full':
+        data[...] = rng.uniform(1., 20000., size=data.shape)
+    traps_filled = datamodels.TrapsFilledModel(data=data)
+    traps_filled.meta.instrument.name = 'NIRCAM'
+    traps_filled.meta.instrument.detector = 'NRCA1'
+    traps_filled.meta.exposure.end_time = START_TIME - 100. / 86400.
+    set_subarray(traps_filled, DET_SHAPE)
+
+    return traps_filled
+
+
+def make_references(rng):
+    """Return the trap density, trap parameters and persistence saturation
+    reference models, for the whole detector"""
+    trap_density = datamodels.TrapDensityModel(
+        data=rng.uniform(1., 3., size=DET_SHAPE).astype(np.float32))
+    set_subarray(trap_density, DET_SHAPE)
+
+    trappars = datamodels.TrapParsModel()
+    trappars.trappars_table = np.array(
+        TRAPPARS, dtype=[('capture0', '<f8'), ('capture1', '<f8'),
+                         ('capture2', '<f8'), ('decay_param', '<f8')])
+
+    persat = datamodels.PersistenceSatModel(
+        data=rng.uniform(6000., 7000., size=DET_SHAPE).astype(np.float32))
+    set_subarray(persat, DET_SHAPE)
+
+    return (trap_density, trappars, persat)
@@ -0,0 +1,132 @@
+"""
+Test the persistence correction against results of the implementation that
+corrected one trap family at a time, and the active-pixel path against the
+full-frame path.
+"""
+from os import path
+
+import asdf
+import numpy as np
+import pytest
+
+from jwst.persistence import persistence
+
+from .helpers import (make_ramp, make_references, make_traps_filled,
+                      DET_SHAPE)
+
+DATA_PATH = path.join(path.dirname(__file__), 'data')
+
+# Results of the implementation that corrected one trap family at a time,
+# computed by run_persistence() for each case
+EXPECTED_FILE = path.join(DATA_PATH, 'persistence_expected.asdf')
+
+CUTOFFS = [0., 0.5, 40.]
+
+
+def case_name(subarray, kind):
+    return '{}_{}'.format('subarray' if subarray else 'full', kind)
+
+
+def run_persistence(module, subarray, kind, cutoff):
+    """
+    Correct synthetic ramps for persistence with the DataSet class of
+    `module`, and return the corrected data, pixeldq, traps-filled and
+    persistence arrays.
+
+    `kind` is 'none', for no input traps-filled state, or one of the kinds
+    of `make_traps_filled`.
+    """
+    rng = np.random.RandomState(17)
+    ramp = make_ramp(rng, subarray)
+    if kind == 'none':
+        traps_filled = None
+    else:
+        traps_filled = make_traps_filled(rng, kind)
+    (trap_density, trappars, persat) = make_references(rng)
+
+    dataset = module.DataSet(ramp, traps_filled, cutoff, True,
+                             trap_density, trappars, persat)
+    (output, traps_filled, output_pers, skipped) = dataset.do_all()
+    assert not skipped
+
+    return (output.data, output.pixeldq, traps_filled.data, output_pers.data)
+
+
+@pytest.fixture
+def expected():
+    with asdf.open(EXPECTED_FILE, copy_arrays=True) as af:
+        return {case: {name: np.array(array) for name, array in arrays.items()}
+                for case, arrays in af.tree['results'].items()}
+
+
+@pytest.mark.parametrize('subarray', [False, True])
+@pytest.mark.parametrize('kind', ['none', 'empty', 'sparse', 'full'])
+@pytest.mark.parametrize('cutoff', CUTOFFS)
+@pytest.mark.parametrize('max_active_fraction',
+                         [persistence.MAX_ACTIVE_FRACTION, -1., 1.])
+def test_do_all(expected, subarray, kind, cutoff, max_active_fraction,
+                monkeypatch):
+    """The results match those of the per-family implementation, whether
+    the decays are computed for the full frame (max_active_fraction -1) or
+    for just the pixels with filled traps, whenever the cutoff allows it
+    (max_active_fraction 1)"""
+    monkeypatch.setattr(persistence, 'MAX_ACTIVE_FRACTION',
+                        max_active_fraction)
+
+    (data, pixeldq, traps_filled, pers) = run_persistence(
+        persistence, subarray, kind, cutoff)
+
+    case = expected[case_name(subarray, kind)]
+    np.testing.assert_allclose(data, case['data'], rtol=1e-6)
+    np.testing.assert_allclose(traps_filled, case['traps_filled'], rtol=1e-6)
+    np.testing.assert_allclose(pers, case['persistence'], rtol=1e-6,
+                               atol=1e-6)
+    np.testing.assert_array_equal(pixeldq,
+                                  case['pixeldq'][CUTOFFS.index(cutoff)])
+
+
+def test_get_active_pixels():
+    """The active pixels are only used if no more than MAX_ACTIVE_FRACTION
+    of the pixels have filled traps, and the cutoff is positive"""
+    data = np.zeros((2,) + DET_SHAPE, dtype=np.float32)
+    size = DET_SHAPE[0] * DET_SHAPE[1]
+    nactive = int(persistence.MAX_ACTIVE_FRACTION * size)
+    # Filled traps in one family or the other
+    data[0].flat[:nactive:2] = 1.
+    data[1].flat[1:nactive:2] = 1.
+    dataset = persistence.DataSet(None, None, 40., False, None, None, None)
+    dataset.traps_filled = make_traps_filled(np.random.RandomState(1),
+                                             'empty')
+    dataset.traps_filled.data = data
+    save_slice = (slice(2, 8), slice(4, 12))
+
+    (act_y, act_x, in_sci) = dataset.get_active_pixels(save_slice)
+    assert len(act_y) == nactive
+    assert np.all(np.any(data[:, act_y, act_x] != 0., axis=0))
+    np.testing.assert_array_equal(in_sci, (act_y >= 2) & (act_y < 8) &
+                                  (act_x >= 4) & (act_x < 12))
+
+    data[0].flat[nactive] = 1.
+    assert dataset.get_active_pixels(save_slice) is None
+
+    data[0].flat[nactive] = 0.
+    dataset.flag_pers_cutoff = 0.
+    assert dataset.get_active_pixels(save_slice) is None
+
+
+def test_mean_of_lowest():
+    """mean_of_lowest gives the same results as masking the sorted values"""
+    rng = np.random.RandomState(5)
+    values = rng.normal(100., 10., size=(7, 5, 6)).astype(np.float32)
+    num_used = rng.randint(-1, 8, size=(5, 6))
+
+    # Zero the values above num_used in the sorted values, then average
+    sorted_values = np.sort(values, axis=0)
+    index = np.arange(7).reshape((7, 1, 1))
+    sorted_values[index >= np.maximum(num_used, 0)] = 0.
+    bad = num_used <= 0
+    expected = sorted_values.sum(axis=0) / np.where(bad, 1, num_used)
+    expected[bad] = 0.
+
+    np.testing.assert_allclose(persistence.mean_of_lowest(values, num_used),
+                               expected, rtol=1e-6)
@@ -0,0 +1,200 @@
+"""Test the in-process store of traps-filled states, and its use by
+PersistenceStep"""
+import os
+
+import numpy as np
+import pytest
+
+from jwst.persistence import persistence, trapsfilled_store
+from jwst.persistence.persistence_step import PersistenceStep
+
+from .helpers import (make_ramp, make_references, make_traps_filled,
+                      START_TIME, TRAPPARS)
+
+DECAY_PARAM = np.array([pars[3] for pars in TRAPPARS])
+
+
+@pytest.fixture(autouse=True)
+def clear_stores():
+    """Start and end each test with no stores"""
+    trapsfilled_store._stores.clear()
+    yield
+    for store in trapsfilled_store._stores.values():
+        store.clear()
+    trapsfilled_store._stores.clear()
+
+
+def test_get_store(tmpdir):
+    """The same store is returned for the same directory"""
+    store = trapsfilled_store.get_store()
+    assert trapsfilled_store.get_store() is store
+    assert store.directory is None
+
+    dir_store = trapsfilled_store.get_store(str(tmpdir))
+    assert dir_store is not store
+    assert trapsfilled_store.get_store(str(tmpdir)) is dir_store
+
+
+@pytest.mark.parametrize('use_directory', [False, True])
+def test_put_get(tmpdir, use_directory):
+    """put and get save and return copies of the state"""
+    directory = str(tmpdir) if use_directory else None
+    store = trapsfilled_store.TrapsFilledStore(directory)
+    traps_filled = make_traps_filled(np.random.RandomState(3), 'full')
+    expected = traps_filled.data.copy()
+
+    assert store.get('NRCA1', START_TIME, DECAY_PARAM) is None
+    store.put(traps_filled)
+    assert 'NRCA1' in store
+    assert len(store) == 1
+
+    # Changing the saved model does not change the state in the store
+    traps_filled.data[...] = 0.
+    first = store.get('NRCA1', START_TIME, DECAY_PARAM)
+    np.testing.assert_array_equal(first.data, expected)
+    assert first.meta.exposure.end_time == traps_filled.meta.exposure.end_time
+
+    # nor does changing a returned model
+    first.data[...] = 0.
+    second = store.get('NRCA1', START_TIME, DECAY_PARAM)
+    np.testing.assert_array_equal(second.data, expected)
+
+    # A state is returned whatever the start time if either time is unknown
+    assert store.get('NRCA1', None, DECAY_PARAM) is not None
+    assert store.get('NRCB1', START_TIME, DECAY_PARAM) is None
+    store.clear()
+
+
+def test_put_replaces(tmpdir):
+    """A state replaces the one saved earlier for the same detector, and
+    its memory-mapped file"""
+    store = trapsfilled_store.TrapsFilledStore(str(tmpdir))
+    rng = np.random.RandomState(3)
+    first = make_traps_filled(rng, 'full')
+    store.put(first)
+    assert len(tmpdir.listdir()) == 1
+    first_file = tmpdir.listdir()[0]
+    assert first_file.basename.startswith('NRCA1_')
+    assert first_file.ext == '.npy'
+    np.testing.assert_array_equal(np.load(str(first_file)), first.data)
+
+    second = make_traps_filled(rng, 'sparse')
+    second.meta.exposure.end_time += 0.01
+    store.put(second)
+    assert len(store) == 1
+    assert tmpdir.listdir() != [first_file]
+    assert len(tmpdir.listdir()) == 1
+
+    saved = store.get('NRCA1', START_TIME + 0.01, DECAY_PARAM)
+    np.testing.assert_array_equal(saved.data, second.data)
+    assert saved.meta.exposure.end_time == second.meta.exposure.end_time
+
+    other = make_traps_filled(rng, 'full')
+    other.meta.instrument.detector = 'NRCB1'
+    store.put(other)
+    assert len(store) == 2
+    assert len(tmpdir.listdir()) == 2
+    store.clear()
+
+
+def test_get_decayed():
+    """A state that will have decayed to a negligible level is discarded"""
+    store = trapsfilled_store.TrapsFilledStore()
+    traps_filled = make_traps_filled(np.random.RandomState(3), 'full')
+    end_time = traps_filled.meta.exposure.end_time
+    max_filled = traps_filled.data.max()
+    store.put(traps_filled)
+
+    # Just before and after the slowest-decaying family falls below the
+    # negligible level
+    elapsed = (np.log(max_filled / trapsfilled_store.NEGLIGIBLE_TRAPS) /
+               np.abs(DECAY_PARAM).min())
+    assert store.get('NRCA1', end_time + 0.99 * elapsed / 86400.,
+                     DECAY_PARAM) is not None
+    assert 'NRCA1' in store
+    assert store.get('NRCA1', end_time + 1.01 * elapsed / 86400.,
+                     DECAY_PARAM) is None
+    assert 'NRCA1' not in store
+
+    # An empty state is always negligible
+    store.put(make_traps_filled(np.random.RandomState(3), 'empty'))
+    assert store.get('NRCA1', end_time, DECAY_PARAM) is None
+    assert len(store) == 0
+
+
+def test_get_later_state():
+    """A state from the end of a later exposure is not used for an earlier
+    exposure, but is kept"""
+    store = trapsfilled_store.TrapsFilledStore()
+    traps_filled = make_traps_filled(np.random.RandomState(3), 'full')
+    end_time = traps_filled.meta.exposure.end_time
+    store.put(traps_filled)
+
+    assert store.get('NRCA1', end_time - 1. / 86400., DECAY_PARAM) is None
+    assert 'NRCA1' in store
+    assert store.get('NRCA1', end_time, DECAY_PARAM) is not None
+
+
+def test_evict_clear(tmpdir):
+    """evict discards the state of one detector, and clear those of all
+    detectors, along with their memory-mapped files"""
+    store = trapsfilled_store.TrapsFilledStore(str(tmpdir))
+    rng = np.random.RandomState(3)
+    for detector in ['NRCA1', 'NRCA2', 'NRCA3']:
+        traps_filled = make_traps_filled(rng, 'full')
+        traps_filled.meta.instrument.detector = detector
+        store.put(traps_filled)
+    assert len(os.listdir(str(tmpdir))) == 3
+
+    store.evict('NRCA2')
+    store.evict('NRCB1')
+    assert len(store) == 2
+    assert 'NRCA2' not in store
+    assert store.get('NRCA2', START_TIME, DECAY_PARAM) is None
+    assert sorted(name[:5] for name in os.listdir(str(tmpdir))) == \
+        ['NRCA1', 'NRCA3']
+
+    store.clear()
+    assert len(store) == 0
+    assert os.listdir(str(tmpdir)) == []
+
+
+@pytest.mark.parametrize('use_directory', [False, True])
+def test_step_uses_store(tmpdir, use_directory):
+    """PersistenceStep corrects with the state in the store, and replaces it
+    with the state at the end of the exposure"""
+    directory = str(tmpdir.mkdir('store')) if use_directory else ""
+    rng = np.random.RandomState(17)
+    ramp = make_ramp(rng)
+    traps_filled = make_traps_filled(rng, 'full')
+    (trap_density, trappars, persat) = make_references(rng)
+
+    # Results of correcting with the same state as input
+    dataset = persistence.DataSet(ramp.copy(), traps_filled.copy(), 40.,
+                                  False, trap_density, trappars, persat)
+    (expected, expected_traps, _, _) = dataset.do_all()
+
+    store = trapsfilled_store.get_store(directory or None)
+    store.put(traps_filled)
+
+    try:
+        step = PersistenceStep(output_dir=str(tmpdir),
+                               use_trapsfilled_store=True,
+                               trapsfilled_store_dir=directory,
+                               save_trapsfilled=False)
+        step.override_trapdensity = trap_density
+        step.override_trappars = trappars
+        step.override_persat = persat
+        result = step.run(ramp)
+
+        assert result.meta.cal_step.persistence == 'COMPLETE'
+        np.testing.assert_array_equal(result.data, expected.data)
+        np.testing.assert_array_equal(result.pixeldq, expected.pixeldq)
+
+        saved = store.get('NRCA1', ramp.meta.exposure.end_time, DECAY_PARAM)
+        np.testing.assert_array_equal(saved.data, expected_traps.data)
+        assert saved.meta.exposure.end_time == ramp.meta.exposure.end_time
+        assert not any(name.endswith('_trapsfilled.fits')
+                       for name in os.listdir(str(tmpdir)))
+    finally:
+        store.clear()
@@ -0,0 +1,194 @@
+#
+#  In-process store of the traps-filled state of each detector
+
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+NEGLIGIBLE_TRAPS = 0.01
+"""A traps-filled state is discarded when decays would leave fewer than
+this number of filled traps in every pixel, for every trap family.
+"""
+
+# One store for each directory of memory-mapped files (None for in memory).
+_stores = {}
+
+
+def get_store(directory=None):
+    """Get the traps-filled store for this process.
+
+    Parameters
+    ----------
+    directory : str or None
+        If not None, the traps-filled arrays are kept in memory-mapped
+        files in this directory, rather than in memory.
+
+    Returns
+    -------
+    TrapsFilledStore
+        The same store is returned for each call with the same directory.
+    """
+
+    if directory not in _stores:
+        _stores[directory] = TrapsFilledStore(directory)
+
+    return _stores[directory]
+
+
+class TrapsFilledStore():
+    """The traps-filled state at the end of the latest exposure of each
+    detector.
+
+    When the exposures of a detector are processed in time order in one
+    process, the traps-filled state at the end of one exposure can be
+    kept here and used for the next exposure, rather than writing it to a
+    trapsfilled file and reading it back.
+
+    Attributes
+    ----------
+    directory : str or None
+        If not None, the traps-filled arrays are kept in memory-mapped
+        files in this directory.
+
+    negligible : float
+        Decayed states with fewer filled traps than this in every pixel
+        are discarded.
+    """
+
+    def __init__(self, directory=None, negligible=NEGLIGIBLE_TRAPS):
+
+        self.directory = directory
+        self.negligible = negligible
+        # detector name -> (TrapsFilledModel without its data, data array,
+        # memory-mapped file name).  The data are kept out of the model so
+        # that a memory-mapped array is unmapped as soon as it's evicted,
+        # rather than when the model is garbage collected.
+        self._states = {}
+
+
+    def __contains__(self, detector):
+
+        return detector in self._states
+
+
+    def __len__(self):
+
+        return len(self._states)
+
+
+    def put(self, traps_filled):
+        """Save the traps-filled state at the end of an exposure.
+
+        This replaces any state saved earlier for the same detector.
+
+        Parameters
+        ----------
+        traps_filled : `TrapsFilledModel`
+            The traps-filled state at the end of an exposure.  A copy is
+            saved, keyed by ``meta.instrument.detector``; the time is taken
+            from ``meta.exposure.end_time``.
+        """
+
+        detector = traps_filled.meta.instrument.detector
+        self.evict(detector)
+
+        state = traps_filled.copy()
+        data = state.data
+        del state.data
+        filename = None
+        if self.directory is not None:
+            (fd, filename) = tempfile.mkstemp(suffix=".npy",
+                                              prefix=detector + "_",
+                                              dir=self.directory)
+            os.close(fd)
+            data = np.lib.format.open_memmap(filename, mode="w+",
+                                             dtype=traps_filled.data.dtype,
+                                             shape=traps_filled.data.shape)
+            data[...] = traps_filled.data
+        self._states[detector] = (state, data, filename)
+        log.debug("Saved traps-filled state for detector %s", detector)
+
+
+    def get(self, detector, start_time, decay_param):
+        """Get the traps-filled state for the next exposure of a detector.
+
+        Parameters
+        ----------
+        detector : str
+            The detector name.
+
+        start_time : float or None
+            The start time (MJD) of the next exposure.
+
+        decay_param : ndarray, 1-D
+            The decay parameter for each trap family, from the trappars
+            reference table.  These are negative, but otherwise they're
+            the reciprocal of the e-folding time for trap decay.
+
+        Returns
+        -------
+        `TrapsFilledModel` or None
+            A copy of the saved state, which may be modified by the caller.
+            None will be returned if there is no state for the detector,
+            or if by `start_time` the state will have decayed so that it's
+            negligible; in the latter case the state is also discarded.
+            None will also be returned, with a warning, if `start_time` is
+            earlier than the end of the exposure of the saved state; the
+            saved state is then kept for later exposures.
+        """
+
+        if detector not in self._states:
+            return None
+        (state, data, filename) = self._states[detector]
+
+        end_time = state.meta.exposure.end_time
+        if start_time is not None and end_time is not None:
+            elapsed = (start_time - end_time) * 86400.
+            if elapsed < 0.:
+                log.warning("The traps-filled state for detector %s is from "
+                            "a later exposure; not using it", detector)
+                return None
+            remaining = np.exp(-elapsed * np.abs(decay_param))
+            nfamilies = data.shape[0]
+            max_filled = np.nanmax(np.abs(data.reshape((nfamilies, -1))),
+                                   axis=1)
+            if np.all(max_filled * remaining < self.negligible):
+                log.info("Traps-filled state for detector %s has decayed "
+                         "to a negligible level; discarding it", detector)
+                self.evict(detector)
+                return None
+
+        traps_filled = state.copy()
+        traps_filled.data = np.array(data)
+        return traps_filled
+
+
+    def evict(self, detector):
+        """Discard the traps-filled state of a detector, if any.
+
+        Parameters
+        ----------
+        detector : str
+            The detector name.
+        """
+
+        if detector not in self._states:
+            return
+
+        (state, data, filename) = self._states.pop(detector)
+        state.close()
+        del state, data
+        if filename is not None:
+            os.remove(filename)
+
+
+    def clear(self):
+        """Discard the traps-filled states of all detectors."""
+
+        for detector in list(self._states):
+            self.evict(detector)
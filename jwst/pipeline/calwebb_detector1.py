@@ -2,6 +2,7 @@
 import logging
 from ..stpipe import Pipeline
 from .. import datamodels
+from . import fused_corrections
 
 # step imports
 from ..group_scale import group_scale_step
@@ -38,6 +39,8 @@ class Detector1Pipeline(Pipeline):
 
     spec = """
         save_calibrated_ramp = boolean(default=False)
+        in_place = boolean(default=False) # steps modify the ramp rather than copy it
+        fuse_corrections = boolean(default=False) # fuse the per-pixel corrections (MIRI; NIR refpix and persistence end passes)
     """
 
     # Define aliases to steps
@@ -63,8 +66,16 @@ class Detector1Pipeline(Pipeline):
 
         log.info('Starting calwebb_detector1 ...')
 
-        # open the input as a RampModel
-        input = datamodels.RampModel(input)
+        # open the input as a RampModel; the steps modify the ramp when
+        # working in place, so a model owned by the caller is copied once
+        if self.in_place and isinstance(input, datamodels.DataModel):
+            input = datamodels.RampModel(input).copy()
+        else:
+            input = datamodels.RampModel(input)
+
+        # let the steps modify the ramp owned by the pipeline in place
+        for step_name in self.step_defs:
+            getattr(self, step_name).in_place = self.in_place
 
         # propagate output_dir to steps that might need it
         self.dark_current.output_dir = self.output_dir
@@ -76,38 +87,33 @@ class Detector1Pipeline(Pipeline):
             # the steps are in a different order than NIR
             log.debug('Processing a MIRI exposure')
 
-            result = self.group_scale(input)
-            result = self.dq_init(result)
-            result = self.saturation(result)
-            result = self.ipc(result)
-            result = self.firstframe(result)
-            result = self.lastframe(result)
-            result = self.linearity(result)
-            result = self.rscd(result)
-            result = self.dark_current(result)
-            result = self.refpix(result)
-
-            # skip until MIRI team has figured out an algorithm
-            #result = self.persistence(result)
+            # skip persistence until MIRI team has figured out an algorithm
+            step_names = ['group_scale', 'dq_init', 'saturation', 'ipc',
+                          'firstframe', 'lastframe', 'linearity', 'rscd',
+                          'dark_current', 'refpix']
 
         else:
 
             # process Near-IR exposures
             log.debug('Processing a Near-IR exposure')
 
-            result = self.group_scale(input)
-            result = self.dq_init(result)
-            result = self.saturation(result)
-            result = self.ipc(result)
-            result = self.superbias(result)
-            result = self.refpix(result)
-            result = self.linearity(result)
+            step_names = ['group_scale', 'dq_init', 'saturation', 'ipc',
+                          'superbias', 'refpix', 'linearity']
 
             # skip persistence for NIRSpec
-            if result.meta.instrument.name != 'NIRSPEC':
-                result = self.persistence(result)
+            if input.meta.instrument.name != 'NIRSPEC':
+                step_names.append('persistence')
 
-            result = self.dark_current(result)
+            step_names.append('dark_current')
+
+        # apply the detector-level steps, fusing the per-pixel corrections
+        # of consecutive steps into single passes over the ramp if requested
+        if self.fuse_corrections:
+            result = fused_corrections.run_steps(self, input, step_names)
+        else:
+            result = input
+            for step_name in step_names:
+                result = getattr(self, step_name)(result)
 
         # apply the jump step
         result = self.jump(result)
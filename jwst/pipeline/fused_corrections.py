@@ -0,0 +1,379 @@
+"""
+Fused execution of the per-pixel detector-level corrections.
+
+The saturation, superbias, linearity and dark current corrections each
+depend only on the values of a pixel in the groups of an integration and on
+the reference data for that pixel. Rather than have each of these steps sweep
+over the whole ramp in turn, the corrections of consecutive steps are
+prepared, loading their reference data once, and then applied together in a
+single pass over tiles of rows of the ramp, each of which is small enough to
+stay in cache while all of the corrections are applied to it.
+"""
+
+import abc
+import logging
+
+import numpy as np
+
+from .. import datamodels
+from ..datamodels import dqflags
+from ..lib import pipe_utils
+from ..lib import reffile_utils
+from ..stpipe import crds_client
+from ..dark_current import dark_sub
+from ..linearity import linearity
+from ..linearity.linearity_func import apply_linearity_func
+from ..saturation import saturation
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+# Size in bytes of the SCI data of a tile of rows
+FUSED_TILE_BYTES = 4 * 1024 * 1024
+
+# Steps that only set DO_NOT_USE flags in the GROUPDQ array, which none of
+# the fused corrections use, so they can run while corrections are pending
+FLAG_ONLY_STEPS = ('firstframe', 'lastframe', 'rscd')
+
+
+class FusedCorrection(abc.ABC):
+    """
+    The per-pixel correction of a step, with its reference data prepared
+    for applying it to tiles of rows of the ramp.
+
+    Attributes
+    ----------
+    cal_step : str
+        name of the calibration step status keyword of the correction
+
+    reftype : str
+        type of the reference file of the correction
+
+    ref_name : str
+        name of the reference file, for the output metadata
+
+    pixeldq : int, 2D array
+        flags to combine with the PIXELDQ array of the science data
+    """
+    cal_step = None
+    reftype = None
+
+    def __init__(self, ref_name):
+        self.ref_name = ref_name
+        self.pixeldq = None
+
+    @abc.abstractmethod
+    def apply(self, data, groupdq, rows):
+        """
+        Apply the correction to a tile of rows of the ramp.
+
+        Parameters
+        ----------
+        data : float, 4D array
+            SCI data [integration, group, row, column] of the tile, corrected
+            in place
+
+        groupdq : int, 4D array
+            GROUPDQ array of the tile, updated in place
+
+        rows : slice
+            rows of the tile in the full science array
+        """
+
+
+class SaturationCorrection(FusedCorrection):
+    """Flag the groups at or above the saturation threshold, and all
+    following groups, as saturated"""
+    cal_step = 'saturation'
+    reftype = 'saturation'
+
+    def __init__(self, input_model, ref_model, ref_name=None):
+        super().__init__(ref_name)
+
+        self.satmask, self.pixeldq = saturation.prepare_reference(input_model,
+                                                                  ref_model)
+
+    def apply(self, data, groupdq, rows):
+        saturation.flag_saturation(data, groupdq, self.satmask[rows])
+
+
+class SuperBiasCorrection(FusedCorrection):
+    """Subtract the superbias image from all groups"""
+    cal_step = 'superbias'
+    reftype = 'superbias'
+
+    def __init__(self, input_model, bias_model, ref_name=None):
+        super().__init__(ref_name)
+
+        if not reffile_utils.ref_matches_sci(input_model, bias_model):
+            bias_model = reffile_utils.get_subarray_model(input_model, bias_model)
+
+        # Replace NaN's in the superbias with zeros
+        self.bias = bias_model.data.copy()
+        self.bias[np.isnan(self.bias)] = 0.0
+        self.pixeldq = bias_model.dq
+
+    def apply(self, data, groupdq, rows):
+        data -= self.bias[rows]
+
+
+class LinearityCorrection(FusedCorrection):
+    """Apply the linearity polynomial to the groups not flagged as
+    saturated"""
+    cal_step = 'linearity'
+    reftype = 'linearity'
+
+    def __init__(self, input_model, lin_model, ref_name=None):
+        super().__init__(ref_name)
+
+        self.coeffs, self.pixeldq = linearity.prepare_coeffs(input_model,
+                                                             lin_model)
+
+    def apply(self, data, groupdq, rows):
+        apply_linearity_func(data, groupdq, self.coeffs[:, rows],
+                             dqflags.group['SATURATED'])
+
+
+class DarkCorrection(FusedCorrection):
+    """Subtract the dark current, averaged to match the group structure of
+    the science data if necessary, from all groups"""
+    cal_step = 'dark_sub'
+    reftype = 'dark'
+
+    def __init__(self, input_model, dark_model, ref_name=None,
+                 dark_cache=None):
+        super().__init__(ref_name)
+
+        instrument = input_model.meta.instrument.name
+        sci_nints, sci_ngroups = input_model.data.shape[:2]
+        sci_nframes = input_model.meta.exposure.nframes
+        sci_groupgap = input_model.meta.exposure.groupgap
+
+        # Replace NaN's in the dark with zeros
+        dark_model.data[np.isnan(dark_model.data)] = 0.0
+
+        if (sci_nframes == dark_model.meta.exposure.nframes and
+                sci_groupgap == dark_model.meta.exposure.groupgap):
+            dark = dark_model
+        else:
+            dark, _ = dark_sub.average_dark(
+                dark_model, instrument, sci_nints, sci_ngroups, sci_nframes,
+                sci_groupgap, dark_cache
+            )
+
+        if instrument == 'MIRI':
+            # MIRI dark reference file has a DQ plane for each integration,
+            # so we collapse the dark DQ planes into a single 2-D array
+            self.dark_data = dark.data[:, :sci_ngroups]
+            self.pixeldq = np.bitwise_or.reduce(dark.dq[:, 0], axis=0)
+        else:
+            self.dark_data = dark.data[np.newaxis, :sci_ngroups]
+            self.pixeldq = dark.dq
+
+    def apply(self, data, groupdq, rows):
+        dark_nints = self.dark_data.shape[0]
+        for integration in range(data.shape[0]):
+            dark_int = self.dark_data[min(integration, dark_nints - 1)]
+            data[integration] -= dark_int[:, rows]
+
+
+def prepare_saturation(step, input_model):
+    """Prepare the correction of a SaturationStep, or return None if the
+    step has to be run on its own"""
+    if pipe_utils.is_irs2(input_model):
+        return None
+    reference, ref_name = get_reference(step, input_model, 'saturation')
+    if reference is None:
+        return None
+    with datamodels.SaturationModel(reference) as ref_model:
+        return SaturationCorrection(input_model, ref_model, ref_name)
+
+
+def prepare_superbias(step, input_model):
+    """Prepare the correction of a SuperBiasStep, or return None if the
+    step has to be run on its own"""
+    reference, ref_name = get_reference(step, input_model, 'superbias')
+    if reference is None:
+        return None
+    with datamodels.SuperBiasModel(reference) as bias_model:
+        return SuperBiasCorrection(input_model, bias_model, ref_name)
+
+
+def prepare_linearity(step, input_model):
+    """Prepare the correction of a LinearityStep, or return None if the
+    step has to be run on its own"""
+    reference, ref_name = get_reference(step, input_model, 'linearity')
+    if reference is None:
+        return None
+    with datamodels.LinearityModel(reference) as lin_model:
+        return LinearityCorrection(input_model, lin_model, ref_name)
+
+
+def prepare_dark(step, input_model):
+    """Prepare the correction of a DarkCurrentStep, or return None if the
+    step has to be run on its own"""
+    # The step saves the dark data that it subtracts, if requested
+    if step.dark_output is not None:
+        return None
+    reference, ref_name = get_reference(step, input_model, 'dark')
+    if reference is None:
+        return None
+    if input_model.meta.instrument.name == 'MIRI':
+        dark_model = datamodels.DarkMIRIModel(reference)
+    else:
+        dark_model = datamodels.DarkModel(reference)
+    with dark_model:
+        # The step warns that it skips itself if the dark does not match
+        if dark_sub.dark_mismatch(input_model, dark_model) is not None:
+            return None
+        return DarkCorrection(input_model, dark_model, ref_name,
+                              step.get_dark_cache())
+
+
+# Steps whose corrections can be fused, with the functions preparing them
+PREPARE_CORRECTION = {
+    'saturation': prepare_saturation,
+    'superbias': prepare_superbias,
+    'linearity': prepare_linearity,
+    'dark_current': prepare_dark,
+}
+
+
+def get_reference(step, input_model, reftype):
+    """
+    Get the reference file of a step for the fused pass.
+
+    Returns the reference file name or override model, or None if there is
+    no reference file, in which case the step skips itself, together with
+    the name to record in the output metadata, as the step would.
+    """
+    reference = step.get_reference_file(input_model, reftype)
+
+    # The step is not run, so take the name it recorded for the output
+    ref_name = step.get_reference_file_name(reftype)
+
+    if reference == 'N/A':
+        return None, None
+    log.info('Using %s reference file %s for the fused %s step',
+             reftype.upper(), ref_name, step.name)
+    return reference, ref_name
+
+
+def can_fuse(step):
+    """
+    Check whether the correction of a step can be applied in the fused pass,
+    which bypasses running the step itself. Steps that are skipped, that
+    have hooks, or that save their results are run on their own.
+    """
+    return not (step.skip or step.pre_hooks or step.post_hooks or
+                step.save_results or step.output_file is not None)
+
+
+def apply_corrections(input_model, corrections, in_place=False,
+                      tile_bytes=FUSED_TILE_BYTES):
+    """
+    Apply prepared corrections, in order, in a single pass over tiles of
+    rows of the ramp.
+
+    Parameters
+    ----------
+    input_model : `~jwst.datamodels.RampModel`
+        science data to be corrected
+
+    corrections : list of `FusedCorrection`
+        corrections to apply, in the order of their steps
+
+    in_place : bool
+        if True, the input model is corrected in place rather than copied
+
+    tile_bytes : int
+        size in bytes of the SCI data of a tile of rows
+
+    Returns
+    -------
+    output_model : `~jwst.datamodels.RampModel`
+        corrected science data
+    """
+    output_model = input_model if in_place else input_model.copy()
+
+    data = output_model.data
+    groupdq = output_model.groupdq
+    nints, ngroups, nrows, ncols = data.shape
+    tile_rows = max(tile_bytes // (nints * ngroups * ncols * data.itemsize), 1)
+    log.info('Applying %s corrections in a fused pass over tiles of %d rows',
+             ', '.join(c.cal_step for c in corrections), tile_rows)
+
+    for start in range(0, nrows, tile_rows):
+        rows = slice(start, min(start + tile_rows, nrows))
+        data_tile = data[:, :, rows]
+        groupdq_tile = groupdq[:, :, rows]
+        for correction in corrections:
+            correction.apply(data_tile, groupdq_tile, rows)
+
+    # Record the results of the steps, as Step.run() would
+    ref_files_used = False
+    for correction in corrections:
+        output_model.pixeldq = np.bitwise_or(output_model.pixeldq,
+                                             correction.pixeldq)
+        setattr(output_model.meta.cal_step, correction.cal_step, 'COMPLETE')
+        if correction.ref_name is not None:
+            ref_files_used = True
+            if hasattr(output_model.meta.ref_file, correction.reftype):
+                getattr(output_model.meta.ref_file, correction.reftype).name = \
+                    correction.ref_name
+    if ref_files_used:
+        output_model.meta.ref_file.crds.sw_version = crds_client.get_svn_version()
+        output_model.meta.ref_file.crds.context_used = \
+            crds_client.get_context_used(output_model.meta.telescope)
+
+    return output_model
+
+
+def run_steps(pipeline, input_model, step_names):
+    """
+    Run the steps of a pipeline in turn, fusing the corrections of
+    consecutive steps that support it into single passes over the ramp.
+
+    The corrections of fusable steps are prepared and kept pending until a
+    step that has to see the corrected data is reached; steps that are
+    skipped or only set DO_NOT_USE group flags do not need to. Steps that
+    cannot be fused, for example because they are skipped or because no
+    reference file is found, are run on their own.
+
+    Parameters
+    ----------
+    pipeline : `~jwst.stpipe.Pipeline`
+        pipeline having the steps as attributes
+
+    input_model : `~jwst.datamodels.RampModel`
+        science data
+
+    step_names : list of str
+        names of the steps to run, in order
+
+    Returns
+    -------
+    result : `~jwst.datamodels.RampModel`
+        science data after all of the steps
+    """
+    result = input_model
+    pending = []
+    for step_name in step_names:
+        step = getattr(pipeline, step_name)
+
+        correction = None
+        if step_name in PREPARE_CORRECTION and can_fuse(step):
+            correction = PREPARE_CORRECTION[step_name](step, result)
+        if correction is not None:
+            pending.append(correction)
+            continue
+
+        if pending and not step.skip and step_name not in FLAG_ONLY_STEPS:
+            result = apply_corrections(result, pending, pipeline.in_place)
+            pending = []
+        result = step(result)
+
+    if pending:
+        result = apply_corrections(result, pending, pipeline.in_place)
+
+    return result
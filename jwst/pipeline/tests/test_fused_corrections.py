@@ -0,0 +1,312 @@
+"""
+Test that the fused detector-level corrections match the steps run in turn,
+and that Detector1Pipeline gives the same results with them fused
+"""
+import os
+
+import numpy as np
+import pytest
+
+from jwst.datamodels import (RampModel, SaturationModel, SuperBiasModel,
+                             LinearityModel, DarkModel, DarkMIRIModel, dqflags)
+from jwst.dark_current import dark_sub
+from jwst.linearity import linearity
+from jwst.pipeline import fused_corrections
+from jwst.pipeline.calwebb_detector1 import Detector1Pipeline
+from jwst.saturation import saturation
+from jwst.stpipe import crds_client
+from jwst.superbias import bias_sub
+
+
+NINTS = 2
+NGROUPS = 6
+NROWS = 25
+NCOLS = 30
+
+
+def set_subarray(model):
+    model.meta.instrument.name = 'NIRCAM'
+    model.meta.instrument.detector = 'NRCA1'
+    model.meta.subarray.xstart = 1
+    model.meta.subarray.ystart = 1
+    model.meta.subarray.xsize = NCOLS
+    model.meta.subarray.ysize = NROWS
+
+
+def make_models(nframes, groupgap):
+    rng = np.random.RandomState(42)
+
+    ramp = RampModel((NINTS, NGROUPS, NROWS, NCOLS))
+    set_subarray(ramp)
+    ramp.meta.exposure.nframes = nframes
+    ramp.meta.exposure.groupgap = groupgap
+    ramp.data[:] = (np.arange(1, NGROUPS + 1)[:, np.newaxis, np.newaxis] *
+                    rng.uniform(1000., 8000., (NINTS, 1, NROWS, NCOLS)))
+    ramp.groupdq[0, 0, 3, 3] = dqflags.group['DO_NOT_USE']
+
+    sat = SaturationModel((NROWS, NCOLS))
+    set_subarray(sat)
+    sat.data[:] = rng.uniform(20000., 60000., (NROWS, NCOLS))
+    sat.data[5, 5] = np.nan
+    sat.dq[6, 6] = dqflags.pixel['NO_SAT_CHECK']
+
+    bias = SuperBiasModel((NROWS, NCOLS))
+    set_subarray(bias)
+    bias.data[:] = rng.uniform(100., 200., (NROWS, NCOLS))
+    bias.data[7, 7] = np.nan
+    bias.dq[8, 8] = dqflags.pixel['HOT']
+
+    lin = LinearityModel((3, NROWS, NCOLS))
+    set_subarray(lin)
+    lin.dq = np.zeros((NROWS, NCOLS), dtype=np.uint32)
+    lin.coeffs[1] = 1.
+    lin.coeffs[2] = rng.uniform(1.e-7, 1.e-6, (NROWS, NCOLS))
+    lin.coeffs[:, 9, 9] = np.nan
+    lin.dq[10, 10] = dqflags.pixel['NO_LIN_CORR']
+
+    ndark = NGROUPS * (nframes + groupgap)
+    dark = DarkModel((ndark, NROWS, NCOLS))
+    set_subarray(dark)
+    dark.meta.exposure.nframes = 1
+    dark.meta.exposure.groupgap = 0
+    dark.data[:] = rng.uniform(0., 10., (ndark, NROWS, NCOLS))
+    dark.data[0, 11, 11] = np.nan
+    dark.dq[12, 12] = dqflags.pixel['WARM']
+
+    return ramp, sat, bias, lin, dark
+
+
+@pytest.mark.parametrize('nframes, groupgap', [(1, 0), (2, 1)])
+@pytest.mark.parametrize('tile_bytes', [1, NCOLS * 1000, 10**9])
+def test_fused_matches_steps(nframes, groupgap, tile_bytes):
+    """Fused corrections give the same result as the steps run in turn,
+    for tiles of one row, several rows and the whole ramp"""
+    ramp, sat, bias, lin, dark = make_models(nframes, groupgap)
+
+    expected = saturation.do_correction(ramp, sat)
+    expected = bias_sub.do_correction(expected, bias)
+    expected = linearity.do_correction(expected, lin)
+    expected = dark_sub.do_correction(expected, dark)
+
+    ramp, sat, bias, lin, dark = make_models(nframes, groupgap)
+    corrections = [
+        fused_corrections.SaturationCorrection(ramp, sat),
+        fused_corrections.SuperBiasCorrection(ramp, bias),
+        fused_corrections.LinearityCorrection(ramp, lin),
+        fused_corrections.DarkCorrection(ramp, dark),
+    ]
+    result = fused_corrections.apply_corrections(ramp, corrections,
+                                                 tile_bytes=tile_bytes)
+
+    # some groups have to be saturated for the test to be meaningful
+    assert np.any(result.groupdq & dqflags.group['SATURATED'])
+    np.testing.assert_array_equal(result.data, expected.data)
+    np.testing.assert_array_equal(result.groupdq, expected.groupdq)
+    np.testing.assert_array_equal(result.pixeldq, expected.pixeldq)
+    for cal_step in ('saturation', 'superbias', 'linearity', 'dark_sub'):
+        assert getattr(result.meta.cal_step, cal_step) == 'COMPLETE'
+
+    # the input is left unchanged unless corrected in place
+    assert not np.any(ramp.groupdq & dqflags.group['SATURATED'])
+
+
+# Steps of Detector1Pipeline that need reference files other than those of
+# the fused corrections, skipped in the tests of the pipeline
+OTHER_STEPS = ['group_scale', 'dq_init', 'ipc', 'refpix', 'rscd',
+               'persistence', 'jump', 'ramp_fit', 'gain_scale']
+
+CAL_STEPS = ['saturation', 'superbias', 'firstframe', 'lastframe',
+             'linearity', 'dark_sub']
+
+REFTYPES = ['saturation', 'superbias', 'linearity', 'dark']
+
+
+@pytest.fixture
+def fused_passes(monkeypatch):
+    """Record the corrections applied by each fused pass"""
+    passes = []
+    apply_corrections = fused_corrections.apply_corrections
+
+    def record_pass(input_model, corrections, *args, **kwargs):
+        passes.append([c.cal_step for c in corrections])
+        return apply_corrections(input_model, corrections, *args, **kwargs)
+
+    monkeypatch.setattr(fused_corrections, 'apply_corrections', record_pass)
+    return passes
+
+
+def run_pipeline(fuse_corrections, models, steps=None, **pars):
+    """Run Detector1Pipeline on a ramp, with the reference models given for
+    the fused corrections and the other steps skipped"""
+    ramp, sat, bias, lin, dark = models
+    step_pars = {step_name: {'skip': True} for step_name in OTHER_STEPS}
+    for step_name, step_config in (steps or {}).items():
+        step_pars.setdefault(step_name, {}).update(step_config)
+
+    pipeline = Detector1Pipeline(fuse_corrections=fuse_corrections,
+                                 steps=step_pars, **pars)
+    # reference models are not looked up in CRDS
+    pipeline.prefetch_references = False
+    overrides = [('saturation', 'saturation', sat),
+                 ('superbias', 'superbias', bias),
+                 ('linearity', 'linearity', lin),
+                 ('dark_current', 'dark', dark)]
+    for step_name, reftype, ref_model in overrides:
+        if ref_model is not None:
+            setattr(getattr(pipeline, step_name), 'override_' + reftype,
+                    ref_model)
+    return pipeline.run(ramp)
+
+
+def assert_same_result(result, expected):
+    """Check that the data and the metadata recorded by the steps match"""
+    np.testing.assert_array_equal(result.data, expected.data)
+    np.testing.assert_array_equal(result.groupdq, expected.groupdq)
+    np.testing.assert_array_equal(result.pixeldq, expected.pixeldq)
+    for cal_step in CAL_STEPS:
+        assert (getattr(result.meta.cal_step, cal_step) ==
+                getattr(expected.meta.cal_step, cal_step))
+    for reftype in REFTYPES:
+        assert (getattr(result.meta.ref_file, reftype).name ==
+                getattr(expected.meta.ref_file, reftype).name)
+    assert result.meta.ref_file.crds.sw_version == \
+        expected.meta.ref_file.crds.sw_version
+    assert result.meta.ref_file.crds.context_used == \
+        expected.meta.ref_file.crds.context_used
+
+
+def test_pipeline_fused(fused_passes):
+    """Detector1Pipeline gives the same result with the corrections fused,
+    applying all of them in one pass"""
+    expected = run_pipeline(False, make_models(2, 1))
+    assert fused_passes == []
+
+    result = run_pipeline(True, make_models(2, 1))
+    assert fused_passes == [['saturation', 'superbias', 'linearity', 'dark_sub']]
+    assert_same_result(result, expected)
+    for cal_step in ('saturation', 'superbias', 'linearity', 'dark_sub'):
+        assert getattr(result.meta.cal_step, cal_step) == 'COMPLETE'
+    assert result.meta.ref_file.linearity.name == 'override://LinearityModel'
+
+
+@pytest.mark.parametrize('steps, expected_passes', [
+    # a skipped step is not applied, and does not end the pass
+    ({'superbias': {'skip': True}},
+     [['saturation', 'linearity', 'dark_sub']]),
+    # a step with hooks is run on its own, between two passes
+    ({'linearity': {'post_hooks': ['jwst.pipeline.tests.mock_steps.MockReflectionStep']}},
+     [['saturation', 'superbias'], ['dark_sub']]),
+])
+def test_pipeline_fallback(fused_passes, steps, expected_passes):
+    """Steps that cannot be fused are run on their own, with the same
+    result"""
+    expected = run_pipeline(False, make_models(1, 0), steps)
+    result = run_pipeline(True, make_models(1, 0), steps)
+    assert fused_passes == expected_passes
+    assert_same_result(result, expected)
+
+
+def test_pipeline_reference_file(fused_passes, tmpdir):
+    """A reference file given by name is used in the fused pass and recorded
+    as by the step"""
+    bias_file = str(tmpdir.join('my_superbias.fits'))
+    make_models(1, 0)[2].save(bias_file)
+    steps = {'superbias': {'override_superbias': bias_file}}
+
+    def models_without_superbias():
+        ramp, sat, _, lin, dark = make_models(1, 0)
+        return ramp, sat, None, lin, dark
+
+    expected = run_pipeline(False, models_without_superbias(), steps)
+    result = run_pipeline(True, models_without_superbias(), steps)
+    assert fused_passes == [['saturation', 'superbias', 'linearity', 'dark_sub']]
+    assert_same_result(result, expected)
+    assert result.meta.ref_file.superbias.name == 'my_superbias.fits'
+
+
+def test_pipeline_missing_reference(fused_passes, monkeypatch):
+    """A step with no reference file is run on its own, skipping itself"""
+    monkeypatch.setattr(crds_client, 'get_reference_file',
+                        lambda dataset, reftype, *args, **kwargs: 'N/A')
+
+    def models_without_linearity():
+        ramp, sat, bias, _, dark = make_models(1, 0)
+        return ramp, sat, bias, None, dark
+
+    expected = run_pipeline(False, models_without_linearity())
+    result = run_pipeline(True, models_without_linearity())
+    assert fused_passes == [['saturation', 'superbias'], ['dark_sub']]
+    assert_same_result(result, expected)
+    assert result.meta.cal_step.linearity == 'SKIPPED'
+
+
+def test_pipeline_dark_output(fused_passes, tmpdir):
+    """The dark current step is run on its own to save the dark data"""
+    dark_output = str(tmpdir.join('dark.fits'))
+    steps = {'dark_current': {'dark_output': 'dark.fits'}}
+
+    expected = run_pipeline(False, make_models(2, 1), steps,
+                            output_dir=str(tmpdir))
+    os.remove(dark_output)
+    result = run_pipeline(True, make_models(2, 1), steps,
+                          output_dir=str(tmpdir))
+    assert fused_passes == [['saturation', 'superbias', 'linearity']]
+    assert_same_result(result, expected)
+    assert os.path.exists(dark_output)
+
+
+def test_pipeline_irs2(fused_passes):
+    """The saturation step is run on its own for IRS2 data"""
+    nints = 1
+    ngroups = 2
+    ramp = RampModel((nints, ngroups, 3200, 2048))
+    ramp.data[:] = np.arange(1, ngroups + 1)[:, np.newaxis, np.newaxis] * 20000.
+    ramp.meta.instrument.name = 'NIRSPEC'
+    ramp.meta.instrument.detector = 'NRS1'
+    ramp.meta.exposure.nints = nints
+    ramp.meta.exposure.ngroups = ngroups
+    ramp.meta.exposure.nrs_normal = 16
+    ramp.meta.exposure.nrs_reference = 4
+    sat = SaturationModel((2048, 2048))
+    sat.data[:] = 30000.
+    for model in (ramp, sat):
+        model.meta.subarray.xstart = 1
+        model.meta.subarray.ystart = 1
+        model.meta.subarray.xsize = 2048
+        model.meta.subarray.ysize = 2048
+
+    steps = {step_name: {'skip': True}
+             for step_name in ('superbias', 'linearity', 'dark_current')}
+    expected = run_pipeline(False, (ramp, sat, None, None, None), steps)
+    result = run_pipeline(True, (ramp, sat, None, None, None), steps)
+    assert fused_passes == []
+    assert_same_result(result, expected)
+    assert result.meta.cal_step.saturation == 'COMPLETE'
+    assert np.any(result.groupdq & dqflags.group['SATURATED'])
+
+
+def make_miri_models():
+    """Return MIRI models, for which the steps are in another order"""
+    ramp, sat, _, lin, dark = make_models(1, 0)
+    miri_dark = DarkMIRIModel((NINTS, NGROUPS, NROWS, NCOLS))
+    miri_dark.data[:] = dark.data[np.newaxis, :NGROUPS]
+    miri_dark.dq[:] = dark.dq
+    miri_dark.meta.exposure.nframes = 1
+    miri_dark.meta.exposure.groupgap = 0
+    for model in (ramp, sat, lin, miri_dark):
+        model.meta.instrument.name = 'MIRI'
+        model.meta.instrument.detector = 'MIRIMAGE'
+    return ramp, sat, None, lin, miri_dark
+
+
+def test_pipeline_flag_only_steps(fused_passes):
+    """The first and last frame steps only set DO_NOT_USE flags, so they are
+    run while the MIRI corrections before them are pending"""
+    expected = run_pipeline(False, make_miri_models())
+    result = run_pipeline(True, make_miri_models())
+    assert fused_passes == [['saturation', 'linearity', 'dark_sub']]
+    assert_same_result(result, expected)
+    for cal_step in ('firstframe', 'lastframe'):
+        assert getattr(result.meta.cal_step, cal_step) == 'COMPLETE'
+    assert np.all(result.groupdq[:, 0] & dqflags.group['DO_NOT_USE'])
+    assert np.all(result.groupdq[:, -1] & dqflags.group['DO_NOT_USE'])
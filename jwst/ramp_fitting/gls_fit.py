@@ -630,23 +630,19 @@ def gls_fit(ramp_data,
     # are 0 for all rows prior to a certain point, then 1 for all
     # subsequent rows (i.e. the Heaviside function).  The transition from
     # 0 to 1 is the location of a cosmic ray hit; the first 1 in a column
-    # corresponds to the value in cr_flagged_2d being 1.
+    # corresponds to the value in cr_flagged_2d being 1.  That is, the
+    # column for the n-th cosmic ray is 1 where at least n cosmic rays have
+    # been flagged up to and including the current group.
     x = np.zeros((nz, ngroups, 2 + num_cr), dtype=np.float64)
     x[:, :, 0] = 1.
     x[:, :, 1] = np.arange(ngroups, dtype=np.float64) * group_time + \
                  frame_time * (M + 1.) / 2.
 
     if num_cr > 0:
-        sum_crs = cr_flagged_2d.cumsum(axis=0)
-        for k in range(ngroups):
-            s = slice(k, ngroups)
-            for n in range(1, num_cr + 1):
-                temp = np.where(np.logical_and(cr_flagged_2d[k] == 1,
-                                               sum_crs[k] == n))
-                if len(temp[0]) > 0:
-                    index = (temp[0], s, n + 1)
-                    x[index] = 1
-        del temp, index
+        sum_crs = np.transpose(cr_flagged_2d.cumsum(axis=0), (1, 0))
+        for n in range(1, num_cr + 1):
+            x[:, :, n + 1] = (sum_crs >= n)
+        del sum_crs
 
     y = np.transpose(ramp_data, (1, 0)).reshape((nz, ngroups, 1))
 
@@ -659,15 +655,14 @@ def gls_fit(ramp_data,
     # similar to the ramp data, but we want the nz axis to be the first
     # (we're constructing an array of nz matrix equations), so transpose
     # prev_fit_data.
+    # Element [k, j] of each matrix is the previous fit at group min(k, j).
     prev_fit_T = np.transpose(prev_fit_data, (1, 0))
-    for k in range(ngroups):
-        # Populate the upper right, row by row.
-        ramp_cov[:, k, k:ngroups] = prev_fit_T[:, k:k + 1]
-        # Populate the lower left, column by column.
-        ramp_cov[:, k:ngroups, k] = prev_fit_T[:, k:k + 1]
-        # Give saturated pixels a very high high variance (hence a low weight)
-        ramp_cov[:, k, k] += saturated_data[k, :]
-    del prev_fit_T
+    k_min = np.minimum.outer(np.arange(ngroups), np.arange(ngroups))
+    ramp_cov[:] = prev_fit_T[:, k_min]
+    # Give saturated pixels a very high high variance (hence a low weight)
+    diag = np.arange(ngroups)
+    ramp_cov[:, diag, diag] += np.transpose(saturated_data, (1, 0))
+    del prev_fit_T, k_min
 
     # I is 2-D, but it can broadcast to 4-D.  This is used to add terms to
     # the diagonal of the covariance matrix.
@@ -688,20 +683,18 @@ def gls_fit(ramp_data,
     # shape of xT is (nz, 2 + num_cr, ngroups)
     xT = np.transpose(x, (0, 2, 1))
 
-    # shape of `ramp_invcov` is (nz, ngroups, ngroups)
-    I = I.reshape((1, ngroups, ngroups))
-    ramp_invcov = la.solve(ramp_cov, I)
-
     del I
 
-    # temp1 = xT @ ramp_invcov
-    # np.einsum use is equivalent to matrix multiplication
-    # shape of temp1 is (nz, 2 + num_cr, ngroups)
-    temp1 = np.einsum('...ij,...jk->...ik', xT, ramp_invcov)
+    # Rather than inverting ramp_cov, solve ramp_cov @ w = [x, y] for all
+    # nz pixels with a single call.  ramp_cov is symmetric, so
+    # xT @ ramp_cov^-1 = (ramp_cov^-1 @ x)T.
+    # shape of `ramp_sol` is (nz, ngroups, 3 + num_cr)
+    ramp_sol = la.solve(ramp_cov, np.concatenate((x, y), axis=2))
 
     # temp_var = xT @ ramp_invcov @ x
+    # np.einsum use is equivalent to matrix multiplication
     # shape of temp_var is (nz, 2 + num_cr, 2 + num_cr)
-    temp_var = np.einsum('...ij,...jk->...ik', temp1, x)
+    temp_var = np.einsum('...ij,...jk->...ik', xT, ramp_sol[:, :, :-1])
 
     # `fitparam_cov` is an array of nz covariance matrices.
     # fitparam_cov = (xT @ ramp_invcov @ x)^-1
@@ -722,7 +715,8 @@ def gls_fit(ramp_data,
 
     # [xT @ ramp_invcov @ y]
     # shape of temp2 is (nz, 2 + num_cr, 1)
-    temp2 = np.einsum('...ij,...jk->...ik', temp1, y)
+    temp2 = np.einsum('...ij,...jk->...ik', xT, ramp_sol[:, :, -1:])
+    del ramp_sol
 
     # shape of fitparam is (nz, 2 + num_cr, 1)
     fitparam = np.einsum('...ij,...jk->...ik', fitparam_cov, temp2)
@@ -13,26 +13,35 @@
 # In this module, comments on the 'first group','second group', etc are
 #    1-based, unless noted otherwise.
 
+import contextlib
 import time
 import logging
+import multiprocessing
 import numpy as np
 import warnings
 
 from .. import datamodels
 from ..datamodels import dqflags
 from ..lib import pipe_utils
+from ..lib.parallel_utils import compute_slices
 
 from . import gls_fit           # used only if algorithm is "GLS"
+from . import segment_fit       # used only if segment_engine is "batched"
 from . import utils
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
-BUFSIZE = 1024 * 30000  # 30Mb cache size for data section
+# Attributes of the optional output product, in the order in which they are
+#   returned by the processes fitting slices of the data
+OPT_ARRAYS = ('slope', 'sigslope', 'var_poisson', 'var_rnoise', 'yint',
+              'sigyint', 'pedestal', 'weights', 'crmag')
 
 
 def ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
-             algorithm, weighting):
+             algorithm, weighting, max_cores=None,
+             segment_engine='iterative', int_block_size=None,
+             precision='float64'):
     """
     Calculate the count rate for each pixel in all data cube sections and all
     integrations, equal to the slope for all sections (intervals between
@@ -41,6 +50,705 @@ def ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     weighting (paper by Fixsen, ref. TBA) will be used in the fitting; this is
     currently the only supported weighting scheme.
 
+    Parameters
+    ----------
+    model : data model
+        input data model, assumed to be of type RampModel
+
+    buffsize : int or None
+        size of data section (buffer) in bytes; if None, this is chosen from
+        the CPU cache size and the available memory
+
+    save_opt : boolean
+       calculate optional fitting results
+
+    readnoise_model : instance of data Model
+        readnoise for all pixels
+
+    gain_model : instance of gain model
+        gain for all pixels
+
+    algorithm : string
+        'OLS' specifies that ordinary least squares should be used;
+        'GLS' specifies that generalized least squares should be used.
+
+    weighting : string
+        'optimal' specifies that optimal weighting should be used;
+         currently the only weighting supported.
+
+    max_cores : string or None
+        fraction of the available cores to use for multiprocessing; one of
+        'quarter', 'half', 'all', or None to use a single process
+
+    segment_engine : string
+        engine used to fit the ramp segments in the OLS algorithm;
+        'iterative' fits one segment of all pixels per iteration, 'batched'
+        fits all segments of all pixels in a data section at once
+
+    int_block_size : int or None
+        number of integrations to fit at a time in the OLS algorithm, to limit
+        the memory used for exposures having many integrations; if None, all
+        integrations are fit at once
+
+    precision : string
+        floating-point precision of the sums over groups in the OLS fits;
+        'float64' accumulates the sums in double precision, 'float32' keeps
+        the per-group products in single precision and accumulates them
+        using compensated summation
+
+    Returns
+    -------
+    new_model : Data Model object
+        DM object containing a rate image averaged over all integrations in
+        the exposure
+
+    int_model : Data Model object or None
+        DM object containing rate images for each integration in the exposure
+
+    opt_model : RampFitOutputModel object or None
+        DM object containing optional OLS-specific ramp fitting data for the
+        exposure
+
+    gls_opt_model : GLS_RampFitModel object or None
+        Object containing optional GLS-specific ramp fitting data for the
+        exposure
+    """
+    if algorithm.upper() == "GLS":
+        new_model, int_model, gls_opt_model = gls_ramp_fit(model,
+                                buffsize, save_opt,
+                                readnoise_model, gain_model, max_cores)
+        opt_model = None
+    else:
+        new_model, int_model, opt_model = \
+               ols_ramp_fit(model, buffsize, save_opt, readnoise_model,
+               gain_model, weighting, max_cores, segment_engine,
+               int_block_size, precision)
+        gls_opt_model = None
+
+    # Update data units in output models
+    if new_model is not None:
+        new_model.meta.bunit_data = 'DN/s'
+        new_model.meta.bunit_err = 'DN/s'
+
+    if int_model is not None:
+        int_model.meta.bunit_data = 'DN/s'
+        int_model.meta.bunit_err = 'DN/s'
+
+    return new_model, int_model, opt_model, gls_opt_model
+
+
+def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
+                 weighting, max_cores=None, segment_engine='iterative',
+                 int_block_size=None, precision='float64'):
+    """
+    Fit a ramp using ordinary least squares. Calculate the count rate for each
+    pixel in all data cube sections and all integrations, equal to the weighted
+    slope for all sections (intervals between cosmic rays) of the pixel's ramp
+    divided by the effective integration time. If more than one process is
+    requested, the image is divided into horizontal slices of rows which are
+    fit by separate processes, and the results are reassembled.
+
+    Parameters
+    ----------
+    model : data model
+        input data model, assumed to be of type RampModel
+
+    buffsize : int or None
+        size of data section (buffer) in bytes; if None, this is chosen from
+        the CPU cache size and the available memory
+
+    save_opt : boolean
+        calculate optional fitting results
+
+    readnoise_model : instance of data Model
+        readnoise for all pixels
+
+    gain_model : instance of gain model
+        gain for all pixels
+
+    weighting : string
+        'optimal' specifies that optimal weighting should be used; currently
+        the only weighting supported.
+
+    max_cores : string or None
+        fraction of the available cores to use for multiprocessing; one of
+        'quarter', 'half', 'all', or None to use a single process
+
+    segment_engine : string
+        engine used to fit the ramp segments; 'iterative' or 'batched'
+
+    int_block_size : int or None
+        number of integrations to fit at a time; if None, all integrations
+        are fit at once
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
+    Returns
+    -------
+    new_model : Data Model object
+        DM object containing a rate image averaged over all integrations in
+        the exposure
+
+    int_model : Data Model object or None
+        DM object containing rate images for each integration in the exposure,
+        or None if there is only one integration in the exposure
+
+    opt_model : Data Model object or None
+        DM object containing optional OLS-specific ramp fitting data for the
+        exposure; this will be None if save_opt is False
+    """
+    # Get needed sizes and shapes
+    nreads, npix, imshape, cubeshape, n_int, instrume, frame_time, ngroups, \
+        group_time = utils.get_dataset_info(model)
+
+    log.info('Number of groups per integration: %d', nreads)
+    log.info('Number of integrations: %d', n_int)
+
+    # For MIRI datasets having >1 group, if all pixels in the final group are
+    #   flagged as DO_NOT_USE, resize the input model arrays to exclude the
+    #   final group.  Similarly, if leading groups 1 though N have all pixels
+    #   flagged as DO_NOT_USE, those groups will be ignored by ramp fitting, and
+    #   the input model arrays will be resized appropriately. If all pixels in
+    #   all groups are flagged, return None for the models. This is done for
+    #   the full image before any slicing, so that all slices are fit using
+    #   the same groups.
+    if (instrume == 'MIRI' and nreads > 1):
+        if not discard_miri_groups(model):
+            return None, None, None
+
+    # Get readnoise array for calculation of variance of noiseless ramps, and
+    #   gain array in case optimal weighting is to be done
+    nframes = model.meta.exposure.nframes
+    readnoise_2d, gain_2d = utils.get_ref_subs(model, readnoise_model,
+                                               gain_model, nframes)
+
+    number_slices = compute_slices(max_cores)
+
+    # A slice must contain at least one row
+    number_slices = min(number_slices, imshape[0])
+
+    if buffsize is None:
+        buffsize = utils.calc_auto_buffsize(model, 'OLS', number_slices)
+
+    # Fit blocks of integrations in turn if requested. The optional output
+    #   product holds results for all integrations, so is not produced in
+    #   this mode.
+    if int_block_size is not None and int_block_size < n_int:
+        if save_opt:
+            log.warning('The optional output product cannot be produced '
+                        'when fitting blocks of integrations; all '
+                        'integrations will be fit at once.')
+        else:
+            if number_slices > 1:
+                log.warning('Blocks of integrations are fit using a single '
+                            'process.')
+            log.info('Fitting %d integrations at a time', int_block_size)
+            return ols_ramp_fit_streaming(model, buffsize, readnoise_2d,
+                                          gain_2d, weighting, int_block_size,
+                                          segment_engine, precision)
+
+    if number_slices == 1:
+        return ols_ramp_fit_single(model, buffsize, save_opt, readnoise_2d,
+                                   gain_2d, weighting, segment_engine,
+                                   precision)
+    else:
+        return ols_ramp_fit_multi(model, buffsize, save_opt, readnoise_2d,
+                                  gain_2d, weighting, number_slices,
+                                  segment_engine, precision)
+
+
+def ols_ramp_fit_multi(model, buffsize, save_opt, readnoise_2d, gain_2d,
+                       weighting, number_slices, segment_engine='iterative',
+                       precision='float64'):
+    """
+    Fit a ramp using ordinary least squares, dividing the image into
+    horizontal slices of rows that are fit in parallel by a pool of
+    processes. Each ramp is fit independently of its neighbors, so the slice
+    results can be reassembled into the full-frame output products. All
+    integrations of a slice are fit by the same process, as the estimated
+    median rate used for the variances is computed over all integrations.
+
+    Parameters
+    ----------
+    model : data model
+        input data model, assumed to be of type RampModel
+
+    buffsize : int
+        size of data section (buffer) in bytes
+
+    save_opt : boolean
+        calculate optional fitting results
+
+    readnoise_2d : float, 2D array
+        readnoise for all pixels, matching the science data
+
+    gain_2d : float, 2D array
+        gain for all pixels, matching the science data
+
+    weighting : string
+        'optimal' specifies that optimal weighting should be used; currently
+        the only weighting supported.
+
+    number_slices : int
+        number of slices (and processes) to use
+
+    segment_engine : string
+        engine used to fit the ramp segments; 'iterative' or 'batched'
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
+    Returns
+    -------
+    new_model : Data Model object
+        DM object containing a rate image averaged over all integrations in
+        the exposure
+
+    int_model : Data Model object or None
+        DM object containing rate images for each integration in the exposure,
+        or None if there is only one integration in the exposure
+
+    opt_model : Data Model object or None
+        DM object containing optional OLS-specific ramp fitting data for the
+        exposure; this will be None if save_opt is False
+    """
+    n_int, nreads, nrows, ncols = model.data.shape
+    imshape = (nrows, ncols)
+
+    # Metadata needed to fit each slice
+    exposure = model.meta.exposure
+    slice_meta = (model.meta.instrument.name, exposure.frame_time,
+                  exposure.ngroups, exposure.group_time, exposure.groupgap,
+                  exposure.nframes, exposure.drop_frames1)
+
+    # Slice up data, err, groupdq, pixeldq, readnoise_2d and gain_2d by rows;
+    #   the last slice gets the remaining rows
+    rows_per_slice = nrows // number_slices
+    row_ranges = []
+    slices = []
+    for i in range(number_slices):
+        rlo = i * rows_per_slice
+        if i == number_slices - 1:
+            rhi = nrows
+        else:
+            rhi = rlo + rows_per_slice
+        row_ranges.append((rlo, rhi))
+        slices.append((model.data[:, :, rlo:rhi, :],
+                       model.err[:, :, rlo:rhi, :],
+                       model.groupdq[:, :, rlo:rhi, :],
+                       model.pixeldq[rlo:rhi, :],
+                       buffsize, save_opt,
+                       readnoise_2d[rlo:rhi, :], gain_2d[rlo:rhi, :],
+                       weighting, segment_engine, precision) + slice_meta)
+
+    log.info("Creating %d processes for ramp fitting " % number_slices)
+    with multiprocessing.Pool(processes=number_slices) as pool:
+        real_result = pool.starmap(ols_ramp_fit_sliced, slices)
+
+    # Reassemble the primary and integration-specific output arrays from the
+    #   slice results
+    image_arrs = [np.zeros(imshape, dtype=np.float32) for ii in range(4)]
+    image_dq = np.zeros(imshape, dtype=np.uint32)
+    if n_int > 1:
+        int_arrs = [np.zeros((n_int,) + imshape, dtype=np.float32)
+                    for ii in range(4)]
+        int_dq = np.zeros((n_int,) + imshape, dtype=np.uint32)
+
+    for (rlo, rhi), (image_info, int_info, opt_info) in zip(row_ranges,
+                                                           real_result):
+        for arr, sect in zip(image_arrs, image_info[:4]):
+            arr[rlo:rhi, :] = sect
+        image_dq[rlo:rhi, :] = image_info[4]
+
+        if n_int > 1:
+            for arr, sect in zip(int_arrs, int_info[:4]):
+                arr[:, rlo:rhi, :] = sect
+            int_dq[:, rlo:rhi, :] = int_info[4]
+
+    data, var_poisson, var_rnoise, err = image_arrs
+    new_model = datamodels.ImageModel(data=data, dq=image_dq,
+                                      var_poisson=var_poisson,
+                                      var_rnoise=var_rnoise, err=err)
+    new_model.update(model)  # ... and add all keys from input
+
+    if n_int > 1:
+        data, var_poisson, var_rnoise, err = int_arrs
+        if pipe_utils.is_tso(model) and hasattr(model, 'int_times'):
+            int_times = model.int_times
+        else:
+            int_times = None
+        int_model = datamodels.CubeModel(data=data, dq=int_dq,
+                                         var_poisson=var_poisson,
+                                         var_rnoise=var_rnoise, err=err)
+        int_model.int_times = int_times
+        int_model.update(model)  # keys from input needed for photom step
+    else:
+        int_model = None
+
+    if save_opt:
+        opt_model = assemble_opt_slices(model, row_ranges,
+                                        [res[2] for res in real_result])
+    else:
+        opt_model = None
+
+    return new_model, int_model, opt_model
+
+
+def assemble_opt_slices(model, row_ranges, opt_infos):
+    """
+    Reassemble the optional output product from the optional results of the
+    individual slices. The number of segments and the number of cosmic rays
+    fit can differ between slices, so the output arrays are sized to the
+    maximum over all slices and padded with zeros.
+
+    Parameters
+    ----------
+    model : data model
+        input data model, assumed to be of type RampModel
+
+    row_ranges : list of (int, int) tuples
+        first and last (exclusive) rows of each slice
+
+    opt_infos : list of tuples
+        optional output arrays for each slice, in the order of the
+        attributes in OPT_ARRAYS
+
+    Returns
+    -------
+    opt_model : RampFitOutputModel object
+        DM object containing optional OLS-specific ramp fitting data for the
+        exposure
+    """
+    n_int, nreads, nrows, ncols = model.data.shape
+
+    opt_arrs = {}
+    for ii, name in enumerate(OPT_ARRAYS):
+        # The depth of the 4D arrays (segments or cosmic rays) varies
+        depth = max(info[ii].shape[1] for info in opt_infos)
+        if opt_infos[0][ii].ndim == 4:
+            shape = (n_int, depth, nrows, ncols)
+        else:
+            shape = (n_int, nrows, ncols)
+        opt_arrs[name] = np.zeros(shape, dtype=np.float32)
+
+        for (rlo, rhi), info in zip(row_ranges, opt_infos):
+            sect = info[ii]
+            if sect.ndim == 4:
+                opt_arrs[name][:, :sect.shape[1], rlo:rhi, :] = sect
+            else:
+                opt_arrs[name][:, rlo:rhi, :] = sect
+
+    opt_model = datamodels.RampFitOutputModel(**opt_arrs)
+    opt_model.meta.filename = model.meta.filename
+    opt_model.update(model)  # add all keys from input
+
+    return opt_model
+
+
+def ols_ramp_fit_sliced(data, err, groupdq, pixeldq, buffsize, save_opt,
+                        readnoise_2d, gain_2d, weighting, segment_engine,
+                        precision, instrume, frame_time, ngroups, group_time, groupgap,
+                        nframes, dropframes1):
+    """
+    Fit the ramps of a single slice of rows; this is run in a separate
+    process by ols_ramp_fit_multi. A RampModel is constructed from the slice
+    arrays and metadata, and the output arrays are returned rather than the
+    models, so that only arrays need to be passed back between processes.
+
+    Parameters
+    ----------
+    data : float, 4D array
+        slice of the science data
+
+    err : float, 4D array
+        slice of the error array
+
+    groupdq : int, 4D array
+        slice of the GROUPDQ array
+
+    pixeldq : int, 2D array
+        slice of the PIXELDQ array
+
+    buffsize : int
+        size of data section (buffer) in bytes
+
+    save_opt : boolean
+        calculate optional fitting results
+
+    readnoise_2d : float, 2D array
+        slice of the readnoise array
+
+    gain_2d : float, 2D array
+        slice of the gain array
+
+    weighting : string
+        'optimal' specifies that optimal weighting should be used; currently
+        the only weighting supported.
+
+    segment_engine : string
+        engine used to fit the ramp segments; 'iterative' or 'batched'
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
+    instrume : string
+        instrument name
+
+    frame_time : float
+        frame time, in seconds
+
+    ngroups : int
+        number of groups per integration
+
+    group_time : float
+        group time, in seconds
+
+    groupgap : int
+        number of frames dropped between groups
+
+    nframes : int
+        number of frames averaged per group
+
+    dropframes1 : int
+        number of frames dropped at the beginning of every integration
+
+    Returns
+    -------
+    image_info : tuple
+        data, var_poisson, var_rnoise, err and dq arrays of the primary output
+
+    int_info : tuple or None
+        data, var_poisson, var_rnoise, err and dq arrays of the
+        integration-specific output, or None if there is only one integration
+
+    opt_info : tuple or None
+        optional output arrays, in the order of OPT_ARRAYS, or None if
+        save_opt is False
+    """
+    model = datamodels.RampModel(data=data, err=err, groupdq=groupdq,
+                                 pixeldq=pixeldq)
+    model.meta.instrument.name = instrume
+    model.meta.exposure.frame_time = frame_time
+    model.meta.exposure.ngroups = ngroups
+    model.meta.exposure.group_time = group_time
+    model.meta.exposure.groupgap = groupgap
+    model.meta.exposure.nframes = nframes
+    model.meta.exposure.drop_frames1 = dropframes1
+
+    new_model, int_model, opt_model = ols_ramp_fit_single(
+        model, buffsize, save_opt, readnoise_2d, gain_2d, weighting,
+        segment_engine, precision)
+
+    image_info = (new_model.data, new_model.var_poisson, new_model.var_rnoise,
+                  new_model.err, new_model.dq)
+
+    int_info = None
+    if int_model is not None:
+        int_info = (int_model.data, int_model.var_poisson,
+                    int_model.var_rnoise, int_model.err, int_model.dq)
+
+    opt_info = None
+    if opt_model is not None:
+        opt_info = tuple(getattr(opt_model, name) for name in OPT_ARRAYS)
+
+    return image_info, int_info, opt_info
+
+
+def discard_miri_groups(model):
+    """
+    For MIRI datasets having >1 group, discard leading groups in which all
+    pixels are flagged as DO_NOT_USE, and the final group if all of its pixels
+    are flagged as DO_NOT_USE. The data, err, and groupdq arrays of the input
+    model are resized in place.
+
+    Parameters
+    ----------
+    model : data model
+        input data model, assumed to be of type RampModel
+
+    Returns
+    -------
+    usable : boolean
+        False if there are fewer than 2 usable groups remaining, in which case
+        the dataset will not be processed
+    """
+    first_gdq = model.groupdq[:,0,:,:]
+    num_bad_slices = 0  # number of initial groups that are all DO_NOT_USE
+    ngroups = model.data.shape[1]
+
+    while (np.all(np.bitwise_and( first_gdq, dqflags.group['DO_NOT_USE']))):
+        num_bad_slices += 1
+        ngroups -= 1
+
+        # Check if there are remaining groups before accessing data
+        if ngroups < 1 :  # no usable data
+            log.error('1. All groups have all pixels flagged as DO_NOT_USE,')
+            log.error('  so will not process this dataset.')
+            return False
+
+        model.data = model.data[:,1:,:,:]
+        model.err = model.err[:,1:,:,:]
+        model.groupdq = model.groupdq[:,1:,:,:]
+
+        # Where the initial group of the just-truncated data is a cosmic ray,
+        #   remove the JUMP_DET flag from the group dq for those pixels so
+        #   that those groups will be included in the fit.
+        wh_cr = np.where( np.bitwise_and(model.groupdq[:,0,:,:],
+                          dqflags.group['JUMP_DET']) != 0 )
+        num_cr_1st = len(wh_cr[0])
+
+        for ii in range(num_cr_1st):
+            model.groupdq[ wh_cr[0][ii], 0, wh_cr[1][ii],
+                wh_cr[2][ii]] -= dqflags.group['JUMP_DET']
+
+        first_gdq = model.groupdq[:,0,:,:]
+
+    log.info('Number of leading groups that are flagged as DO_NOT_USE: %s', num_bad_slices)
+
+    # If all groups were flagged, the final group would have been picked up
+    #   in the while loop above, ngroups would have been set to 0, and False
+    #   would have been returned.  If execution has gotten here, there must
+    #   be at least 1 remaining group that is not all flagged.
+    last_gdq = model.groupdq[:,-1,:,:]
+    if np.all(np.bitwise_and( last_gdq, dqflags.group['DO_NOT_USE'] )):
+        ngroups -= 1
+
+        # Check if there are remaining groups before accessing data
+        if ngroups < 1 :  # no usable data
+            log.error('2. All groups have all pixels flagged as DO_NOT_USE,')
+            log.error('  so will not process this dataset.')
+            return False
+
+        model.data = model.data[:,:-1,:,:]
+        model.err = model.err[:,:-1,:,:]
+        model.groupdq = model.groupdq[:,:-1,:,:]
+
+        log.info('MIRI dataset has all pixels in the final group flagged as DO_NOT_USE.')
+
+    # Next block is to satisfy github issue 1681:
+    # "MIRI FirstFrame and LastFrame minimum number of groups"
+    if (ngroups < 2):
+        log.warning('MIRI datasets require at least 2 groups/integration')
+        log.warning('(NGROUPS), so will not process this dataset.')
+        return False
+
+    return True
+
+
+def ols_ramp_fit_single(model, buffsize, save_opt, readnoise_2d, gain_2d,
+                        weighting, segment_engine='iterative',
+                        precision='float64'):
+    """
+    Fit a ramp using ordinary least squares, in a single process. Calculate
+    the count rate for each pixel in all data cube sections and all
+    integrations, equal to the weighted slope for all sections (intervals
+    between cosmic rays) of the pixel's ramp divided by the effective
+    integration time.
+
+    Parameters
+    ----------
+    model : data model
+        input data model, assumed to be of type RampModel
+
+    buffsize : int
+        size of data section (buffer) in bytes
+
+    save_opt : boolean
+        calculate optional fitting results
+
+    readnoise_2d : float, 2D array
+        readnoise for all pixels, matching the science data
+
+    gain_2d : float, 2D array
+        gain for all pixels, matching the science data
+
+    weighting : string
+        'optimal' specifies that optimal weighting should be used; currently
+        the only weighting supported.
+
+    segment_engine : string
+        engine used to fit the ramp segments; 'iterative' or 'batched'
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
+    Returns
+    -------
+    new_model : Data Model object
+        DM object containing a rate image averaged over all integrations in
+        the exposure
+
+    int_model : Data Model object or None
+        DM object containing rate images for each integration in the exposure,
+        or None if there is only one integration in the exposure
+
+    opt_model : Data Model object or None
+        DM object containing optional OLS-specific ramp fitting data for the
+        exposure; this will be None if save_opt is False
+    """
+    n_int, nreads, nrows, ncols = model.data.shape
+    imshape = (nrows, ncols)
+
+    if (nreads == 1):
+        log.warning('Dataset has NGROUPS=1, so count rates for each integration')
+        log.warning('will be calculated as the value of that 1 group divided by')
+        log.warning('the group exposure time.')
+
+    # If all the pixels have their initial groups flagged as saturated, the DQ
+    #   in the primary and integration-specific output products are updated,
+    #   the other arrays in all output products are populated with zeros, and
+    #   the output products are returned to ramp_fit(). If the initial group of
+    #   a ramp is saturated, it is assumed that all groups are saturated.
+    first_gdq = model.groupdq[:,0,:,:]
+    if np.all(np.bitwise_and( first_gdq, dqflags.group['SATURATED'] )):
+        new_model, int_model, opt_model = utils.do_all_sat( model, imshape,
+                                                            n_int, save_opt )
+
+        return new_model, int_model, opt_model
+
+    slope_int, dq_int, var_p3, var_r3, var_both3, rate_sums, opt_model = \
+        ols_fit_integrations(model, buffsize, save_opt, readnoise_2d, gain_2d,
+                             weighting, segment_engine, precision=precision)
+
+    effintim = utils.get_efftim_ped(model)[0]
+
+    # For multiple-integration datasets, will output integration-specific
+    #    results to separate file named <basename> + '_integ.fits'
+    int_times = None
+    if n_int > 1:
+        if pipe_utils.is_tso(model) and hasattr(model, 'int_times'):
+            int_times = model.int_times
+        else:
+            int_times = None
+        int_model = utils.ols_output_integ(model, slope_int, dq_int, effintim,
+                                       var_p3, var_r3, var_both3, int_times)
+    else:
+        int_model = None
+
+    # Compress all integration's dq arrays to create 2D PIXELDDQ array for
+    #   primary output
+    final_pixeldq = dq_compress_final(dq_int, n_int)
+
+    new_model = ols_output_primary(model, rate_sums, final_pixeldq, effintim)
+
+    return new_model, int_model, opt_model
+
+
+def ols_ramp_fit_streaming(model, buffsize, readnoise_2d, gain_2d, weighting,
+                           int_block_size, segment_engine='iterative',
+                           precision='float64'):
+    """
+    Fit a ramp using ordinary least squares, fitting blocks of integrations
+    in turn, so that the memory used by the fitting is set by the number of
+    integrations per block rather than by the number in the exposure. The
+    segment variances depend on the median rates over all integrations, so
+    these are computed in a first pass over the data. In a second pass, each
+    block is fit, its integration-specific results are copied to the output,
+    and its contributions to the sums from which the primary output is
+    computed are accumulated. The optional output product is not produced in
+    this mode.
+
     Parameters
     ----------
     model : data model
@@ -49,70 +757,164 @@ def ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     buffsize : int
         size of data section (buffer) in bytes
 
-    save_opt : boolean
-       calculate optional fitting results
+    readnoise_2d : float, 2D array
+        readnoise for all pixels, matching the science data
+
+    gain_2d : float, 2D array
+        gain for all pixels, matching the science data
+
+    weighting : string
+        'optimal' specifies that optimal weighting should be used; currently
+        the only weighting supported.
+
+    int_block_size : int
+        number of integrations to fit at a time
+
+    segment_engine : string
+        engine used to fit the ramp segments; 'iterative' or 'batched'
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
+    Returns
+    -------
+    new_model : Data Model object
+        DM object containing a rate image averaged over all integrations in
+        the exposure
+
+    int_model : Data Model object or None
+        DM object containing rate images for each integration in the exposure,
+        or None if there is only one integration in the exposure
+
+    opt_model : None
+        the optional output product is not produced in this mode
+    """
+    n_int, nreads, nrows, ncols = model.data.shape
+    imshape = (nrows, ncols)
+
+    # If all the pixels have their initial groups flagged as saturated, the
+    #   output products are populated as for the single process fit.
+    first_gdq = model.groupdq[:,0,:,:]
+    if np.all(np.bitwise_and( first_gdq, dqflags.group['SATURATED'] )):
+        return utils.do_all_sat(model, imshape, n_int, False)
+
+    # In the 'First Pass' over the data, compute the median rates over all
+    #   integrations, which are needed to calculate the segment variances.
+    med_rates = calc_median_rates(model, buffsize)
+
+    effintim = utils.get_efftim_ped(model)[0]
+
+    # Integration-specific results, filled in as each block is fit
+    slope_int = np.zeros((n_int,) + imshape, dtype=np.float32)
+    var_p3 = np.zeros((n_int,) + imshape, dtype=np.float32)
+    var_r3 = np.zeros((n_int,) + imshape, dtype=np.float32)
+    var_both3 = np.zeros((n_int,) + imshape, dtype=np.float32)
+    dq_int = np.zeros((n_int,) + imshape, dtype=np.uint32)
+
+    # In the 'Second Pass', fit each block of integrations. The block models
+    #   contain views of the input arrays, so the arrays of the input model
+    #   are not copied.
+    rate_sums = None
+    for ilo in range(0, n_int, int_block_size):
+        ihi = min(ilo + int_block_size, n_int)
+        log.debug('Fitting integrations %d through %d', ilo + 1, ihi)
+
+        block = datamodels.RampModel(data=model.data[ilo:ihi],
+                                     err=model.err[ilo:ihi],
+                                     groupdq=model.groupdq[ilo:ihi],
+                                     pixeldq=model.pixeldq)
+        block.update(model)
+
+        (slope_int[ilo:ihi], dq_int[ilo:ihi], var_p3[ilo:ihi],
+         var_r3[ilo:ihi], var_both3[ilo:ihi], block_sums, _) = \
+            ols_fit_integrations(block, buffsize, False, readnoise_2d, gain_2d,
+                                 weighting, segment_engine, med_rates,
+                                 precision)
+        block.close()
+
+        if rate_sums is None:
+            rate_sums = block_sums
+        else:
+            rate_sums = tuple(s_all + s_block for s_all, s_block in
+                              zip(rate_sums, block_sums))
+
+    if n_int > 1:
+        if pipe_utils.is_tso(model) and hasattr(model, 'int_times'):
+            int_times = model.int_times
+        else:
+            int_times = None
+        int_model = utils.ols_output_integ(model, slope_int, dq_int, effintim,
+                                           var_p3, var_r3, var_both3,
+                                           int_times)
+    else:
+        int_model = None
+
+    final_pixeldq = dq_compress_final(dq_int, n_int)
 
-    readnoise_model : instance of data Model
-        readnoise for all pixels
+    new_model = ols_output_primary(model, rate_sums, final_pixeldq, effintim)
 
-    gain_model : instance of gain model
-        gain for all pixels
+    return new_model, int_model, None
 
-    algorithm : string
-        'OLS' specifies that ordinary least squares should be used;
-        'GLS' specifies that generalized least squares should be used.
 
-    weighting : string
-        'optimal' specifies that optimal weighting should be used;
-         currently the only weighting supported.
+def calc_median_rates(model, buffsize):
+    """
+    Calculate the estimated rates used to compute the segment variances, from
+    the median first differences of each pixel averaged over all
+    integrations. Saturated groups in the input data are set to NaN.
+
+    Parameters
+    ----------
+    model : data model
+        input data model, assumed to be of type RampModel
+
+    buffsize : int
+        size of data section (buffer) in bytes
 
     Returns
     -------
-    new_model : Data Model object
-        DM object containing a rate image averaged over all integrations in
-        the exposure
+    med_rates : float, 2D array
+        estimated rate for each pixel
+    """
+    n_int, nreads, nrows, ncols = model.data.shape
+    cubeshape = (nreads, nrows, ncols)
+    nrows_sect = calc_nrows(model, buffsize, cubeshape, nreads)
 
-    int_model : Data Model object or None
-        DM object containing rate images for each integration in the exposure
+    median_diffs_2d = np.zeros((nrows, ncols), dtype=np.float32)
 
-    opt_model : RampFitOutputModel object or None
-        DM object containing optional OLS-specific ramp fitting data for the
-        exposure
+    for num_int in range(n_int):
+        for rlo in range(0, nrows, nrows_sect):
+            rhi = min(rlo + nrows_sect, nrows)
 
-    gls_opt_model : GLS_RampFitModel object or None
-        Object containing optional GLS-specific ramp fitting data for the
-        exposure
-    """
-    if algorithm.upper() == "GLS":
-        new_model, int_model, gls_opt_model = gls_ramp_fit(model,
-                                buffsize, save_opt,
-                                readnoise_model, gain_model)
-        opt_model = None
-    else:
-        new_model, int_model, opt_model = \
-               ols_ramp_fit(model, buffsize, save_opt, readnoise_model,
-               gain_model, weighting)
-        gls_opt_model = None
+            data_sect = model.get_section('data')[num_int, :, rlo:rhi, :]
 
-    # Update data units in output models
-    if new_model is not None:
-        new_model.meta.bunit_data = 'DN/s'
-        new_model.meta.bunit_err = 'DN/s'
+            # Skip data section if it is all NaNs
+            if np.all(np.isnan(data_sect)):
+                continue
 
-    if int_model is not None:
-        int_model.meta.bunit_data = 'DN/s'
-        int_model.meta.bunit_err = 'DN/s'
+            gdq_sect = model.get_section('groupdq')[num_int, :, rlo:rhi, :]
 
-    return new_model, int_model, opt_model, gls_opt_model
+            # Reset all saturated groups in the input data array to NaN
+            where_sat = np.where(np.bitwise_and(gdq_sect,
+                                 dqflags.group['SATURATED']) != 0)
+            data_sect[where_sat] = np.NaN
 
+            median_diffs_2d[rlo:rhi, :] += \
+                calc_median_diffs(data_sect, gdq_sect)
 
-def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
-                 weighting):
+    median_diffs_2d /= n_int
+
+    return median_diffs_2d / model.meta.exposure.group_time
+
+
+def ols_fit_integrations(model, buffsize, save_opt, readnoise_2d, gain_2d,
+                         weighting, segment_engine='iterative', med_rates=None,
+                         precision='float64'):
     """
-    Fit a ramp using ordinary least squares. Calculate the count rate for each
-    pixel in all data cube sections and all integrations, equal to the weighted
-    slope for all sections (intervals between cosmic rays) of the pixel's ramp
-    divided by the effective integration time.
+    Fit the ramps of all integrations in the model using ordinary least
+    squares, and compute the integration-specific slopes and variances. The
+    sums over all integrations from which the slopes and variances of the
+    primary output are computed are also returned, so that the results of
+    separately fit blocks of integrations can be combined.
 
     Parameters
     ----------
@@ -125,116 +927,67 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     save_opt : boolean
         calculate optional fitting results
 
-    readnoise_model : instance of data Model
-        readnoise for all pixels
+    readnoise_2d : float, 2D array
+        readnoise for all pixels, matching the science data
 
-    gain_model : instance of gain model
-        gain for all pixels
+    gain_2d : float, 2D array
+        gain for all pixels, matching the science data
 
     weighting : string
         'optimal' specifies that optimal weighting should be used; currently
         the only weighting supported.
 
+    segment_engine : string
+        engine used to fit the ramp segments; 'iterative' or 'batched'
+
+    med_rates : float, 2D array or None
+        median rates used to calculate the segment variances; if None, these
+        are computed from the integrations in the model
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
     Returns
     -------
-    new_model : Data Model object
-        DM object containing a rate image averaged over all integrations in
-        the exposure
+    slope_int : float, 3D array
+        weighted slopes for each integration
 
-    int_model : Data Model object or None
-        DM object containing rate images for each integration in the exposure,
-        or None if there is only one integration in the exposure
+    dq_int : int, 3D array
+        DQ arrays for each integration
+
+    var_p3, var_r3, var_both3 : float, 3D arrays
+        integration-specific slope variances due to Poisson noise, read
+        noise, and both
+
+    rate_sums : tuple of float, 2D arrays
+        sums over integrations and segments of the slope / variance, of
+        1 / variance, of 1 / Poisson variance, and of 1 / read noise variance
 
     opt_model : Data Model object or None
         DM object containing optional OLS-specific ramp fitting data for the
-        exposure; this will be None if save_opt is False
+        integrations; this will be None if save_opt is False
     """
     tstart = time.time()
 
-    # Get needed sizes and shapes
-    nreads, npix, imshape, cubeshape, n_int, instrume, frame_time, ngroups, \
-        group_time = utils.get_dataset_info(model)
-
-    # Save original shapes for writing to log file, as these may change for MIRI
-    orig_nreads = nreads
-    orig_cubeshape = cubeshape
-
-    # For MIRI datasets having >1 group, if all pixels in the final group are
-    #   flagged as DO_NOT_USE, resize the input model arrays to exclude the
-    #   final group.  Similarly, if leading groups 1 though N have all pixels
-    #   flagged as DO_NOT_USE, those groups will be ignored by ramp fitting, and
-    #   the input model arrays will be resized appropriately. If all pixels in
-    #   all groups are flagged, return None for the models.
-
-    if (instrume == 'MIRI' and nreads > 1):
-        first_gdq = model.groupdq[:,0,:,:]
-        num_bad_slices = 0  # number of initial groups that are all DO_NOT_USE
-
-        while (np.all(np.bitwise_and( first_gdq, dqflags.group['DO_NOT_USE']))):
-            num_bad_slices += 1
-            nreads -= 1
-            ngroups -= 1
-
-            # Check if there are remaining groups before accessing data
-            if ngroups < 1 :  # no usable data
-                log.error('1. All groups have all pixels flagged as DO_NOT_USE,')
-                log.error('  so will not process this dataset.')
-                return None, None, None
-
-            model.data = model.data[:,1:,:,:]
-            model.err = model.err[:,1:,:,:]
-            model.groupdq = model.groupdq[:,1:,:,:]
-
-            cubeshape = (nreads,) + imshape
-
-            # Where the initial group of the just-truncated data is a cosmic ray,
-            #   remove the JUMP_DET flag from the group dq for those pixels so
-            #   that those groups will be included in the fit.
-            wh_cr = np.where( np.bitwise_and(model.groupdq[:,0,:,:],
-                              dqflags.group['JUMP_DET']) != 0 )
-            num_cr_1st = len(wh_cr[0])
-
-            for ii in range(num_cr_1st):
-                model.groupdq[ wh_cr[0][ii], 0, wh_cr[1][ii],
-                    wh_cr[2][ii]] -= dqflags.group['JUMP_DET']
-
-            first_gdq = model.groupdq[:,0,:,:]
-
-        log.info('Number of leading groups that are flagged as DO_NOT_USE: %s', num_bad_slices)
-
-        # If all groups were flagged, the final group would have been picked up
-        #   in the while loop above, ngroups would have been set to 0, and Nones
-        #   would have been returned.  If execution has gotten here, there must
-        #   be at least 1 remaining group that is not all flagged.
-        last_gdq = model.groupdq[:,-1,:,:]
-        if np.all(np.bitwise_and( last_gdq, dqflags.group['DO_NOT_USE'] )):
-            nreads -= 1
-            ngroups -= 1
-
-            # Check if there are remaining groups before accessing data
-            if ngroups < 1 :  # no usable data
-                log.error('2. All groups have all pixels flagged as DO_NOT_USE,')
-                log.error('  so will not process this dataset.')
-                return None, None, None
-
-            model.data = model.data[:,:-1,:,:]
-            model.err = model.err[:,:-1,:,:]
-            model.groupdq = model.groupdq[:,:-1,:,:]
-
-            cubeshape = (nreads,) + imshape
-            log.info('MIRI dataset has all pixels in the final group flagged as DO_NOT_USE.')
-
-        # Next block is to satisfy github issue 1681:
-        # "MIRI FirstFrame and LastFrame minimum number of groups"
-        if (ngroups < 2):
-            log.warning('MIRI datasets require at least 2 groups/integration')
-            log.warning('(NGROUPS), so will not process this dataset.')
-            return None, None, None
-
-    if (ngroups == 1):
-        log.warning('Dataset has NGROUPS=1, so count rates for each integration')
-        log.warning('will be calculated as the value of that 1 group divided by')
-        log.warning('the group exposure time.')
+    # The batched segment fitting engine handles ramps having >2 groups with
+    #   optimal weighting; all other cases use the iterative engine.
+    if (segment_engine == 'batched' and model.data.shape[1] > 2 and
+            weighting.lower() == 'optimal'):
+        calc_slope_func = segment_fit.calc_slope
+    else:
+        calc_slope_func = calc_slope
+
+    # Get needed sizes and shapes. The number of groups is taken from the
+    #   data rather than from NGROUPS, as leading and trailing MIRI groups may
+    #   have been discarded.
+    n_int, nreads, nrows, ncols = model.data.shape
+    ngroups = nreads
+    imshape = (nrows, ncols)
+    cubeshape = (nreads,) + imshape
+    npix = nrows * ncols
+    instrume = model.meta.instrument.name
+    frame_time = model.meta.exposure.frame_time
+    group_time = model.meta.exposure.group_time
 
     # Calculate effective integration time (once EFFINTIM has been populated
     #   and accessible, will use that instead), and other keywords that will
@@ -248,18 +1001,6 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     gdq_cube = model.groupdq
     gdq_cube_shape = gdq_cube.shape
 
-    # If all the pixels have their initial groups flagged as saturated, the DQ
-    #   in the primary and integration-specific output products are updated,
-    #   the other arrays in all output products are populated with zeros, and
-    #   the output products are returned to ramp_fit(). If the initial group of
-    #   a ramp is saturated, it is assumed that all groups are saturated.
-    first_gdq = model.groupdq[:,0,:,:]
-    if np.all(np.bitwise_and( first_gdq, dqflags.group['SATURATED'] )):
-        new_model, int_model, opt_model = utils.do_all_sat( model, imshape,
-                                                            n_int, save_opt )
-
-        return new_model, int_model, opt_model
-
     # Get max number of segments fit in all integrations
     max_seg = calc_num_seg(gdq_cube, n_int)
     del gdq_cube
@@ -274,11 +1015,6 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     # Calculate number of (contiguous) rows per data section
     nrows = calc_nrows(model, buffsize, cubeshape, nreads)
 
-    # Get readnoise array for calculation of variance of noiseless ramps, and
-    #   gain array in case optimal weighting is to be done
-    readnoise_2d, gain_2d = utils.get_ref_subs(model, readnoise_model,
-                                               gain_model, nframes)
-
     # Get Pixel DQ array from input file. The incoming RampModel has uint32
     #   PIXELDQ, but ramp fitting will update this array here by flagging
     #   the 2D PIXELDQ locations where the ramp data has been previously
@@ -294,6 +1030,8 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     #   as is done in the jump detection step, except here CR-affected and
     #   saturated groups have already been flagged. The actual, fit, slopes for
     #   each segment are also calculated here.
+    pixeldq_sect = None
+    inv_var = None
 
     # Loop over data integrations:
     for num_int in range(0, n_int):
@@ -327,59 +1065,15 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
             data_sect[ where_sat ] = np.NaN
             del where_sat
 
-            # Compute the first differences of all groups
-            first_diffs_sect = np.diff(data_sect, axis=0)
-
-            # If the dataset has only 1 group/integ, assume the 'previous group'
-            #   is all zeros, so just use data as the difference
-            if (first_diffs_sect.shape[0] == 0):
-                first_diffs_sect = data_sect.copy()
-            else:
-                # Similarly, for datasets having >1 group/integ and having
-                #   single-group segments, just use the data as the difference
-                wh_nan = np.where( np.isnan( first_diffs_sect[0,:,:]) )
-
-                if (len(wh_nan[0]) > 0):
-                    first_diffs_sect[0,:,:][wh_nan] = data_sect[0,:,:][wh_nan]
-
-                del wh_nan
-
-                i_group,i_yy,i_xx, = np.where( np.bitwise_and(gdq_sect[1:,:,:],
-                                              dqflags.group['JUMP_DET']) != 0)
-
-                # Mask all the first differences that are affected by a CR,
-                #   starting at group 1.  The purpose of starting at index 1 is
-                #   to shift all the indices down by 1, so they line up with the
-                #   indices in first_diffs.
-                first_diffs_sect[ i_group-1, i_yy, i_xx ] = np.NaN
-
-                del i_group, i_yy, i_xx
-
-                # Check for pixels in which there is good data in 0th group, but
-                #   all first_diffs for this ramp are NaN because there are too
-                #   few good groups past the 0th. Due to the shortage of good
-                #   data, the first_diffs will be set here equal to the data in
-                #   the 0th group.
-                wh_min = np.where( np.logical_and(np.isnan(first_diffs_sect)
-                              .all(axis=0), np.isfinite( data_sect[0,:,:])))
-                if len(wh_min[0] > 0):
-                    first_diffs_sect[0,:,:][wh_min] = data_sect[0,:,:][wh_min]
-
-                del wh_min
-
-            # All first differences affected by saturation and CRs have been set
-            #  to NaN, so compute the median of all non-NaN first differences.
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", "All-NaN.*", RuntimeWarning)
-                nan_med = np.nanmedian(first_diffs_sect, axis=0)
-            nan_med[np.isnan(nan_med)] = 0. # if all first_diffs_sect are nans
-            median_diffs_2d[ rlo:rhi, : ] += nan_med
+            if med_rates is None:
+                median_diffs_2d[ rlo:rhi, : ] += \
+                    calc_median_diffs(data_sect, gdq_sect)
 
             # Calculate the slope of each segment
             t_dq_cube, inv_var, opt_res, f_max_seg, num_seg = \
-                 calc_slope(data_sect, gdq_sect, frame_time, opt_res, save_opt,
-                            rn_sect, gain_sect, max_seg, ngroups, weighting,
-                            f_max_seg)
+                 calc_slope_func(data_sect, gdq_sect, frame_time, opt_res,
+                                 save_opt, rn_sect, gain_sect, max_seg,
+                                 ngroups, weighting, f_max_seg, precision)
 
             del gain_sect
 
@@ -426,11 +1120,11 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
         del pixeldq_sect
 
     # Compute the final 2D array of differences; create rate array
-    median_diffs_2d /= n_int
-    med_rates = median_diffs_2d/group_time
+    if med_rates is None:
+        median_diffs_2d /= n_int
+        med_rates = median_diffs_2d/group_time
 
     del median_diffs_2d
-    del first_diffs_sect
 
     (var_p3, var_r3, var_p4, var_r4, var_both4, var_both3,
      inv_var_both4, s_inv_var_p3, s_inv_var_r3, s_inv_var_both3,
@@ -589,19 +1283,9 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     s_slope_by_var2 = s_slope_by_var3.sum(axis=0) # sum over integrations
     s_inv_var_both2 = s_inv_var_both3.sum(axis=0)
 
-    # Compute the 'dataset-averaged' slope
-    # Suppress, then re-enable harmless arithmetic warnings
-    warnings.filterwarnings("ignore", ".*invalid value.*", RuntimeWarning)
-    warnings.filterwarnings("ignore", ".*divide by zero.*", RuntimeWarning)
-    slope_dataset2 = s_slope_by_var2/s_inv_var_both2
-    warnings.resetwarnings()
-
-    del s_inv_var_both2, s_slope_by_var2, s_slope_by_var3, slope_by_var4
+    del s_slope_by_var3, slope_by_var4
     del s_inv_var_both3
 
-    #  Replace nans in slope_dataset2 with 0 (for non-existing segments)
-    slope_dataset2[np.isnan(slope_dataset2)] = 0.
-
     # Compute the integration-specific slope
     the_num = (opt_res.slope_seg * inv_var_both4).sum(axis=1)
 
@@ -675,58 +1359,142 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     if pixeldq is not None:
         del pixeldq
 
-    # For multiple-integration datasets, will output integration-specific
-    #    results to separate file named <basename> + '_integ.fits'
-    int_times = None
-    if n_int > 1:
-        if pipe_utils.is_tso(model) and hasattr(model, 'int_times'):
-            int_times = model.int_times
-        else:
-            int_times = None
-        int_model = utils.ols_output_integ(model, slope_int, dq_int, effintim,
-                                       var_p3, var_r3, var_both3, int_times)
-    else:
-        int_model = None
-
     if opt_res is not None:
         del opt_res
 
-    if slope_int is not None:
-        del slope_int
-    del var_p3
-    del var_r3
-    del var_both3
-    if int_times is not None:
-        del int_times
-
-    # Divide slopes by total (summed over all integrations) effective
-    #   integration time to give count rates.
-    c_rates = slope_dataset2 / effintim
-
-    # Compress all integration's dq arrays to create 2D PIXELDDQ array for
-    #   primary output
-    final_pixeldq = dq_compress_final(dq_int, n_int)
-
-    if dq_int is not None:
-        del dq_int
-
     tstop = time.time()
 
-    log_stats(c_rates)
-
     log.debug('Instrument: %s', instrume)
     log.debug('Number of pixels in 2D array: %d', npix)
     log.debug('Shape of 2D image: (%d, %d)' %(imshape))
-    log.debug('Shape of data cube: (%d, %d, %d)' %(orig_cubeshape))
+    log.debug('Shape of data cube: (%d, %d, %d)' %(cubeshape))
     log.debug('Buffer size (bytes): %d', buffsize)
     log.debug('Number of rows per buffer: %d', nrows)
-    log.info('Number of groups per integration: %d', orig_nreads)
-    log.info('Number of integrations: %d', n_int)
     log.debug('The execution time in seconds: %f', tstop - tstart)
 
+    rate_sums = (s_slope_by_var2, s_inv_var_both2, s_inv_var_p3.sum(axis=0),
+                 s_inv_var_r3.sum(axis=0))
+
+    return slope_int, dq_int, var_p3, var_r3, var_both3, rate_sums, opt_model
+
+
+def calc_median_diffs(data_sect, gdq_sect):
+    """
+    Calculate the median of the first differences of the groups, excluding
+    the differences affected by saturation and cosmic rays, for each pixel in
+    the data section of a single integration. These are used to estimate the
+    slopes from which the variances are calculated.
+
+    Parameters
+    ----------
+    data_sect : float, 3D array
+        section of input data cube array, with saturated groups set to NaN
+
+    gdq_sect : int, 3D array
+        section of GROUPDQ data quality array
+
+    Returns
+    -------
+    nan_med : float, 2D array
+        median of the first differences for each pixel
+    """
+    # Compute the first differences of all groups
+    first_diffs_sect = np.diff(data_sect, axis=0)
+
+    # If the dataset has only 1 group/integ, assume the 'previous group'
+    #   is all zeros, so just use data as the difference
+    if (first_diffs_sect.shape[0] == 0):
+        first_diffs_sect = data_sect.copy()
+    else:
+        # Similarly, for datasets having >1 group/integ and having
+        #   single-group segments, just use the data as the difference
+        wh_nan = np.where( np.isnan( first_diffs_sect[0,:,:]) )
+
+        if (len(wh_nan[0]) > 0):
+            first_diffs_sect[0,:,:][wh_nan] = data_sect[0,:,:][wh_nan]
+
+        del wh_nan
+
+        i_group,i_yy,i_xx, = np.where( np.bitwise_and(gdq_sect[1:,:,:],
+                                      dqflags.group['JUMP_DET']) != 0)
+
+        # Mask all the first differences that are affected by a CR,
+        #   starting at group 1.  The purpose of starting at index 1 is
+        #   to shift all the indices down by 1, so they line up with the
+        #   indices in first_diffs.
+        first_diffs_sect[ i_group-1, i_yy, i_xx ] = np.NaN
+
+        del i_group, i_yy, i_xx
+
+        # Check for pixels in which there is good data in 0th group, but
+        #   all first_diffs for this ramp are NaN because there are too
+        #   few good groups past the 0th. Due to the shortage of good
+        #   data, the first_diffs will be set here equal to the data in
+        #   the 0th group.
+        wh_min = np.where( np.logical_and(np.isnan(first_diffs_sect)
+                      .all(axis=0), np.isfinite( data_sect[0,:,:])))
+        if len(wh_min[0] > 0):
+            first_diffs_sect[0,:,:][wh_min] = data_sect[0,:,:][wh_min]
+
+        del wh_min
+
+    # All first differences affected by saturation and CRs have been set
+    #  to NaN, so compute the median of all non-NaN first differences.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "All-NaN.*", RuntimeWarning)
+        nan_med = np.nanmedian(first_diffs_sect, axis=0)
+    nan_med[np.isnan(nan_med)] = 0. # if all first_diffs_sect are nans
+
+    return nan_med
+
+
+def ols_output_primary(model, rate_sums, final_pixeldq, effintim):
+    """
+    Construct the primary output for the OLS algorithm, from the sums over
+    all integrations and segments of the slopes and variances.
+
+    Parameters
+    ----------
+    model : instance of Data Model
+       DM object for input
+
+    rate_sums : tuple of float, 2D arrays
+        sums over integrations and segments of the slope / variance, of
+        1 / variance, of 1 / Poisson variance, and of 1 / read noise variance
+
+    final_pixeldq : int, 2D array
+        combination of all integration's DQ arrays
+
+    effintim : float
+       Effective integration time per integration
+
+    Returns
+    -------
+    new_model : Data Model object
+        DM object containing a rate image averaged over all integrations in
+        the exposure
+    """
+    s_slope_by_var2, s_inv_var_both2, s_inv_var_p2, s_inv_var_r2 = rate_sums
+
+    # Compute the 'dataset-averaged' slope
+    # Suppress, then re-enable harmless arithmetic warnings
+    warnings.filterwarnings("ignore", ".*invalid value.*", RuntimeWarning)
+    warnings.filterwarnings("ignore", ".*divide by zero.*", RuntimeWarning)
+    slope_dataset2 = s_slope_by_var2/s_inv_var_both2
+    warnings.resetwarnings()
+
+    #  Replace nans in slope_dataset2 with 0 (for non-existing segments)
+    slope_dataset2[np.isnan(slope_dataset2)] = 0.
+
+    # Divide slopes by total (summed over all integrations) effective
+    #   integration time to give count rates.
+    c_rates = slope_dataset2 / effintim
+
+    log_stats(c_rates)
+
     # Compute the 2D variances due to Poisson and read noise
-    var_p2 = 1/(s_inv_var_p3.sum(axis=0))
-    var_r2 = 1/(s_inv_var_r3.sum(axis=0))
+    var_p2 = 1/s_inv_var_p2
+    var_r2 = 1/s_inv_var_r2
 
     # Huge variances correspond to non-existing segments, so are reset to 0
     #  to nullify their contribution.
@@ -745,9 +1513,6 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
     err_tot = np.sqrt(var_p2 + var_r2)
     warnings.resetwarnings()
 
-    del s_inv_var_p3
-    del s_inv_var_r3
-
     # Create new model for the primary output.
     new_model = datamodels.ImageModel(data=c_rates.astype(np.float32),
             dq=final_pixeldq.astype(np.uint32),
@@ -757,12 +1522,12 @@ def ols_ramp_fit(model, buffsize, save_opt, readnoise_model, gain_model,
 
     new_model.update(model)  # ... and add all keys from input
 
-    return new_model, int_model, opt_model
+    return new_model
 
 
 def gls_ramp_fit(model,
                  buffsize, save_opt,
-                 readnoise_model, gain_model):
+                 readnoise_model, gain_model, max_cores=None):
     """Fit a ramp using generalized least squares.
 
     Extended Summary
@@ -781,8 +1546,9 @@ def gls_ramp_fit(model,
     model : data model
         Input data model, assumed to be of type RampModel.
 
-    buffsize : int
-        Size of data section (buffer) in bytes.
+    buffsize : int or None
+        Size of data section (buffer) in bytes; if None, this is chosen from
+        the CPU cache size and the available memory.
 
     save_opt : boolean
         Calculate optional fitting results.
@@ -793,6 +1559,11 @@ def gls_ramp_fit(model,
     gain_model : instance of gain model
         Gain for all pixels.
 
+    max_cores : string or None
+        Fraction of the available cores to use for multiprocessing; one of
+        'quarter', 'half', 'all', or None to use a single process.  The data
+        sections of each integration are fit in separate processes.
+
     Returns
     -------
     new_model : Data Model object
@@ -873,7 +1644,12 @@ def gls_ramp_fit(model,
     # (uint16) PIXELDQ in the outgoing ImageModel.
     pixeldq = model.pixeldq.copy()
 
+    # The data sections are fit in separate processes if requested
+    number_slices = compute_slices(max_cores)
+
     # calculate number of (contiguous) rows per data section
+    if buffsize is None:
+        buffsize = utils.calc_auto_buffsize(model, 'GLS', number_slices)
     nrows = calc_nrows(model, buffsize, cubeshape, nreads)
 
     # Get readnoise array for calculation of variance of noiseless ramps, and
@@ -885,92 +1661,117 @@ def gls_ramp_fit(model,
     # Flag any bad pixels in the gain
     pixeldq = utils.reset_bad_gain( pixeldq, gain_2d )
 
-    # loop over data integrations
-    for num_int in range(n_int):
-        if save_opt:
-            first_group[:, :] = 0.      # re-use this for each integration
-
-        # loop over data sections
-        for rlo in range(0, cubeshape[1], nrows):
-            rhi = rlo + nrows
-
-            if rhi > cubeshape[1]:
-                rhi = cubeshape[1]
-
-            data_sect = model.get_section('data')[num_int, :, rlo:rhi, :]
-
-            # We'll propagate error estimates from previous steps to the
-            # current step by using the variance.
-            input_var_sect = model.get_section('err')[num_int, :, rlo:rhi, :]
-            input_var_sect = input_var_sect**2
-
-            gdq_sect = gdq_cube[num_int, :, rlo:rhi, :]
-            rn_sect = readnoise_2d[rlo:rhi, :]
-            gain_sect = gain_2d[rlo:rhi, :]
-
-            # Convert the data section from DN to electrons.
-            data_sect *= gain_sect
-            if save_opt:
-                first_group[rlo:rhi, :] = data_sect[0, :, :].copy()
-
-            (intercept_sect, intercept_var_sect,
-             slope_sect, slope_var_sect,
-             cr_sect, cr_var_sect) = \
-                        gls_fit.determine_slope(data_sect, input_var_sect,
-                                                gdq_sect, rn_sect, gain_sect,
-                                                frame_time, group_time,
-                                                nframes_used, max_num_cr,
-                                                saturated_flag, jump_flag)
-
-            slope_int[num_int, rlo:rhi, :] = slope_sect.copy()
-            v_mask = (slope_var_sect <= 0.)
-            if v_mask.any():
-                # Replace negative or zero variances with a large value.
-                slope_var_sect[v_mask] = utils.LARGE_VARIANCE
-                # Also set a flag in the pixel dq array.
-                temp_dq[rlo:rhi, :][v_mask] = dqflags.pixel['UNRELIABLE_SLOPE']
-            del v_mask
-            # If a pixel was flagged (by an earlier step) as saturated in
-            # the first group, flag the pixel as bad.
-            # Note:  save s_mask until after the call to utils.gls_pedestal.
-            s_mask = (gdq_sect[0] == saturated_flag)
-            if s_mask.any():
-                temp_dq[rlo:rhi, :][s_mask] = dqflags.pixel['UNRELIABLE_SLOPE']
-            slope_err_int[num_int, rlo:rhi, :] = np.sqrt(slope_var_sect)
-
-            # We need to take a weighted average if (and only if) n_int > 1.
-            # Accumulate sum of slopes and sum of weights.
-            if n_int > 1:
-                weight = 1. / slope_var_sect
-                slopes[rlo:rhi, :] += (slope_sect * weight)
-                sum_weight[rlo:rhi, :] += weight
+    # The data sections are fit in a pool of processes, if requested,
+    # which is closed even if a fit fails
+    with contextlib.ExitStack() as stack:
+        if number_slices > 1:
+            log.info("Creating %d processes for ramp fitting " % number_slices)
+            pool = stack.enter_context(
+                multiprocessing.Pool(processes=number_slices))
 
+        # loop over data integrations
+        for num_int in range(n_int):
             if save_opt:
-                # Save the intercepts and cosmic-ray amplitudes for the
-                # current integration.
-                intercept_int[num_int, rlo:rhi, :] = intercept_sect.copy()
-                intercept_err_int[num_int, rlo:rhi, :] = \
-                        np.sqrt(np.abs(intercept_var_sect))
-                pedestal_int[num_int, rlo:rhi, :] = \
-                        utils.gls_pedestal(first_group[rlo:rhi, :],
-                                           slope_int[num_int, rlo:rhi, :],
-                                           s_mask,
-                                           frame_time, nframes_used)
-                ampl_int[num_int, rlo:rhi, :, :] = cr_sect.copy()
-                ampl_err_int[num_int, rlo:rhi, :, :] = \
-                        np.sqrt(np.abs(cr_var_sect))
-            del s_mask
-
-            # Compress 4D->2D dq arrays for saturated and jump-detected
-            #   pixels
-            pixeldq_sect = pixeldq[rlo:rhi, :].copy()
-            dq_int[num_int, rlo:rhi, :] = \
-                  dq_compress_sect(gdq_sect, pixeldq_sect).copy()
-
-        # temp_dq |= dq_int[num_int, :, :]
-        # dq_int[num_int, :, :] = temp_dq.copy()
-        dq_int[num_int, :, :] |= temp_dq
-        temp_dq[:, :] = 0               # initialize for next integration
+                first_group[:, :] = 0.      # re-use this for each integration
+
+            # Fit the data sections in chunks of one section per process,
+            # storing the results of each chunk before setting up the next,
+            # so that only one chunk of sections is in memory at a time
+            row_ranges = [(rlo, min(rlo + nrows, cubeshape[1]))
+                          for rlo in range(0, cubeshape[1], nrows)]
+            for first in range(0, len(row_ranges), number_slices):
+                chunk = row_ranges[first:first + number_slices]
+
+                # Set up the fit of each data section
+                section_args = []
+                for rlo, rhi in chunk:
+                    data_sect = model.get_section('data')[num_int, :, rlo:rhi, :]
+
+                    # We'll propagate error estimates from previous steps to the
+                    # current step by using the variance.
+                    input_var_sect = model.get_section('err')[num_int, :, rlo:rhi, :]
+                    input_var_sect = input_var_sect**2
+
+                    gdq_sect = gdq_cube[num_int, :, rlo:rhi, :]
+                    rn_sect = readnoise_2d[rlo:rhi, :]
+                    gain_sect = gain_2d[rlo:rhi, :]
+
+                    # Convert the data section from DN to electrons.
+                    data_sect *= gain_sect
+                    if save_opt:
+                        first_group[rlo:rhi, :] = data_sect[0, :, :].copy()
+
+                    section_args.append((data_sect, input_var_sect,
+                                         gdq_sect, rn_sect, gain_sect,
+                                         frame_time, group_time,
+                                         nframes_used, max_num_cr,
+                                         saturated_flag, jump_flag))
+
+                if number_slices > 1:
+                    section_fits = pool.starmap(gls_fit.determine_slope, section_args)
+                else:
+                    section_fits = [gls_fit.determine_slope(*args)
+                                    for args in section_args]
+
+                # loop over data sections
+                for (rlo, rhi), args, fits in zip(chunk, section_args,
+                                                  section_fits):
+                    gdq_sect = args[2]
+                    (intercept_sect, intercept_var_sect,
+                     slope_sect, slope_var_sect,
+                     cr_sect, cr_var_sect) = fits
+
+                    slope_int[num_int, rlo:rhi, :] = slope_sect.copy()
+                    v_mask = (slope_var_sect <= 0.)
+                    if v_mask.any():
+                        # Replace negative or zero variances with a large value.
+                        slope_var_sect[v_mask] = utils.LARGE_VARIANCE
+                        # Also set a flag in the pixel dq array.
+                        temp_dq[rlo:rhi, :][v_mask] = dqflags.pixel['UNRELIABLE_SLOPE']
+                    del v_mask
+                    # If a pixel was flagged (by an earlier step) as saturated in
+                    # the first group, flag the pixel as bad.
+                    # Note:  save s_mask until after the call to utils.gls_pedestal.
+                    s_mask = (gdq_sect[0] == saturated_flag)
+                    if s_mask.any():
+                        temp_dq[rlo:rhi, :][s_mask] = dqflags.pixel['UNRELIABLE_SLOPE']
+                    slope_err_int[num_int, rlo:rhi, :] = np.sqrt(slope_var_sect)
+
+                    # We need to take a weighted average if (and only if) n_int > 1.
+                    # Accumulate sum of slopes and sum of weights.
+                    if n_int > 1:
+                        weight = 1. / slope_var_sect
+                        slopes[rlo:rhi, :] += (slope_sect * weight)
+                        sum_weight[rlo:rhi, :] += weight
+
+                    if save_opt:
+                        # Save the intercepts and cosmic-ray amplitudes for the
+                        # current integration.
+                        intercept_int[num_int, rlo:rhi, :] = intercept_sect.copy()
+                        intercept_err_int[num_int, rlo:rhi, :] = \
+                                np.sqrt(np.abs(intercept_var_sect))
+                        pedestal_int[num_int, rlo:rhi, :] = \
+                                utils.gls_pedestal(first_group[rlo:rhi, :],
+                                                   slope_int[num_int, rlo:rhi, :],
+                                                   s_mask,
+                                                   frame_time, nframes_used)
+                        ampl_int[num_int, rlo:rhi, :, :] = cr_sect.copy()
+                        ampl_err_int[num_int, rlo:rhi, :, :] = \
+                                np.sqrt(np.abs(cr_var_sect))
+                    del s_mask
+
+                    # Compress 4D->2D dq arrays for saturated and jump-detected
+                    #   pixels
+                    pixeldq_sect = pixeldq[rlo:rhi, :].copy()
+                    dq_int[num_int, rlo:rhi, :] = \
+                          dq_compress_sect(gdq_sect, pixeldq_sect).copy()
+
+                del section_args, section_fits
+
+            # temp_dq |= dq_int[num_int, :, :]
+            # dq_int[num_int, :, :] = temp_dq.copy()
+            dq_int[num_int, :, :] |= temp_dq
+            temp_dq[:, :] = 0               # initialize for next integration
 
     # Average the slope over all integrations.
     if n_int > 1:
@@ -1161,10 +1962,7 @@ def calc_nrows(model, buffsize, cubeshape, nreads):
     nrows : int
        number of rows in buffer of data section
     """
-    bitpix = model.data.dtype.itemsize
-    bytepix = int(abs(bitpix) / 8)
-    if bytepix < 1:
-        bytepix = 1
+    bytepix = model.data.dtype.itemsize
 
     nrows = int(buffsize / (bytepix * cubeshape[2] * nreads))
     if nrows < 1:
@@ -1176,7 +1974,8 @@ def calc_nrows(model, buffsize, cubeshape, nreads):
 
 
 def calc_slope(data_sect, gdq_sect, frame_time, opt_res, save_opt, rn_sect,
-               gain_sect, i_max_seg, ngroups, weighting, f_max_seg):
+               gain_sect, i_max_seg, ngroups, weighting, f_max_seg,
+               precision='float64'):
     """
     Compute the slope of each segment for each pixel in the data cube section
     for the current integration. Each segment has its slope fit in fit_lines();
@@ -1223,6 +2022,9 @@ def calc_slope(data_sect, gdq_sect, frame_time, opt_res, save_opt, rn_sect,
         actual maximum number of segments within a ramp, based on the fitting
         of all ramps; later used when truncating arrays before output.
 
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
     Returns
     -------
     gdq_sect : int, 3D array
@@ -1340,7 +2142,7 @@ def calc_slope(data_sect, gdq_sect, frame_time, opt_res, save_opt, rn_sect,
         f_max_seg, num_seg = \
               fit_next_segment(start, end_st, end_heads, pixel_done, data_sect,
                  mask_2d, mask_2d_init, inv_var, num_seg, opt_res, save_opt,
-                 rn_sect, gain_sect, ngroups, weighting, f_max_seg)
+                 rn_sect, gain_sect, ngroups, weighting, f_max_seg, precision)
 
         if f_max_seg is None:
             f_max_seg = 1
@@ -1353,7 +2155,8 @@ def calc_slope(data_sect, gdq_sect, frame_time, opt_res, save_opt, rn_sect,
 
 def fit_next_segment(start, end_st, end_heads, pixel_done, data_sect, mask_2d,
                      mask_2d_init, inv_var, num_seg, opt_res, save_opt, rn_sect,
-                     gain_sect, ngroups, weighting, f_max_seg):
+                     gain_sect, ngroups, weighting, f_max_seg,
+                     precision='float64'):
     """
     Call routine to LS fit masked data for a single segment for all pixels in
     data section. Then categorize each pixel's fitting interval based on
@@ -1418,6 +2221,9 @@ def fit_next_segment(start, end_st, end_heads, pixel_done, data_sect, mask_2d,
         fitting ramps in the current data section; later used when truncating
         arrays before output.
 
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
     Returns
     -------
     f_max_seg : int
@@ -1435,7 +2241,7 @@ def fit_next_segment(start, end_st, end_heads, pixel_done, data_sect, mask_2d,
 
     # Each returned array below is 1D, for all npix pixels for current segment
     slope, intercept, variance, sig_intercept, sig_slope = fit_lines(data_sect,
-              mask_2d, rn_sect, gain_sect, ngroups, weighting)
+              mask_2d, rn_sect, gain_sect, ngroups, weighting, precision)
 
     end_locs = end_st[end_heads[all_pix] - 1, all_pix]
 
@@ -1778,7 +2584,8 @@ def fit_next_segment(start, end_st, end_heads, pixel_done, data_sect, mask_2d,
     return f_max_seg, num_seg
 
 
-def fit_lines(data, mask_2d, rn_sect, gain_sect, ngroups, weighting):
+def fit_lines(data, mask_2d, rn_sect, gain_sect, ngroups, weighting,
+              precision='float64'):
     """
     Do linear least squares fit to data cube in this integration for a single
     segment for all pixels.  In addition to applying the mask due to identified
@@ -1807,6 +2614,9 @@ def fit_lines(data, mask_2d, rn_sect, gain_sect, ngroups, weighting):
         'optimal' specifies that optimal weighting should be used; currently
         the only weighting supported.
 
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
     Returns
     -------
     Note - all of these pertain to a single segment (hence '_s')
@@ -1898,7 +2708,13 @@ def fit_lines(data, mask_2d, rn_sect, gain_sect, ngroups, weighting):
 
     del wh_pix_to_use
 
-    xvalues = np.arange(data_masked.shape[0])[:, np.newaxis] * c_mask_2d
+    # In float32 mode the xvalues are single precision, so that the products
+    #   of the xvalues, weights and data are not promoted to double precision
+    if precision == 'float32':
+        xvalues = np.arange(data_masked.shape[0], dtype=np.float32)
+    else:
+        xvalues = np.arange(data_masked.shape[0])
+    xvalues = xvalues[:, np.newaxis] * c_mask_2d
     xvalues = xvalues[:, good_pix]  # set to those pixels to be used
 
     c_mask_2d = c_mask_2d[:, good_pix]
@@ -1907,7 +2723,16 @@ def fit_lines(data, mask_2d, rn_sect, gain_sect, ngroups, weighting):
     if weighting.lower() == 'optimal': # fit using optimal weighting
         # get sums from optimal weighting
         sumx, sumxx, sumxy, sumy, nreads_wtd, xvalues = calc_opt_sums( rn_sect,
-                gain_sect, data_masked, c_mask_2d, xvalues, good_pix )
+                gain_sect, data_masked, c_mask_2d, xvalues, good_pix,
+                precision )
+
+        # The fit is calculated from the sums in double precision, which for
+        #   1D arrays is cheap, and avoids losing the precision of the
+        #   single precision sums in the differences of their products
+        if precision == 'float32':
+            sumx, sumxx, sumxy, sumy, nreads_wtd = \
+                [x.astype(np.float64) for x in
+                 (sumx, sumxx, sumxy, sumy, nreads_wtd)]
 
         slope, intercept, sig_slope, sig_intercept = calc_opt_fit( nreads_wtd,
                       sumxx, sumx, sumxy, sumy)
@@ -1917,7 +2742,7 @@ def fit_lines(data, mask_2d, rn_sect, gain_sect, ngroups, weighting):
     elif weighting.lower() == 'unweighted': # fit using unweighted weighting
         # get sums from unweighted weighting
         sumx, sumxx, sumxy, sumy =\
-              calc_unwtd_sums(data_masked, xvalues)
+              calc_unwtd_sums(data_masked, xvalues, precision)
 
         slope, intercept, sig_slope, sig_intercept, line_fit =\
                calc_unwtd_fit(xvalues, nreads_1d, sumxx, sumx, sumxy, sumy)
@@ -2413,7 +3238,7 @@ def calc_num_seg(gdq, n_int):
     return max_num_seg
 
 
-def calc_unwtd_sums(data_masked, xvalues):
+def calc_unwtd_sums(data_masked, xvalues, precision='float64'):
     """
     Calculate the sums needed to determine the slope and intercept (and sigma
     of each) using an unweighted fit. Unweighted fitting currently not
@@ -2427,6 +3252,9 @@ def calc_unwtd_sums(data_masked, xvalues):
     xvalues : int, 1D array
         indices of valid pixel values for all groups
 
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
     Return:
     -------
     sumx : float
@@ -2442,15 +3270,17 @@ def calc_unwtd_sums(data_masked, xvalues):
         sum of data
 
     """
-    sumx = xvalues.sum(axis=0)
-    sumxx = (xvalues**2).sum(axis=0)
-    sumy = (np.reshape(data_masked.sum(axis=0), sumx.shape))
-    sumxy = (xvalues * np.reshape(data_masked, xvalues.shape)).sum(axis=0)
+    sumx = utils.sum_groups(xvalues, precision)
+    sumxx = utils.sum_groups(xvalues**2, precision)
+    sumy = (np.reshape(utils.sum_groups(data_masked, precision), sumx.shape))
+    sumxy = utils.sum_groups(xvalues * np.reshape(data_masked, xvalues.shape),
+                             precision)
 
     return sumx, sumxx, sumxy, sumy
 
 
-def calc_opt_sums(rn_sect, gain_sect, data_masked, mask_2d, xvalues, good_pix):
+def calc_opt_sums(rn_sect, gain_sect, data_masked, mask_2d, xvalues, good_pix,
+                  precision='float64'):
     """
     Calculate the sums needed to determine the slope and intercept (and sigma of
     each) using the optimal weights.  For each good pixel's segment, from the
@@ -2480,6 +3310,9 @@ def calc_opt_sums(rn_sect, gain_sect, data_masked, mask_2d, xvalues, good_pix):
     good_pix : int, 1D array
         indices of pixels having valid data for all groups
 
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
     Return:
     -------
     sumx : float
@@ -2561,15 +3394,11 @@ def calc_opt_sums(rn_sect, gain_sect, data_masked, mask_2d, xvalues, good_pix):
     data_diff = 0
     sigma_ir = 0
 
-    power_wt_r = calc_power(snr)  # get the weighting exponent for this SNR
+    # Get the index of the weighting exponent for this SNR
+    pow_index = utils.calc_power_index(snr)
 
-    # Make array of number of good groups, and exponents for each pixel
+    # Make array of number of good groups for each pixel
     num_nz = (data_masked != 0.).sum(0) # number of nonzero groups per pixel
-    nrd_data_a = num_nz.copy()
-    num_nz = 0
-
-    nrd_prime = (nrd_data_a - 1) / 2.
-    nrd_data_a = 0
 
     # Calculate inverse read noise^2 for use in weights
     # Suppress, then re-enable, harmless arithmetic warning
@@ -2580,19 +3409,20 @@ def calc_opt_sums(rn_sect, gain_sect, data_masked, mask_2d, xvalues, good_pix):
     rn_sect = 0
     fnz = 0
 
-    # Set optimal weights for each group of each pixel;
-    #    for all pixels at once, loop over the groups
-    wt_h = np.zeros(data_masked.shape, dtype=np.float32)
-
-    for jj_rd in range(data_masked.shape[0]):
-        wt_h[jj_rd, :] = \
-            abs((abs(jj_rd - nrd_prime) / nrd_prime) ** power_wt_r) * invrdns2_r
+    # Set optimal weights for each group of each pixel, from the cached table
+    #    of weights for the number of groups, the number of nonzero groups and
+    #    the weighting exponent, scaled by the inverse read noise^2
+    wt_table = utils.opt_weight_table(data_masked.shape[0])
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "invalid value.*", RuntimeWarning)
+        wt_h = (wt_table[pow_index, num_nz, :].T *
+                invrdns2_r).astype(np.float32)
 
     wt_h[np.isnan(wt_h)] = 0.
     wt_h[np.isinf(wt_h)] = 0.
 
-    nrd_prime = 0
-    power_wt_r = 0
+    num_nz = 0
+    pow_index = 0
 
     # For all pixels, 'roll' up the leading zeros such that the 0th group of
     #  each pixel is the lowest nonzero group for that pixel
@@ -2604,15 +3434,18 @@ def calc_opt_sums(rn_sect, gain_sect, data_masked, mask_2d, xvalues, good_pix):
         wh_m2d_f = np.logical_not(c_mask_2d[0, :])
 
     # Create weighted sums for Poisson noise and read noise
-    nreads_wtd = (wt_h * c_mask_2d).sum(axis=0)  # using optimal weights
+    # using optimal weights
+    nreads_wtd = utils.sum_groups(wt_h * c_mask_2d, precision)
 
-    sumx = (xvalues * wt_h).sum(axis=0)
-    sumxx = (xvalues**2 * wt_h).sum(axis=0)
+    sumx = utils.sum_groups(xvalues * wt_h, precision)
+    sumxx = utils.sum_groups(xvalues**2 * wt_h, precision)
 
     c_data_masked = data_masked.copy()
     c_data_masked[np.isnan(c_data_masked)] = 0.
-    sumy = (np.reshape((c_data_masked * wt_h).sum(axis=0), sumx.shape))
-    sumxy = (xvalues * wt_h * np.reshape(c_data_masked, xvalues.shape)).sum(axis=0)
+    sumy = (np.reshape(utils.sum_groups(c_data_masked * wt_h, precision),
+                       sumx.shape))
+    sumxy = utils.sum_groups(
+        xvalues * wt_h * np.reshape(c_data_masked, xvalues.shape), precision)
 
     return sumx, sumxx, sumxy, sumy, nreads_wtd, xvalues
 
@@ -23,6 +23,11 @@ class RampFitStep (Step):
         int_name = string(default='')
         save_opt = boolean(default=False) # Save optional output
         opt_name = string(default='')
+        maximum_cores = option('quarter', 'half', 'all', default=None) # max number of processes to create
+        segment_engine = option('iterative', 'batched', default='iterative') # OLS segment fitting engine
+        int_block_size = integer(min=1, default=None) # number of integrations to fit at a time
+        precision = option('float64', 'float32', default='float64') # precision of the OLS fitting sums
+        buffsize = integer(min=1, default=None) # data section size in bytes; default set from cache and memory
     """
 
     # Prior to 04/26/17, the following were also in the spec above:
@@ -62,15 +67,19 @@ class RampFitStep (Step):
 
             log.info('Using algorithm = %s' % self.algorithm)
             log.info('Using weighting = %s' % self.weighting)
+            if self.maximum_cores is not None:
+                log.info('Maximum cores to use = %s', self.maximum_cores)
+            log.info('Using segment fitting engine = %s', self.segment_engine)
+            log.info('Using fitting precision = %s', self.precision)
 
-            buffsize = ramp_fit.BUFSIZE
-            if self.algorithm == "GLS":
-                buffsize //= 10
+            if self.buffsize is not None:
+                log.info('Using data section size = %d bytes', self.buffsize)
 
             out_model, int_model, opt_model, gls_opt_model = ramp_fit.ramp_fit(
-                input_model, buffsize,
+                input_model, self.buffsize,
                 self.save_opt, readnoise_model, gain_model, self.algorithm,
-                self.weighting
+                self.weighting, self.maximum_cores, self.segment_engine,
+                self.int_block_size, self.precision
             )
 
             readnoise_model.close()
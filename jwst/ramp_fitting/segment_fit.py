@@ -0,0 +1,445 @@
+#! /usr/bin/env python
+#
+#  segment_fit.py - batched fitting of all ramp segments in a data section.
+#
+#  This is an alternative to the iterative calc_slope() / fit_next_segment()
+#  engine in ramp_fit.py. Rather than fitting one segment of every pixel per
+#  iteration, the segment boundaries of all pixels in the data section are
+#  determined up front from the GROUPDQ array, and all segments are then fit
+#  at once. The segments and the fitted values are the same as those of the
+#  iterative engine, so the runtime no longer depends on the pixel having the
+#  most cosmic rays.
+
+import logging
+import warnings
+
+import numpy as np
+
+from . import utils
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+# Segment fit types
+FIT_NONE = 0      # no fit is recorded for the segment
+FIT_SINGLE = 1    # single good 0th group; the data is used as the slope
+FIT_DOUBLE = 2    # segment having exactly 2 groups
+FIT_OPTIMAL = 3   # segment having >2 groups, fit with optimal weighting
+
+
+def calc_slope(data_sect, gdq_sect, frame_time, opt_res, save_opt, rn_sect,
+               gain_sect, i_max_seg, ngroups, weighting, f_max_seg,
+               precision='float64'):
+    """
+    Compute the slope of each segment for each pixel in the data cube section
+    for the current integration, fitting all segments of all pixels at once.
+    This has the same interface and results as ramp_fit.calc_slope(), and
+    supports datasets having more than 2 groups per integration with optimal
+    weighting.
+
+    Parameters
+    ----------
+    data_sect : float, 3D array
+        section of input data cube array
+
+    gdq_sect : int, 3D array
+        section of GROUPDQ data quality array
+
+    frame_time : float
+        integration time
+
+    opt_res : OptRes object
+        contains quantities related to fitting for optional output
+
+    save_opt : boolean
+       save optional fitting results
+
+    rn_sect : float, 2D array
+        read noise values for all pixels in data section
+
+    gain_sect : float, 2D array
+        gain values for all pixels in data section
+
+    i_max_seg : int
+        used for size of initial allocation of arrays for optional results;
+        maximum possible number of segments within the ramp, based on the
+        number of CR flags
+
+    ngroups : int
+        number of groups per integration
+
+    weighting : string
+        'optimal' specifies that optimal weighting should be used; currently
+        the only weighting supported.
+
+    f_max_seg : int
+        actual maximum number of segments within a ramp, based on the fitting
+        of all ramps; later used when truncating arrays before output.
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
+    Returns
+    -------
+    gdq_sect : int, 3D array
+        data quality flags for pixels in section
+
+    inv_var : float, 1D array
+        values of 1/variance for good pixels
+
+    opt_res : OptRes object
+        contains quantities related to fitting for optional output
+
+    f_max_seg : int
+        actual maximum number of segments within a ramp, updated here based on
+        fitting ramps in the current data section; later used when truncating
+        arrays before output.
+
+    num_seg : int, 1D array
+        numbers of segments for good pixels
+    """
+    nreads, asize2, asize1 = data_sect.shape
+    npix = asize2 * asize1
+
+    data_2d = data_sect.reshape((nreads, npix))
+    gdq_2d = gdq_sect.reshape((nreads, npix))
+    rn_1d = rn_sect.reshape(npix)
+    gain_1d = gain_sect.reshape(npix)
+
+    inv_var = np.zeros(npix, dtype=np.float32)  # inverse of fit variance
+    num_seg = np.zeros(npix, dtype=np.int32)  # number of segments per pixel
+
+    # Create object to hold optional results
+    opt_res.init_2d(npix, i_max_seg, save_opt)
+
+    seg_pix, seg_start, seg_npts, seg_type, seg_forced = \
+        find_segments(gdq_2d)
+
+    slope, intercept, variance, sig_intercept, sig_slope = \
+        fit_segments(data_2d, rn_1d, gain_1d, seg_pix, seg_start, seg_npts,
+                     seg_type, precision)
+
+    # Segments are recorded if their variance is positive, except for those
+    #   which are recorded regardless of their variance.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "invalid value.*", RuntimeWarning)
+        keep = seg_forced | (variance > 0.)
+    keep[seg_type == FIT_NONE] = False
+
+    seg_pix = seg_pix[keep]
+    if len(seg_pix) > 0:
+        slope = slope[keep]
+        intercept = intercept[keep]
+        sig_intercept = sig_intercept[keep]
+        sig_slope = sig_slope[keep]
+
+        # The segments are ordered by pixel, so the index of each recorded
+        #   segment within its pixel's ramp is its position in the list minus
+        #   the position of the pixel's first recorded segment.
+        first_of_pix = np.ones(len(seg_pix), dtype=bool)
+        first_of_pix[1:] = seg_pix[1:] != seg_pix[:-1]
+        first_pos = np.maximum.accumulate(
+            np.where(first_of_pix, np.arange(len(seg_pix)), 0))
+        seg_index = np.arange(len(seg_pix)) - first_pos
+
+        # Running sum of the inverse variances within each pixel's ramp, as
+        #   recorded for each segment
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", "divide by zero.*",
+                                    RuntimeWarning)
+            seg_inv_var = (1.0 / variance[keep]).astype(np.float32)
+        cum_inv_var = np.cumsum(seg_inv_var.astype(np.float64))
+        offset = np.where(first_of_pix, cum_inv_var - seg_inv_var, 0.)
+        cum_inv_var -= np.maximum.accumulate(offset)
+
+        opt_res.slope_2d[seg_index, seg_pix] = slope
+        if save_opt:
+            opt_res.interc_2d[seg_index, seg_pix] = intercept
+            opt_res.siginterc_2d[seg_index, seg_pix] = sig_intercept
+            opt_res.sigslope_2d[seg_index, seg_pix] = sig_slope
+            opt_res.inv_var_2d[seg_index, seg_pix] = cum_inv_var
+
+        num_seg[:] = np.bincount(seg_pix, minlength=npix)
+        inv_var[:] = np.bincount(seg_pix, weights=seg_inv_var,
+                                 minlength=npix)
+        f_max_seg = max(f_max_seg, num_seg.max())
+
+    return gdq_sect, inv_var, opt_res, f_max_seg, num_seg
+
+
+def find_segments(gdq_2d):
+    """
+    Determine the segments of all ramps in the data section from the GROUPDQ
+    array. Every flagged group (other than the 0th) ends a segment, and the
+    following segment starts at that flagged group, as the group in which a
+    cosmic ray is flagged is the first group of the new segment. The final
+    segment of a ramp ends at the final group.
+
+    Parameters
+    ----------
+    gdq_2d : int, 2D array
+        GROUPDQ values [group, pixel] for the data section
+
+    Returns
+    -------
+    seg_pix : int, 1D array
+        pixel index of each segment, ordered by pixel and then group
+
+    seg_start : int, 1D array
+        first group of each segment
+
+    seg_npts : int, 1D array
+        number of groups in each segment that are included in the fit
+
+    seg_type : int, 1D array
+        type of fit for each segment; one of FIT_NONE, FIT_SINGLE,
+        FIT_DOUBLE, or FIT_OPTIMAL
+
+    seg_forced : boolean, 1D array
+        True for segments that are recorded regardless of their variance:
+        2-group segments not at the end of the ramp, and single-group ramps
+    """
+    nreads, npix = gdq_2d.shape
+    flagged = gdq_2d != 0
+
+    # Groups that end a segment
+    is_end = flagged.copy()
+    is_end[0, :] = False
+    is_end[-1, :] = True
+
+    seg_pix, seg_end = np.nonzero(is_end.T)
+
+    first_of_pix = np.ones(len(seg_pix), dtype=bool)
+    first_of_pix[1:] = seg_pix[1:] != seg_pix[:-1]
+    seg_start = np.zeros_like(seg_end)
+    seg_start[1:] = seg_end[:-1]
+    seg_start[first_of_pix] = 0
+
+    l_interval = seg_end - seg_start
+    at_end = seg_end == nreads - 1
+
+    # The groups fit are those from the start of the segment through the
+    #   group preceding its end, or through the final group if that is good.
+    seg_npts = l_interval.copy()
+    seg_npts[at_end] += ~flagged[-1, seg_pix[at_end]]
+
+    seg_type = np.full(len(seg_pix), FIT_NONE, dtype=np.uint8)
+
+    # Segments having >2 groups, and 2-group segments not at the end of the
+    #   ramp. A segment at the end of the ramp having 2 groups is fit only if
+    #   its final group is good.
+    long_seg = (l_interval > 2) | (at_end & (l_interval == 2))
+    seg_type[long_seg & (seg_npts > 2)] = FIT_OPTIMAL
+    seg_type[long_seg & (seg_npts == 2)] = FIT_DOUBLE
+    seg_type[~at_end & (l_interval == 2)] = FIT_DOUBLE
+    seg_forced = ~at_end & (l_interval == 2)
+    seg_type[at_end & (l_interval == 1) & (seg_npts == 2)] = FIT_DOUBLE
+
+    # A ramp whose only good group is the 0th group, followed by a bad group,
+    #   has that group's data used as the slope.
+    num_good = (~flagged).sum(axis=0)
+    single_pix = ~flagged[0, :] & flagged[1, :] & (num_good == 1)
+    wh_single = first_of_pix & single_pix[seg_pix]
+    seg_type[wh_single] = FIT_SINGLE
+    seg_forced[wh_single] = True
+
+    return seg_pix, seg_start, seg_npts, seg_type, seg_forced
+
+
+def fit_segments(data_2d, rn_1d, gain_1d, seg_pix, seg_start, seg_npts,
+                 seg_type, precision='float64'):
+    """
+    Fit all segments of all pixels in the data section at once.
+
+    Parameters
+    ----------
+    data_2d : float, 2D array
+        data values [group, pixel] for the data section
+
+    rn_1d : float, 1D array
+        read noise values for all pixels in data section
+
+    gain_1d : float, 1D array
+        gain values for all pixels in data section
+
+    seg_pix : int, 1D array
+        pixel index of each segment
+
+    seg_start : int, 1D array
+        first group of each segment
+
+    seg_npts : int, 1D array
+        number of groups in each segment that are included in the fit
+
+    seg_type : int, 1D array
+        type of fit for each segment
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
+    Returns
+    -------
+    slope, intercept, variance, sig_intercept, sig_slope : float, 1D arrays
+        fit results for each segment
+    """
+    nsegs = len(seg_pix)
+    slope = np.zeros(nsegs, dtype=np.float32)
+    intercept = np.zeros(nsegs, dtype=np.float32)
+    variance = np.zeros(nsegs, dtype=np.float32)
+    sig_intercept = np.zeros(nsegs, dtype=np.float32)
+    sig_slope = np.zeros(nsegs, dtype=np.float32)
+
+    # Single good 0th group: use the data as the slope. The variance is a
+    #   place-holder, to be calculated later.
+    wh_single = np.where(seg_type == FIT_SINGLE)[0]
+    slope[wh_single] = data_2d[0, seg_pix[wh_single]]
+    variance[wh_single] = utils.LARGE_VARIANCE
+
+    # Segments having exactly 2 groups
+    wh_double = np.where(seg_type == FIT_DOUBLE)[0]
+    if len(wh_double) > 0:
+        pix = seg_pix[wh_double]
+        second_read = seg_start[wh_double] + 1
+        data0 = data_2d[second_read - 1, pix]
+        data1 = data_2d[second_read, pix]
+        rn = rn_1d[pix]
+
+        slope[wh_double] = data1 - data0
+        intercept[wh_double] = data1 * (1. - second_read) + \
+            data0 * second_read  # by geometry
+        variance[wh_double] = 2.0 * rn * rn
+        sig_slope[wh_double] = np.sqrt(2) * rn
+        sig_intercept[wh_double] = np.sqrt(2) * rn
+
+    # Segments having >2 groups, fit with optimal weighting
+    wh_opt = np.where(seg_type == FIT_OPTIMAL)[0]
+    if len(wh_opt) > 0:
+        (slope[wh_opt], intercept[wh_opt], variance[wh_opt],
+         sig_intercept[wh_opt], sig_slope[wh_opt]) = \
+            fit_optimal(data_2d, rn_1d, gain_1d, seg_pix[wh_opt],
+                        seg_start[wh_opt], seg_npts[wh_opt], precision)
+
+    return slope, intercept, variance, sig_intercept, sig_slope
+
+
+def fit_optimal(data_2d, rn_1d, gain_1d, seg_pix, seg_start, seg_npts,
+                precision='float64'):
+    """
+    Fit segments having >2 groups using optimal weighting, following the
+    formulation by Fixsen (Fixsen et al, PASP, 112, 1350) as implemented in
+    ramp_fit.calc_opt_sums() and ramp_fit.calc_opt_fit(). The weighted sums
+    for all segments are computed at once over an array of [group within
+    segment, segment].
+
+    Parameters
+    ----------
+    data_2d : float, 2D array
+        data values [group, pixel] for the data section
+
+    rn_1d : float, 1D array
+        read noise values for all pixels in data section
+
+    gain_1d : float, 1D array
+        gain values for all pixels in data section
+
+    seg_pix : int, 1D array
+        pixel index of each segment
+
+    seg_start : int, 1D array
+        first group of each segment
+
+    seg_npts : int, 1D array
+        number of groups in each segment
+
+    precision : string
+        precision of the sums over groups; 'float64' or 'float32'
+
+    Returns
+    -------
+    slope, intercept, variance, sig_intercept, sig_slope : float, 1D arrays
+        fit results for each segment
+    """
+    nreads = data_2d.shape[0]
+    seg_last = seg_start + seg_npts - 1
+
+    # The number of groups used to center the weights is counted as in
+    #   calc_opt_sums(), from the nonzero values of the masked data: groups in
+    #   the segment whose data is nonzero, and NaN groups anywhere in the ramp.
+    is_nan = np.isnan(data_2d)
+    nz_cum = np.zeros((nreads + 1, data_2d.shape[1]), dtype=np.int32)
+    np.cumsum(data_2d != 0., axis=0, out=nz_cum[1:])
+    nan_cum = np.zeros_like(nz_cum)
+    np.cumsum(is_nan, axis=0, out=nan_cum[1:])
+    nz_in_seg = nz_cum[seg_last + 1, seg_pix] - nz_cum[seg_start, seg_pix]
+    nan_in_seg = nan_cum[seg_last + 1, seg_pix] - nan_cum[seg_start, seg_pix]
+    num_nz = nz_in_seg + nan_cum[-1, seg_pix] - nan_in_seg
+
+    # SNR of each segment, from the difference between its final and initial
+    #   groups, the readnoise, and the gain
+    data_diff = data_2d[seg_last, seg_pix] - data_2d[seg_start, seg_pix]
+    rn = rn_1d[seg_pix]
+    rn_2 = rn * rn
+    gain = gain_1d[seg_pix]
+
+    snr = np.zeros_like(data_diff)
+    sqrt_arg = rn_2 + data_diff * gain
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "invalid value.*", RuntimeWarning)
+        wh_pos = np.where((sqrt_arg >= 0.) & (gain != 0.))
+    sigma = np.sqrt(sqrt_arg[wh_pos]) / gain[wh_pos]
+    snr[wh_pos] = data_diff[wh_pos] / sigma
+    snr[np.isnan(snr)] = 0.0
+    snr[snr < 0.] = 0.0
+
+    pow_index = utils.calc_power_index(snr)
+
+    # Optimal weights for each group of each segment, from the cached table
+    #   of weights scaled by the inverse read noise^2
+    wt_table = utils.opt_weight_table(nreads)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "divide by zero.*", RuntimeWarning)
+        warnings.filterwarnings("ignore", "invalid value.*", RuntimeWarning)
+        invrdns2 = 1. / rn_2
+        wt = (wt_table[pow_index, num_nz, :].T *
+              invrdns2).astype(np.float32)
+    wt[~np.isfinite(wt)] = 0.
+    k_rd = np.arange(nreads)[:, np.newaxis]
+    wt[k_rd >= seg_npts] = 0.
+
+    # Values for each group of each segment; NaN data is not used
+    groups = np.minimum(seg_start + k_rd, nreads - 1)
+    yvalues = data_2d[groups, seg_pix]
+    yvalues[np.isnan(yvalues)] = 0.
+
+    if precision == 'float32':
+        # Single precision products, with compensated sums over groups; the
+        #   fit is then calculated from the sums in double precision
+        xvalues = groups.astype(np.float32)
+        def sum_wtd(values):
+            return utils.sum_groups(values, precision).astype(np.float64)
+
+        nreads_wtd = sum_wtd(wt)
+        sumx = sum_wtd(xvalues * wt)
+        sumxx = sum_wtd(xvalues**2 * wt)
+        sumy = sum_wtd(yvalues * wt)
+        sumxy = sum_wtd(xvalues * wt * yvalues)
+    else:
+        xvalues = groups.astype(np.float64)
+        nreads_wtd = wt.sum(axis=0, dtype=np.float64)
+        sumx = (xvalues * wt).sum(axis=0)
+        sumxx = (xvalues**2 * wt).sum(axis=0)
+        sumy = (yvalues * wt).sum(axis=0, dtype=np.float64)
+        sumxy = (xvalues * wt * yvalues).sum(axis=0)
+
+    denominator = nreads_wtd * sumxx - sumx**2
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "invalid value.*", RuntimeWarning)
+        warnings.filterwarnings("ignore", "divide by zero.*", RuntimeWarning)
+        slope = (nreads_wtd * sumxy - sumx * sumy) / denominator
+        intercept = (sumxx * sumy - sumx * sumxy) / denominator
+        sig_intercept = (sumxx / denominator)**0.5
+        sig_slope = (nreads_wtd / denominator)**0.5
+    variance = sig_slope**2.
+
+    return slope, intercept, variance, sig_intercept, sig_slope
@@ -1,7 +1,8 @@
 import pytest
 import numpy as np
 
-from jwst.ramp_fitting.ramp_fit import ramp_fit
+from jwst.ramp_fitting.ramp_fit import ramp_fit, calc_power, calc_nrows
+from jwst.ramp_fitting import utils
 from jwst.datamodels import dqflags
 from jwst.datamodels import RampModel
 from jwst.datamodels import GainModel, ReadnoiseModel
@@ -520,6 +521,305 @@ def test_miri_first_last():
     np.testing.assert_allclose( new_mod.data, 10./3., rtol=1E-5)
 
 
+@pytest.mark.parametrize("save_opt", [False, True])
+def test_multiprocessing_matches_single(save_opt, monkeypatch):
+    """ Test that fitting row slices in separate processes gives the same
+        results as fitting the whole image in a single process.
+    """
+    (ngroups, nints, nrows, ncols, deltatime) = (8, 2, 7, 5, 10.)
+    rng = np.random.RandomState(42)
+    ramps = (np.arange(ngroups)[np.newaxis, :, np.newaxis, np.newaxis] *
+             rng.uniform(5., 50., size=(nints, 1, nrows, ncols)) +
+             rng.normal(0., 2., size=(nints, ngroups, nrows, ncols)))
+
+    # Cosmic rays in a few ramps, one ramp with two, and saturation
+    jumps = np.zeros((nints, ngroups, nrows, ncols), dtype=np.uint8)
+    jumps[0, 3, 1, 2] = dqflags.group['JUMP_DET']
+    jumps[1, 5, 4, 0] = dqflags.group['JUMP_DET']
+    jumps[1, 2, 6, 4] = dqflags.group['JUMP_DET']
+    jumps[1, 6, 6, 4] = dqflags.group['JUMP_DET']
+    jumps[0, 6:, 3, 3] = dqflags.group['SATURATED']
+    ramps[jumps == dqflags.group['JUMP_DET']] += 500.
+
+    results = []
+    for max_cores in (None, 'all'):
+        model1, gdq, rnModel, pixdq, err, gain = setup_small_cube(ngroups,
+            nints, nrows, ncols, deltatime)
+        model1.data[...] = ramps
+        model1.groupdq[...] = jumps
+        monkeypatch.setattr("multiprocessing.cpu_count", lambda: 3)
+        results.append(ramp_fit(model1, 1024*30000., save_opt, rnModel, gain,
+                                'OLS', 'optimal', max_cores))
+
+    (single, single_int, single_opt, _), (multi, multi_int, multi_opt, _) = \
+        results
+
+    for attr in ('data', 'dq', 'err', 'var_poisson', 'var_rnoise'):
+        np.testing.assert_allclose(getattr(multi, attr), getattr(single, attr))
+        np.testing.assert_allclose(getattr(multi_int, attr),
+                                   getattr(single_int, attr))
+
+    if save_opt:
+        for attr in ('slope', 'sigslope', 'var_poisson', 'var_rnoise', 'yint',
+                     'sigyint', 'pedestal', 'weights', 'crmag'):
+            np.testing.assert_allclose(getattr(multi_opt, attr),
+                                       getattr(single_opt, attr))
+    else:
+        assert single_opt is None and multi_opt is None
+
+
+def test_gls_multiprocessing_matches_single(monkeypatch):
+    """ Test that fitting the data sections in separate processes with the
+        GLS algorithm gives the same results as fitting in a single process.
+    """
+    (ngroups, nints, nrows, ncols, deltatime) = (6, 2, 7, 5, 10.)
+    rng = np.random.RandomState(11)
+    ramps = (np.arange(ngroups)[np.newaxis, :, np.newaxis, np.newaxis] *
+             rng.uniform(5., 50., size=(nints, 1, nrows, ncols)) +
+             rng.normal(0., 2., size=(nints, ngroups, nrows, ncols)))
+
+    jumps = np.zeros((nints, ngroups, nrows, ncols), dtype=np.uint8)
+    jumps[0, 3, 1, 2] = dqflags.group['JUMP_DET']
+    jumps[1, 2, 6, 4] = dqflags.group['JUMP_DET']
+    jumps[1, 4, 6, 4] = dqflags.group['JUMP_DET']
+    ramps[jumps == dqflags.group['JUMP_DET']] += 500.
+
+    results = []
+    for max_cores in (None, 'all'):
+        model1, gdq, rnModel, pixdq, err, gain = setup_small_cube(ngroups,
+            nints, nrows, ncols, deltatime)
+        model1.data[...] = ramps
+        model1.groupdq[...] = jumps
+        monkeypatch.setattr("multiprocessing.cpu_count", lambda: 3)
+        # A small buffer, so the image is fit in several data sections
+        results.append(ramp_fit(model1, 2 * ngroups * ncols, True,
+                                rnModel, gain, 'GLS', 'optimal', max_cores))
+
+    (single, single_int, _, single_opt), (multi, multi_int, _, multi_opt) = \
+        results
+
+    for attr in ('data', 'dq', 'err'):
+        np.testing.assert_allclose(getattr(multi, attr), getattr(single, attr))
+        np.testing.assert_allclose(getattr(multi_int, attr),
+                                   getattr(single_int, attr))
+    for attr in ('yint', 'sigyint', 'pedestal', 'crmag', 'sigcrmag'):
+        np.testing.assert_allclose(getattr(multi_opt, attr),
+                                   getattr(single_opt, attr))
+
+
+@pytest.mark.parametrize("save_opt", [True, False])
+def test_batched_engine_matches_iterative(save_opt):
+    """ Test that fitting all segments at once gives the same results as
+        fitting the segments iteratively, for ramps having many cosmic rays,
+        2-group segments, saturation, and a single good 0th group.
+    """
+    (ngroups, nints, nrows, ncols, deltatime) = (10, 2, 6, 7, 10.)
+    rng = np.random.RandomState(7)
+    ramps = (np.arange(ngroups)[np.newaxis, :, np.newaxis, np.newaxis] *
+             rng.uniform(5., 50., size=(nints, 1, nrows, ncols)) +
+             rng.normal(0., 2., size=(nints, ngroups, nrows, ncols)))
+
+    jumps = np.zeros((nints, ngroups, nrows, ncols), dtype=np.uint8)
+    jumps[rng.uniform(size=jumps.shape) < 0.2] = dqflags.group['JUMP_DET']
+    ramps[jumps == dqflags.group['JUMP_DET']] += 500.
+    jumps[0, 4:, 2, 3] = dqflags.group['SATURATED']
+    jumps[1, 1:, 5, 6] = dqflags.group['SATURATED']
+    jumps[1, 9, 0, :] = dqflags.group['DO_NOT_USE']
+
+    results = []
+    for segment_engine in ('iterative', 'batched'):
+        model1, gdq, rnModel, pixdq, err, gain = setup_small_cube(ngroups,
+            nints, nrows, ncols, deltatime)
+        model1.meta.instrument.name = 'NIRCAM'
+        model1.data[...] = ramps
+        model1.groupdq[...] = jumps
+        results.append(ramp_fit(model1, 1024*30000., save_opt, rnModel, gain,
+                                'OLS', 'optimal', None, segment_engine))
+
+    (iter_mod, iter_int, iter_opt, _), (batch_mod, batch_int, batch_opt, _) = \
+        results
+
+    for attr in ('data', 'dq', 'err', 'var_poisson', 'var_rnoise'):
+        np.testing.assert_allclose(getattr(batch_mod, attr),
+                                   getattr(iter_mod, attr), rtol=1e-5,
+                                   atol=1e-4)
+        np.testing.assert_allclose(getattr(batch_int, attr),
+                                   getattr(iter_int, attr), rtol=1e-5,
+                                   atol=1e-4)
+
+    if save_opt:
+        for attr in ('slope', 'sigslope', 'var_poisson', 'var_rnoise',
+                     'sigyint', 'weights', 'crmag'):
+            np.testing.assert_allclose(getattr(batch_opt, attr),
+                                       getattr(iter_opt, attr), rtol=1e-5,
+                                       atol=1e-4)
+        # The intercepts are differences of large weighted sums
+        for attr in ('yint', 'pedestal'):
+            np.testing.assert_allclose(getattr(batch_opt, attr),
+                                       getattr(iter_opt, attr), atol=1e-2)
+    else:
+        assert iter_opt is None and batch_opt is None
+
+
+@pytest.mark.parametrize("int_block_size", [1, 2, 4])
+def test_int_blocks_match_all_integrations(int_block_size):
+    """ Test that fitting blocks of integrations in turn gives the same
+        results as fitting all integrations at once.
+    """
+    (ngroups, nints, nrows, ncols, deltatime) = (6, 5, 4, 3, 10.)
+    rng = np.random.RandomState(3)
+    ramps = (np.arange(ngroups)[np.newaxis, :, np.newaxis, np.newaxis] *
+             rng.uniform(5., 50., size=(nints, 1, nrows, ncols)) +
+             rng.normal(0., 2., size=(nints, ngroups, nrows, ncols)))
+
+    jumps = np.zeros((nints, ngroups, nrows, ncols), dtype=np.uint8)
+    jumps[0, 3, 1, 1] = dqflags.group['JUMP_DET']
+    jumps[3, 2, 3, 2] = dqflags.group['JUMP_DET']
+    jumps[2, 4:, 2, 2] = dqflags.group['SATURATED']
+    jumps[4, :, 0, 0] = dqflags.group['SATURATED']
+    ramps[jumps == dqflags.group['JUMP_DET']] += 500.
+
+    results = []
+    for block_size in (None, int_block_size):
+        model1, gdq, rnModel, pixdq, err, gain = setup_small_cube(ngroups,
+            nints, nrows, ncols, deltatime)
+        model1.data[...] = ramps
+        model1.groupdq[...] = jumps
+        results.append(ramp_fit(model1, 1024*30000., False, rnModel, gain,
+                                'OLS', 'optimal', None, 'iterative',
+                                block_size))
+
+    (all_mod, all_int, _, _), (block_mod, block_int, block_opt, _) = results
+
+    assert block_opt is None
+    for attr in ('data', 'dq', 'err', 'var_poisson', 'var_rnoise'):
+        np.testing.assert_allclose(getattr(block_mod, attr),
+                                   getattr(all_mod, attr), rtol=1e-6)
+        np.testing.assert_allclose(getattr(block_int, attr),
+                                   getattr(all_int, attr), rtol=1e-6)
+
+
+def test_opt_weight_table():
+    """ Test that the cached table of optimal weights matches the weights
+        computed directly, and is reused.
+    """
+    nreads = 7
+    table = utils.opt_weight_table(nreads)
+    assert table.shape == (len(utils.POWER_WEIGHTS), nreads + 1, nreads)
+    assert utils.opt_weight_table(nreads) is table
+
+    snr = np.array([0., 5., 7., 15., 30., 75., 150.])
+    pow_index = utils.calc_power_index(snr)
+    np.testing.assert_array_equal(utils.POWER_WEIGHTS[pow_index],
+                                  calc_power(snr))
+
+    num_nz = 5
+    nrd_prime = (num_nz - 1) / 2.
+    for ii, power in zip(pow_index, calc_power(snr)):
+        expected = np.abs((np.abs(np.arange(nreads) - nrd_prime) /
+                           nrd_prime) ** power)
+        np.testing.assert_allclose(table[ii, num_nz], expected)
+
+
+@pytest.mark.parametrize("segment_engine", ['iterative', 'batched'])
+def test_float32_precision_matches_float64(segment_engine):
+    """ Test that fitting with single precision sums gives results close to
+        those of fitting with double precision sums, for long ramps having
+        a large pedestal.
+    """
+    (ngroups, nints, nrows, ncols, deltatime) = (60, 1, 5, 6, 10.)
+    rng = np.random.RandomState(11)
+    ramps = (rng.uniform(1.e4, 3.e4, size=(nints, 1, nrows, ncols)) +
+             np.arange(ngroups)[np.newaxis, :, np.newaxis, np.newaxis] *
+             rng.uniform(1., 500., size=(nints, 1, nrows, ncols)) +
+             rng.normal(0., 5., size=(nints, ngroups, nrows, ncols)))
+
+    jumps = np.zeros((nints, ngroups, nrows, ncols), dtype=np.uint8)
+    jumps[0, 20, 1, 2] = dqflags.group['JUMP_DET']
+    jumps[0, 40:, 3, 4] = dqflags.group['SATURATED']
+    ramps[jumps == dqflags.group['JUMP_DET']] += 1000.
+
+    results = []
+    for precision in ('float64', 'float32'):
+        model1, gdq, rnModel, pixdq, err, gain = setup_small_cube(ngroups,
+            nints, nrows, ncols, deltatime)
+        model1.data[...] = ramps
+        model1.groupdq[...] = jumps
+        results.append(ramp_fit(model1, 1024*30000., False, rnModel, gain,
+                                'OLS', 'optimal', None, segment_engine,
+                                None, precision))
+
+    (mod64, _, _, _), (mod32, _, _, _) = results
+
+    np.testing.assert_array_equal(mod32.dq, mod64.dq)
+    for attr in ('data', 'err', 'var_poisson', 'var_rnoise'):
+        np.testing.assert_allclose(getattr(mod32, attr),
+                                   getattr(mod64, attr), rtol=1e-4)
+
+
+def test_auto_buffsize(monkeypatch):
+    """ Test that the automatically chosen data sections fit the memory used
+        in fitting them in the cache, limited by the available memory, and
+        give the same results as a specified section size.
+    """
+    (ngroups, nints, nrows, ncols, deltatime) = (10, 1, 20, 8, 10.)
+    model1, gdq, rnModel, pixdq, err, gain = setup_small_cube(ngroups,
+        nints, nrows, ncols, deltatime)
+    ramps = (np.arange(ngroups)[:, np.newaxis, np.newaxis] *
+             np.arange(1., nrows * ncols + 1.).reshape(nrows, ncols))
+    cubeshape = (ngroups, nrows, ncols)
+    row_bytes = utils.OLS_BYTES_PER_VALUE * ngroups * ncols
+
+    monkeypatch.setattr(utils, 'get_cache_size', lambda: 4 * row_bytes)
+    monkeypatch.setattr(utils, 'get_available_memory', lambda: None)
+    buffsize = utils.calc_auto_buffsize(model1, 'OLS', 1)
+    assert calc_nrows(model1, buffsize, cubeshape, ngroups) == 4
+    buffsize = utils.calc_auto_buffsize(model1, 'OLS', 2)
+    assert calc_nrows(model1, buffsize, cubeshape, ngroups) == 2
+
+    # The sections are limited by the available memory
+    monkeypatch.setattr(utils, 'get_available_memory',
+                        lambda: int(3 * row_bytes / utils.MEMORY_FRACTION))
+    buffsize = utils.calc_auto_buffsize(model1, 'OLS', 1)
+    assert calc_nrows(model1, buffsize, cubeshape, ngroups) == 3
+
+    # A GLS fit uses more memory per group
+    buffsize = utils.calc_auto_buffsize(model1, 'GLS', 1)
+    assert calc_nrows(model1, buffsize, cubeshape, ngroups) == 1
+
+    results = []
+    for buffsize in (None, 1024*30000.):
+        model1, gdq, rnModel, pixdq, err, gain = setup_small_cube(ngroups,
+            nints, nrows, ncols, deltatime)
+        model1.data[...] = ramps
+        results.append(ramp_fit(model1, buffsize, False, rnModel, gain, 'OLS',
+                                'optimal', None)[0])
+
+    auto_mod, fixed_mod = results
+    for attr in ('data', 'dq', 'err', 'var_poisson', 'var_rnoise'):
+        np.testing.assert_array_equal(getattr(auto_mod, attr),
+                                      getattr(fixed_mod, attr))
+
+
+def test_sum_groups_compensated():
+    """ Test that the compensated single precision sum over groups is more
+        accurate than the plain single precision sum.
+    """
+    rng = np.random.RandomState(5)
+    values = rng.uniform(1.e4, 1.e5, size=(500, 20)).astype(np.float32)
+    expected = values.astype(np.float64).sum(axis=0)
+
+    naive = np.add.accumulate(values, axis=0, dtype=np.float32)[-1]
+    compensated = utils.sum_groups(values, 'float32')
+
+    assert compensated.dtype == np.float32
+    assert (np.abs(compensated - expected).max() <
+            np.abs(naive - expected).max())
+    np.testing.assert_allclose(compensated, expected, rtol=1e-7)
+    np.testing.assert_array_equal(utils.sum_groups(values),
+                                  values.sum(axis=0))
+
+
 def setup_small_cube(ngroups=10, nints=1, nrows=2, ncols=2, deltatime=10.,
         gain=1., readnoise =10.):
     '''Create input MIRI datacube having the specified dimensions
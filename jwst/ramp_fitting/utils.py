@@ -1,7 +1,10 @@
 #! /usr/bin/env python
 #
 # utils.py: utility functions
+import functools
+import glob
 import logging
+import os
 import warnings
 import numpy as np
 
@@ -15,6 +18,23 @@ log.setLevel(logging.DEBUG)
 # Replace zero or negative variances with this:
 LARGE_VARIANCE = 1.e8
 
+# Weighting exponents for optimal weighting, for SNR values greater than
+#   successive elements of SNR_THRESHOLDS (Fixsen et al, PASP, 112, 1350)
+SNR_THRESHOLDS = np.array([5., 10., 20., 50., 100.])
+POWER_WEIGHTS = np.array([0., 0.4, 1., 3., 6., 10.])
+
+# Estimated memory used in fitting a data section, in bytes per group per
+#   pixel. For the GLS algorithm this also grows with the number of groups,
+#   through the covariance matrix of each ramp.
+OLS_BYTES_PER_VALUE = 48
+GLS_BYTES_PER_VALUE = 40
+GLS_BYTES_PER_VALUE_PER_GROUP = 16
+
+# Cache size to assume if it cannot be determined, and the fraction of the
+#   available memory that the data sections fit at the same time may use
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024
+MEMORY_FRACTION = 0.25
+
 
 class OptRes:
     """
@@ -231,6 +251,7 @@ class OptRes:
 
         # Loop over integrations and groups: for those pix having a cr, add
         #    the magnitude to the compressed array
+        max_num_crs = 0
         for ii_int in range(0, n_int):
             cr_mag_int = self.cr_mag_seg[ii_int, :, :, :]
             cr_int_has_cr = np.where(cr_mag_int.sum(axis=0) != 0)
@@ -247,7 +268,8 @@ class OptRes:
                         cr_com[ii_int,end_cr[y,x],y,x] = cr_mag_int[k_rd,y,x]
                         end_cr[y, x] += 1
 
-        max_num_crs = end_cr.max()
+            max_num_crs = max(max_num_crs, end_cr.max())
+
         self.cr_mag_seg = cr_com [:,:max_num_crs,:,:]
 
 
@@ -343,6 +365,201 @@ class OptRes:
         print((self.cr_mag_seg))
 
 
+@functools.lru_cache(maxsize=1)
+def get_cache_size():
+    """
+    Get the size of the largest (last level) CPU data cache.
+
+    Returns
+    -------
+    cache_size : int or None
+        cache size in bytes, or None if it cannot be determined
+    """
+    sizes = []
+    for cache_dir in glob.glob('/sys/devices/system/cpu/cpu0/cache/index*'):
+        try:
+            with open(os.path.join(cache_dir, 'type')) as fd:
+                cache_type = fd.read().strip()
+            with open(os.path.join(cache_dir, 'size')) as fd:
+                size = fd.read().strip()
+        except OSError:
+            continue
+        if cache_type == 'Instruction' or not size:
+            continue
+        scale = {'K': 1024, 'M': 1024**2, 'G': 1024**3}.get(size[-1].upper())
+        try:
+            sizes.append(int(size[:-1]) * scale if scale else int(size))
+        except ValueError:
+            continue
+
+    for name in ('SC_LEVEL3_CACHE_SIZE', 'SC_LEVEL2_CACHE_SIZE'):
+        try:
+            sizes.append(os.sysconf(name))
+        except (ValueError, OSError):
+            pass
+
+    sizes = [size for size in sizes if size > 0]
+
+    return max(sizes) if sizes else None
+
+
+def get_available_memory():
+    """
+    Get the amount of memory available for new allocations.
+
+    Returns
+    -------
+    avail_mem : int or None
+        available memory in bytes, or None if it cannot be determined
+    """
+    try:
+        with open('/proc/meminfo') as fd:
+            for line in fd:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError):
+        return None
+
+
+def calc_auto_buffsize(model, algorithm, number_slices):
+    """
+    Choose the size of the data sections to fit, so that the memory used in
+    fitting a section, including the auxiliary arrays allocated for it,
+    fits in the last level CPU cache shared by the fitting processes. The
+    sections are also limited to a fraction of the available memory.
+
+    Parameters
+    ----------
+    model : data model
+        input data model, assumed to be of type RampModel
+
+    algorithm : string
+        'OLS' or 'GLS'
+
+    number_slices : int
+        number of processes fitting data sections at the same time
+
+    Returns
+    -------
+    buffsize : int
+        size of the science data in each data section, in bytes
+    """
+    nreads = model.data.shape[1]
+    if algorithm.upper() == 'GLS':
+        bytes_per_value = (GLS_BYTES_PER_VALUE +
+                           GLS_BYTES_PER_VALUE_PER_GROUP * nreads)
+    else:
+        bytes_per_value = OLS_BYTES_PER_VALUE
+
+    cache_size = get_cache_size() or DEFAULT_CACHE_SIZE
+    sect_bytes = cache_size // number_slices
+
+    avail_mem = get_available_memory()
+    if avail_mem is not None:
+        sect_bytes = min(sect_bytes,
+                         int(avail_mem * MEMORY_FRACTION) // number_slices)
+
+    buffsize = max(sect_bytes // bytes_per_value, 1) * model.data.itemsize
+    log.debug('Cache size: %s, available memory: %s; using data sections '
+              'of %d bytes', cache_size, avail_mem, buffsize)
+
+    return buffsize
+
+
+def calc_power_index(snr):
+    """
+    Get the index into POWER_WEIGHTS of the optimal weighting exponent for
+    each SNR value; see ramp_fit.calc_power().
+
+    Parameters
+    ----------
+    snr : float, 1D array
+        signal-to-noise for the ramp segments
+
+    Returns
+    -------
+    pow_index : int, 1D array
+        index of the weighting exponent
+    """
+    return np.searchsorted(SNR_THRESHOLDS, snr.ravel(), side='left')
+
+
+@functools.lru_cache(maxsize=4)
+def opt_weight_table(nreads):
+    """
+    Compute the table of optimal weights, excluding the inverse readnoise
+    squared factor, for ramps having nreads groups. The weight of group k of
+    a segment having num_nz nonzero groups and weighting exponent index i is
+    table[i, num_nz, k]. These depend only on nreads, so the table is cached
+    and reused for all data sections, integrations and exposures having the
+    same number of groups. Undefined weights are set to 0.
+
+    Parameters
+    ----------
+    nreads : int
+        number of groups in the ramps
+
+    Returns
+    -------
+    table : float, 3D array
+        read-only array of weights [exponent index, num_nz, group]
+    """
+    nrd_prime = (np.arange(nreads + 1) - 1) / 2.
+    k_rd = np.arange(nreads)
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", ".*divide by zero.*", RuntimeWarning)
+        warnings.filterwarnings("ignore", "invalid value.*", RuntimeWarning)
+        table = np.abs((np.abs(k_rd - nrd_prime[:, np.newaxis]) /
+                        nrd_prime[:, np.newaxis]) **
+                       POWER_WEIGHTS[:, np.newaxis, np.newaxis])
+    table[~np.isfinite(table)] = 0.
+    table.flags.writeable = False
+
+    return table
+
+
+def sum_groups(arr, precision='float64'):
+    """
+    Sum an array over its first (group) axis. For 'float64' precision this is
+    a plain numpy sum in the precision of the array. For 'float32' precision
+    the array is summed in single precision using Kahan compensated summation,
+    so that the rounding error of the sums does not grow with the number of
+    groups.
+
+    Parameters
+    ----------
+    arr : float, 2D array
+        values to sum [group, pixel]
+
+    precision : string
+        'float64' or 'float32'
+
+    Returns
+    -------
+    total : float, 1D array
+        sum over groups for each pixel
+    """
+    if precision != 'float32':
+        return arr.sum(axis=0)
+
+    arr = arr.astype(np.float32, copy=False)
+    total = np.zeros(arr.shape[1:], dtype=np.float32)
+    comp = np.zeros_like(total)   # running compensation for lost low bits
+    for row in arr:
+        y = row - comp
+        t = total + y
+        comp = (t - total) - y
+        total = t
+
+    return total
+
+
 def alloc_arrays_1(n_int, imshape):
     """
     Allocate arrays for integration-specific results and segment-specific
@@ -1,13 +1,17 @@
 import logging
+import multiprocessing
 
 import numpy as np
 from scipy.ndimage.filters import convolve1d
 
+from ..lib.parallel_utils import compute_slices
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 def correct_model(input_model, irs2_model,
-                  scipix_n_default=16, refpix_r_default=4, pad=8):
+                  scipix_n_default=16, refpix_r_default=4, pad=8,
+                  in_place=False, max_cores=None):
     """Process IRS2 data.
 
     Parameters
@@ -31,6 +35,14 @@ def correct_model(input_model, irs2_model,
         of each row (new-row overhead).  The padding is needed to preserve
         the phase of temporally periodic signals.
 
+    in_place: bool
+        If True, the input model is corrected in place rather than copied.
+
+    max_cores: string or None
+        Fraction of the available cores to use for correcting the groups
+        and integrations in parallel; one of 'quarter', 'half', 'all', or
+        None to use a single process.
+
     Returns
     -------
     output_model: ramp model
@@ -68,7 +80,7 @@ def correct_model(input_model, irs2_model,
     This agrees with the above value of tframe (14.5889 s) if NFOH = 714.
     """
 
-    output_model = input_model.copy()
+    output_model = input_model if in_place else input_model.copy()
     output_model.meta.cal_step.refpix = 'not specified yet'
 
     # Get reference data.
@@ -150,15 +162,20 @@ def correct_model(input_model, irs2_model,
     else:
         log.warning("DQ extension not found in reference file")
 
-    for integ in range(n_int):
-        # The input data have a length of 3200 for the last axis (X), while
-        # the output data have an X axis with length 2048, the same as the
-        # Y axis.  This is the reason for the slice `nx-ny:` that is used
-        # below.  The last axis of output_model.data should be 2048.
-        data0 = data[integ, :, :, :]
-        data0 = subtract_reference(data0, alpha, beta, irs2_mask,
-                                   scipix_n, refpix_r, pad)
-        data[integ, :, :, nx - ny:] = data0
+    # The input data have a length of 3200 for the last axis (X), while
+    # the output data have an X axis with length 2048, the same as the
+    # Y axis.  This is the reason for the slice `nx-ny:` that is used
+    # below.  The last axis of output_model.data should be 2048.
+    number_slices = compute_slices(max_cores)
+    if number_slices > 1:
+        subtract_reference_parallel(data, alpha, beta, irs2_mask,
+                                    scipix_n, refpix_r, pad, number_slices)
+    else:
+        for integ in range(n_int):
+            data0 = data[integ, :, :, :]
+            data0 = subtract_reference(data0, alpha, beta, irs2_mask,
+                                       scipix_n, refpix_r, pad)
+            data[integ, :, :, nx - ny:] = data0
     temp_data = data[:, :, :, nx - ny:]
     del data
     # Convert back to sky orientation.
@@ -175,6 +192,80 @@ def correct_model(input_model, irs2_model,
     return output_model
 
 
+def subtract_reference_parallel(data, alpha, beta, irs2_mask,
+                                scipix_n, refpix_r, pad, number_slices):
+    """Subtract reference output and pixels using a pool of processes.
+
+    The average over the ramp is subtracted from each integration in this
+    process.  The groups of all the integrations are then divided into
+    slices, which are corrected by `subtract_reference_groups` in a pool
+    of `number_slices` processes.  The results are copied back into `data`
+    and the average over the ramp is added back, giving the same values as
+    `subtract_reference` applied to each integration in turn.
+
+    Parameters
+    ----------
+    data: ndarray
+        The science data for all integrations, in detector orientation,
+        with shape (nints, ngroups, ny, 3200).  This is modified in place;
+        on return, the corrected data are in ``data[..., nx-ny:]``.
+
+    alpha, beta, irs2_mask, scipix_n, refpix_r, pad:
+        See `subtract_reference`.
+
+    number_slices: int
+        The number of processes to create.
+    """
+
+    n_int, ngroups, ny, nx = data.shape
+
+    # Divide the groups of each integration so that there are about as
+    # many slices as processes.
+    n_group_slices = min(-(-number_slices // n_int), ngroups)
+    bounds = np.linspace(0, ngroups, n_group_slices + 1).astype(np.intp)
+
+    offsets = []
+    slices = []
+    for integ in range(n_int):
+        b_offset = data[integ].sum(axis=0, dtype=np.float64) / float(ngroups)
+        data[integ] -= b_offset
+        offsets.append(b_offset)
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            slices.append((integ, first, last))
+
+    log.info("Correcting %d slices of the groups with %d processes"
+             % (len(slices), number_slices))
+    # The arrays that are the same for all slices are sent to each process
+    # once, when it starts, rather than with every slice
+    with multiprocessing.Pool(processes=number_slices,
+                              initializer=_init_worker,
+                              initargs=(alpha, beta, irs2_mask,
+                                        scipix_n, refpix_r, pad)) as pool:
+        results = pool.map(_subtract_reference_slice,
+                           [data[integ, first:last]
+                            for integ, first, last in slices])
+
+    for (integ, first, last), data0 in zip(slices, results):
+        data0 += offsets[integ][..., irs2_mask]
+        data[integ, first:last, :, nx - ny:] = data0
+
+
+# Arguments of subtract_reference_groups that are the same for all slices,
+# set in each process of the pool by _init_worker
+_worker_args = ()
+
+
+def _init_worker(*args):
+    """Keep the arguments shared by all slices in a pool process"""
+    global _worker_args
+    _worker_args = args
+
+
+def _subtract_reference_slice(data):
+    """Correct a slice of the groups in a pool process"""
+    return subtract_reference_groups(data, *_worker_args)
+
+
 def float_to_complex(data):
     """Convert real and imaginary parts to complex"""
 
@@ -447,6 +538,50 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
         nx = ny = 2048.
     """
 
+    ngroups = data0.shape[0]
+
+    # Subtract the average over the ramp for each pixel.
+    b_offset = data0.sum(axis=0, dtype=np.float64) / float(ngroups)
+    data0 -= b_offset
+    # Save b_offset, and add it back in at the end.
+
+    data0 = subtract_reference_groups(data0, alpha, beta, irs2_mask,
+                                      scipix_n, refpix_r, pad)
+
+    # b_offset is the average over the ramp that we subtracted near the
+    # beginning; add it back in.
+    # Shape of b_offset is (2048, 3200), data0 is (ngroups, 2048, 2048).
+    data0 += b_offset[..., irs2_mask]
+
+    return data0
+
+
+def subtract_reference_groups(data0, alpha, beta, irs2_mask,
+                              scipix_n, refpix_r, pad):
+    """Subtract reference output and pixels for a set of groups.
+
+    This does the work of `subtract_reference` after the average over the
+    ramp has been subtracted from `data0`.  From that point on, each group
+    is corrected independently of the others, so `data0` may contain any
+    subset of the groups of an integration.
+
+    Parameters
+    ----------
+    data0: ramp data
+        The science data for some or all of the groups of the current
+        integration, with the average over the ramp already subtracted.
+        The shape is expected to be (ngroups, ny, 3200).
+
+    alpha, beta, irs2_mask, scipix_n, refpix_r, pad:
+        See `subtract_reference`.
+
+    Returns
+    -------
+    data0: ramp data
+        The corrected groups, with shape (ngroups, ny, nx), where
+        nx = ny = 2048.  The average over the ramp has not been added back.
+    """
+
     shape = data0.shape
     ngroups = shape[0]
     ny = shape[1]
@@ -478,11 +613,6 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
     href1 = ind_ref + (scipix_n + 2) * (ind_ref // refpix_r) + \
             scipix_n // 2 + 1
 
-    # Subtract the average over the ramp for each pixel.
-    b_offset = data0.sum(axis=0, dtype=np.float64) / float(ngroups)
-    data0 -= b_offset
-    # Save b_offset, and add it back in at the end.
-
     # IDL:  data0 = reform(data0, s[1]/5, 5, s[2], s[3], /over)
     #                             nx/5,   5, ny,   ngroups    (IDL)
     data0 = data0.reshape((ngroups, ny, 5, nx // 5))
@@ -742,11 +872,6 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
     # IDL:  data0 = reform(data0[*, 1:*, *, *], s[2], s[2], s[3], /over)
     # Note:  ny x ny, not ny x nx.
     data0 = data0[:, :, 1:, :].reshape((ngroups, ny, ny))
-    # b_offset is the average over the ramp that we subtracted near the
-    # beginning; add it back in.
-    # Shape of b_offset is (2048, 3200), data0 is (ngroups, 2048, 2048).
-    data0 += b_offset[..., irs2_mask]
-
     return data0
 
 
@@ -664,14 +664,37 @@ class NIRDataset(Dataset):
         augmented_data = self.create_reflected(data, smoothing_length)
         augmented_dq = self.create_reflected(dq, smoothing_length)
         nrows, ncols = data.shape
+        window_size = smoothing_length * ncols
+        #
+        # Set the pixels flagged as DO_NOT_USE to NaN, so that they are sorted
+        # to the end of each window, and count the good pixels in each window
+        # from the cumulative number of good pixels in the rows
+        bad = np.bitwise_and(augmented_dq, dqflags.pixel['DO_NOT_USE']) != 0
+        augmented_data[bad] = np.nan
+        goodcount = np.zeros(augmented_data.shape[0] + 1, dtype=np.intp)
+        np.cumsum(ncols - bad.sum(axis=1), out=goodcount[1:])
+        ngood = goodcount[smoothing_length:smoothing_length + nrows] - goodcount[:nrows]
+        #
+        # The box for each row, as rows of a strided view of the reflected
+        # data, sorted all at once
+        rowstride, colstride = augmented_data.strides
+        windows = np.lib.stride_tricks.as_strided(
+            augmented_data, shape=(nrows, smoothing_length, ncols),
+            strides=(rowstride, rowstride, colstride))
+        windows = np.sort(windows.reshape(nrows, window_size), axis=1)
+        #
+        # The median is the middle good value, or the mean of the two middle
+        # good values, in the same way as np.median
+        rows = np.arange(nrows)
+        lower = windows[rows, np.maximum(ngood - 1, 0) // 2]
+        upper = windows[rows, np.minimum(ngood // 2, window_size - 1)]
         result = np.zeros(nrows)
-        for i in range(nrows):
-            rowstart = i
-            rowstop = rowstart + smoothing_length
-            goodpixels = np.where(np.bitwise_and(augmented_dq[rowstart:rowstop],
-                                                 dqflags.pixel['DO_NOT_USE']) == 0)
-            window = augmented_data[rowstart:rowstop][goodpixels]
-            result[i] = np.median(window)
+        result[:] = (lower + upper) / 2
+        #
+        # As with np.median, windows with no good pixels, or with NaN in the
+        # good pixels, have a median of NaN
+        nvalid = window_size - np.isnan(windows).sum(axis=1)
+        result[(ngood == 0) | (nvalid < ngood)] = np.nan
         return result
 
     def calculate_side_ref_signal(self, group, colstart, colstop):
@@ -726,9 +749,7 @@ class NIRDataset(Dataset):
         """
 
         combined = 0.5 * (left + right)
-        sidegroup = np.zeros((2048, 2048))
-        for column in range(2048):
-            sidegroup[:, column] = combined
+        sidegroup = np.broadcast_to(combined[:, np.newaxis], (2048, 2048))
         return sidegroup
 
     def apply_side_correction(self, group, sidegroup):
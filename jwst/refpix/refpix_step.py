@@ -23,6 +23,7 @@ class RefPixStep(Step):
         side_smoothing_length = integer(default=11)
         side_gain = float(default=1.0)
         odd_even_rows = boolean(default=True)
+        maximum_cores = option('quarter', 'half', 'all', default=None) # max number of processes to create
     """
 
     reference_file_types = ['refpix']
@@ -40,14 +41,18 @@ class RefPixStep(Step):
                 if self.irs2_name == 'N/A':
                     self.log.warning('No refpix reference file found')
                     self.log.warning('RefPix step will be skipped')
-                    result = input_model.copy()
+                    result = input_model if self.in_place else input_model.copy()
                     result.meta.cal_step.refpix = 'SKIPPED'
                     input_model.close()
                     return result
 
+                if self.maximum_cores is not None:
+                    self.log.info('Maximum cores to use = %s',
+                                  self.maximum_cores)
                 irs2_model = datamodels.IRS2Model(self.irs2_name)
-                result = irs2_subtract_reference.correct_model(input_model,
-                                                               irs2_model)
+                result = irs2_subtract_reference.correct_model(
+                    input_model, irs2_model, in_place=self.in_place,
+                    max_cores=self.maximum_cores)
                 if result.meta.cal_step.refpix != 'SKIPPED':
                     result.meta.cal_step.refpix = 'COMPLETE'
                 irs2_model.close()
@@ -61,7 +66,10 @@ class RefPixStep(Step):
                               (self.side_smoothing_length,))
                 self.log.info('side_gain = %f' % (self.side_gain,))
                 self.log.info('odd_even_rows = %s' % (self.odd_even_rows,))
-                datamodel = input_model.copy()
+                if self.in_place:
+                    datamodel = input_model
+                else:
+                    datamodel = input_model.copy()
                 status = reference_pixels.correct_model(datamodel,
                                                         self.odd_even_columns,
                                                         self.use_side_ref_pixels,
@@ -0,0 +1,30 @@
+import numpy as np
+
+from ..irs2_subtract_reference import (make_irs2_mask, subtract_reference,
+                                       subtract_reference_parallel)
+
+
+class MockModel:
+    def __init__(self, shape):
+        self.pixeldq = np.zeros(shape, dtype=np.uint32)
+
+
+def test_subtract_reference_parallel():
+    """Correcting slices of the groups in a pool of processes gives the same
+    result as correcting each integration in turn"""
+    rng = np.random.RandomState(42)
+    nints, ngroups, ny, nx = 2, 2, 2048, 3200
+    data = rng.normal(100., 5., (nints, ngroups, ny, nx)).astype(np.float32)
+    alpha = (rng.normal(1., 0.01, (4, 712 * 2048)) + 0j).astype(np.complex64)
+    beta = (rng.normal(0., 0.01, (4, 712 * 2048)) + 0j).astype(np.complex64)
+    irs2_mask = make_irs2_mask(MockModel((ny, nx)), 16, 4)
+
+    expected = data.copy()
+    for integ in range(nints):
+        expected[integ, :, :, nx - ny:] = subtract_reference(
+            expected[integ], alpha, beta, irs2_mask, 16, 4, 8)
+
+    subtract_reference_parallel(data, alpha, beta, irs2_mask, 16, 4, 8, 3)
+
+    np.testing.assert_array_equal(data[..., nx - ny:],
+                                  expected[..., nx - ny:])
@@ -570,6 +570,35 @@ def test_do_top_bottom_correction_no_even_odd(setup_cube):
             decimal=1)
 
 
+@pytest.mark.parametrize('smoothing_length', [11, 12])
+def test_median_filter(setup_cube, smoothing_length):
+    '''Test the running median of the side reference pixels against the median
+    of the good pixels in the box around each row.'''
+
+    input_model = setup_cube('NIRCAM', 'NRCALONG', 1, 2048, 2048)
+    dataset = NIRDataset(input_model, True, True, smoothing_length, 1.0)
+
+    nrows = 100
+    rng = np.random.RandomState(5)
+    data = rng.normal(10., 3., (nrows, 4)).astype(np.float32)
+    dq = np.zeros((nrows, 4), dtype=np.uint32)
+    dq[rng.uniform(size=(nrows, 4)) < 0.2] = dqflags.pixel['DO_NOT_USE']
+    dq[40:60] = dqflags.pixel['DO_NOT_USE']
+    data[dq != 0] = 1.e5
+
+    result = dataset.median_filter(data, dq, smoothing_length)
+
+    augmented_data = dataset.create_reflected(data, smoothing_length)
+    augmented_dq = dataset.create_reflected(dq, smoothing_length)
+    for i in range(nrows):
+        window = augmented_data[i:i + smoothing_length]
+        good = augmented_dq[i:i + smoothing_length] == 0
+        if np.any(good):
+            assert result[i] == np.median(window[good])
+        else:
+            assert np.isnan(result[i])
+
+
 def make_rampmodel(ngroups, ysize, xsize):
     '''Make MIRI ramp model for testing'''
 
@@ -1,3 +1,5 @@
+import tempfile
+
 import numpy as np
 
 from drizzle import util
@@ -16,7 +18,8 @@ class GWCSDrizzle:
     """
     def __init__(self, product, outwcs=None, single=False,
                  wt_scl="exptime", pixfrac=1.0, kernel="square",
-                 fillval="INDEF"):
+                 fillval="INDEF", pixmap_cache=None, pixmap_stepsize=1,
+                 pixmap_tolerance=resample_utils.PIXMAP_TOLERANCE):
         """
         Create a new Drizzle output object and set the drizzle parameters.
 
@@ -55,6 +58,19 @@ class GWCSDrizzle:
         fillval : str, otional
             The value a pixel is set to in the output if the input image does
             not overlap it. The default value of INDEF does not set a value.
+
+        pixmap_cache : `~jwst.resample.pixmap_cache.PixmapCache`, optional
+            A cache of the pixel maps from input to output images.  If not
+            provided, the pixel maps are computed for each input image.
+
+        pixmap_stepsize : int, optional
+            If more than 1, the pixel maps are interpolated from the
+            transform of every ``pixmap_stepsize``-th input pixel in each
+            direction, unless that is off by more than ``pixmap_tolerance``
+            output pixels.  See `~jwst.resample.resample_utils.calc_gwcs_pixmap`.
+
+        pixmap_tolerance : float, optional
+            Maximum error, in output pixels, of interpolated pixel maps.
         """
 
         # Initialize the object fields
@@ -69,6 +85,9 @@ class GWCSDrizzle:
         self.kernel = kernel
         self.fillval = fillval
         self.pixfrac = pixfrac
+        self.pixmap_cache = pixmap_cache
+        self.pixmap_stepsize = pixmap_stepsize
+        self.pixmap_tolerance = pixmap_tolerance
 
         self.sciext = "SCI"
         self.whtext = "WHT"
@@ -202,7 +221,10 @@ class GWCSDrizzle:
                             pscale_ratio=pscale_ratio, uniqid=self.uniqid,
                             xmin=xmin, xmax=xmax, ymin=ymin, ymax=ymax,
                             pixfrac=self.pixfrac, kernel=self.kernel,
-                            fillval=self.fillval)
+                            fillval=self.fillval,
+                            pixmap_cache=self.pixmap_cache,
+                            pixmap_stepsize=self.pixmap_stepsize,
+                            pixmap_tolerance=self.pixmap_tolerance)
 
     def blot_image(self, blotwcs, interp='poly5', sinscl=1.0):
         """
@@ -258,12 +280,252 @@ class GWCSDrizzle:
         self.uniqid += 1
 
 
+class TiledDrizzle:
+    """
+    Combine images using the drizzle algorithm onto memory-mapped output
+    arrays, one output tile at a time
+    """
+    def __init__(self, product, shape, nimages, tile_size, directory=None,
+                 outwcs=None, pixfrac=1.0, kernel="square", fillval="INDEF",
+                 pixmap_cache=None, pixmap_stepsize=1,
+                 pixmap_tolerance=resample_utils.PIXMAP_TOLERANCE):
+        """
+        Create memory-mapped output arrays, and set them in the product.
+
+        Parameters
+        ----------
+
+        product : `~jwst.datamodels.ImageModel`
+            The output model.  Its data, weight and context arrays are
+            replaced by the memory-mapped arrays.
+
+        shape : tuple
+            The shape of the output arrays.
+
+        nimages : int
+            The number of images that will be added, which sets the number
+            of context planes.
+
+        tile_size : int
+            The number of rows and columns of each output tile.  Each image
+            is drizzled onto an in-memory copy of each tile that it overlaps.
+
+        directory : str, optional
+            The directory of the (unnamed) files to which the output arrays
+            are memory-mapped; by default, the system temporary directory.
+
+        outwcs : `gwcs.WCS`, optional
+            The world coordinate system of the resampled image.  If not
+            provided, the WCS is taken from product.
+
+        pixfrac, kernel, fillval, pixmap_cache, pixmap_stepsize, pixmap_tolerance
+            As for `GWCSDrizzle`.
+        """
+        self.outwcs = outwcs or product.meta.wcs
+        self.tile_size = tile_size
+        self.pixfrac = pixfrac
+        self.kernel = kernel
+        self.fillval = fillval
+        self.pixmap_cache = pixmap_cache
+        self.pixmap_stepsize = pixmap_stepsize
+        self.pixmap_tolerance = pixmap_tolerance
+        self.uniqid = 0
+
+        nplanes = (nimages - 1) // 32 + 1
+        self.outsci = _memmap_zeros(shape, np.float32, directory)
+        self.outwht = _memmap_zeros(shape, np.float32, directory)
+        self.outcon = _memmap_zeros((nplanes,) + shape, np.int32, directory)
+
+        # Drizzle sets the output pixels without any input to the fill value,
+        # even outside the tiles that are drizzled onto
+        try:
+            self.outsci[...] = float(fillval)
+        except (TypeError, ValueError):
+            # INDEF leaves them at zero
+            pass
+
+        product.data = self.outsci
+        product.wht = self.outwht
+        # Like GWCSDrizzle, only the first context plane is kept
+        product.con = self.outcon[0]
+
+    def add_image(self, insci, inwcs, inwht=None, expin=1.0, in_units="cps",
+                  pscale_ratio=1.0):
+        """
+        Combine an input image with the output drizzled image.
+
+        The pixel map of the input image is computed once, and the image is
+        drizzled onto each output tile that the pixel map overlaps.
+
+        Parameters
+        ----------
+
+        insci, inwcs, inwht, expin, in_units, pscale_ratio
+            As for `GWCSDrizzle.add_image`.
+        """
+        insci = insci.astype(np.float32)
+
+        if inwht is None:
+            inwht = np.ones(insci.shape, dtype=insci.dtype)
+        else:
+            inwht = inwht.astype(np.float32)
+
+        self.uniqid += 1
+
+        pixmap = resample_utils.calc_gwcs_pixmap(inwcs, self.outwcs,
+                                                 insci.shape,
+                                                 cache=self.pixmap_cache,
+                                                 stepsize=self.pixmap_stepsize,
+                                                 tolerance=self.pixmap_tolerance)
+
+        # Drizzle only keeps the input pixels that fall entirely within the
+        # output, so each tile is drizzled onto a copy of the output with a
+        # border wide enough for the input pixels that straddle its edges
+        spacing = pixel_spacing(pixmap)
+        border = int(np.ceil(spacing)) + 2
+        (ny, nx) = self.outsci.shape
+
+        for tile in self.overlapping_tiles(pixmap, spacing):
+            # Only the input pixels that fall on the tile or its border are
+            # drizzled, so that just their part of the pixel map is copied
+            inputs = self.input_section(pixmap, tile, border)
+            if inputs is None:
+                continue
+
+            ystart = max(tile[0].start - border, 0)
+            xstart = max(tile[1].start - border, 0)
+            window = (slice(ystart, min(tile[0].stop + border, ny)),
+                      slice(xstart, min(tile[1].stop + border, nx)))
+            outsci = np.ascontiguousarray(self.outsci[window])
+            outwht = np.ascontiguousarray(self.outwht[window])
+            outcon = np.ascontiguousarray(self.outcon[(slice(None),) + window])
+
+            dodrizzle(np.ascontiguousarray(insci[inputs]), inwcs,
+                      np.ascontiguousarray(inwht[inputs]), self.outwcs,
+                      outsci, outwht, outcon,
+                      expin, in_units, 1.0,
+                      pscale_ratio=pscale_ratio, uniqid=self.uniqid,
+                      pixfrac=self.pixfrac, kernel=self.kernel,
+                      fillval=self.fillval,
+                      pixmap=pixmap[inputs] - np.array([xstart, ystart]))
+
+            # Copy back only the tile itself
+            inner = (slice(tile[0].start - ystart, tile[0].stop - ystart),
+                     slice(tile[1].start - xstart, tile[1].stop - xstart))
+            self.outsci[tile] = outsci[inner]
+            self.outwht[tile] = outwht[inner]
+            self.outcon[(slice(None),) + tile] = outcon[(slice(None),) + inner]
+
+    @staticmethod
+    def input_section(pixmap, tile, border):
+        """
+        Return the slices of the input rows and columns that map onto an
+        output tile, extended by a border.
+
+        Parameters
+        ----------
+
+        pixmap : 3d array
+            The pixel map of an input image, as returned by
+            `~jwst.resample.resample_utils.calc_gwcs_pixmap`.
+
+        tile : tuple of slices
+            The slices of the output arrays for the tile.
+
+        border : int
+            The number of output pixels around the tile to include.
+
+        Returns
+        -------
+        inputs : tuple of slices or None
+            The slices of the input arrays, or None if no input pixel maps
+            onto the tile or its border.  Two more input pixels are included
+            on each side, so that drizzle sees the same neighbours for the
+            pixels mapped onto the tile as it does for the whole image.
+        """
+        x = pixmap[..., 0]
+        y = pixmap[..., 1]
+        inside = ((x >= tile[1].start - border) & (x < tile[1].stop + border) &
+                  (y >= tile[0].start - border) & (y < tile[0].stop + border))
+        rows = np.flatnonzero(inside.any(axis=1))
+        if rows.size == 0:
+            return None
+        columns = np.flatnonzero(inside.any(axis=0))
+
+        return (slice(max(rows[0] - 2, 0), rows[-1] + 3),
+                slice(max(columns[0] - 2, 0), columns[-1] + 3))
+
+    def overlapping_tiles(self, pixmap, spacing=None):
+        """
+        Return the slices of the output tiles that a pixel map overlaps.
+
+        Parameters
+        ----------
+
+        pixmap : 3d array
+            The pixel map of an input image, as returned by
+            `~jwst.resample.resample_utils.calc_gwcs_pixmap`.
+
+        spacing : float, optional
+            The spacing of the input pixels in the output, as returned by
+            `pixel_spacing`.
+
+        Returns
+        -------
+        tiles : list of tuples of slices
+            The slices of the output arrays for each tile.
+        """
+        (ny, nx) = self.outsci.shape
+        # Pixels that don't map to the output are set to -1
+        mapped = ~np.all(pixmap == -1, axis=-1)
+        if not mapped.any():
+            return []
+        x = pixmap[..., 0][mapped]
+        y = pixmap[..., 1][mapped]
+
+        # Allow for the extent of the input pixels and of the kernel
+        if spacing is None:
+            spacing = pixel_spacing(pixmap)
+        margin = 2. * spacing + 3.
+
+        size = self.tile_size
+        xfirst = max(int((x.min() - margin) // size), 0)
+        xlast = min(int((x.max() + margin) // size), (nx - 1) // size)
+        yfirst = max(int((y.min() - margin) // size), 0)
+        ylast = min(int((y.max() + margin) // size), (ny - 1) // size)
+
+        return [(slice(j * size, min((j + 1) * size, ny)),
+                 slice(i * size, min((i + 1) * size, nx)))
+                for j in range(yfirst, ylast + 1)
+                for i in range(xfirst, xlast + 1)]
+
+
+def pixel_spacing(pixmap):
+    """
+    Return the largest distance, along either output axis, between the
+    output positions of adjacent input pixels in a pixel map (at least 1).
+    """
+    mapped = ~np.all(pixmap == -1, axis=-1)
+    ydiff = np.abs(np.diff(pixmap, axis=0))[mapped[1:] & mapped[:-1]]
+    xdiff = np.abs(np.diff(pixmap, axis=1))[mapped[:, 1:] & mapped[:, :-1]]
+
+    return max(ydiff.max(initial=1.), xdiff.max(initial=1.))
+
+
+def _memmap_zeros(shape, dtype, directory=None):
+    """Return a zero array memory-mapped to an unnamed temporary file."""
+    with tempfile.TemporaryFile(dir=directory) as fd:
+        return np.memmap(fd, dtype=dtype, mode='w+', shape=shape)
+
+
 def dodrizzle(insci, input_wcs, inwht,
               output_wcs, outsci, outwht, outcon,
               expin, in_units, wt_scl,
               pscale_ratio=1.0, uniqid=1,
               xmin=0, xmax=0, ymin=0, ymax=0,
-              pixfrac=1.0, kernel='square', fillval="INDEF"):
+              pixfrac=1.0, kernel='square', fillval="INDEF",
+              pixmap_cache=None, pixmap_stepsize=1,
+              pixmap_tolerance=resample_utils.PIXMAP_TOLERANCE, pixmap=None):
     """
     Low level routine for performing 'drizzle' operation on one image.
 
@@ -368,6 +630,22 @@ def dodrizzle(insci, input_wcs, inwht,
         The value a pixel is set to in the output if the input image does
         not overlap it. The default value of INDEF does not set a value.
 
+    pixmap_cache: `~jwst.resample.pixmap_cache.PixmapCache`, optional
+        A cache in which to look for (and save) the pixel map from the
+        input to the output image.
+
+    pixmap_stepsize: int, optional
+        If more than 1, the pixel map is interpolated from the transform of
+        every ``pixmap_stepsize``-th input pixel in each direction, unless
+        that is off by more than ``pixmap_tolerance`` output pixels.
+
+    pixmap_tolerance: float, optional
+        Maximum error, in output pixels, of an interpolated pixel map.
+
+    pixmap: 3d array, optional
+        The pixel map from the input to the output image, if it has already
+        been computed.
+
     Returns
     -------
     A tuple with three values: a version string, the number of pixels
@@ -422,7 +700,12 @@ def dodrizzle(insci, input_wcs, inwht,
 
     # Compute the mapping between the input and output pixel coordinates
     # for use in drizzle.cdrizzle.tdriz
-    pixmap = resample_utils.calc_gwcs_pixmap(input_wcs, output_wcs, insci.shape)
+    if pixmap is None:
+        pixmap = resample_utils.calc_gwcs_pixmap(input_wcs, output_wcs,
+                                                 insci.shape,
+                                                 cache=pixmap_cache,
+                                                 stepsize=pixmap_stepsize,
+                                                 tolerance=pixmap_tolerance)
     # pixmap[np.isnan(pixmap)] = -10
     # print("Number of NaNs: ", len(np.isnan(pixmap)) / 2)
     # inwht[np.isnan(pixmap[:,:,0])] = 0.
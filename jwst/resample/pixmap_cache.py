@@ -0,0 +1,200 @@
+import collections
+import hashlib
+import io
+import logging
+import os
+
+import asdf
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+__all__ = ["PixmapCache", "get_cache", "get_requested_cache"]
+
+# Number of pixmaps kept in memory by each cache, unless set by the
+# pixmap_cache_size step parameter
+DEFAULT_CACHE_SIZE = 16
+
+# One cache for each directory of saved pixmaps (None for none)
+_caches = {}
+
+
+def get_cache(directory=None, maxsize=DEFAULT_CACHE_SIZE):
+    """
+    Get the pixmap cache for this process
+
+    Parameters
+    ----------
+    directory : str or None
+        If not None, pixmaps are also saved in (and read from) this
+        directory.
+
+    maxsize : int
+        The number of pixmaps to keep in memory.
+
+    Returns
+    -------
+    cache : `PixmapCache`
+        The same cache is returned for each call with the same directory,
+        resized to ``maxsize``.
+    """
+    if directory not in _caches:
+        _caches[directory] = PixmapCache(directory, maxsize)
+    else:
+        _caches[directory].resize(maxsize)
+
+    return _caches[directory]
+
+
+def get_requested_cache(pars):
+    """
+    Get the pixmap cache requested by the ``cache_pixmaps``,
+    ``pixmap_cache_dir`` and ``pixmap_cache_size`` step parameters in
+    ``pars``, or None if pixmaps are not to be cached.
+    """
+    if not pars.get('cache_pixmaps', False):
+        return None
+
+    maxsize = pars.get('pixmap_cache_size')
+    if maxsize is None:
+        maxsize = DEFAULT_CACHE_SIZE
+
+    return get_cache(pars.get('pixmap_cache_dir') or None, maxsize)
+
+
+def wcs_fingerprint(wcs):
+    """
+    Return a hash of the serialized form of a WCS, or None if the WCS cannot
+    be serialized.
+
+    WCS objects that are copies of one another have the same fingerprint.
+    """
+    buffer = io.BytesIO()
+    try:
+        asdf.AsdfFile({'wcs': wcs}).write_to(buffer)
+    except Exception as err:
+        log.debug("Unable to serialize WCS for the pixmap cache: %s", err)
+        return None
+
+    return hashlib.sha1(buffer.getvalue()).hexdigest()
+
+
+class PixmapCache:
+    """
+    Pixel maps from input to output frames, as computed by
+    `~jwst.resample.resample_utils.calc_gwcs_pixmap`
+
+    Pixmaps are keyed on fingerprints of the input and output WCS and the
+    shape of the input data, so the pixmap computed when drizzling an
+    image can be reused when blotting back to it.  The most recently used
+    pixmaps are kept in memory.  If a directory is given, each pixmap is
+    also saved there as a ``.npy`` file, and read back memory-mapped when
+    it is not in memory.
+    """
+    def __init__(self, directory=None, maxsize=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.maxsize = maxsize
+        self._pixmaps = collections.OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._pixmaps
+
+    def __len__(self):
+        return len(self._pixmaps)
+
+    @staticmethod
+    def make_key(in_wcs, out_wcs, shape=None, sampling=None):
+        """
+        Return the key for the pixmap from ``in_wcs`` to ``out_wcs``, or None
+        if either WCS cannot be fingerprinted.
+
+        ``sampling`` is None for pixmaps evaluated for every pixel, or the
+        step size and tolerance of pixmaps interpolated from a sparse grid.
+        """
+        in_fingerprint = wcs_fingerprint(in_wcs)
+        if in_fingerprint is None:
+            return None
+        out_fingerprint = wcs_fingerprint(out_wcs)
+        if out_fingerprint is None:
+            return None
+        if shape is not None:
+            shape = tuple(int(n) for n in shape)
+
+        return (in_fingerprint, out_fingerprint, shape, sampling)
+
+    def get(self, key):
+        """
+        Return the pixmap for ``key``, or None if it is not in the cache.
+
+        The pixmap is shared with the cache, and must not be modified.
+        """
+        if key in self._pixmaps:
+            self._pixmaps.move_to_end(key)
+            log.debug("Using cached pixmap")
+            return self._pixmaps[key]
+
+        path = self._path(key)
+        if path is None or not os.path.exists(path):
+            return None
+
+        log.debug("Using pixmap %s", path)
+        pixmap = np.load(path, mmap_mode='c')
+        self._add(key, pixmap)
+
+        return pixmap
+
+    def put(self, key, pixmap):
+        """
+        Add the pixmap for ``key`` to the cache.
+        """
+        path = self._path(key)
+        if path is not None and not os.path.exists(path):
+            log.debug("Saving pixmap to %s", path)
+            # Write to a temporary name, so that other processes never
+            # read a partial file
+            tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+            with open(tmp_path, 'wb') as fd:
+                np.save(fd, pixmap)
+            os.replace(tmp_path, path)
+        self._add(key, pixmap)
+
+    def clear(self):
+        """
+        Remove all pixmaps from memory.
+        """
+        self._pixmaps.clear()
+
+    def resize(self, maxsize):
+        """
+        Change the number of pixmaps kept in memory, removing the least
+        recently used ones if there are more.
+        """
+        self.maxsize = maxsize
+        self._trim()
+
+    def _add(self, key, pixmap):
+        self._pixmaps[key] = pixmap
+        self._pixmaps.move_to_end(key)
+        self._trim()
+
+    def _trim(self):
+        while len(self._pixmaps) > self.maxsize:
+            self._pixmaps.popitem(last=False)
+
+    def _path(self, key):
+        if self.directory is None:
+            return None
+
+        (in_fingerprint, out_fingerprint, shape, sampling) = key
+        if shape is None:
+            shape = 'bbox'
+        else:
+            shape = 'x'.join(str(n) for n in shape)
+        name = 'pixmap_{}_{}_{}'.format(in_fingerprint[:16],
+                                        out_fingerprint[:16], shape)
+        if sampling is not None:
+            name += '_step{}_tol{:g}'.format(*sampling)
+        name += '.npy'
+
+        return os.path.join(self.directory, name)
@@ -1,12 +1,18 @@
+import io
 import logging
+import multiprocessing
 from collections import OrderedDict
+
+import asdf
 import numpy as np
 
 from .. import datamodels
 
 from . import gwcs_drizzle
 from . import resample_utils
+from . import pixmap_cache
 from ..model_blender import blendmeta
+from ..lib.parallel_utils import compute_slices
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
@@ -51,10 +57,18 @@ class ResampleData:
             output = input_models.meta.resample.output
         self.output_filename = output
 
+        # Output arrays are memory-mapped and drizzled onto in tiles, if
+        # requested, rather than allocated in memory
+        self.output_tile_size = pars.get('output_tile_size', 0)
+        self.output_tile_dir = pars.get('output_tile_dir') or None
+
         # Define output WCS based on all inputs, including a reference WCS
         self.output_wcs = resample_utils.make_output_wcs(self.input_models)
         log.debug('Output mosaic size: {}'.format(self.output_wcs.data_size))
-        self.blank_output = datamodels.ImageModel(self.output_wcs.data_size)
+        if self.output_tile_size:
+            self.blank_output = datamodels.ImageModel()
+        else:
+            self.blank_output = datamodels.ImageModel(self.output_wcs.data_size)
 
         # update meta data and wcs
         self.blank_output.update(input_models[0], only='PRIMARY')
@@ -63,6 +77,17 @@ class ResampleData:
 
         self.output_models = datamodels.ModelContainer()
 
+        # Pixel maps are reused by blot and by later runs, if requested
+        self.pixmap_cache = pixmap_cache.get_requested_cache(pars)
+
+        # Number of processes among which to divide the inputs of each output
+        self.number_slices = compute_slices(pars.get('maximum_cores'))
+
+        # Pixel maps are interpolated from a sparse grid, if requested
+        self.pixmap_stepsize = pars.get('pixmap_stepsize', 1)
+        self.pixmap_tolerance = pars.get('pixmap_tolerance',
+                                         resample_utils.PIXMAP_TOLERANCE)
+
     def update_driz_outputs(self):
         """ Define output arrays for use with drizzle operations.
         """
@@ -119,12 +144,34 @@ class ResampleData:
 
             exposure_times = {'start': [], 'end': []}
 
-            # Initialize the output with the wcs
-            driz = gwcs_drizzle.GWCSDrizzle(output_model,
-                                            single=self.drizpars['single'],
-                                            pixfrac=self.drizpars['pixfrac'],
-                                            kernel=self.drizpars['kernel'],
-                                            fillval=self.drizpars['fillval'])
+            # Divide the inputs among processes, if there are enough of them
+            # and the output is not tiled
+            number_slices = min(self.number_slices, len(exposure))
+            if self.output_tile_size:
+                number_slices = 1
+                driz = gwcs_drizzle.TiledDrizzle(output_model,
+                                                 self.output_wcs.data_size,
+                                                 len(exposure),
+                                                 self.output_tile_size,
+                                                 directory=self.output_tile_dir,
+                                                 pixfrac=self.drizpars['pixfrac'],
+                                                 kernel=self.drizpars['kernel'],
+                                                 fillval=self.drizpars['fillval'],
+                                                 pixmap_cache=self.pixmap_cache,
+                                                 pixmap_stepsize=self.pixmap_stepsize,
+                                                 pixmap_tolerance=self.pixmap_tolerance)
+            elif number_slices > 1:
+                images = []
+            else:
+                # Initialize the output with the wcs
+                driz = gwcs_drizzle.GWCSDrizzle(output_model,
+                                                single=self.drizpars['single'],
+                                                pixfrac=self.drizpars['pixfrac'],
+                                                kernel=self.drizpars['kernel'],
+                                                fillval=self.drizpars['fillval'],
+                                                pixmap_cache=self.pixmap_cache,
+                                                pixmap_stepsize=self.pixmap_stepsize,
+                                                pixmap_tolerance=self.pixmap_tolerance)
 
             for n, img in enumerate(exposure):
                 exposure_times['start'].append(img.meta.exposure.start_time)
@@ -141,9 +188,17 @@ class ResampleData:
                 inwht = resample_utils.build_driz_weight(img,
                     weight_type=self.drizpars['weight_type'],
                     good_bits=self.drizpars['good_bits'])
-                driz.add_image(img.data, img.meta.wcs, inwht=inwht,
-                        expin=img.meta.exposure.exposure_time,
-                        pscale_ratio=outwcs_pscale / wcslin_pscale)
+                if number_slices > 1:
+                    images.append((img.data, img.meta.wcs, inwht,
+                                   img.meta.exposure.exposure_time,
+                                   outwcs_pscale / wcslin_pscale))
+                else:
+                    driz.add_image(img.data, img.meta.wcs, inwht=inwht,
+                            expin=img.meta.exposure.exposure_time,
+                            pscale_ratio=outwcs_pscale / wcslin_pscale)
+
+            if number_slices > 1:
+                self.drizzle_parallel(output_model, images, number_slices)
 
             # Update some basic exposure time values based on all the inputs
             output_model.meta.exposure.exposure_time = texptime
@@ -157,6 +212,78 @@ class ResampleData:
 
             self.output_models.append(output_model)
 
+    def drizzle_parallel(self, output_model, images, number_slices):
+        """
+        Drizzle images onto an output model in a pool of processes.
+
+        Each process drizzles a subset of the images onto its own output
+        arrays, which are then combined, weighted by the drizzle weights.
+        The result is the same as drizzling the images one after another,
+        apart from rounding.
+
+        Parameters
+        ----------
+        output_model : `~jwst.datamodels.ImageModel`
+            The output model, with the output WCS.  Its data, weight and
+            context arrays are replaced.
+
+        images : list of tuples
+            The data, WCS, weight, exposure time and pixel scale ratio of
+            each image.
+
+        number_slices : int
+            The number of processes to use.
+        """
+        shape = output_model.data.shape
+        nplanes = (len(images) - 1) // 32 + 1
+        bounds = np.linspace(0, len(images), number_slices + 1).astype(int)
+        output_wcs = _serialize_wcs(output_model.meta.wcs)
+        drizpars = {key: self.drizpars.get(key) for key in
+                    ('pixfrac', 'kernel', 'fillval', 'cache_pixmaps',
+                     'pixmap_cache_dir', 'pixmap_cache_size')}
+        drizpars['pixmap_stepsize'] = self.pixmap_stepsize
+        drizpars['pixmap_tolerance'] = self.pixmap_tolerance
+
+        slices = []
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            subset = [(data, _serialize_wcs(wcs), inwht, expin, pscale_ratio)
+                      for (data, wcs, inwht, expin, pscale_ratio)
+                      in images[first:last]]
+            slices.append((subset, output_wcs, shape, nplanes, first,
+                           drizpars))
+
+        log.info('Drizzling {} images in {} processes'.format(len(images),
+                                                              number_slices))
+        with multiprocessing.Pool(processes=number_slices) as pool:
+            results = pool.starmap(drizzle_images, slices)
+
+        # Combine the outputs of the processes
+        sci_sum = np.zeros(shape, dtype=np.float64)
+        wht_sum = np.zeros(shape, dtype=np.float64)
+        outcon = np.zeros((nplanes,) + shape, dtype=np.int32)
+        for outsci, outwht, con in results:
+            # Pixels without any input may have been set to the fill value
+            sci_sum += np.where(outwht > 0, outsci, 0.) * outwht
+            wht_sum += outwht
+            outcon |= con
+        outsci = np.zeros(shape, dtype=np.float32)
+        np.divide(sci_sum, wht_sum, out=outsci, where=wht_sum > 0,
+                  casting='unsafe')
+        try:
+            # As drizzle does, fill the pixels without any input
+            outsci[wht_sum == 0] = float(self.drizpars['fillval'])
+        except (TypeError, ValueError):
+            # INDEF leaves them at zero
+            pass
+
+        output_model.data = outsci
+        output_model.wht = wht_sum.astype(np.float32)
+        # Like GWCSDrizzle, only keep the first context plane of a 2D array
+        if output_model.con.ndim == 2:
+            output_model.con = outcon[0]
+        else:
+            output_model.con = outcon
+
     def update_fits_wcs(self, model):
         """
         Update FITS WCS keywords of the resampled image.
@@ -174,3 +301,67 @@ class ResampleData:
         model.meta.wcsinfo.pc1_2 = transform[2].matrix.value[0][1]
         model.meta.wcsinfo.pc2_1 = transform[2].matrix.value[1][0]
         model.meta.wcsinfo.pc2_2 = transform[2].matrix.value[1][1]
+
+
+def drizzle_images(images, output_wcs, shape, nplanes, first_id, drizpars):
+    """
+    Drizzle a subset of the images of an output onto new output arrays.
+
+    This is run in a worker process by `ResampleData.drizzle_parallel`.
+
+    Parameters
+    ----------
+    images : list of tuples
+        The data, serialized WCS, weight, exposure time and pixel scale
+        ratio of each image.
+
+    output_wcs : bytes
+        The serialized output WCS.
+
+    shape : tuple
+        The output shape.
+
+    nplanes : int
+        The number of context planes for all the images of the output.
+
+    first_id : int
+        The number of images of the output before this subset, so that
+        each image sets its own context bit.
+
+    drizpars : dict
+        The drizzle and pixel map parameters.
+
+    Returns
+    -------
+    outsci, outwht, outcon : ndarray
+        The drizzled data, weight and context arrays.
+    """
+    product = datamodels.ImageModel(shape)
+    driz = gwcs_drizzle.GWCSDrizzle(
+        product, outwcs=_deserialize_wcs(output_wcs),
+        pixfrac=drizpars['pixfrac'], kernel=drizpars['kernel'],
+        fillval=drizpars['fillval'],
+        pixmap_cache=pixmap_cache.get_requested_cache(drizpars),
+        pixmap_stepsize=drizpars['pixmap_stepsize'],
+        pixmap_tolerance=drizpars['pixmap_tolerance'])
+    driz.outcon = np.zeros((nplanes,) + shape, dtype=np.int32)
+    driz.uniqid = first_id
+
+    for (data, wcs, inwht, expin, pscale_ratio) in images:
+        driz.add_image(data, _deserialize_wcs(wcs), inwht=inwht, expin=expin,
+                       pscale_ratio=pscale_ratio)
+
+    return driz.outsci, driz.outwht, driz.outcon
+
+
+def _serialize_wcs(wcs):
+    """Serialize a WCS to ASDF, to pass it to another process."""
+    buffer = io.BytesIO()
+    asdf.AsdfFile({'wcs': wcs}).write_to(buffer)
+    return buffer.getvalue()
+
+
+def _deserialize_wcs(buffer):
+    """Read a WCS serialized by `_serialize_wcs`."""
+    with asdf.open(io.BytesIO(buffer), copy_arrays=True) as af:
+        return af.tree['wcs']
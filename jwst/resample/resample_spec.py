@@ -15,6 +15,7 @@ from ..cube_build.cube_build_wcs_util import  wrap_ra
 from .. import datamodels
 from . import gwcs_drizzle
 from . import resample_utils
+from . import pixmap_cache
 from ..model_blender import blendmeta
 
 CRBIT = np.uint32(datamodels.dqflags.pixel['JUMP_DET'])
@@ -71,6 +72,14 @@ class ResampleSpecData:
         self.blank_output.meta.wcs = self.output_wcs
         self.output_models = datamodels.ModelContainer()
 
+        # Pixel maps are reused by blot and by later runs, if requested
+        self.pixmap_cache = pixmap_cache.get_requested_cache(pars)
+
+        # Pixel maps are interpolated from a sparse grid, if requested
+        self.pixmap_stepsize = pars.get('pixmap_stepsize', 1)
+        self.pixmap_tolerance = pars.get('pixmap_tolerance',
+                                         resample_utils.PIXMAP_TOLERANCE)
+
     def build_interpolated_output_wcs(self, refmodel=None):
         """
         Create a spatial/spectral WCS output frame using all the input models
@@ -362,7 +371,10 @@ class ResampleSpecData:
                                 single=self.drizpars['single'],
                                 pixfrac=self.drizpars['pixfrac'],
                                 kernel=self.drizpars['kernel'],
-                                fillval=self.drizpars['fillval'])
+                                fillval=self.drizpars['fillval'],
+                                pixmap_cache=self.pixmap_cache,
+                                pixmap_stepsize=self.pixmap_stepsize,
+                                pixmap_tolerance=self.pixmap_tolerance)
 
             for n, img in enumerate(group):
                 exposure_times['start'].append(img.meta.exposure.start_time)
@@ -52,6 +52,11 @@ class ResampleSpecStep(ResampleStep):
             self.log.info("No NIRSpec DIRZPARS reffile")
             kwargs = self._set_spec_defaults()
             kwargs['blendheaders'] = self.blendheaders
+            kwargs['cache_pixmaps'] = self.cache_pixmaps
+            kwargs['pixmap_cache_dir'] = self.pixmap_cache_dir
+            kwargs['pixmap_cache_size'] = self.pixmap_cache_size
+            kwargs['pixmap_stepsize'] = self.pixmap_stepsize
+            kwargs['pixmap_tolerance'] = self.pixmap_tolerance
 
         # Call resampling
         self.drizpars = kwargs
@@ -36,6 +36,14 @@ class ResampleStep(Step):
         weight_type = option('exptime', default='exptime')
         single = boolean(default=False)
         blendheaders = boolean(default=True)
+        cache_pixmaps = boolean(default=False) # reuse pixel maps between inputs with the same WCS
+        pixmap_cache_dir = string(default="") # directory in which to also save pixel maps for reuse
+        pixmap_cache_size = integer(default=16) # number of pixel maps to keep in memory
+        pixmap_stepsize = integer(default=1) # interpolate pixel maps from every Nth pixel
+        pixmap_tolerance = float(default=0.01) # maximum error of interpolated pixel maps, in output pixels
+        maximum_cores = option('quarter', 'half', 'all', default=None) # max number of processes to create
+        output_tile_size = integer(default=0) # drizzle onto memory-mapped output in tiles of this size
+        output_tile_dir = string(default="") # directory for the memory-mapped output arrays
     """
 
     reference_file_types = ['drizpars']
@@ -68,6 +76,14 @@ class ResampleStep(Step):
             # Deal with NIRSpec which currently has no default drizpars reffile
             self.log.info("No NIRSpec DIRZPARS reffile")
             kwargs = self._set_spec_defaults()
+            kwargs['cache_pixmaps'] = self.cache_pixmaps
+            kwargs['pixmap_cache_dir'] = self.pixmap_cache_dir
+            kwargs['pixmap_cache_size'] = self.pixmap_cache_size
+            kwargs['pixmap_stepsize'] = self.pixmap_stepsize
+            kwargs['pixmap_tolerance'] = self.pixmap_tolerance
+            kwargs['maximum_cores'] = self.maximum_cores
+            kwargs['output_tile_size'] = self.output_tile_size
+            kwargs['output_tile_dir'] = self.output_tile_dir
 
         # Call the resampling routine
         resamp = resample.ResampleData(input_models, **kwargs)
@@ -168,7 +184,15 @@ class ResampleStep(Step):
         kwargs = dict(
             good_bits=GOOD_BITS,
             single=self.single,
-            blendheaders=self.blendheaders
+            blendheaders=self.blendheaders,
+            cache_pixmaps=self.cache_pixmaps,
+            pixmap_cache_dir=self.pixmap_cache_dir,
+            pixmap_cache_size=self.pixmap_cache_size,
+            pixmap_stepsize=self.pixmap_stepsize,
+            pixmap_tolerance=self.pixmap_tolerance,
+            maximum_cores=self.maximum_cores,
+            output_tile_size=self.output_tile_size,
+            output_tile_dir=self.output_tile_dir
             )
 
         kwargs.update(all_drizpars)
@@ -5,6 +5,7 @@ import numpy as np
 from astropy import wcs as fitswcs
 from astropy.modeling import Model
 from gwcs import WCS, wcstools
+from scipy.interpolate import RectBivariateSpline
 
 from jwst.datamodels.dqflags import interpret_bit_flags
 
@@ -13,6 +14,9 @@ from ..assign_wcs.util import wcs_from_footprints, wcs_bbox_from_shape
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
+# Maximum error, in output pixels, of a pixmap interpolated from a sparse grid
+PIXMAP_TOLERANCE = 0.01
+
 
 def make_output_wcs(input_models):
     """ Generate output WCS here based on footprints of all input WCS objects
@@ -64,9 +68,30 @@ def shape_from_bounding_box(bounding_box):
     return tuple(reversed(size))
 
 
-def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None):
+def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None, cache=None, stepsize=1,
+                     tolerance=PIXMAP_TOLERANCE):
     """ Return a pixel grid map from input frame to output frame.
+
+    If ``stepsize`` is more than 1, the transform is only evaluated for every
+    ``stepsize``-th pixel in each direction, and bicubic splines through
+    these are used for the other pixels.  The splines are checked against
+    the transform midway between the evaluated pixels, and if they are off
+    by more than ``tolerance`` output pixels, the transform is evaluated for
+    every pixel after all.
+
+    If a `~jwst.resample.pixmap_cache.PixmapCache` is given, the pixmap is
+    taken from it if possible, and otherwise added to it.  A cached pixmap
+    is shared with the cache and must not be modified.
     """
+    sampling = (stepsize, tolerance) if stepsize > 1 else None
+    key = None
+    if cache is not None:
+        key = cache.make_key(in_wcs, out_wcs, shape, sampling)
+    if key is not None:
+        pixmap = cache.get(key)
+        if pixmap is not None:
+            return pixmap
+
     if shape:
         bb = wcs_bbox_from_shape(shape)
         log.debug("Bounding box from data shape: {}".format(bb))
@@ -75,9 +100,88 @@ def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None):
         log.debug("Bounding box from WCS: {}".format(in_wcs.bounding_box))
 
     grid = wcstools.grid_from_bounding_box(bb)
-    pixmap = np.dstack(reproject(in_wcs, out_wcs)(grid[0], grid[1]))
+    transform = reproject(in_wcs, out_wcs)
+    pixmap = None
+    if stepsize > 1:
+        pixmap = interpolate_pixmap(transform, grid, stepsize, tolerance)
+    if pixmap is None:
+        pixmap = np.dstack(transform(grid[0], grid[1]))
     pixmap[np.isnan(pixmap)] = -1
 
+    if key is not None:
+        cache.put(key, pixmap)
+
+    return pixmap
+
+
+def interpolate_pixmap(transform, grid, stepsize, tolerance):
+    """
+    Compute a pixel map by evaluating a transform on a sparse grid and
+    interpolating between the grid points with bicubic splines.
+
+    Parameters
+    ----------
+    transform : func
+        Function taking x, y arrays of input pixel positions and returning
+        the output pixel positions, as returned by `reproject`.
+
+    grid : tuple of 2D arrays
+        The x and y positions of all input pixels, as returned by
+        `gwcs.wcstools.grid_from_bounding_box`.
+
+    stepsize : int
+        The transform is evaluated for every ``stepsize``-th row and column
+        of the grid, and for the last row and column.
+
+    tolerance : float
+        Maximum difference, in output pixels, between the interpolated and
+        the evaluated positions midway between the sparse grid points.
+
+    Returns
+    -------
+    pixmap : 3D array or None
+        The pixel map, as from `calc_gwcs_pixmap`, or None if the grid
+        is too small, the transform is not finite over the sparse grid or
+        the interpolation is not within the tolerance.
+    """
+    x = grid[0][0]
+    y = grid[1][:, 0]
+    x_index = np.union1d(np.arange(0, x.size, stepsize), [x.size - 1])
+    y_index = np.union1d(np.arange(0, y.size, stepsize), [y.size - 1])
+
+    # Bicubic splines need at least 4 points in each direction
+    if x_index.size < 4 or y_index.size < 4:
+        return None
+
+    x_sparse = x[x_index]
+    y_sparse = y[y_index]
+    sparse = transform(*np.meshgrid(x_sparse, y_sparse))
+    if not all(np.isfinite(axis).all() for axis in sparse):
+        log.debug("Transform not finite on the sparse grid; "
+                  "evaluating every pixel")
+        return None
+    splines = [RectBivariateSpline(y_sparse, x_sparse, axis, kx=3, ky=3)
+               for axis in sparse]
+
+    # Check the splines where they are furthest from the grid points
+    x_mid = (x_sparse[:-1] + x_sparse[1:]) / 2.
+    y_mid = (y_sparse[:-1] + y_sparse[1:]) / 2.
+    residual = 0.
+    for spline, axis in zip(splines,
+                            transform(*np.meshgrid(x_mid, y_mid))):
+        residual = max(residual,
+                       np.max(np.abs(spline(y_mid, x_mid) - axis)))
+    if not residual <= tolerance:
+        log.info("Interpolated pixel map is off by up to %g pixels; "
+                 "evaluating every pixel", residual)
+        return None
+    log.debug("Pixel map interpolated from every %d pixels, to within %g "
+              "pixels", stepsize, residual)
+
+    pixmap = np.empty((y.size, x.size, 2))
+    for i, spline in enumerate(splines):
+        pixmap[..., i] = spline(y, x)
+
     return pixmap
 
 
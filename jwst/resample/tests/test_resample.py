@@ -0,0 +1,145 @@
+"""Test the drizzling of the inputs of an output by ResampleData"""
+import numpy as np
+import pytest
+from astropy import coordinates as coord
+from astropy import units as u
+from astropy.modeling import models
+from gwcs import WCS
+from gwcs import coordinate_frames as cf
+
+from jwst.datamodels import ImageModel, ModelContainer, dqflags
+from jwst.resample import gwcs_drizzle
+from jwst.resample.resample import ResampleData
+from jwst.resample.resample_utils import calc_gwcs_pixmap
+
+
+def _imaging_wcs(crpix, crval, pscale=1e-5, angle=0.):
+    transform = (models.Shift(-crpix[0]) & models.Shift(-crpix[1]) |
+                 models.Rotation2D(angle) |
+                 models.Scale(pscale) & models.Scale(pscale) |
+                 models.Pix2Sky_TAN() |
+                 models.RotateNative2Celestial(crval[0], crval[1], 180))
+    detector = cf.Frame2D(name='detector', axes_order=(0, 1),
+                          unit=(u.pix, u.pix))
+    sky = cf.CelestialFrame(reference_frame=coord.ICRS(), name='world',
+                            unit=(u.deg, u.deg))
+    return WCS([(detector, transform), (sky, None)])
+
+
+def _images(rng, number):
+    """Return the data, WCS, weight, exposure time and pixel scale ratio of
+    dithered images"""
+    images = []
+    for n in range(number):
+        data = rng.normal(10., 1., (40, 50)).astype(np.float32)
+        inwht = (rng.uniform(size=data.shape) > 0.1).astype(np.float32)
+        wcs = _imaging_wcs((25. + 3 * n, 20. - 2 * n), (10., 20.),
+                           angle=2. * n)
+        images.append((data, wcs, inwht, 100., 1.))
+    return images
+
+
+def _drizzle(images, shape, output_wcs, fillval):
+    """Drizzle the images in turn, as ResampleData does by default"""
+    expected = ImageModel(shape)
+    expected.meta.wcs = output_wcs
+    driz = gwcs_drizzle.GWCSDrizzle(expected, fillval=fillval)
+    for data, wcs, inwht, expin, pscale_ratio in images:
+        driz.add_image(data, wcs, inwht=inwht, expin=expin,
+                       pscale_ratio=pscale_ratio)
+    return expected
+
+
+def _image_models(rng, number):
+    """Return a ModelContainer of dithered exposures, as ImageModels"""
+    models = ModelContainer()
+    for n, (data, wcs, inwht, expin, pscale_ratio) in enumerate(
+            _images(rng, number)):
+        model = ImageModel(data=data)
+        model.dq[inwht == 0] = dqflags.pixel['DO_NOT_USE']
+        model.meta.wcs = wcs
+        model.meta.wcs.bounding_box = ((-0.5, 49.5), (-0.5, 39.5))
+        model.meta.wcsinfo.wcsaxes = 2
+        model.meta.wcsinfo.ctype1 = 'RA---TAN'
+        model.meta.wcsinfo.ctype2 = 'DEC--TAN'
+        model.meta.wcsinfo.cdelt1 = 1e-5
+        model.meta.wcsinfo.roll_ref = 0.
+        model.meta.wcsinfo.v3yangle = 0.
+        model.meta.wcsinfo.vparity = -1
+        model.meta.exposure.exposure_time = expin
+        model.meta.exposure.start_time = 58000. + n
+        model.meta.exposure.end_time = 58000.01 + n
+        model.meta.observation.program_number = '00001'
+        model.meta.observation.observation_number = '001'
+        model.meta.observation.visit_number = '001'
+        model.meta.observation.visit_group = '01'
+        model.meta.observation.sequence_id = '1'
+        model.meta.observation.activity_id = '01'
+        model.meta.observation.exposure_number = str(n + 1)
+        model.meta.filename = 'image{}_cal.fits'.format(n)
+        models.append(model)
+    models.meta.resample.output = 'mosaic_i2d.fits'
+    return models
+
+
+def _resample(models, **pars):
+    drizpars = dict(pixfrac=1.0, kernel='square', fillval='NaN',
+                    weight_type='exptime', good_bits='~DO_NOT_USE',
+                    single=False, blendheaders=False)
+    drizpars.update(pars)
+    resamp = ResampleData(models, **drizpars)
+    resamp.do_drizzle()
+    return resamp.output_models[0]
+
+
+def test_drizzle_parallel(monkeypatch):
+    """Drizzling subsets of the images in separate processes and combining
+    the results gives the same output as drizzling them in turn"""
+    rng = np.random.RandomState(42)
+    models = _image_models(rng, 5)
+    expected = _resample(models)
+
+    monkeypatch.setattr("multiprocessing.cpu_count", lambda: 2)
+    result = _resample(models, maximum_cores='all')
+
+    np.testing.assert_allclose(result.data, expected.data, rtol=1e-6)
+    np.testing.assert_allclose(result.wht, expected.wht, rtol=1e-6)
+    np.testing.assert_array_equal(result.con, expected.con)
+    assert (result.con > 1).any()
+    assert np.isnan(result.data).any()
+
+
+@pytest.mark.parametrize('fillval', ['INDEF', '-1'])
+def test_tiled_drizzle(tmpdir, fillval):
+    """Drizzling onto memory-mapped output arrays one tile at a time gives
+    the same output as drizzling onto the whole output"""
+    rng = np.random.RandomState(42)
+    shape = (90, 70)
+    output_wcs = _imaging_wcs((35., 45.), (10., 20.))
+    images = _images(rng, 4)
+    expected = _drizzle(images, shape, output_wcs, fillval)
+
+    output_model = ImageModel()
+    output_model.meta.wcs = output_wcs
+    driz = gwcs_drizzle.TiledDrizzle(output_model, shape, len(images), 16,
+                                     directory=str(tmpdir), fillval=fillval)
+    for data, wcs, inwht, expin, pscale_ratio in images:
+        driz.add_image(data, wcs, inwht=inwht, expin=expin,
+                       pscale_ratio=pscale_ratio)
+
+    # the first image only overlaps some of the tiles, and each of these is
+    # drizzled from only part of the image
+    pixmap = calc_gwcs_pixmap(images[0][1], output_wcs, (40, 50))
+    tiles = driz.overlapping_tiles(pixmap)
+    assert len(tiles) < 30
+    for tile in tiles:
+        inputs = driz.input_section(pixmap, tile, 4)
+        if inputs is not None:
+            assert pixmap[inputs].size < pixmap.size
+
+    # apart from rounding of the shifted pixel maps
+    np.testing.assert_allclose(output_model.data, expected.data, rtol=1e-5)
+    np.testing.assert_allclose(output_model.wht, expected.wht, rtol=1e-5,
+                               atol=1e-6)
+    np.testing.assert_array_equal(output_model.con, expected.con)
+    assert (output_model.wht == 0).any()
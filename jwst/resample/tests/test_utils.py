@@ -1,11 +1,20 @@
 """Test various utility functions"""
+import copy
+
 import pytest
 
 import numpy as np
+from astropy import coordinates as coord
+from astropy import units as u
+from astropy.modeling import models
+from gwcs import WCS
+from gwcs import coordinate_frames as cf
 
 from jwst.datamodels import SlitModel
+from jwst.resample import pixmap_cache
+from jwst.resample.pixmap_cache import PixmapCache
 from jwst.resample.resample_spec import find_dispersion_axis
-from jwst.resample.resample_utils import build_mask
+from jwst.resample.resample_utils import build_mask, calc_gwcs_pixmap
 
 
 DQ = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8])
@@ -54,3 +63,100 @@ def test_find_dispersion_axis():
 
     dm.meta.wcsinfo.dispersion_direction = 2    # vertical
     assert find_dispersion_axis(dm) == 1        # Y axis for wcs functions
+
+
+def _imaging_wcs(crpix, crval, pscale=3e-5, angle=0.):
+    """Return a simple tangent-plane imaging WCS"""
+    transform = (models.Shift(-crpix[0]) & models.Shift(-crpix[1]) |
+                 models.Rotation2D(angle) |
+                 models.Scale(pscale) & models.Scale(pscale) |
+                 models.Pix2Sky_TAN() |
+                 models.RotateNative2Celestial(crval[0], crval[1], 180))
+    detector = cf.Frame2D(name='detector', axes_order=(0, 1),
+                          unit=(u.pix, u.pix))
+    sky = cf.CelestialFrame(reference_frame=coord.ICRS(), name='world',
+                            unit=(u.deg, u.deg))
+    return WCS([(detector, transform), (sky, None)])
+
+
+def test_calc_gwcs_pixmap_cache(tmpdir):
+    """
+    Test that pixmaps are reused for copies of the same input and output WCS,
+    in memory and from the cache directory
+    """
+    shape = (40, 50)
+    in_wcs = _imaging_wcs((25., 20.), (10., 20.), angle=5.)
+    out_wcs = _imaging_wcs((40., 40.), (10.0002, 20.0001))
+    expected = calc_gwcs_pixmap(in_wcs, out_wcs, shape)
+
+    cache = PixmapCache(str(tmpdir), maxsize=1)
+    pixmap = calc_gwcs_pixmap(in_wcs, out_wcs, shape, cache=cache)
+    np.testing.assert_array_equal(pixmap, expected)
+    assert len(tmpdir.listdir()) == 1
+
+    # copies of the WCS give the cached pixmap
+    key = cache.make_key(copy.deepcopy(in_wcs), copy.deepcopy(out_wcs), shape)
+    assert key in cache
+    assert calc_gwcs_pixmap(copy.deepcopy(in_wcs), out_wcs, shape,
+                            cache=cache) is pixmap
+
+    # a different input WCS gives a different pixmap, which replaces the
+    # first one in memory
+    other_wcs = _imaging_wcs((25., 20.), (10., 20.), angle=6.)
+    other = calc_gwcs_pixmap(other_wcs, out_wcs, shape, cache=cache)
+    assert not np.array_equal(other, expected)
+    assert key not in cache
+    assert len(tmpdir.listdir()) == 2
+
+    # the first pixmap is read back from the cache directory
+    pixmap = calc_gwcs_pixmap(in_wcs, out_wcs, shape, cache=cache)
+    assert key in cache
+    np.testing.assert_array_equal(pixmap, expected)
+
+
+def test_get_requested_cache(monkeypatch):
+    """
+    Test that the requested cache keeps pixmap_cache_size pixmaps in memory
+    """
+    monkeypatch.setattr(pixmap_cache, '_caches', {})
+    assert pixmap_cache.get_requested_cache({}) is None
+
+    cache = pixmap_cache.get_requested_cache({'cache_pixmaps': True})
+    assert cache.maxsize == pixmap_cache.DEFAULT_CACHE_SIZE
+    assert cache.directory is None
+
+    shape = (10, 12)
+    out_wcs = _imaging_wcs((5., 5.), (10., 20.))
+    for n in range(3):
+        in_wcs = _imaging_wcs((5., 5.), (10., 20.), angle=float(n))
+        calc_gwcs_pixmap(in_wcs, out_wcs, shape, cache=cache)
+    assert len(cache) == 3
+
+    # the same cache, resized
+    pars = {'cache_pixmaps': True, 'pixmap_cache_dir': '',
+            'pixmap_cache_size': 2}
+    assert pixmap_cache.get_requested_cache(pars) is cache
+    assert cache.maxsize == 2
+    assert len(cache) == 2
+
+
+def test_calc_gwcs_pixmap_interpolated():
+    """
+    Test that pixmaps interpolated from a sparse grid are within the
+    tolerance, and that the transform is evaluated for every pixel if the
+    interpolation is not
+    """
+    shape = (100, 120)
+    in_wcs = _imaging_wcs((60., 50.), (10., 20.), pscale=1e-3, angle=5.)
+    out_wcs = _imaging_wcs((70., 70.), (10.02, 20.01), pscale=1e-3)
+    expected = calc_gwcs_pixmap(in_wcs, out_wcs, shape)
+
+    pixmap = calc_gwcs_pixmap(in_wcs, out_wcs, shape, stepsize=10,
+                              tolerance=0.01)
+    assert pixmap.shape == expected.shape
+    assert not np.array_equal(pixmap, expected)
+    assert np.abs(pixmap - expected).max() < 0.01
+
+    pixmap = calc_gwcs_pixmap(in_wcs, out_wcs, shape, stepsize=10,
+                              tolerance=0.)
+    np.testing.assert_array_equal(pixmap, expected)
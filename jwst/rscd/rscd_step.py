@@ -49,7 +49,8 @@ class RSCD_Step(Step):
                 rscd_model = datamodels.RSCDModel(self.rscd_name)
 
                 # Do the rscd correction
-                result = rscd_sub.do_correction(input_model, rscd_model, self.type)
+                result = rscd_sub.do_correction(input_model, rscd_model, self.type,
+                                                self.in_place)
 
                 # Close the reference file
                 rscd_model.close()
@@ -57,7 +58,7 @@ class RSCD_Step(Step):
             else:
                 self.log.warning('RSCD correction is only for MIRI data')
                 self.log.warning('RSCD step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.rscd = 'SKIPPED'
 
         return result
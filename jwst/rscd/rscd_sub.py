@@ -9,8 +9,12 @@ from ..datamodels import dqflags
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
+# Maximum number of values (integrations x groups x rows x columns) for which
+# the decay-function correction is computed at once
+DECAY_CHUNK_SIZE = 2**24
 
-def do_correction(input_model, rscd_model, type):
+
+def do_correction(input_model, rscd_model, type, in_place=False):
     """
     Short Summary
     -------------
@@ -29,6 +33,10 @@ def do_correction(input_model, rscd_model, type):
     type: string
         type of algorithm ['baseline' or 'enhanced']
 
+    in_place: bool
+        if True, the baseline correction flags the groups in the input model
+        rather than in a copy
+
     Returns
     -------
     output_model: ~jwst.datamodels.RampModel
@@ -46,7 +54,7 @@ def do_correction(input_model, rscd_model, type):
 
     if type == 'baseline':
         group_skip = param['skip']
-        output = correction_skip_groups(input_model, group_skip)
+        output = correction_skip_groups(input_model, group_skip, in_place)
     else:
         # enhanced algorithm is not enabled yet (updated code and validation needed)
         log.warning('Enhanced algorithm not support yet: RSCD correction will be skipped')
@@ -58,7 +66,7 @@ def do_correction(input_model, rscd_model, type):
     return output
 
 
-def correction_skip_groups(input_model, group_skip):
+def correction_skip_groups(input_model, group_skip, in_place=False):
     """
     Short Summary
     -------------
@@ -73,6 +81,10 @@ def correction_skip_groups(input_model, group_skip):
     group_skip: int
         number of groups to skip at the beginning of the ramp
 
+    in_place: bool
+        if True, the groups are flagged in the input model rather than in a
+        copy
+
     Returns
     -------
     output_model: ~jwst.datamodels.RampModel
@@ -86,8 +98,9 @@ def correction_skip_groups(input_model, group_skip):
     log.debug("RSCD correction using: nints=%d, ngroups=%d" %
               (sci_nints, sci_ngroups))
 
-    # Create output as a copy of the input science data model
-    output = input_model.copy()
+    # Create output as a copy of the input science data model, unless the
+    # input can be updated in place
+    output = input_model if in_place else input_model.copy()
 
     # If ngroups <= group_skip+3, skip the flagging
     # the +3 is to ensure there is a slope to be fit including the flagging for
@@ -200,24 +213,27 @@ def correction_decay_function(input_model, param):
     tau_even = param['even']['tau'].item()
     tau_odd = param['odd']['tau'].item()
 
-    # loop over all integrations except the first
-    mdelta = int(sci_nints / 10) + 1
-    for i in range(1, sci_nints):
-        if ((i + 1) % mdelta) == 0:
-            log.info(' Working on integration %d', i + 1)
+    # The decay terms for all groups, broadcast over integrations and pixels
+    T = np.arange(1, sci_ngroups + 1)
+    eterm_even = np.exp(-T / tau_even).reshape((sci_ngroups, 1, 1))
+    eterm_odd = np.exp(-T / tau_odd).reshape((sci_ngroups, 1, 1))
+
+    # correct blocks of integrations (all except the first) at once
+    npix = sci_ngroups * input_model.data.shape[2] * input_model.data.shape[3]
+    nchunk = max(DECAY_CHUNK_SIZE // npix, 1)
+    for first in range(1, sci_nints, nchunk):
+        ints = np.arange(first, min(first + nchunk, sci_nints))
+        log.info(' Working on integrations %d to %d', ints[0] + 1,
+                 ints[-1] + 1)
 
         sat, dn_last23, dn_lastfit = \
-            get_DNaccumulated_last_int(input_model, i, sci_ngroups)
+            get_DNaccumulated_last_int(input_model, ints, sci_ngroups)
 
-        lastframe_even = dn_last23[1::2, :]
-        lastframe_odd = dn_last23[0::2, :]
+        lastframe_even = dn_last23[:, 1::2, :]
+        lastframe_odd = dn_last23[:, 0::2, :]
 
-        correction_even = lastframe_even.copy() * 0.0
-        correction_odd = lastframe_odd.copy() * 0.0
-        factor2_even = lastframe_even.copy() * 0.0
-        factor2_odd = lastframe_odd.copy() * 0.0
-        a1_even = lastframe_even.copy() * 0.0
-        a1_odd = lastframe_odd.copy() * 0.0
+        factor2_even = lastframe_even * 0.0
+        factor2_odd = lastframe_odd * 0.0
 
         counts2_even = lastframe_even - crossopt_even
         counts2_odd = lastframe_odd - crossopt_odd
@@ -240,38 +256,36 @@ def correction_decay_function(input_model, param):
         a1_odd = b1_odd * (np.power(counts2_odd, b2_odd)) * factor2_odd
         #___________________________________________________________________
         # SATURATED DATA
-        counts3_even = dn_lastfit[1::2, :] * sat_scale_even
-        counts3_odd = dn_lastfit[0::2, :] * sat_scale_odd
+        counts3_even = dn_lastfit[:, 1::2, :] * sat_scale_even
+        counts3_odd = dn_lastfit[:, 0::2, :] * sat_scale_odd
 
         a1_sat_even = sat_final_slope_even * counts3_even + sat_mzp_even
         a1_sat_odd = sat_final_slope_odd * counts3_odd + sat_mzp_odd
 
-        sat_even = sat[1::2, :]
-        sat_odd = sat[0::2, :]
-
-        # loop over groups in input science data:
-        for j in range(sci_ngroups):
-
-            # Compute the correction factors for even and odd rows
-            T = (j + 1)
-            eterm_even = np.exp(-T / tau_even)
-            eterm_odd = np.exp(-T / tau_odd)
-
-            # Apply the corrections to even and odd rows:
-            # the first row is defined as odd (python index 0)
-            # the second row is the first even row (python index of 1)
-            correction_odd = lastframe_odd * a1_odd * 0.01 * eterm_odd
-            correction_even = lastframe_even * a1_even * 0.01 * eterm_even
-            correction_sat_odd = lastframe_odd * a1_sat_odd * 0.01 * eterm_odd
-            correction_sat_even = lastframe_even * a1_sat_even * 0.01 * \
-                eterm_even
-            sat_index_even = np.where(sat_even)
-            sat_index_odd = np.where(sat_odd)
-            correction_even[sat_index_even] = \
-                correction_sat_even[sat_index_even]
-            correction_odd[sat_index_odd] = correction_sat_odd[sat_index_odd]
-            output.data[i, j, 0::2, :] += correction_odd
-            output.data[i, j, 1::2, :] += correction_even
+        # the previous integration saturated, per integration and pixel,
+        # broadcast over groups
+        sat_even = sat[:, np.newaxis, 1::2, :]
+        sat_odd = sat[:, np.newaxis, 0::2, :]
+
+        # Compute the corrections for all groups of the even and odd rows,
+        # (integration, group, row, column).  The decay terms are applied
+        # with the precision of the amplitudes.
+        amp_even = (lastframe_even * a1_even * 0.01)[:, np.newaxis]
+        amp_odd = (lastframe_odd * a1_odd * 0.01)[:, np.newaxis]
+        amp_sat_even = (lastframe_even * a1_sat_even * 0.01)[:, np.newaxis]
+        amp_sat_odd = (lastframe_odd * a1_sat_odd * 0.01)[:, np.newaxis]
+        correction_even = np.where(
+            sat_even, amp_sat_even * eterm_even.astype(amp_sat_even.dtype),
+            amp_even * eterm_even.astype(amp_even.dtype))
+        correction_odd = np.where(
+            sat_odd, amp_sat_odd * eterm_odd.astype(amp_sat_odd.dtype),
+            amp_odd * eterm_odd.astype(amp_odd.dtype))
+
+        # Apply the corrections to even and odd rows:
+        # the first row is defined as odd (python index 0)
+        # the second row is the first even row (python index of 1)
+        output.data[ints[0]:ints[-1] + 1, :, 0::2, :] += correction_odd
+        output.data[ints[0]:ints[-1] + 1, :, 1::2, :] += correction_even
 
     output.meta.cal_step.rscd = 'COMPLETE'
 
@@ -422,7 +436,7 @@ def get_DNaccumulated_last_int(input_model, i, sci_ngroups):
     Parameters
     ----------
     input_model: ~jwst.datamodels.RampModel
-    i: integration #
+    i: integration #, or an array of integration numbers
     sci_ngroups: number of frames/integration
 
     return values
@@ -430,15 +444,13 @@ def get_DNaccumulated_last_int(input_model, i, sci_ngroups):
     sat: the previous integration for this pixel saturated: yes/no
     dn_lastframe_23: extrapolated last frame using 2nd and 3rd to last frames
     dn_lastfrane_fit: extrapolated last frame using the fit to the entire ramp
+
+    If `i` is an array, the return values have a leading axis for the
+    integrations.
     """
 
-    nrows = input_model.data.shape[2]
-    ncols = input_model.data.shape[3]
-    dn_lastframe2 = input_model.data[i - 1][sci_ngroups - 2]
-    dn_lastframe3 = input_model.data[i - 1][sci_ngroups - 3]
-    dn_lastframe23 = dn_lastframe2.copy() * 0.0
-    dn_lastframe_fit = dn_lastframe2.copy() * 0.0
-    saturated = np.full((nrows, ncols), False)
+    dn_lastframe2 = input_model.data[i - 1, sci_ngroups - 2]
+    dn_lastframe3 = input_model.data[i - 1, sci_ngroups - 3]
 
     diff = dn_lastframe2 - dn_lastframe3
     dn_lastframe23 = dn_lastframe2 + diff
@@ -448,14 +460,14 @@ def get_DNaccumulated_last_int(input_model, i, sci_ngroups):
     ref_flag = dqflags.pixel['REFERENCE_PIXEL']
 
     # mark the locations of reference pixels
-    refpix_2d = np.bitwise_and(input_model.pixeldq, ref_flag)
-    dn_lastframe23[np.where(refpix_2d)] = 0.0
+    refpix_2d = np.bitwise_and(input_model.pixeldq, ref_flag) != 0
+    dn_lastframe23[..., refpix_2d] = 0.0
 
     # load the ramp data needed for computing slopes
     ramp3d = input_model.data[i - 1, 1:sci_ngroups - 1]
     groupdq3d = input_model.groupdq[i - 1, 1:sci_ngroups - 1]
     satmask3d = (groupdq3d == sat_flag)
-    saturated = satmask3d.any(axis=0)
+    saturated = satmask3d.any(axis=-3)
 
     # compute the slopes
     slope, intercept, ngood = ols_fit(ramp3d, groupdq3d)
@@ -467,8 +479,8 @@ def get_DNaccumulated_last_int(input_model, i, sci_ngroups):
     dn_lastframe_fit[slope0] = dn_lastframe23[slope0]
 
     # reset the results for reference pixels
-    dn_lastframe23[np.where(refpix_2d)] = 0.0
-    dn_lastframe_fit[np.where(refpix_2d)] = 0.0
+    dn_lastframe23[..., refpix_2d] = 0.0
+    dn_lastframe_fit[..., refpix_2d] = 0.0
 
     return saturated, dn_lastframe23, dn_lastframe_fit
 
@@ -484,18 +496,19 @@ def ols_fit(y, dq):
     sat_flag = dqflags.group['SATURATED']
     shape = y.shape
 
-    # Find ramp values that are saturated
-    x = np.arange(shape[0], dtype=np.float64)[:, np.newaxis, np.newaxis] * \
-        np.ones(shape)
+    # Find ramp values that are saturated; the ramps may be for one or
+    # more integrations, with the groups along axis -3, and x is broadcast
+    # over integrations and pixels
+    x = np.arange(shape[-3], dtype=np.float64)[:, np.newaxis, np.newaxis]
     good_data = np.bitwise_and(dq, sat_flag) == 0
-    ngood = good_data.sum(axis=0)
+    ngood = good_data.sum(axis=-3)
 
     # Compute sums of unsaturated (good) x/y values
-    sumx = (x * good_data).sum(axis=0)
-    sumy = (y * good_data).sum(axis=0)
-    sumxy = (x * y * good_data).sum(axis=0)
-    sumxx = (x * x * good_data).sum(axis=0)
-    nelem = good_data.sum(axis=0)
+    sumx = (x * good_data).sum(axis=-3)
+    sumy = (y * good_data).sum(axis=-3)
+    sumxy = (x * y * good_data).sum(axis=-3)
+    sumxx = (x * x * good_data).sum(axis=-3)
+    nelem = ngood
 
     # Compute the slopes and intercepts
     denom = nelem * sumxx - sumx * sumx
@@ -2,6 +2,7 @@ import numpy as np
 
 from jwst.datamodels import RampModel
 from jwst.datamodels import dqflags
+from jwst.rscd import rscd_sub
 from jwst.rscd.rscd_sub import correction_skip_groups
 
 
@@ -99,3 +100,59 @@ def test_rscd_baseline_too_few_groups():
                                   dq_diff,
                                   err_msg='groupdq flags changed when '
                                   + 'not enough groups are present')
+
+
+def test_rscd_decay_function_integrations(monkeypatch):
+    """
+    Test that the decay function correction of each integration depends
+    only on the previous integration, whether the integrations are
+    corrected all at once or in blocks
+    """
+
+    # size of exposure
+    nints = 7
+    ngroups = 6
+    xsize = 12
+    ysize = 10
+
+    rng = np.random.RandomState(42)
+    param = {}
+    for rows in ('even', 'odd'):
+        param[rows] = {
+            'ascale': np.float32(1.e-3), 'illum_zp': np.float32(1.5),
+            'illum_slope': np.float32(0.01), 'illum2': np.float32(1.e-4),
+            'sat_zp': np.float32(0.1), 'sat_slope': np.float32(1.e-3),
+            'sat2': np.float32(1.e-5), 'sat_rowterm': np.float32(1.e-4),
+            'pow': np.float32(0.7), 'param3': np.float32(3.e4),
+            'crossopt': np.float32(20.), 'sat_mzp': np.float32(1.e-4),
+            'sat_scale': np.float32(1.), 'tau': np.float32(4.)}
+
+    csize = (nints, ngroups, ysize, xsize)
+    rate = rng.uniform(0., 10000., (nints, 1, ysize, xsize))
+    data = (rate * np.arange(ngroups)[:, np.newaxis, np.newaxis]
+            ).astype(np.float32)
+    groupdq = np.zeros(csize, dtype=np.uint8)
+    groupdq[data > 40000.] = dqflags.group['SATURATED']
+    dm_ramp = RampModel(data=data, groupdq=groupdq)
+    dm_ramp.pixeldq[:, 0] = dqflags.pixel['REFERENCE_PIXEL']
+
+    result = rscd_sub.correction_decay_function(dm_ramp, param)
+    assert result.meta.cal_step.rscd == 'COMPLETE'
+
+    # the first integration is not corrected
+    np.testing.assert_array_equal(result.data[0], dm_ramp.data[0])
+    assert np.any(result.data[1:] != dm_ramp.data[1:])
+
+    # correct pairs of integrations, one at a time
+    for i in range(1, nints):
+        pair = RampModel(data=data[i - 1:i + 1].copy(),
+                         groupdq=groupdq[i - 1:i + 1].copy())
+        pair.pixeldq[:, 0] = dqflags.pixel['REFERENCE_PIXEL']
+        expected = rscd_sub.correction_decay_function(pair, param)
+        np.testing.assert_array_equal(result.data[i], expected.data[1])
+
+    # correct blocks of three integrations
+    monkeypatch.setattr(rscd_sub, 'DECAY_CHUNK_SIZE',
+                        3 * ngroups * ysize * xsize)
+    blocks = rscd_sub.correction_decay_function(dm_ramp, param)
+    np.testing.assert_array_equal(blocks.data, result.data)
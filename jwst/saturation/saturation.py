@@ -15,7 +15,7 @@ log.setLevel(logging.DEBUG)
 
 HUGE_NUM = 100000.
 
-def do_correction(input_model, ref_model):
+def do_correction(input_model, ref_model, in_place=False):
     """
     Short Summary
     -------------
@@ -30,6 +30,9 @@ def do_correction(input_model, ref_model):
     ref_model: data model object
         Saturation reference file mode object
 
+    in_place: bool
+        If True, the flags are set in the input model rather than in a copy
+
     Returns
     -------
     output_model: data model object
@@ -42,14 +45,70 @@ def do_correction(input_model, ref_model):
     if is_irs2_format:
         irs2_mask = x_irs2.make_mask(input_model)
 
-   # Create the output model as a copy of the input
-    output_model = input_model.copy()
+   # Create the output model as a copy of the input, unless the input can
+   # be updated in place
+    output_model = input_model if in_place else input_model.copy()
     groupdq = output_model.groupdq
 
+    # Get the saturation thresholds and DQ flags matching the science data
+    satmask, dqmask = prepare_reference(input_model, ref_model)
+
+    nints = ramparr.shape[0]
+
+    detector = input_model.meta.instrument.detector
+    for ints in range(nints):
+        # Update the 4D groupdq array with the saturation flag, in all of
+        # the groups of the integration at once
+        if is_irs2_format:
+            sci_temp = x_irs2.from_irs2(ramparr[ints], irs2_mask, detector)
+            gdq_temp = x_irs2.from_irs2(groupdq[ints], irs2_mask, detector)
+            flag_saturation(sci_temp, gdq_temp, satmask)
+            # Copy gdq_temp back into the normal pixels of groupdq.
+            x_irs2.to_irs2(groupdq[ints], gdq_temp, irs2_mask, detector)
+        else:
+            flag_saturation(ramparr[ints], groupdq[ints], satmask)
+
+    output_model.groupdq = groupdq
+    if is_irs2_format:
+        pixeldq_temp = x_irs2.from_irs2(output_model.pixeldq, irs2_mask,
+                                        detector)
+        pixeldq_temp = np.bitwise_or(pixeldq_temp, dqmask)
+        x_irs2.to_irs2(output_model.pixeldq, pixeldq_temp, irs2_mask, detector)
+    else:
+        output_model.pixeldq = np.bitwise_or(output_model.pixeldq, dqmask)
+
+    return output_model
+
+
+def prepare_reference(input_model, ref_model):
+    """
+    Short Summary
+    -------------
+    Get the saturation thresholds and DQ flags from the reference file,
+    extracting the subarray of the science data if necessary.  Pixels
+    flagged as NO_SAT_CHECK, or having NaN thresholds, are given thresholds
+    so high that they are never flagged as saturated.
+
+    Parameters
+    ----------
+    input_model: data model object
+        The input science data
+
+    ref_model: data model object
+        Saturation reference file model object, which is not modified
+
+    Returns
+    -------
+    satmask: 2-d array
+        Saturation thresholds
+
+    dqmask: ndarray, same shape as `satmask`
+        DQ flags to combine with the PIXELDQ array of the science data
+    """
     # Extract subarray from reference file, if necessary
     if reffile_utils.ref_matches_sci(input_model, ref_model):
-        satmask = ref_model.data
-        dqmask = ref_model.dq
+        satmask = ref_model.data.copy()
+        dqmask = ref_model.dq.copy()
     else:
         log.info('Extracting reference file subarray to match science data')
         ref_sub_model = reffile_utils.get_subarray_model(input_model, ref_model)
@@ -65,39 +124,43 @@ def do_correction(input_model, ref_model):
     # Correct saturation values for NaNs in the ref file
     correct_for_NaN(satmask, dqmask)
 
-    dq_flag = dqflags.group['SATURATED']
+    return satmask, dqmask
 
-    nints = ramparr.shape[0]
-    ngroups = ramparr.shape[1]
 
-    detector = input_model.meta.instrument.detector
-    flagarray = np.zeros(ramparr.shape[-2:], dtype=groupdq.dtype)
-    for ints in range(nints):
-        for plane in range(ngroups):
-            # Update the 4D groupdq array with the saturation flag. The
-            # flag is set in the current plane and all following planes.
-            if is_irs2_format:
-                sci_temp = x_irs2.from_irs2(ramparr[ints, plane, :, :],
-                                            irs2_mask, detector)
-                flag_temp = np.where(sci_temp >= satmask, dq_flag, 0)
-                # Copy flag_temp into flagarray.
-                x_irs2.to_irs2(flagarray, flag_temp, irs2_mask, detector)
-            else:
-                flagarray[:, :] = np.where(ramparr[ints, plane, :, :] >= satmask,
-                                          dq_flag, 0)
-            np.bitwise_or(groupdq[ints, plane:, :, :], flagarray,
-                          groupdq[ints, plane:, :, :])
+def flag_saturation(data, groupdq, satmask):
+    """
+    Short Summary
+    -------------
+    Flag the groups in which the signal is at or above the saturation
+    threshold as saturated, together with all of the following groups.
+    The saturated groups of all pixels are found at once, and carried
+    forward to the following groups with a cumulative logical OR along the
+    group axis.
 
-    output_model.groupdq = groupdq
-    if is_irs2_format:
-        pixeldq_temp = x_irs2.from_irs2(output_model.pixeldq, irs2_mask,
-                                        detector)
-        pixeldq_temp = np.bitwise_or(pixeldq_temp, dqmask)
-        x_irs2.to_irs2(output_model.pixeldq, pixeldq_temp, irs2_mask, detector)
-    else:
-        output_model.pixeldq = np.bitwise_or(output_model.pixeldq, dqmask)
+    Parameters
+    ----------
+    data: ndarray
+        Science data, with groups along the third from last axis, e.g.
+        [group, row, column] for an integration.
 
-    return output_model
+    groupdq: ndarray, same shape as `data`
+        The GROUPDQ array of the science data, updated in-place.
+
+    satmask: 2-d array
+        Saturation thresholds, with the shape of the last two axes of `data`.
+    """
+    saturated = (data >= satmask)
+
+    # Accumulate plane by plane, as np.logical_or.accumulate is much slower
+    # along the strided group axis
+    for group in range(1, saturated.shape[-3]):
+        np.logical_or(saturated[..., group - 1, :, :],
+                      saturated[..., group, :, :],
+                      out=saturated[..., group, :, :])
+
+    flags = saturated.astype(groupdq.dtype)
+    flags *= dqflags.group['SATURATED']
+    np.bitwise_or(groupdq, flags, out=groupdq)
 
 
 def correct_for_NaN(satmask, dqmask):
@@ -28,7 +28,7 @@ class SaturationStep(Step):
             if self.ref_name == 'N/A':
                 self.log.warning('No SATURATION reference file found')
                 self.log.warning('Saturation step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.saturation = 'SKIPPED'
                 return result
 
@@ -36,7 +36,8 @@ class SaturationStep(Step):
             ref_model = datamodels.SaturationModel(self.ref_name)
 
             # Do the saturation check
-            sat = saturation.do_correction(input_model, ref_model)
+            sat = saturation.do_correction(input_model, ref_model,
+                                           self.in_place)
 
             # Close the reference file and update the step status
             ref_model.close()
@@ -8,6 +8,7 @@ import pytest
 import numpy as np
 
 from jwst.saturation import SaturationStep
+from jwst.saturation import x_irs2
 from jwst.saturation.saturation import do_correction, correct_for_NaN
 from jwst.datamodels import RampModel, SaturationModel, dqflags
 
@@ -251,6 +252,54 @@ def test_full_step(setup_nrc_cube):
     assert np.all(output.groupdq[0, :, 100, 100] != dqflags.group['SATURATED'])
 
 
+def test_irs2_saturation_flagging():
+    '''Check that only normal pixels of IRS2 data are flagged, in the
+       saturated group and all following groups of each integration.'''
+
+    nints = 2
+    ngroups = 5
+    nrows = 3200
+    ncols = 10
+
+    data = RampModel((nints, ngroups, nrows, ncols))
+    data.meta.instrument.name = 'NIRSPEC'
+    data.meta.instrument.detector = 'NRS1'
+    data.meta.exposure.readpatt = 'NRSIRS2'
+    data.meta.exposure.nrs_normal = 16
+    data.meta.exposure.nrs_reference = 4
+    data.meta.subarray.xstart = 1
+    data.meta.subarray.ystart = 1
+    data.meta.subarray.xsize = ncols
+    data.meta.subarray.ysize = 2048
+
+    satmap = SaturationModel((2048, ncols))
+    satmap.meta.instrument.name = 'NIRSPEC'
+    satmap.meta.subarray.xstart = 1
+    satmap.meta.subarray.ystart = 1
+    satmap.meta.subarray.xsize = ncols
+    satmap.meta.subarray.ysize = 2048
+    satmap.data[:, :] = 60000
+
+    # rows of the IRS2 data holding normal and reference pixels
+    irs2_mask = x_irs2.make_mask(data)
+    normal_row = np.nonzero(irs2_mask)[0][100]
+    ref_row = np.nonzero(~irs2_mask)[0][-1]
+
+    # saturate a normal pixel from the third group of the second integration,
+    # dipping back below the limit, and a reference pixel in all groups
+    data.data[1, 2:, normal_row, 5] = [61000, 59000, 62000]
+    data.data[:, :, ref_row, 5] = 70000
+
+    output = do_correction(data, satmap)
+
+    sat = dqflags.group['SATURATED']
+    assert np.all(output.groupdq[1, 2:, normal_row, 5] == sat)
+    assert np.all(output.groupdq[1, :2, normal_row, 5] == 0)
+    assert np.all(output.groupdq[0, :, normal_row, 5] == 0)
+    assert np.all(output.groupdq[:, :, ref_row, 5] == 0)
+    assert np.count_nonzero(output.groupdq) == 3
+
+
 @pytest.fixture(scope='function')
 def setup_nrc_cube():
     ''' Set up fake NIRCam data to test.'''
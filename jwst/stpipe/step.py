@@ -64,6 +64,11 @@ class Step():
     # but by default attempt to prefetch
     prefetch_references = True
 
+    # Set to True, by a pipeline that owns its input, to allow steps
+    # that support it to modify the input model in place rather than
+    # working on a copy
+    in_place = False
+
     @classmethod
     def merge_config(cls, config, config_file):
         return config
@@ -685,6 +690,28 @@ class Step():
                 (reference_file_type, hdr_name))
         return crds_client.check_reference_open(reference_name)
 
+    def get_reference_file_name(self, reference_file_type):
+        """
+        Get the name of a reference file, as recorded in the output metadata.
+
+        Parameters
+        ----------
+        reference_file_type : string
+            The type of reference file, as passed to `get_reference_file`.
+
+        Returns
+        -------
+        reference_name : string or None
+            The name recorded for the reference file of this type by the
+            last call to `get_reference_file` in the current run, or None
+            if no name was recorded.
+        """
+        reference_name = None
+        for used_type, used_name in self._reference_files_used:
+            if used_type == reference_file_type:
+                reference_name = used_name
+        return reference_name
+
     @classmethod
     def get_config_from_reference(cls, dataset, observatory=None, disable=None):
         """Retrieve step parameters from reference database
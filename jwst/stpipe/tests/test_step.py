@@ -692,6 +692,8 @@ def test_crds_override():
 
     fd = step.get_reference_file(datamodels.open(), 'flat_field')
     assert fd == join(dirname(__file__), 'data', 'flat.fits')
+    assert step.get_reference_file_name('flat_field') == 'flat.fits'
+    assert step.get_reference_file_name('dark') is None
 
 
 def test_omit_ref_file():
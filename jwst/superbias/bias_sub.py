@@ -10,7 +10,7 @@ log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 
-def do_correction(input_model, bias_model):
+def do_correction(input_model, bias_model, in_place=False):
     """
     Short Summary
     -------------
@@ -24,6 +24,10 @@ def do_correction(input_model, bias_model):
     bias_model: super-bias model object
         bias data
 
+    in_place: bool
+        if True, the bias is subtracted from the input model rather than
+        from a copy
+
     Returns
     -------
     output_model: data model object
@@ -40,14 +44,14 @@ def do_correction(input_model, bias_model):
     bias_model.data[np.isnan(bias_model.data)] = 0.0
 
     # Subtract the bias ref image from the science data
-    output_model = subtract_bias(input_model, bias_model)
+    output_model = subtract_bias(input_model, bias_model, in_place)
 
     output_model.meta.cal_step.superbias = 'COMPLETE'
 
     return output_model
 
 
-def subtract_bias(input, bias):
+def subtract_bias(input, bias, in_place=False):
     """
     Subtracts a superbias image from a science data set, subtracting the
     superbias from each group of each integration in the science data.
@@ -62,6 +66,10 @@ def subtract_bias(input, bias):
     bias: superbias model object
         the superbias image data
 
+    in_place: bool
+        if True, the bias is subtracted from the input model rather than
+        from a copy
+
     Returns
     -------
     output: data model object
@@ -69,8 +77,9 @@ def subtract_bias(input, bias):
 
     """
 
-    # Create output as a copy of the input science data model
-    output = input.copy()
+    # Create output as a copy of the input science data model, unless the
+    # input can be modified in place
+    output = input if in_place else input.copy()
 
     # combine the science and superbias DQ arrays
     output.pixeldq = np.bitwise_or(input.pixeldq, bias.dq)
@@ -30,7 +30,7 @@ class SuperBiasStep(Step):
             if self.bias_name == 'N/A':
                 self.log.warning('No SUPERBIAS reference file found')
                 self.log.warning('Superbias step will be skipped')
-                result = input_model.copy()
+                result = input_model if self.in_place else input_model.copy()
                 result.meta.cal_step.superbias = 'SKIPPED'
                 return result
 
@@ -38,7 +38,8 @@ class SuperBiasStep(Step):
             bias_model = datamodels.SuperBiasModel(self.bias_name)
 
             # Do the bias subtraction
-            result = bias_sub.do_correction(input_model, bias_model)
+            result = bias_sub.do_correction(input_model, bias_model,
+                                            self.in_place)
 
             # Close the superbias reference file model and
             # set the step status to complete